@@ -0,0 +1,30 @@
+"""
+The API documentation views, imported on the first request to ``/swagger/`` or ``/redoc/``.
+
+See reviews.docs for why they are kept out of the URLconf.
+"""
+from drf_yasg import openapi
+from drf_yasg.views import get_schema_view
+from rest_framework import permissions
+
+from reviews.schema import CachedSchemaMixin
+
+
+# Also SWAGGER_SETTINGS['DEFAULT_INFO'], for the schemas built outside a request
+api_info = openapi.Info(
+    title="Movie Review API",
+    default_version='v1',
+    description="API for managing movie reviews and users",
+    terms_of_service="https://www.example.com/terms/",
+    contact=openapi.Contact(email="contact@example.com"),
+    license=openapi.License(name="BSD License"),
+)
+
+
+# Serves the spec from the schema built once per version of the code, see reviews.schema
+class SchemaView(CachedSchemaMixin, get_schema_view(api_info, public=True, permission_classes=(permissions.AllowAny,))):
+    pass
+
+
+swagger_ui = SchemaView.with_ui('swagger', cache_timeout=0)
+redoc_ui = SchemaView.with_ui('redoc', cache_timeout=0)
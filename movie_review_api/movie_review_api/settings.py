@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
+import os
 from pathlib import Path
 from datetime import timedelta
 
@@ -41,13 +42,14 @@ INSTALLED_APPS = [
     'rest_framework',
     'rest_framework.authtoken',
     'rest_framework_simplejwt.token_blacklist', 
-    'rest_framework_swagger',
     'reviews',
     'drf_yasg',
     'django_filters',
 ]
 
 MIDDLEWARE = [
+    # First, so its total covers the other middleware too
+    'reviews.profiling.ProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -81,12 +83,121 @@ WSGI_APPLICATION = 'movie_review_api.wsgi.application'
 REST_FRAMEWORK = {
     
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'reviews.authentication.CachedJWTAuthentication',  # JWT with an in-process user cache
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticatedOrReadOnly',
     ],
     'DEFAULT_FILTER_BACKENDS': ['django_filters.rest_framework.DjangoFilterBackend'],
+    'DEFAULT_RENDERER_CLASSES': [
+        'reviews.renderers.FastJSONRenderer',  # DRF's JSON output, encoded with orjson when it is installed
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+}
+
+# Serve the review and movie lists from values() rows instead of serializer instances, see reviews/rows.py
+FAST_LIST_SERIALIZATION = True
+
+
+# What to do when a view runs more SQL queries than its declared query_budget:
+# 'log' a warning, 'raise' reviews.budgets.QueryBudgetExceeded, or None to skip counting
+QUERY_BUDGET_MODE = 'log'
+
+
+# Per-request timing breakdown, see reviews/profiling.py. Set to None to turn it off.
+PROFILING = {
+    'SERVER_TIMING': True,  # Send the breakdown to clients in a Server-Timing header
+    'SAMPLE_RATE': 0,  # Fraction of requests run under cProfile
+    'SLOW_REQUEST_MS': 1000,  # Sample the stacks of requests running longer than this; None to never
+    'DUMP_DIR': BASE_DIR / 'profiles',  # Where .prof and .folded files are written
+}
+
+
+# Admission control of the expensive endpoints, see reviews/admission.py. Limits are per worker
+# process: keep the concurrency plus the queue of all classes below its thread count. None turns it off.
+ADMISSION = {
+    'CLASSES': {
+        'search': {'CONCURRENCY': 2, 'QUEUE': 4, 'TIMEOUT': 2.0, 'THROTTLE': {'RATE': 10, 'BURST': 50}},
+        'list': {'CONCURRENCY': 4, 'QUEUE': 8, 'TIMEOUT': 2.0, 'THROTTLE': {'RATE': 20, 'BURST': 100}},
+        'bulk': {'CONCURRENCY': 2, 'QUEUE': 2, 'TIMEOUT': 5.0, 'THROTTLE': {'RATE': 1, 'BURST': 20}},
+        # Full-corpus streams, each holding its slot until the last row is sent
+        'export': {'CONCURRENCY': 1, 'QUEUE': 1, 'TIMEOUT': 5.0, 'THROTTLE': {'RATE': 0.1, 'BURST': 5}},
+    },
+    'RETRY_AFTER': 1,  # Seconds shed clients are told to wait
+    'THROTTLE_CACHE': 'throttle',
+}
+
+
+# wsgi.py and asgi.py check the SQLite settings and warm up before a worker takes traffic only
+# with PREPARE_WORKER=1 in the environment; importing them stays free of side effects otherwise.
+# A server hook, e.g. gunicorn's post_worker_init, can call reviews.startup.prepare_worker instead.
+PREPARE_WORKER = os.environ.get('PREPARE_WORKER') == '1'
+
+# One-off work of the warm-up, see reviews/startup.py; None leaves it to the first request.
+# manage.py bench_cold_start measures the difference.
+WARMUP = {
+    'CONNECTIONS': True,  # Open every database connection, with its pragmas
+    'URLS': ['/api/movies/?page_size=1', '/api/reviews/?page_size=1'],  # Requested in process, filling the response cache
+    'TYPEAHEAD': True,  # Build the movie-title index of /api/movies/autocomplete/
+}
+
+
+# Largest JSON array accepted by the bulk create/update endpoints
+BULK_MAX_ITEMS = 5000
+
+
+# Movie leaderboards, see reviews/leaderboards.py; run manage.py compact_leaderboards periodically
+LEADERBOARDS = {
+    'PRIOR_WEIGHT': 10,  # Reviews a movie needs before its own mean outweighs the catalogue's in top-rated
+    'TRENDING_HOURS': 24,
+    'WEEK_HOURS': 168,
+}
+
+
+# Item-item recommendations, see reviews/recommendations.py; run manage.py compute_similarities periodically
+RECOMMENDATIONS = {
+    'PATH': BASE_DIR / 'similarities.bin',  # Neighbours file shared by the workers through mmap
+    'NEIGHBOURS': 20,  # Most similar movies kept per movie
+    'MIN_COMMON_USERS': 2,  # Raters two movies need in common before their similarity counts
+    'RECENT_RATINGS': 50,  # A user's latest ratings that recommendations are built from
+}
+
+
+# Write-behind ingest of review POSTs, see reviews/ingest.py; accepted reviews are answered with 202
+# and a ticket, and inserted in batches. Run manage.py flush_review_logs after a crash.
+REVIEW_INGEST = {
+    'ENABLED': False,
+    'DIR': BASE_DIR / 'ingest',  # Local directory of the append-only logs, one per worker process
+    'FLUSH_MS': 200,  # Longest a review waits for its batch; None leaves flushing to reads and the command
+    'BATCH_ROWS': 500,  # Flush at once when this many reviews are waiting
+    'FSYNC': True,  # Sync each review to disk before answering; off, a host crash can lose the last ones
+    'ROTATE_BYTES': 16 * 1024 * 1024,  # Start a new log once the current one is inserted and this large
+    'PENDING_SECONDS': 30,  # How long an author's reads flush the logs after they post
+    'TICKET_SECONDS': 3600,  # How long /api/reviews/ingest/<ticket>/ remembers a review
+    # Tickets and pending flags; must be shared by the worker processes, write-behind stays off
+    # while it is a local-memory cache such as the one configured below
+    'CACHE': 'default',
+}
+
+
+# Movie-title suggestions at /api/movies/autocomplete/, from an index in each process, see reviews/typeahead.py
+TYPEAHEAD = {
+    # Shared cache alias carrying the version that tells the other processes a title changed. None, or a
+    # local-memory alias such as 'default' here, leaves them to catch up at their next refresh
+    'CACHE': None,
+    'CHECK_SECONDS': 1,  # Longest a process answers from its index before checking that version again
+    'REFRESH_SECONDS': 300,  # Rebuild this often anyway, for the review counts the suggestions are ordered by
+    'LIMIT': 10,
+    'MAX_LIMIT': 50,
+    'SCAN_LIMIT': 256,  # Prefixes matching more title words than this are ranked when the index is built
+}
+
+
+# Delta-sync feed at /api/changes/, see reviews/changelog.py; run manage.py prune_change_log daily
+CHANGE_LOG = {
+    'PAGE_SIZE': 100,
+    'MAX_LIMIT': 1000,
+    'TOMBSTONE_DAYS': 30,  # How long deletes are kept; clients away for longer sync again from scratch
 }
 
 
@@ -95,10 +206,23 @@ SIMPLE_JWT = {
     'REFRESH_TOKEN_LIFETIME': timedelta(days=7),
     'ROTATE_REFRESH_TOKENS': True,
     'BLACKLIST_AFTER_ROTATION': True,
+    # Checks the blacklist through an in-memory filter before querying it
+    'TOKEN_REFRESH_SERIALIZER': 'reviews.authentication.TokenRefreshSerializer',
+}
+
+# Threads the async signup and login views hash passwords in (None: one per CPU, at most 4)
+PASSWORD_HASHING_WORKERS = None
+
+# Users behind JWT access tokens kept in process, see reviews.authentication; with
+# RESPONSE_CACHE on a backend the worker processes share, other workers' writes reach them too
+JWT_USER_CACHE = {
+    'MAX_SIZE': 1024,
+    'TIMEOUT': 60,  # Seconds; writes through the ORM invalidate entries sooner
 }
 
 SWAGGER_SETTINGS = {
-    'DEFAULT_INFO': 'reviews.urls.schema_view',
+    'DEFAULT_INFO': 'movie_review_api.docs.api_info',
+    'DEFAULT_GENERATOR_CLASS': 'reviews.schema.SchemaGenerator',  # Applies the deferred swagger_auto_schema first
     'SECURITY_DEFINITIONS': {
         'Bearer': {
             'type': 'apiKey',
@@ -111,17 +235,97 @@ SWAGGER_SETTINGS = {
     'JSON_EDITOR': True,
 }
 
+# Spec of /swagger/ and /redoc/ built once per version of the code, see reviews/schema.py;
+# run manage.py build_openapi_schema at build time, None generates it on every request
+OPENAPI_SCHEMA = {
+    'DIR': BASE_DIR / 'openapi',  # Where the built JSON and YAML go
+    'MAX_AGE': 0,  # Seconds clients may use the spec before revalidating with its ETag
+}
+
 
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
+# The production SQLite profile (see reviews/sqlite.py) is opt-in: start with
+# SQLITE_PROFILE=production. Without it, development, tests and makemigrations keep SQLite's
+# defaults and leave the tracked db.sqlite3 in rollback-journal mode.
+SQLITE_PRODUCTION = os.environ.get('SQLITE_PROFILE') == 'production'
+
+# Keep connections, and the pragmas set on them, across requests
+SQLITE_PRODUCTION_CONN_MAX_AGE = 600
+SQLITE_PRODUCTION_OPTIONS = {
+    # Take the write lock at BEGIN, so a transaction that reads and then writes waits
+    # for the busy timeout instead of failing at once with "database is locked"
+    'transaction_mode': 'IMMEDIATE',
+}
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'CONN_MAX_AGE': SQLITE_PRODUCTION_CONN_MAX_AGE if SQLITE_PRODUCTION else 0,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': dict(SQLITE_PRODUCTION_OPTIONS) if SQLITE_PRODUCTION else {},
+        # A file-backed test database lets threaded tests wait on SQLite locks instead of failing
+        'TEST': {
+            'NAME': BASE_DIR / 'test_db.sqlite3',
+        },
     }
 }
 
+# Read replicas for the GET requests of the API views, see reviews/replicas.py. Locally they are
+# SQLite copies of the primary, refreshed with `manage.py sync_replicas`; start with e.g.
+# DATABASE_REPLICAS=2 to use db.replica1.sqlite3 and db.replica2.sqlite3.
+DATABASE_REPLICAS = [f'replica{i}' for i in range(1, int(os.environ.get('DATABASE_REPLICAS', 0)) + 1)]
+DATABASES.update({
+    alias: {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / f'db.{alias}.sqlite3',
+        'CONN_MAX_AGE': SQLITE_PRODUCTION_CONN_MAX_AGE if SQLITE_PRODUCTION else 0,
+        'CONN_HEALTH_CHECKS': True,
+        'TEST': {'MIRROR': 'default'},
+    }
+    for alias in DATABASE_REPLICAS
+})
+
+DATABASE_ROUTERS = ['reviews.replicas.ReplicaRouter']
+
+# Applied to every new SQLite connection and verified at startup under the production profile,
+# see reviews/sqlite.py. Without the profile SQLITE_PRAGMAS is None, which keeps SQLite's defaults.
+SQLITE_PRODUCTION_PRAGMAS = {
+    'journal_mode': 'WAL',  # Readers and the writer no longer block each other
+    'synchronous': 'NORMAL',  # Safe from corruption under WAL; the last commits may roll back on power loss
+    'mmap_size': 256 * 1024 * 1024,  # Bytes of the file read through the memory map
+    'busy_timeout': 5000,  # Milliseconds a writer waits for the lock before "database is locked"
+}
+SQLITE_PRAGMAS = SQLITE_PRODUCTION_PRAGMAS if SQLITE_PRODUCTION else None
+
+# Seconds a user's reads stay on the primary after they write; also the replica lag tolerated
+REPLICA_PIN_SECONDS = 5
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # Token buckets of the admission throttles; a shared backend makes them span worker processes
+    'throttle': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'throttle',
+    },
+}
+
+# Versioned response cache for the read endpoints, see reviews/caching.py. Local-memory
+# caches are per process; switch to FileBasedCache when running several worker processes.
+# TIMEOUT only evicts entries already made unreachable by a write. Set to None to disable.
+RESPONSE_CACHE = {
+    'ALIAS': 'default',
+    'TIMEOUT': 300,
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -16,31 +16,15 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path, include
-from rest_framework import permissions
-from drf_yasg.views import get_schema_view
-from drf_yasg import openapi
 
-
-
-schema_view = get_schema_view(
-    openapi.Info(
-        title="Movie Review API",
-        default_version='v1',
-        description="API for managing movie reviews and users",
-        terms_of_service="https://www.example.com/terms/",
-        contact=openapi.Contact(email="contact@example.com"),
-        license=openapi.License(name="BSD License"),
-    ),
-    public=True,
-    permission_classes=(permissions.AllowAny,),
-)
+from reviews.docs import lazy_view
 
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('reviews.urls')),
     path('api-auth/', include('rest_framework.urls')),
-    path('swagger/', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
-    path('redoc/', schema_view.with_ui('redoc', cache_timeout=0), name='schema-redoc'),
+    # drf_yasg loads on the first docs request, see reviews.docs
+    path('swagger/', lazy_view('movie_review_api.docs.swagger_ui'), name='schema-swagger-ui'),
+    path('redoc/', lazy_view('movie_review_api.docs.redoc_ui'), name='schema-redoc'),
 ]
-
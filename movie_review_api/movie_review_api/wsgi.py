@@ -9,8 +9,16 @@ https://docs.djangoproject.com/en/5.1/howto/deployment/wsgi/
 
 import os
 
+from django.conf import settings
 from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'movie_review_api.settings')
 
 application = get_wsgi_application()
+
+# Only with PREPARE_WORKER=1 in the environment, so tools that import this module
+# neither touch the database nor send requests
+if getattr(settings, 'PREPARE_WORKER', False):
+    from reviews.startup import prepare_worker  # Needs the apps loaded
+
+    prepare_worker()
@@ -0,0 +1,255 @@
+"""
+Admission control and load shedding.
+
+Views name the admission class of their expensive methods with
+``admission_class``: either one name or a dict keyed by HTTP method, like
+``query_budget``. ``settings.ADMISSION['CLASSES']`` sets three limits for
+each class:
+
+``CONCURRENCY``  how many of its requests may run at once
+``QUEUE``        how many more may wait for a slot
+``TIMEOUT``      how many seconds a request waits before it gives up
+
+A request that finds the queue full, or whose wait times out, is turned
+away at once with 503 and ``Retry-After``. It never ties up a worker thread
+that cheap requests need, so a spike in searches cannot starve detail
+lookups and logins. Views without a class, such as the detail views, are
+never limited. A streamed response, such as the review export, keeps its
+slot until the server closes it. The limits apply per worker process, and
+queued requests hold their thread while they wait. Keep the concurrency plus
+the queue of all classes below the number of threads in a worker.
+
+A class can also set ``THROTTLE``: a per-user token bucket (per client IP
+for anonymous requests) of ``RATE`` requests a second with bursts of up to
+``BURST``. Over the limit, a request gets DRF's 429 with ``Retry-After``.
+Buckets live in the cache named by ``THROTTLE_CACHE``. With the default
+local-memory cache they are per worker process; a shared cache backend makes
+them per host or per site.
+
+``metrics()`` reports the queue depth, active requests and admission
+counters of this process; ``/api/admission/metrics/`` serves them to staff
+users. Time spent queueing shows as the ``queue`` phase in
+``reviews.profiling``.
+"""
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from rest_framework.throttling import BaseThrottle
+
+from . import profiling
+
+
+logger = logging.getLogger(__name__)
+
+THROTTLE_KEY = 'reviews:throttle:{}:{}'
+
+
+def _config():
+    return getattr(settings, 'ADMISSION', None) or {}
+
+
+def retry_after():
+    return _config().get('RETRY_AFTER', 1)
+
+
+class Overloaded(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'The server is busy, try again shortly.'
+    default_code = 'overloaded'
+
+    def __init__(self, wait, detail=None):
+        super().__init__(detail)
+        self.wait = wait  # DRF's exception handler turns it into Retry-After
+
+
+class Limiter:
+    """
+    Concurrency limit with a bounded wait queue for one admission class.
+    """
+    def __init__(self, name, concurrency, queue=0, timeout=1.0):
+        self.name = name
+        self.concurrency = concurrency
+        self.queue = queue
+        self.timeout = timeout
+        self._condition = threading.Condition()
+        self.active = self.waiting = self.max_waiting = 0
+        self.admitted = self.rejected = self.timed_out = 0
+
+    def acquire(self):
+        """
+        Take a slot, waiting in the queue up to ``timeout`` seconds; False when the request is turned away.
+        """
+        with self._condition:
+            # Newcomers only skip the queue when nobody is waiting in it
+            if self.active < self.concurrency and not self.waiting:
+                self.active += 1
+                self.admitted += 1
+                return True
+            if self.waiting >= self.queue:
+                self.rejected += 1
+                return False
+
+            self.waiting += 1
+            self.max_waiting = max(self.max_waiting, self.waiting)
+            deadline = time.monotonic() + self.timeout
+            try:
+                while self.active >= self.concurrency:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.timed_out += 1
+                        return False
+                    self._condition.wait(remaining)
+            finally:
+                self.waiting -= 1
+            self.active += 1
+            self.admitted += 1
+            return True
+
+    def release(self):
+        with self._condition:
+            self.active -= 1
+            self._condition.notify()
+
+    def snapshot(self):
+        with self._condition:
+            return {
+                'concurrency': self.concurrency, 'queue': self.queue, 'active': self.active,
+                'waiting': self.waiting, 'max_waiting': self.max_waiting, 'admitted': self.admitted,
+                'rejected': self.rejected, 'timed_out': self.timed_out,
+            }
+
+
+_limiters = {}  # Class name -> (its settings, Limiter) in this process
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(name):
+    """
+    The limiter of an admission class, or None when the class has no limits.
+    """
+    limits = (_config().get('CLASSES') or {}).get(name) if name else None
+    if not limits or limits.get('CONCURRENCY') is None:
+        return None
+    entry = _limiters.get(name)
+    if entry is None or entry[0] != limits:
+        with _limiters_lock:
+            entry = _limiters.get(name)
+            if entry is None or entry[0] != limits:
+                # New settings start a new limiter; requests holding the old one release it
+                limiter = Limiter(name, limits['CONCURRENCY'], limits.get('QUEUE', 0), limits.get('TIMEOUT', 1.0))
+                entry = _limiters[name] = (limits, limiter)
+    return entry[1]
+
+
+_throttled = {}  # Class name -> requests throttled in this process
+
+
+def metrics():
+    return {
+        name: {**limiter.snapshot(), 'throttled': _throttled.get(name, 0)}
+        for name, (_, limiter) in sorted(_limiters.items())
+    }
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    Per user, or per client IP for anonymous requests, token bucket of one admission class.
+    """
+    # Read-modify-write of a bucket; other processes sharing the cache can still interleave
+    _lock = threading.Lock()
+
+    def __init__(self, name, rate, burst):
+        self.name = name
+        self.rate = rate
+        self.burst = burst
+        self._wait = None
+
+    def allow_request(self, request, view):
+        user = getattr(request, 'user', None)
+        ident = f'user-{user.pk}' if user is not None and user.is_authenticated else f'ip-{self.get_ident(request)}'
+        key = THROTTLE_KEY.format(self.name, ident)
+        cache = caches[_config().get('THROTTLE_CACHE', 'default')]
+        now = time.time()
+        with self._lock:
+            tokens, updated = cache.get(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            # Kept until the bucket would be full again anyway
+            cache.set(key, (tokens, now), timeout=self.burst / self.rate + 1)
+        if not allowed:
+            self._wait = (1 - tokens) / self.rate
+            _throttled[self.name] = _throttled.get(self.name, 0) + 1
+        return allowed
+
+    def wait(self):
+        return self._wait
+
+
+class AdmissionControlMixin:
+    """
+    DRF view mixin that throttles and admits requests through the limits of the view's ``admission_class``.
+    """
+    admission_class = None
+
+    def get_admission_class(self, method):
+        if isinstance(self.admission_class, dict):
+            return self.admission_class.get(method)
+        return self.admission_class
+
+    def get_throttles(self):
+        throttles = super().get_throttles()
+        name = self.get_admission_class(self.request.method)
+        limits = (_config().get('CLASSES') or {}).get(name) if name else None
+        throttle = (limits or {}).get('THROTTLE')
+        if throttle:
+            throttles.append(TokenBucketThrottle(name, throttle['RATE'], throttle['BURST']))
+        return throttles
+
+    def initial(self, request, *args, **kwargs):
+        # Authentication and throttles first; a throttled request never takes a slot
+        super().initial(request, *args, **kwargs)
+        limiter = get_limiter(self.get_admission_class(request.method))
+        if limiter is None:
+            return
+        with profiling.phase('queue'):
+            admitted = limiter.acquire()
+        if not admitted:
+            logger.warning('Shed %s %s, admission class %s is full', request.method, request.path, limiter.name)
+            raise Overloaded(wait=retry_after())
+        self._admission_limiter = limiter
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        limiter = getattr(self, '_admission_limiter', None)
+        if limiter is not None:
+            self._admission_limiter = None
+            if getattr(response, 'streaming', False):
+                # The work happens while the body streams, after the view returned
+                response.streaming_content = ReleaseOnClose(response.streaming_content, limiter)
+            else:
+                limiter.release()
+        return super().finalize_response(request, response, *args, **kwargs)
+
+
+class ReleaseOnClose:
+    """
+    Streaming body that gives its admission slot back when the server closes the response.
+    """
+    def __init__(self, iterable, limiter):
+        self.iterable = iterable
+        self.limiter = limiter
+
+    def __iter__(self):
+        return iter(self.iterable)
+
+    def close(self):
+        # Called once the body is sent or the client went away, started or not
+        limiter, self.limiter = self.limiter, None
+        if limiter is not None:
+            limiter.release()
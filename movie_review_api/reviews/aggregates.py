@@ -0,0 +1,159 @@
+"""
+Denormalized per-movie rating aggregates.
+
+Every review write adjusts the counters on its movie with a single
+``UPDATE ... SET col = col + delta`` statement, so concurrent writers never
+overwrite each other's increments. ``rebuild`` recomputes the counters from
+the review table for repair and verification.
+"""
+from collections import Counter
+
+from django.db import connections, router, transaction
+from django.db.models import Case, Count, F, FloatField, Q, Sum, When
+from django.db.models.functions import Cast
+
+from .models import RATING_CHOICES, Movie, Review
+
+
+AGGREGATE_FIELDS = ['review_count', 'rating_sum', 'average_rating'] + [
+    f'rating_{rating}_count' for rating in RATING_CHOICES
+]
+
+
+def record_ratings(movie_id, added=(), removed=()):
+    """
+    Apply added and removed review ratings to the aggregates of a movie.
+    """
+    deltas = _deltas(added, removed)
+    if not deltas:
+        return
+
+    count_delta = deltas.get('review_count', 0)
+    new_count = F('review_count') + count_delta
+    new_sum = F('rating_sum') + deltas.get('rating_sum', 0)
+    changes = {field: F(field) + delta for field, delta in deltas.items()}
+    # Evaluated against the pre-update row, so the mean stays consistent with the counters
+    changes['average_rating'] = Case(
+        When(Q(review_count__gt=-count_delta), then=Cast(new_sum, FloatField()) / new_count),
+        default=0.0,
+        output_field=FloatField(),
+    )
+
+    # The movie may already be gone when its reviews are removed through CASCADE
+    Movie.objects.filter(pk=movie_id).update(**changes)
+
+
+def record_many(changes, chunk_size=500):
+    """
+    Apply rating changes for many movies at once, given as ``{movie_id: (added, removed)}``.
+
+    Each chunk of movies costs one UPDATE that adds every movie's own deltas,
+    picked with ``CASE id WHEN ...``, and recomputes the mean from the same
+    expressions, which like in ``record_ratings`` read the pre-update row.
+    The statement is written by hand because resolving thousands of ORM
+    When() expressions costs far more than running the query, and the ids and
+    deltas are inlined as integer literals since one parameter per value would
+    cap a statement at a few dozen movies under SQLite's 999 parameter limit.
+    """
+    deltas = {movie_id: _deltas(added, removed) for movie_id, (added, removed) in changes.items()}
+    movie_ids = sorted(int(movie_id) for movie_id, movie_deltas in deltas.items() if movie_deltas)
+    if not movie_ids:
+        return
+
+    connection = connections[router.db_for_write(Movie)]
+    qn = connection.ops.quote_name
+    pk = qn(Movie._meta.pk.column)
+    counters = [field for field in AGGREGATE_FIELDS if field != 'average_rating']
+
+    with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+        for start in range(0, len(movie_ids), chunk_size):
+            chunk = movie_ids[start:start + chunk_size]
+            new_values = {}
+            for field in counters:
+                branches = ' '.join(
+                    f'WHEN {movie_id} THEN {int(deltas[movie_id][field])}'
+                    for movie_id in chunk if deltas[movie_id].get(field)
+                )
+                column = qn(field)
+                new_values[field] = f'({column} + CASE {pk} {branches} ELSE 0 END)' if branches else column
+
+            assignments = [f'{qn(field)} = {value}' for field, value in new_values.items() if value != qn(field)]
+            count, total = new_values['review_count'], new_values['rating_sum']
+            assignments.append(
+                f'{qn("average_rating")} = CASE WHEN {count} > 0 THEN {total} * 1.0 / {count} ELSE 0 END'
+            )
+            cursor.execute(
+                f'UPDATE {qn(Movie._meta.db_table)} SET {", ".join(assignments)} '
+                f'WHERE {pk} IN ({", ".join(map(str, chunk))})'
+            )
+
+
+def _deltas(added, removed):
+    # Non-zero changes to the counter fields
+    deltas = Counter()
+    deltas['review_count'] = len(added) - len(removed)
+    deltas['rating_sum'] = sum(added) - sum(removed)
+    for rating in added:
+        if rating in RATING_CHOICES:
+            deltas[f'rating_{rating}_count'] += 1
+    for rating in removed:
+        if rating in RATING_CHOICES:
+            deltas[f'rating_{rating}_count'] -= 1
+    return {field: delta for field, delta in deltas.items() if delta}
+
+
+def compute_aggregates(movie_ids=None):
+    """
+    Compute the aggregates of every movie that has reviews straight from the review table.
+    """
+    reviews = Review.objects.order_by()
+    if movie_ids is not None:
+        reviews = reviews.filter(movie_id__in=movie_ids)
+
+    buckets = {
+        f'rating_{rating}_count': Count('id', filter=Q(rating=rating)) for rating in RATING_CHOICES
+    }
+    rows = reviews.values('movie_id').annotate(review_count=Count('id'), rating_sum=Sum('rating'), **buckets)
+
+    aggregates = {}
+    for row in rows:
+        movie_id = row.pop('movie_id')
+        row['average_rating'] = row['rating_sum'] / row['review_count']
+        aggregates[movie_id] = row
+    return aggregates
+
+
+def rebuild(movie_ids=None, verify_only=False, batch_size=500):
+    """
+    Recompute the aggregates from scratch and return the ids of movies whose stored values were wrong.
+    With ``verify_only`` the stored values are compared but left untouched.
+    """
+    empty = dict.fromkeys(AGGREGATE_FIELDS, 0)
+    empty['average_rating'] = 0.0
+
+    with transaction.atomic():
+        movies = Movie.objects.only('id', *AGGREGATE_FIELDS).order_by('pk')
+        if movie_ids is not None:
+            movies = movies.filter(pk__in=movie_ids)
+        if not verify_only:
+            movies = movies.select_for_update()
+        expected = compute_aggregates(movie_ids)
+
+        stale = []
+        for movie in movies.iterator(chunk_size=batch_size):
+            values = expected.get(movie.pk, empty)
+            if any(not _same(getattr(movie, field), values[field]) for field in AGGREGATE_FIELDS):
+                for field in AGGREGATE_FIELDS:
+                    setattr(movie, field, values[field])
+                stale.append(movie)
+
+        if stale and not verify_only:
+            Movie.objects.bulk_update(stale, AGGREGATE_FIELDS, batch_size=batch_size)
+
+    return [movie.pk for movie in stale]
+
+
+def _same(stored, expected):
+    if isinstance(expected, float):
+        return abs(stored - expected) < 1e-9
+    return stored == expected
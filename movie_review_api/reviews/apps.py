@@ -1,6 +1,22 @@
 from django.apps import AppConfig
+from django.core import checks
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_migrate
 
 
 class ReviewsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'reviews'
+
+    def ready(self):
+        from . import signals  # Registers the model signal handlers
+        post_migrate.connect(signals.ensure_search_index, sender=self)
+        post_migrate.connect(signals.ensure_change_log, sender=self)
+
+        from . import sqlite  # Pragmas for every new SQLite connection, and the check that they took
+        connection_created.connect(sqlite.configure_connection)
+        checks.register(sqlite.sqlite_profile_check, checks.Tags.database)
+
+        from . import ingest, typeahead  # Write-behind and the title index need a cache every process shares
+        checks.register(ingest.ingest_check)
+        checks.register(typeahead.typeahead_check)
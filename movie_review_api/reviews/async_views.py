@@ -0,0 +1,212 @@
+"""
+Async versions of the read endpoints plus signup and login, for ASGI servers.
+
+The read views wrap the matching sync view: its queryset, filters, ordering,
+pagination class and serializer are reused as they are, and only the
+queries are awaited through the async ORM, so the JSON is the same as the
+sync endpoint's. Serializers run on rows that are already loaded (the
+querysets join ``movie`` and ``user``), so serialization never touches the
+database from the event loop.
+
+Before querying, the sync view's ``initial`` runs in a thread, so a request
+goes through the same authentication, permissions, token-bucket throttles
+and admission limits, flushes its author's write-behind reviews and picks a
+replica, as on the sync endpoint; ``finalize_response`` then gives the
+admission slot back. The response cache and the query budgets are not
+applied: both are synchronous, and the budgets count per thread.
+
+Password hashing for signup and login runs in a bounded thread pool
+(``settings.PASSWORD_HASHING_WORKERS``) instead of on the event loop or in
+the single thread Django runs sync code in under ASGI.
+"""
+import asyncio
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.hashers import check_password, make_password
+from django.contrib.auth.models import User
+from django.http import Http404, HttpResponse
+from django.views import View
+from rest_framework import status
+from rest_framework.exceptions import APIException, MethodNotAllowed
+from rest_framework.parsers import FormParser, JSONParser, MultiPartParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.views import exception_handler
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from . import replicas, search, views
+from .pagination import apaginate_queryset
+from .serializers import UserSerializer
+
+
+_hash_executor = None
+
+
+def hash_executor():
+    global _hash_executor
+    if _hash_executor is None:
+        workers = getattr(settings, 'PASSWORD_HASHING_WORKERS', None) or min(4, os.cpu_count() or 1)
+        _hash_executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hash')
+    return _hash_executor
+
+
+async def run_hasher(func, *args):
+    return await asyncio.get_running_loop().run_in_executor(hash_executor(), functools.partial(func, *args))
+
+
+def json_response(data, status_code=status.HTTP_200_OK):
+    return HttpResponse(JSONRenderer().render(data), status=status_code, content_type='application/json')
+
+
+class AsyncAPIView(View):
+    """
+    Base for the async views: DRF's request wrapper for parsing and DRF's error responses.
+    """
+    parser_classes = [JSONParser, FormParser, MultiPartParser]
+
+    async def dispatch(self, request, *args, **kwargs):
+        request = Request(request, parsers=[parser() for parser in self.parser_classes])
+        try:
+            return await super().dispatch(request, *args, **kwargs)
+        except (APIException, Http404) as exc:
+            response = exception_handler(exc, {'view': self, 'request': request})
+            return json_response(response.data, response.status_code)
+
+
+class AsyncReadView(AsyncAPIView):
+    """
+    GET for ``view_class`` through the async ORM, behind the sync view's own checks.
+    """
+    view_class = None
+
+    async def dispatch(self, request, *args, **kwargs):
+        view = self.view_class(args=args, kwargs=kwargs, format_kwarg=None)
+        request = view.initialize_request(request, *args, **kwargs)
+        view.request = request
+        view.headers = view.default_response_headers
+        try:
+            alias = await sync_to_async(_initial)(view, request, *args, **kwargs)
+            if request.method not in ('GET', 'HEAD'):
+                raise MethodNotAllowed(request.method)
+            with replicas.reading_from(alias):
+                response = await self.get(view, request)
+        except Exception as exc:
+            response = view.handle_exception(exc)
+        return view.finalize_response(request, response, *args, **kwargs)
+
+    async def get_queryset(self, view):
+        await search.ais_available()  # Search filters ask for it while building the queryset
+        return view.filter_queryset(view.get_queryset())
+
+
+def _initial(view, request, *args, **kwargs):
+    # Authentication, permissions, throttles, admission, the write-behind settle and the replica choice
+    view.initial(request, *args, **kwargs)
+    token = getattr(view, '_replica_token', None)
+    if token is None:
+        return None
+    # The replica is handed back to the event loop, where the context variable set here cannot be reset
+    view._replica_token = None
+    alias = replicas._read_alias.get()
+    replicas._read_alias.reset(token)
+    return alias
+
+
+class AsyncListView(AsyncReadView):
+    async def get(self, view, request):
+        queryset = await self.get_queryset(view)
+        paginator = view.paginator
+        page = await apaginate_queryset(paginator, queryset, request, view) if paginator else None
+        if page is None:
+            return json_response(view.get_serializer([obj async for obj in queryset], many=True).data)
+        return json_response(paginator.get_paginated_response(view.get_serializer(page, many=True).data).data)
+
+
+class AsyncDetailView(AsyncReadView):
+    async def get(self, view, request):
+        queryset = await self.get_queryset(view)
+        lookup_url_kwarg = view.lookup_url_kwarg or view.lookup_field
+        try:
+            obj = await queryset.aget(**{view.lookup_field: view.kwargs[lookup_url_kwarg]})
+        except queryset.model.DoesNotExist:
+            raise Http404(f'No {queryset.model._meta.object_name} matches the given query.')
+        return json_response(view.get_serializer(obj).data)
+
+
+## Async read endpoints
+class ReviewList(AsyncListView):
+    """
+    A simple view to fetch all movie reviews, served asynchronously.
+    """
+    view_class = views.ReviewListCreate
+
+
+class ReviewDetail(AsyncDetailView):
+    view_class = views.ReviewDetail
+
+
+class ReviewSearch(AsyncListView):
+    """
+    Review search by movie title, review text or rating, served asynchronously.
+    """
+    view_class = views.ReviewSearchFilter
+
+
+class MovieList(AsyncListView):
+    view_class = views.MovieListCreate
+
+
+class MovieDetail(AsyncDetailView):
+    view_class = views.MovieDetail
+
+
+## Signup and login with the password hashing off the event loop
+class SignupView(AsyncAPIView):
+    async def post(self, request, *args, **kwargs):
+        serializer = UserSerializer(data=request.data)
+        # Validation checks the username is free, which takes a query
+        if not await sync_to_async(serializer.is_valid)():
+            return json_response(serializer.errors, status.HTTP_400_BAD_REQUEST)
+
+        data = serializer.validated_data
+        # What UserManager.create_user does, with the hash computed in the executor
+        user = User(
+            username=User.normalize_username(data['username']),
+            email=User.objects.normalize_email(data.get('email', '')),
+            password=await run_hasher(make_password, data['password']),
+        )
+        await user.asave()
+        return json_response(
+            {'message': 'User created successfully', 'user': UserSerializer(user).data},
+            status.HTTP_201_CREATED,
+        )
+
+
+class LoginView(AsyncAPIView):
+    """
+    Issues the same access/refresh token pair as the sync login endpoint.
+    """
+    async def post(self, request, *args, **kwargs):
+        username = request.data.get('username')
+        password = request.data.get('password')
+        user = await User.objects.filter(username=username).afirst() if username else None
+
+        if user is None:
+            # Hash anyway so a missing user takes as long as a wrong password, like ModelBackend
+            await run_hasher(make_password, password)
+            valid = False
+        else:
+            # No setter: outdated hashes are upgraded by the sync login
+            valid = await run_hasher(check_password, password, user.password)
+        if not valid or not jwt_settings.USER_AUTHENTICATION_RULE(user):
+            return json_response(
+                {'detail': 'No active account found with the given credentials'}, status.HTTP_401_UNAUTHORIZED,
+            )
+
+        refresh = await sync_to_async(RefreshToken.for_user)(user)  # Records the outstanding token
+        return json_response({'refresh': str(refresh), 'access': str(refresh.access_token)})
@@ -0,0 +1,226 @@
+"""
+JWT authentication without a database query per request.
+
+``CachedJWTAuthentication`` keeps the users behind access tokens in a small
+bounded in-process LRU cache. A User save or delete drops the user from the
+cache of the process that made it (``signals.forget_cached_user``), and
+entries expire after ``JWT_USER_CACHE['TIMEOUT']`` seconds, which bounds
+staleness when rows change through ``QuerySet.update()`` or in another
+process. When the response cache is on a backend the processes share, each
+entry also remembers the ``user`` version from ``reviews.caching`` it was
+loaded under; every User save or delete moves that version on, so a
+deactivated or changed user is reloaded on their next request in every
+worker rather than after the timeout.
+
+Refresh tokens are checked against a Bloom filter of the blacklisted jtis
+before the blacklist table: a token the filter has never seen cannot be
+blacklisted, so only possible matches cost a query. Blacklisting a token
+moves the ``blacklistedtoken`` version on, and the filter catches up with
+one query for the new rows the next time it is asked; checks between two
+blacklistings (logouts, or refreshes when tokens are not rotated) cost no
+query at all.
+
+The filter relies on every process seeing the versions the others set, as
+a blacklisted token must be refused at once, so it is only used when the
+response cache is on a backend the processes share (file-based, database,
+Redis, Memcached). With a local-memory cache a blacklisting in one worker
+would never reach the others, so every refresh token is checked in the
+blacklist table, as without the filter.
+"""
+import copy
+import hashlib
+import math
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt import serializers as jwt_serializers
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from . import caching
+
+
+def _cache_settings():
+    return getattr(settings, 'JWT_USER_CACHE', None) or {}
+
+
+def _shared_version(name):
+    # None when there is no cache shared by the processes to learn about the others' writes from
+    if not caching.is_shared():
+        return None
+    return caching.get_versions([name])[0]
+
+
+class UserCache:
+    """
+    Thread-safe LRU cache of user instances keyed by the id in the token.
+    """
+    def __init__(self, max_size=1024, timeout=60):
+        self.max_size = max_size
+        self.timeout = timeout
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id, version=None):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            user, loaded_version, expires = entry
+            if loaded_version != version or expires < time.monotonic():
+                del self._entries[user_id]
+                return None
+            self._entries.move_to_end(user_id)
+        # A copy per request, so attributes set while handling one request never leak into another
+        return copy_user(user)
+
+    def set(self, user_id, user, version=None):
+        with self._lock:
+            self._entries[user_id] = (copy_user(user), version, time.monotonic() + self.timeout)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+def copy_user(user):
+    # Model.__getstate__ copies _state and its fields cache, so related objects are not shared either
+    return copy.copy(user)
+
+
+user_cache = UserCache(**{key.lower(): value for key, value in _cache_settings().items()})
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    simplejwt's JWTAuthentication, with users served from ``user_cache`` instead of a query per request.
+    """
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_('Token contained no recognizable user identification'))
+
+        key = str(user_id)
+        # None without a shared cache: the entries then only follow this process's writes and the timeout
+        version = _shared_version('user')
+        user = user_cache.get(key, version)
+        if user is None:
+            try:
+                user = self.user_model.objects.get(**{api_settings.USER_ID_FIELD: user_id})
+            except self.user_model.DoesNotExist:
+                raise AuthenticationFailed(_('User not found'), code='user_not_found')
+            user_cache.set(key, user, version)
+
+        # The same checks as JWTAuthentication, on the cached row
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+        if api_settings.CHECK_REVOKE_TOKEN and (
+            validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password)
+        ):
+            raise AuthenticationFailed(_("The user's password has been changed."), code='password_changed')
+        return user
+
+
+class BloomFilter:
+    """
+    Set membership with false positives at about ``error_rate`` and no false negatives.
+    """
+    def __init__(self, capacity, error_rate=0.01):
+        self.capacity = capacity
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0  # Kept by the caller, who knows which values are new
+
+    def _positions(self, value):
+        # Double hashing: two 64-bit halves of one digest stand in for k independent hashes
+        digest = hashlib.blake2b(value.encode(), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+        return ((first + i * second) % self.size for i in range(self.hashes))
+
+    def add(self, value):
+        for position in self._positions(value):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, value):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(value))
+
+
+class RevokedTokenFilter:
+    """
+    Bloom filter over the jtis of blacklisted refresh tokens that have not expired yet.
+    """
+    RESYNC_WINDOW = 100
+
+    def __init__(self, capacity=100000, error_rate=0.01):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.bloom = BloomFilter(self.capacity, self.error_rate)
+        self.last_id = 0
+        self.version = None
+
+    def might_contain(self, jti):
+        version = _shared_version('blacklistedtoken')
+        if version is None:
+            return True
+        with self._lock:
+            if version != self.version:
+                self._sync(version)
+            return jti in self.bloom
+
+    def _sync(self, version):
+        # Rows added since the last sync, plus a window before it for ids that committed out of
+        # order on backends with concurrent writers; re-adding a jti sets no new bits.
+        # Expired tokens are rejected by verify() whatever the blacklist says, so they are left out.
+        rows = BlacklistedToken.objects.filter(
+            id__gt=self.last_id - self.RESYNC_WINDOW, token__expires_at__gt=timezone.now(),
+        )
+        new = list(rows.order_by('id').values_list('id', 'token__jti'))
+        fresh = sum(1 for row_id, _ in new if row_id > self.last_id)
+        if self.bloom.count + fresh > self.bloom.capacity:
+            # Full: start over, sized for the tokens that are still live
+            live = BlacklistedToken.objects.filter(token__expires_at__gt=timezone.now()).count()
+            self.capacity = max(self.capacity, 2 * live)
+            self.reset()
+            return self._sync(version)
+        for _, jti in new:
+            self.bloom.add(jti)
+        self.bloom.count += fresh
+        self.last_id = max([self.last_id] + [row_id for row_id, _ in new])
+        self.version = version
+
+
+revoked_tokens = RevokedTokenFilter()
+
+
+class FilteredRefreshToken(RefreshToken):
+    """
+    Refresh token whose blacklist check skips the query for tokens the filter rules out.
+    """
+    def check_blacklist(self):
+        if revoked_tokens.might_contain(self.payload[api_settings.JTI_CLAIM]):
+            super().check_blacklist()
+
+
+class TokenRefreshSerializer(jwt_serializers.TokenRefreshSerializer):
+    token_class = FilteredRefreshToken
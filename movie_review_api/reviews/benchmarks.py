@@ -0,0 +1,107 @@
+"""
+Helpers shared by the ``bench_*`` management commands.
+
+Benchmarks run in-process against a throwaway database created the same way
+as the test database, so they never touch the development data and need no
+running server.
+"""
+import itertools
+import random
+import time
+from contextlib import contextmanager
+from datetime import date, timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from . import aggregates
+from .models import Movie, Review
+
+
+@contextmanager
+def benchmark_database(verbosity=0):
+    """
+    Run the block against a freshly migrated database that is destroyed afterwards.
+    """
+    setup_test_environment(debug=False)
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=verbosity, autoclobber=True, serialize=False)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=verbosity)
+        teardown_test_environment()
+
+
+def seed(movies=200, users=100, reviews=5000, random_seed=0, batch_size=2000, skew=0, password=None):
+    """
+    Fill the database with a deterministic synthetic catalogue and return the created movies and users.
+
+    With ``skew`` reviews are spread like real traffic instead of evenly: the movie and the user of
+    popularity rank r are picked with weight 1 / r ** skew, so a few blockbusters and power users
+    get most of them. Users can log in with ``password`` when one is given.
+    """
+    rng = random.Random(random_seed)
+    # One hash for everyone, hashing a password per user would dominate the seeding
+    password_hash = make_password(password) if password else '!'
+    user_objs = User.objects.bulk_create(
+        [User(username=f'user{i}', email=f'user{i}@example.com', password=password_hash) for i in range(users)],
+        batch_size=batch_size,
+    )
+    movie_objs = Movie.objects.bulk_create(
+        [
+            Movie(
+                movie_title=f'Movie {i}',
+                description=f'Synthetic movie number {i}',
+                release_date=date(1970, 1, 1) + timedelta(days=rng.randrange(20000)),
+            )
+            for i in range(movies)
+        ],
+        batch_size=batch_size,
+    )
+    pick_movie = _picker(rng, movie_objs, skew)
+    pick_user = _picker(rng, user_objs, skew)
+    Review.objects.bulk_create(
+        [
+            Review(
+                movie=pick_movie(),
+                user=pick_user(),
+                review_content=f'Synthetic review {i}',
+                rating=rng.randint(1, 5),
+            )
+            for i in range(reviews)
+        ],
+        batch_size=batch_size,
+    )
+    # bulk_create skips the signals that keep the aggregates current
+    aggregates.rebuild()
+    return movie_objs, user_objs
+
+
+def _picker(rng, items, skew):
+    if not skew:
+        return lambda: rng.choice(items)
+    # Popularity ranks in a shuffled order, so the popular rows are not simply the first ids
+    ranked = rng.sample(items, len(items))
+    cum_weights = list(itertools.accumulate(1 / rank ** skew for rank in range(1, len(ranked) + 1)))
+    return lambda: rng.choices(ranked, cum_weights=cum_weights)[0]
+
+
+def throughput(func, iterations):
+    """
+    Call ``func`` repeatedly and return the calls per second.
+    """
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return iterations / (time.perf_counter() - start)
+
+
+def percentile(samples, fraction):
+    """
+    Nearest-rank percentile of ``samples``, e.g. ``percentile(latencies, 0.99)``.
+    """
+    ordered = sorted(samples)
+    return ordered[max(0, min(len(ordered) - 1, round(fraction * len(ordered)) - 1))]
@@ -0,0 +1,98 @@
+"""
+Per-view query budgets.
+
+Views declare the most SQL queries a request may cost with ``query_budget``,
+either one number or a dict keyed by HTTP method, and the test suite fails
+any view that goes over it. ``settings.QUERY_BUDGET_MODE`` decides what
+happens at runtime: ``'log'`` writes a warning for every request over
+budget, ``'raise'`` raises ``QueryBudgetExceeded`` and ``None`` turns
+counting off entirely. Work a view does on behalf of something else, like
+flushing the write-behind log in reviews.ingest or building the typeahead
+index of reviews.typeahead, runs under ``uncounted()``.
+"""
+import logging
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+
+
+logger = logging.getLogger(__name__)
+
+
+# True inside uncounted()
+_uncounted = ContextVar('query_budget_uncounted', default=False)
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+class QueryCounter:
+    """
+    Database execute wrapper that counts the queries run through it.
+    """
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        if not _uncounted.get():
+            self.count += 1
+        return execute(sql, params, many, context)
+
+
+@contextmanager
+def count_queries():
+    """
+    Count the queries run on every configured database inside the block.
+    """
+    counter = QueryCounter()
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(counter))
+        yield counter
+
+
+@contextmanager
+def uncounted():
+    """
+    Leave the queries run inside the block out of every query count.
+    """
+    token = _uncounted.set(True)
+    try:
+        yield
+    finally:
+        _uncounted.reset(token)
+
+
+class QueryBudgetMixin:
+    """
+    View mixin that checks each request against the view's ``query_budget``.
+    """
+    query_budget = None
+
+    def get_query_budget(self, method):
+        if isinstance(self.query_budget, dict):
+            return self.query_budget.get(method)
+        return self.query_budget
+
+    def dispatch(self, request, *args, **kwargs):
+        mode = getattr(settings, 'QUERY_BUDGET_MODE', None)
+        if not mode or self.get_query_budget(request.method) is None:
+            return super().dispatch(request, *args, **kwargs)
+
+        with count_queries() as counter:
+            response = super().dispatch(request, *args, **kwargs)
+
+        # Asked again now the view has run, since bulk views size their budget by the payload
+        budget = self.get_query_budget(request.method)
+        if counter.count > budget:
+            message = (
+                f'{type(self).__name__} {request.method} {request.path} ran {counter.count} '
+                f'queries, budget is {budget}'
+            )
+            if mode == 'raise':
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+        return response
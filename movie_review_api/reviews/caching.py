@@ -0,0 +1,156 @@
+"""
+Versioned response cache with conditional GET support.
+
+Every model a response depends on has a version token in the cache that is
+replaced whenever a row of that model is written. Cached responses are keyed
+by the request URL plus the current tokens, so a write makes every stale
+entry unreachable at once and nothing is served from before it; the cache
+timeout only evicts those orphaned entries. Tokens are random rather than
+counters because ``incr`` is not atomic on the file-based backend, and a
+fresh token is set after the write commits, so no reader can pair it with
+older data.
+
+The tokens also give each response an ETag and Last-Modified header, and a
+client revalidating with If-None-Match gets a 304 without the view touching
+the database or the cached body. If-Modified-Since alone never does: HTTP
+dates have whole seconds, and a write in the same second as the previous
+version would leave the date unchanged.
+
+Versions live in the cache named by ``settings.RESPONSE_CACHE['ALIAS']``.
+Local-memory caches are per process, so they only invalidate correctly with
+a single worker process; use the file-based (or a shared) backend when
+running several.
+"""
+import hashlib
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+
+from . import profiling, replicas
+
+
+VERSION_KEY = 'reviews:version:{}'
+RESPONSE_KEY = 'reviews:response:{}'
+
+
+def _config():
+    return getattr(settings, 'RESPONSE_CACHE', None)
+
+
+def _cache():
+    return caches[_config().get('ALIAS', 'default')]
+
+
+def is_process_local(cache):
+    """
+    Whether what ``cache`` holds stays in the process that wrote it, as with local-memory caches.
+    """
+    return isinstance(cache, (LocMemCache, DummyCache))
+
+
+def is_shared():
+    """
+    Whether the versions live where every worker process reads them, unlike local-memory caches.
+    """
+    return bool(_config()) and not is_process_local(_cache())
+
+
+def _new_token():
+    return (time.time(), uuid.uuid4().hex)
+
+
+def bump(*names):
+    """
+    Invalidate every cached response that depends on the named models.
+    """
+    if not _config():
+        return
+
+    def set_new_versions():
+        _cache().set_many({VERSION_KEY.format(name): _new_token() for name in names}, timeout=None)
+
+    # Bumping right away keeps this transaction's own reads off the old entries; the bump
+    # after commit is the one that guarantees nobody caches the pre-write rows under the new version
+    set_new_versions()
+    transaction.on_commit(set_new_versions)
+
+
+def get_versions(names):
+    cache = _cache()
+    keys = [VERSION_KEY.format(name) for name in names]
+    found = cache.get_many(keys)
+    for key in keys:
+        if key not in found:
+            # First use, or the cache was cleared: start a new version, unless another worker just did
+            cache.add(key, _new_token(), timeout=None)
+            found[key] = cache.get(key)
+    return [found[key] for key in keys]
+
+
+class CachedResponseMixin:
+    """
+    View mixin that caches rendered JSON GET responses and answers revalidation with 304.
+    ``cache_models`` names the models whose writes change the view's output.
+    """
+    cache_models = ()
+
+    def get(self, request, *args, **kwargs):
+        handler = super().get
+        config = _config()
+        if not config or not self.cache_models or request.accepted_renderer.format != 'json':
+            # The browsable API renders per user, so only JSON is cached
+            return handler(request, *args, **kwargs)
+
+        # Read the versions before the data, so a concurrent write can only make the entry newer
+        versions = get_versions(self.cache_models)
+        url = request.build_absolute_uri()
+        digest = hashlib.sha1(
+            repr((type(self).__name__, url, request.accepted_media_type, versions)).encode()
+        ).hexdigest()
+        etag = quote_etag(digest)
+        last_modified = max(timestamp for timestamp, _ in versions)
+
+        # By ETag only, Last-Modified cannot tell two versions from the same second apart
+        not_modified = get_conditional_response(request, etag=etag)
+        if not_modified is not None:
+            return self._add_validators(not_modified, etag, last_modified)
+
+        cache = _cache()
+        key = RESPONSE_KEY.format(digest)
+        cached = cache.get(key)
+        if cached is not None:
+            content, content_type = cached
+            return self._add_validators(HttpResponse(content, content_type=content_type), etag, last_modified)
+
+        # A replica may not have the rows behind a version this young yet, and its page
+        # would be cached and tagged as that version
+        with replicas.primary_reads_since(last_modified):
+            response = handler(request, *args, **kwargs)
+        if response.status_code == 200:
+            self._render(request, response)
+            cache.set(key, (response.content, response['Content-Type']), config.get('TIMEOUT', 300))
+            self._add_validators(response, etag, last_modified)
+        return response
+
+    def _render(self, request, response):
+        # The same steps finalize_response and the response middleware would take
+        response.accepted_renderer = request.accepted_renderer
+        response.accepted_media_type = request.accepted_media_type
+        response.renderer_context = self.get_renderer_context()
+        with profiling.phase('render'):
+            response.render()
+
+    def _add_validators(self, response, etag, last_modified):
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        patch_cache_control(response, max_age=0, must_revalidate=True)
+        patch_vary_headers(response, ['Accept'])
+        return response
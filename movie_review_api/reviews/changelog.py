@@ -0,0 +1,191 @@
+"""
+Change log behind the delta-sync feed, ``/api/changes/``.
+
+Every movie and review has one row in ``Change``: its latest change, with a
+sequence number that only goes up. Triggers on the movie, review and user
+tables replace the row, under a new number, on every insert, update and
+delete. The log therefore also covers ``bulk_create``, ``QuerySet.update()``,
+the raw inserts of the importer and the deletes the collector runs for
+``CASCADE``. A delete leaves the row behind as a tombstone. Renaming a movie
+or a user changes the reviews that show the name.
+
+A client keeps the ``cursor`` of the last page it read and asks for the
+changes after it, ``limit`` at a time and oldest first, until ``has_more`` is
+false. A page is one walk along the primary key from the cursor plus one
+lookup of the changed objects per model, so a sync costs O(changes) whatever
+the size of the tables. Each object keeps only its latest row, so a client
+that was away for long gets every object once. Objects come back as the
+list endpoints show them; a change whose object was deleted again since is
+left out, as its tombstone follows. A review can come before a later
+change of its movie, so clients should apply each page as a whole.
+
+``prune`` (``manage.py prune_change_log``) deletes tombstones older than
+``settings.CHANGE_LOG['TOMBSTONE_DAYS']``. Cursors from before the newest
+pruned tombstone could miss deletes, so they get 410 Gone and the client
+starts over from cursor 0.
+
+The triggers are SQLite only, like the search index; on other backends
+``install`` does nothing and the feed answers 501.
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from .models import Change, ChangeLogState, Movie, Review
+
+
+STATE_ID = 1
+
+# Same text format as Django's datetimes on SQLite
+NOW_SQL = "strftime('%Y-%m-%d %H:%M:%f', 'now')"
+
+TRIGGER_PREFIX = 'reviews_change_'
+
+
+def _config():
+    return getattr(settings, 'CHANGE_LOG', None) or {}
+
+
+class CursorExpired(APIException):
+    status_code = status.HTTP_410_GONE
+    default_detail = 'Deletes after this cursor have been pruned, sync again from cursor 0.'
+    default_code = 'cursor_expired'
+
+
+class Unsupported(APIException):
+    status_code = status.HTTP_501_NOT_IMPLEMENTED
+    default_detail = 'The change log needs SQLite.'
+    default_code = 'change_log_unsupported'
+
+
+def _trigger_sql(connection):
+    qn = connection.ops.quote_name
+    change, movie, review = (qn(model._meta.db_table) for model in (Change, Movie, Review))
+    user = qn(get_user_model()._meta.db_table)
+
+    def record(model, object_id, deleted=0):
+        return (
+            f"INSERT OR REPLACE INTO {change} (model, object_id, deleted, changed_at) "
+            f"VALUES ('{model}', {object_id}, {deleted}, {NOW_SQL});"
+        )
+
+    def record_reviews(column, value):
+        return (
+            f"INSERT OR REPLACE INTO {change} (model, object_id, deleted, changed_at) "
+            f"SELECT 'review', id, 0, {NOW_SQL} FROM {review} WHERE {column} = {value};"
+        )
+
+    triggers = {}
+    for name, table in (('movie', movie), ('review', review)):
+        triggers[f'{name}_ai'] = f'AFTER INSERT ON {table} BEGIN {record(name, "new.id")} END'
+        triggers[f'{name}_au'] = f'AFTER UPDATE ON {table} BEGIN {record(name, "new.id")} END'
+        triggers[f'{name}_ad'] = f'AFTER DELETE ON {table} BEGIN {record(name, "old.id", deleted=1)} END'
+    # Reviews show the movie title and the username
+    triggers['movie_title'] = (
+        f'AFTER UPDATE OF movie_title ON {movie} WHEN new.movie_title IS NOT old.movie_title '
+        f'BEGIN {record_reviews("movie_id", "new.id")} END'
+    )
+    triggers['username'] = (
+        f'AFTER UPDATE OF username ON {user} WHEN new.username IS NOT old.username '
+        f'BEGIN {record_reviews("user_id", "new.id")} END'
+    )
+    return {f'{TRIGGER_PREFIX}{name}': f'CREATE TRIGGER {TRIGGER_PREFIX}{name} {body}' for name, body in triggers.items()}
+
+
+def install(connection, backfill=True):
+    """
+    (Re)create the change log triggers and, with ``backfill``, log the rows that have no change yet.
+    Does nothing on backends other than SQLite.
+    """
+    if connection.vendor != 'sqlite':
+        return False
+    qn = connection.ops.quote_name
+    triggers = _trigger_sql(connection)
+    with connection.cursor() as cursor:
+        for name, statement in triggers.items():
+            cursor.execute(f'DROP TRIGGER IF EXISTS {name}')
+            cursor.execute(statement)
+        if backfill:
+            # Movies first, so a client syncing from scratch gets them before their reviews
+            for name, model in (('movie', Movie), ('review', Review)):
+                cursor.execute(
+                    f"INSERT OR IGNORE INTO {qn(Change._meta.db_table)} (model, object_id, deleted, changed_at) "
+                    f"SELECT '{name}', id, 0, {NOW_SQL} FROM {qn(model._meta.db_table)} ORDER BY id"
+                )
+    return True
+
+
+def uninstall(connection):
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for name in _trigger_sql(connection):
+            cursor.execute(f'DROP TRIGGER IF EXISTS {name}')
+
+
+def pruned_seq():
+    state = ChangeLogState.objects.filter(pk=STATE_ID).values_list('pruned_seq', flat=True).first()
+    return state or 0
+
+
+def changes_since(cursor, limit, serializers):
+    """
+    One page of the feed after ``cursor``: ``(changes, next cursor, has more)``.
+
+    ``serializers`` maps ``'movie'`` and ``'review'`` to a function that serializes a list of objects.
+    """
+    if cursor and cursor < pruned_seq():
+        raise CursorExpired()
+    changes = list(Change.objects.filter(seq__gt=cursor).order_by('seq')[:limit + 1])
+    has_more = len(changes) > limit
+    changes = changes[:limit]
+
+    wanted = defaultdict(list)
+    for change in changes:
+        if not change.deleted:
+            wanted[change.model].append(change.object_id)
+    querysets = {'movie': Movie.objects.all(), 'review': Review.objects.select_related('movie', 'user')}
+    data = {}
+    for model, ids in wanted.items():
+        objects = list(querysets[model].filter(pk__in=ids).order_by())
+        data[model] = dict(zip((obj.pk for obj in objects), serializers[model](objects)))
+
+    page = []
+    for change in changes:
+        entry = {
+            'seq': change.seq, 'model': change.model, 'id': change.object_id, 'deleted': change.deleted,
+            'changed_at': change.changed_at,
+        }
+        if not change.deleted:
+            entry['data'] = data[change.model].get(change.object_id)
+            if entry['data'] is None:
+                continue  # Deleted since; its tombstone comes later in the log
+        page.append(entry)
+    return page, changes[-1].seq if changes else cursor, has_more
+
+
+def prune(older_than=None):
+    """
+    Delete the tombstones older than ``older_than`` (default ``TOMBSTONE_DAYS``); returns how many went.
+    """
+    if older_than is None:
+        older_than = timedelta(days=_config().get('TOMBSTONE_DAYS', 30))
+    now = timezone.now()
+    with transaction.atomic():
+        tombstones = Change.objects.filter(deleted=True, changed_at__lt=now - older_than)
+        highest = tombstones.aggregate(Max('seq'))['seq__max']
+        if highest is None:
+            return 0
+        state, _ = ChangeLogState.objects.get_or_create(pk=STATE_ID)
+        state.pruned_seq = max(state.pruned_seq, highest)
+        state.pruned_at = now
+        state.save()
+        deleted, _ = tombstones.filter(seq__lte=highest).delete()
+    return deleted
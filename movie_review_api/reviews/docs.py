@@ -0,0 +1,68 @@
+"""
+Documentation tooling that loads when the docs are asked for, not when a worker starts.
+
+Importing drf_yasg for its views, renderers and codecs is a large part of a
+worker's start-up, for routes few requests hit. The URLconf mounts the docs
+views through ``lazy_view``, which imports them on their first request, and
+the API views describe themselves with this module's ``swagger_auto_schema``.
+It takes the same arguments as drf_yasg's, with ``query_param`` in place of
+``openapi.Parameter``, and only records them; ``load`` applies drf_yasg's
+decorator to everything recorded before a schema is generated, which the
+generator in reviews.schema does.
+"""
+import threading
+
+from django.utils.module_loading import import_string
+
+
+_pending = []  # (view method, overrides) not yet handed to drf_yasg
+_lock = threading.Lock()
+
+
+def swagger_auto_schema(**overrides):
+    """
+    ``drf_yasg.utils.swagger_auto_schema``, applied when the schema is first generated.
+    """
+    def decorator(view_method):
+        with _lock:
+            _pending.append((view_method, overrides))
+        return view_method
+    return decorator
+
+
+def query_param(name, type, description):
+    """
+    A query string parameter of ``manual_parameters``; ``type`` is an OpenAPI type such as ``'integer'``.
+    """
+    return lambda openapi: openapi.Parameter(name, openapi.IN_QUERY, description=description, type=type)
+
+
+def load():
+    """
+    Apply drf_yasg's decorator for every ``swagger_auto_schema`` so far.
+    """
+    from drf_yasg import openapi, utils
+
+    with _lock:
+        while _pending:
+            view_method, overrides = _pending.pop(0)
+            if 'manual_parameters' in overrides:
+                overrides = {
+                    **overrides, 'manual_parameters': [parameter(openapi) for parameter in overrides['manual_parameters']],
+                }
+            utils.swagger_auto_schema(**overrides)(view_method)
+
+
+def lazy_view(path):
+    """
+    A view that imports the view at ``path``, e.g. ``'movie_review_api.docs.swagger_ui'``, on its first request.
+    """
+    view = None
+
+    def wrapper(request, *args, **kwargs):
+        nonlocal view
+        if view is None:
+            view = import_string(path)
+        return view(request, *args, **kwargs)
+    wrapper.csrf_exempt = True  # Like the DRF view it stands for
+    return wrapper
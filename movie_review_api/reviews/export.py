@@ -0,0 +1,152 @@
+"""
+Streaming export of the review corpus as NDJSON or CSV.
+
+Rows are read in keyset chunks on ``id`` (``WHERE id > last ORDER BY id LIMIT
+n``) as plain tuples and encoded one at a time, so memory stays flat however
+large the table is and no read holds the database for the whole export.
+Both ``ReviewExport`` and the ``export_reviews`` command stream the same
+bytes; gzip compresses them incrementally.
+"""
+import csv
+import io
+import json
+import zlib
+
+from rest_framework.renderers import BaseRenderer
+
+from .filters import ReviewExportFilter
+from .models import Review
+
+
+# Same keys as ReviewSerializer, with the username under "user"
+FIELDS = ['id', 'movie', 'movie_title', 'review_content', 'rating', 'user', 'created_date']
+_COLUMNS = ['id', 'movie_id', 'movie__movie_title', 'review_content', 'rating', 'user__username', 'created_date']
+
+FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+CHUNK_SIZE = 2000
+
+# On review text level 3 compresses within a few percent of the default 6 at about four times the speed
+GZIP_LEVEL = 3
+
+
+class ExportRenderer(BaseRenderer):
+    """
+    Lets ?format= and the Accept header pick the export format. The export
+    itself is streamed by the view; only error responses go through render().
+    """
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return json.dumps(data).encode()
+
+
+class NDJSONRenderer(ExportRenderer):
+    media_type = FORMATS['ndjson']
+    format = 'ndjson'
+
+
+class CSVRenderer(ExportRenderer):
+    media_type = FORMATS['csv']
+    format = 'csv'
+
+
+def filter_reviews(params, queryset=None):
+    """
+    Apply the export filters (movie, rating, created_after, created_before) to the reviews.
+    Returns the filterset so callers can report its errors.
+    """
+    return ReviewExportFilter(params, queryset=Review.objects.all() if queryset is None else queryset)
+
+
+def iter_rows(queryset, chunk_size=CHUNK_SIZE):
+    """
+    Yield the export fields of every review in the queryset, in id order.
+    """
+    rows = queryset.order_by('id').values_list(*_COLUMNS)
+    last_id = None
+    while True:
+        chunk = rows if last_id is None else rows.filter(id__gt=last_id)
+        chunk = list(chunk[:chunk_size])
+        for row in chunk:
+            yield row
+        if len(chunk) < chunk_size:
+            return
+        last_id = chunk[-1][0]
+
+
+def _timestamp(value):
+    # Matches DRF's DateTimeField output
+    value = value.isoformat()
+    return value[:-6] + 'Z' if value.endswith('+00:00') else value
+
+
+def ndjson_lines(rows):
+    for row in rows:
+        record = dict(zip(FIELDS, row))
+        record['created_date'] = _timestamp(record['created_date'])
+        yield (json.dumps(record, ensure_ascii=False) + '\n').encode()
+
+
+def csv_lines(rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def flush():
+        data = buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+        return data
+
+    writer.writerow(FIELDS)
+    yield flush()
+    for row in rows:
+        writer.writerow(row[:-1] + (_timestamp(row[-1]),))
+        yield flush()
+
+
+def encode(rows, export_format):
+    return {'ndjson': ndjson_lines, 'csv': csv_lines}[export_format](rows)
+
+
+def gzipped(chunks, flush_bytes=64 * 1024):
+    """
+    Gzip a stream of byte strings, yielding compressed blocks of roughly ``flush_bytes`` input.
+    """
+    compressor = zlib.compressobj(GZIP_LEVEL, wbits=31)  # 31 writes the gzip header and trailer
+    pending = 0
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        pending += len(chunk)
+        if pending >= flush_bytes:
+            data += compressor.flush(zlib.Z_SYNC_FLUSH)
+            pending = 0
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def buffered(chunks, size=64 * 1024):
+    """
+    Join small byte strings into blocks of about ``size`` bytes, fewer writes to the socket or file.
+    """
+    parts, length = [], 0
+    for chunk in chunks:
+        parts.append(chunk)
+        length += len(chunk)
+        if length >= size:
+            yield b''.join(parts)
+            parts, length = [], 0
+    if parts:
+        yield b''.join(parts)
+
+
+def stream(queryset, export_format, compress=False, chunk_size=CHUNK_SIZE):
+    """
+    The whole export as an iterator of byte blocks.
+    """
+    chunks = buffered(encode(iter_rows(queryset, chunk_size), export_format))
+    return gzipped(chunks) if compress else chunks
@@ -0,0 +1,35 @@
+import django_filters
+
+from . import search
+from .models import Movie, Review
+
+
+class MovieFilter(django_filters.FilterSet):
+    """
+    Filters movies on their precomputed rating aggregates and by full-text search.
+    """
+    search = django_filters.CharFilter(method='filter_search')
+    min_rating = django_filters.NumberFilter(field_name='average_rating', lookup_expr='gte')
+    max_rating = django_filters.NumberFilter(field_name='average_rating', lookup_expr='lte')
+    min_reviews = django_filters.NumberFilter(field_name='review_count', lookup_expr='gte')
+
+    class Meta:
+        model = Movie
+        fields = ['search', 'min_rating', 'max_rating', 'min_reviews']
+
+    def filter_search(self, queryset, name, value):
+        # Searches title and description, best matches first unless ?ordering= is given
+        return search.search_movies(queryset, value)
+
+
+class ReviewExportFilter(django_filters.FilterSet):
+    """
+    Filters for the review export: movie id, rating and a created_date range.
+    """
+    movie = django_filters.NumberFilter(field_name='movie_id')  # No lookup, an unknown id just matches nothing
+    created_after = django_filters.IsoDateTimeFilter(field_name='created_date', lookup_expr='gte')
+    created_before = django_filters.IsoDateTimeFilter(field_name='created_date', lookup_expr='lt')
+
+    class Meta:
+        model = Review
+        fields = ['movie', 'rating', 'created_after', 'created_before']
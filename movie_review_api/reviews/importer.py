@@ -0,0 +1,389 @@
+"""
+Batched import of movies, users and reviews from CSV or NDJSON files.
+
+Records are read one at a time (``.gz`` files are decompressed on the fly),
+turned into unsaved model instances and inserted with ``bulk_create`` in
+one transaction per batch. Reviews refer to movies by id or title and to
+users by username; both are resolved against maps loaded once up front,
+never with a query per row. The rating aggregates and the response cache
+versions are updated per batch in the same transaction.
+
+The number of records consumed is stored in an ``ImportCheckpoint`` row that
+is saved in the batch's transaction, so after a crash rerunning the same
+import skips exactly the records that were committed. Rows that fail
+validation are skipped and counted, the rest of the batch is kept.
+
+On SQLite ``synchronous`` is turned off for the duration of the import,
+which is still safe if the process dies; the journal mode is left alone
+because MEMORY or OFF journals can corrupt the database in that case.
+"""
+import csv
+import gzip
+import itertools
+import json
+import os
+import time
+from contextlib import contextmanager, nullcontext
+
+from django.contrib.auth.hashers import identify_hasher, make_password
+from django.contrib.auth.models import User
+from django.db import connections, router, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from . import aggregates, caching, leaderboards, search, typeahead
+from .models import RATING_CHOICES, ImportCheckpoint, Movie, Review
+
+
+FORMATS = ('csv', 'ndjson')
+
+BATCH_SIZE = 20000
+
+# Kept per run so the command can show what went wrong without storing every bad row
+MAX_REPORTED_ERRORS = 20
+
+SQLITE_PRAGMAS = {
+    'synchronous': 'OFF',
+    'cache_size': -256 * 1024,  # 256 MB, negative values are in KiB
+    'temp_store': 'MEMORY',
+}
+
+
+class RowError(ValueError):
+    pass
+
+
+class CheckpointMismatch(Exception):
+    pass
+
+
+def detect_format(path):
+    name = path[:-3] if path.endswith('.gz') else path
+    extension = os.path.splitext(name)[1].lower()
+    if extension == '.csv':
+        return 'csv'
+    if extension in ('.ndjson', '.jsonl', '.json'):
+        return 'ndjson'
+    return None
+
+
+def open_source(path):
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8', newline='')
+    return open(path, encoding='utf-8', newline='')
+
+
+def read_records(stream, source_format):
+    """
+    Yield one item per record: a dict, ``None`` for a blank NDJSON line or a RowError for malformed JSON.
+    """
+    if source_format == 'csv':
+        return csv.DictReader(stream)
+    return (_parse_line(line) for line in stream)
+
+
+def _parse_line(line):
+    if not line.strip():
+        return None
+    try:
+        record = json.loads(line)
+    except ValueError as e:
+        return RowError(f'invalid JSON: {e}')
+    return record if isinstance(record, dict) else RowError('expected a JSON object')
+
+
+def _required(record, name):
+    value = record.get(name)
+    if value is None or value == '':
+        raise RowError(f'{name} is required')
+    return value
+
+
+def _int(value, name):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise RowError(f'{name} must be an integer')
+
+
+@contextmanager
+def sqlite_bulk_pragmas(connection):
+    """
+    Relax SQLite durability settings inside the block and restore the previous values afterwards.
+    """
+    if connection.vendor != 'sqlite' or connection.in_atomic_block:
+        # SQLite refuses to change the safety level inside a transaction, as in the test suite
+        yield
+        return
+
+    with connection.cursor() as cursor:
+        previous = {}
+        for name, value in SQLITE_PRAGMAS.items():
+            cursor.execute(f'PRAGMA {name}')
+            previous[name] = cursor.fetchone()[0]
+            cursor.execute(f'PRAGMA {name} = {value}')
+    try:
+        yield
+    finally:
+        with connection.cursor() as cursor:
+            for name, value in previous.items():
+                cursor.execute(f'PRAGMA {name} = {value}')
+
+
+class Importer:
+    """
+    Turns records of one kind into model instances and saves them in batches.
+    """
+    kind = None
+    model = None
+
+    def __init__(self, keep_ids=False):
+        self.keep_ids = keep_ids
+
+    def load_references(self):
+        pass
+
+    def build(self, record):
+        raise NotImplementedError
+
+    def build_with_id(self, record):
+        obj = self.build(record)
+        if self.keep_ids:
+            obj.pk = _int(_required(record, 'id'), 'id')
+        return obj
+
+    @property
+    def connection(self):
+        return connections[router.db_for_write(self.model)]
+
+    def save(self, objs):
+        self.model.objects.bulk_create(objs)
+
+    def after_save(self, objs):
+        pass
+
+
+class MovieImporter(Importer):
+    kind = 'movies'
+    model = Movie
+
+    def build(self, record):
+        title = str(_required(record, 'movie_title'))
+        if len(title) > 100:
+            raise RowError('movie_title is longer than 100 characters')
+        release_date = parse_date(str(_required(record, 'release_date')))
+        if release_date is None:
+            raise RowError('release_date must be a YYYY-MM-DD date')
+        return Movie(movie_title=title, description=record.get('description') or '', release_date=release_date)
+
+    def after_save(self, objs):
+        caching.bump('movie')
+        typeahead.invalidate()
+
+
+class UserImporter(Importer):
+    """
+    Users with a ``password`` column must carry a Django password hash, the others get an unusable password.
+    """
+    kind = 'users'
+    model = User
+
+    def load_references(self):
+        self.usernames = set(User.objects.values_list('username', flat=True))
+
+    def build(self, record):
+        username = str(_required(record, 'username'))
+        if username in self.usernames:
+            raise RowError(f'username {username!r} already exists')
+        password = record.get('password') or None
+        if password is not None:
+            try:
+                identify_hasher(password)
+            except ValueError:
+                raise RowError('password must be a Django password hash, not plain text')
+        self.usernames.add(username)
+        return User(username=username, email=record.get('email') or '', password=password or make_password(None))
+
+    def after_save(self, objs):
+        caching.bump('user')
+
+
+class ReviewImporter(Importer):
+    """
+    The movie is given by id (``movie``) or title (``movie_title``), the user by ``user`` or ``username``.
+    Records exported by ``export_reviews`` can be imported as they are.
+
+    Reviews are by far the largest imports, so rows are built as plain tuples and
+    inserted with ``executemany``, skipping the model instances and the SQL
+    compilation of ``bulk_create``. Each batch is added to the full-text index
+    in one statement rather than by the per-row trigger, unless ids come from
+    the file (see ``search.deferred_indexing``).
+    """
+    kind = 'reviews'
+    model = Review
+    columns = ['movie_id', 'user_id', 'review_content', 'rating', 'created_date']
+
+    def load_references(self):
+        self.movie_ids = set()
+        self.movie_titles = {}
+        for movie_id, title in Movie.objects.order_by('id').values_list('id', 'movie_title'):
+            self.movie_ids.add(movie_id)
+            self.movie_titles.setdefault(title, movie_id)  # The oldest movie wins on duplicate titles
+        self.user_ids = dict(User.objects.values_list('username', 'id'))
+        self.adapt_datetime = self.connection.ops.adapt_datetimefield_value
+        self.now = self.adapt_datetime(timezone.now())
+
+    def build(self, record):
+        movie = record.get('movie')
+        if movie not in (None, ''):
+            movie_id = _int(movie, 'movie')
+            if movie_id not in self.movie_ids:
+                raise RowError(f'movie {movie_id} does not exist')
+        else:
+            title = _required(record, 'movie_title')
+            movie_id = self.movie_titles.get(title)
+            if movie_id is None:
+                raise RowError(f'movie {title!r} does not exist')
+
+        username = record.get('user') or _required(record, 'username')
+        user_id = self.user_ids.get(username)
+        if user_id is None:
+            raise RowError(f'user {username!r} does not exist')
+
+        rating = _int(_required(record, 'rating'), 'rating')
+        if rating not in RATING_CHOICES:
+            raise RowError('rating must be between 1 and 5')
+
+        created_date = record.get('created_date')
+        if created_date:
+            try:
+                created_date = parse_datetime(created_date)
+            except ValueError:
+                created_date = None
+            if created_date is None:
+                raise RowError('created_date must be an ISO 8601 datetime')
+            if timezone.is_naive(created_date):
+                created_date = timezone.make_aware(created_date)
+            created_date = self.adapt_datetime(created_date)
+
+        content = str(_required(record, 'review_content'))
+        return (movie_id, user_id, content, rating, created_date or self.now)
+
+    def build_with_id(self, record):
+        row = self.build(record)
+        if self.keep_ids:
+            row += (_int(_required(record, 'id'), 'id'),)
+        return row
+
+    def save(self, rows):
+        connection = self.connection
+        qn = connection.ops.quote_name
+        columns = self.columns + ['id'] if self.keep_ids else self.columns
+        sql = (
+            f'INSERT INTO {qn(Review._meta.db_table)} ({", ".join(map(qn, columns))}) '
+            f'VALUES ({", ".join(["%s"] * len(columns))})'
+        )
+        indexing = nullcontext() if self.keep_ids else search.deferred_indexing(connection, search.REVIEW_FTS_TABLE)
+        with indexing, connection.cursor() as cursor:
+            cursor.executemany(sql, rows)
+
+    def after_save(self, rows):
+        # The insert skips the signals that keep the aggregates current
+        ratings = {}
+        for movie_id, _, _, rating, *_ in rows:
+            ratings.setdefault(movie_id, ([], ()))[0].append(rating)
+        aggregates.record_many(ratings)
+        leaderboards.record(added=[(movie_id, created_date) for movie_id, _, _, _, created_date, *_ in rows])
+        caching.bump('review')
+
+
+IMPORTERS = {importer.kind: importer for importer in (MovieImporter, UserImporter, ReviewImporter)}
+
+
+class ImportRun:
+    """
+    One pass over a source file, resuming from and advancing its checkpoint.
+    """
+    def __init__(self, importer, path, source_format=None, batch_size=BATCH_SIZE, restart=False):
+        self.importer = importer
+        self.path = path
+        self.source_format = source_format or detect_format(path)
+        if self.source_format not in FORMATS:
+            raise ValueError(f'Cannot tell the format of {path}, pass it explicitly.')
+        self.batch_size = batch_size
+        self.restart = restart
+        self.imported = 0
+        self.skipped = 0
+        self.errors = []
+
+    def get_checkpoint(self):
+        size = os.path.getsize(self.path)
+        checkpoint, created = ImportCheckpoint.objects.get_or_create(
+            kind=self.importer.kind, source=os.path.abspath(self.path), defaults={'source_size': size},
+        )
+        if self.restart and not created:
+            checkpoint.rows_done = checkpoint.rows_skipped = 0
+            checkpoint.finished = False
+            checkpoint.source_size = size
+            checkpoint.save()
+        elif checkpoint.source_size != size:
+            raise CheckpointMismatch(
+                f'{self.path} changed size since the last run stopped at record {checkpoint.rows_done}.'
+            )
+        return checkpoint
+
+    def run(self, progress=None):
+        """
+        Import the file and return its checkpoint. ``progress`` is called after every batch.
+        """
+        self.checkpoint = checkpoint = self.get_checkpoint()
+        if checkpoint.finished:
+            return checkpoint
+
+        self.importer.load_references()
+        self.started = time.perf_counter()
+        self.resumed_at = position = checkpoint.rows_done
+        batch, skipped = [], 0
+        connection = self.importer.connection
+
+        with open_source(self.path) as stream, sqlite_bulk_pragmas(connection):
+            for record in itertools.islice(read_records(stream, self.source_format), position, None):
+                position += 1
+                try:
+                    if isinstance(record, RowError):
+                        raise record
+                    if record is not None:
+                        batch.append(self.importer.build_with_id(record))
+                except RowError as e:
+                    skipped += 1
+                    if len(self.errors) < MAX_REPORTED_ERRORS:
+                        self.errors.append((position, str(e)))
+
+                if position - checkpoint.rows_done >= self.batch_size:
+                    self.save_batch(batch, position, skipped)
+                    batch, skipped = [], 0
+                    if progress:
+                        progress(self)
+
+            self.save_batch(batch, position, skipped, finished=True)
+            if progress:
+                progress(self)
+        return checkpoint
+
+    def save_batch(self, batch, position, skipped, finished=False):
+        checkpoint = self.checkpoint
+        with transaction.atomic(using=checkpoint._state.db):
+            if batch:
+                self.importer.save(batch)
+                self.importer.after_save(batch)
+            checkpoint.rows_done = position
+            checkpoint.rows_skipped += skipped
+            checkpoint.finished = finished
+            checkpoint.save()
+        self.imported += len(batch)
+        self.skipped += skipped
+
+    @property
+    def rate(self):
+        elapsed = time.perf_counter() - self.started
+        return (self.checkpoint.rows_done - self.resumed_at) / elapsed if elapsed else 0.0
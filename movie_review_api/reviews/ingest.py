@@ -0,0 +1,419 @@
+"""
+Write-behind ingest of single reviews.
+
+With ``settings.REVIEW_INGEST['ENABLED']`` a POST to ``/api/reviews/`` is
+validated as usual, but instead of inserting the review it appends it as one
+JSON line to this process's log file, fsyncs it and answers 202 with a
+ticket id. Each log has a flusher thread that inserts what was appended with
+one ``bulk_create`` every ``FLUSH_MS`` milliseconds, or as soon as
+``BATCH_ROWS`` reviews are waiting, and updates the aggregates, leaderboards
+and response cache once per batch. Bursts of reviews then cost one write
+transaction per batch instead of one per request, which is what serializes
+the workers on SQLite's write lock.
+
+How far each log has been inserted is an ``IngestLog`` row, updated in the
+same transaction as the batch, so every logged review is inserted exactly
+once whichever process flushes it. A log is locked with ``flock`` by the
+process writing it. ``recover()`` (``manage.py flush_review_logs``, and
+every process when it opens its log) inserts the rest of the logs whose
+process died and deletes them. A process also deletes its own log once it
+is inserted and larger than ``ROTATE_BYTES``, and starts a new one.
+
+Reviews get their ``created_date`` when they are inserted, so the reviews
+listing only ever grows at its end and cursors handed out earlier stay
+valid. A review the flusher cannot insert because its movie or user was
+deleted in the meantime is dropped and its ticket says so.
+
+Read-your-writes: after a write-behind POST the author's reads on views with
+``WriteBehindMixin`` first flush every log of the host that is behind,
+for ``PENDING_SECONDS``. ``/api/reviews/ingest/<ticket>/`` does the same,
+then reports the saved review. The logs live on local disk, so this holds
+as long as an author's requests reach the host that took the review.
+
+Tickets and the authors' pending flags are kept in the
+``REVIEW_INGEST['CACHE']`` cache, which every worker process has to share:
+a ticket polled on another worker, or an author's read there, must see what
+the worker that took the review stored. Write-behind stays off, with POSTs
+inserted at once, while that cache is a local-memory one, and the
+``reviews.E002`` system check reports it.
+"""
+import atexit
+import fcntl
+import json
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from collections import defaultdict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core import checks
+from django.core.cache import caches
+from django.db import close_old_connections, connections, transaction
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.response import Response
+
+from . import aggregates, budgets, caching, leaderboards, replicas
+from .models import IngestLog, Movie, Review
+
+
+logger = logging.getLogger(__name__)
+
+PENDING_KEY = 'reviews:ingest:pending:{}'
+TICKET_KEY = 'reviews:ingest:ticket:{}'
+
+LOG_SUFFIX = '.log'
+
+
+def _config():
+    return getattr(settings, 'REVIEW_INGEST', None) or {}
+
+
+def _cache():
+    return caches[_config().get('CACHE', 'default')]
+
+
+def enabled():
+    # Tickets and pending flags in a process-local cache would be lost to the other workers
+    return bool(_config().get('ENABLED')) and not caching.is_process_local(_cache())
+
+
+def ingest_check(app_configs=None, **kwargs):
+    config = _config()
+    if not config.get('ENABLED') or not caching.is_process_local(_cache()):
+        return []
+    return [checks.Error(
+        f'REVIEW_INGEST is enabled but its cache {config.get("CACHE", "default")!r} is local to each process; '
+        'reviews are inserted at once instead.',
+        hint='Point REVIEW_INGEST["CACHE"] at a cache the worker processes share (Redis, Memcached, database).',
+        id='reviews.E002',
+    )]
+
+
+def log_directory():
+    return os.fspath(_config().get('DIR') or os.path.join(settings.BASE_DIR, 'ingest'))
+
+
+def _ticket_seconds():
+    return _config().get('TICKET_SECONDS', 3600)
+
+
+class ReviewLog:
+    """
+    Append-only log of the reviews this process accepted, and the thread that flushes it.
+    """
+    def __init__(self, directory):
+        self.directory = directory
+        self._condition = threading.Condition()
+        self._thread = None
+        self._closed = False
+        self.unflushed = 0
+        os.makedirs(directory, exist_ok=True)
+        self._open()
+
+    def _open(self):
+        self.name = f'reviews-{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}{LOG_SUFFIX}'
+        self.path = os.path.join(self.directory, self.name)
+        self._file = open(self.path, 'ab')
+        fcntl.flock(self._file, fcntl.LOCK_EX | fcntl.LOCK_NB)  # Tells recover() the log has a live writer
+        IngestLog.objects.create(name=self.name)
+
+    def append(self, entry):
+        line = json.dumps(entry, separators=(',', ':')).encode() + b'\n'
+        config = _config()
+        with self._condition:
+            self._file.write(line)
+            self._file.flush()
+            if config.get('FSYNC', True):
+                os.fsync(self._file.fileno())
+            self.unflushed += 1
+            if self.unflushed >= config.get('BATCH_ROWS', 500):
+                self._condition.notify()
+        if config.get('FLUSH_MS') is not None and self._thread is None:
+            self._start()
+
+    def _start(self):
+        with self._condition:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='review-ingest-flusher', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            config = _config()
+            with self._condition:
+                while not self.unflushed and not self._closed:
+                    self._condition.wait()
+                if self._closed:
+                    connections.close_all()  # Of this thread
+                    return
+                # Wait for a full batch, but no longer than FLUSH_MS after the first review came in
+                deadline = time.monotonic() + (config.get('FLUSH_MS') or 0) / 1000
+                while self.unflushed < config.get('BATCH_ROWS', 500):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+                self.unflushed = 0
+            try:
+                flush_log(self.path)
+                self.rotate()
+            except Exception:
+                logger.exception('Flushing %s failed, retrying', self.name)
+                with self._condition:
+                    self.unflushed += 1
+                time.sleep((config.get('FLUSH_MS') or 0) / 1000 or 1)
+            finally:
+                close_old_connections()
+
+    def rotate(self, force=False):
+        """
+        Delete the log and start a new one once it is fully inserted and over ``ROTATE_BYTES``.
+        """
+        with self._condition:
+            if self._file.closed:
+                return False  # Closed while the flusher was inserting
+            size = self._file.tell()
+            if not force and size < _config().get('ROTATE_BYTES', 16 * 1024 * 1024):
+                return False
+            with transaction.atomic():
+                checkpoint = IngestLog.objects.select_for_update().filter(name=self.name).first()
+                if checkpoint is None or checkpoint.offset < size:
+                    return False
+                # The file goes first: a log without its row would be replayed from the start
+                self._file.close()
+                os.remove(self.path)
+                checkpoint.delete()
+            if not force:
+                self._open()
+            return True
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        flush_log(self.path)
+        if not self.rotate(force=True):
+            self._file.close()  # Left for recover()
+
+
+_log = None
+_log_lock = threading.Lock()
+
+
+def get_log():
+    """
+    The log this process appends to, opened on first use in the configured directory.
+    """
+    global _log
+    directory = log_directory()
+    if _log is None or _log.directory != directory:
+        with _log_lock:
+            if _log is None or _log.directory != directory:
+                recover(directory)
+                _log = ReviewLog(directory)
+    return _log
+
+
+def close():
+    """
+    Flush and delete this process's log; a clean shutdown leaves nothing to recover.
+    """
+    global _log
+    with _log_lock:
+        if _log is not None:
+            _log, log = None, _log
+            log.close()
+
+
+atexit.register(close)
+
+
+def enqueue(user, validated_data):
+    """
+    Log a validated review of ``user`` for the flusher and return its ticket.
+    """
+    ticket = uuid.uuid4().hex
+    get_log().append({
+        'ticket': ticket,
+        'user': user.pk,
+        'movie': validated_data['movie'].pk,
+        'review_content': validated_data['review_content'],
+        'rating': validated_data['rating'],
+    })
+    _cache().set(TICKET_KEY.format(ticket), {'status': 'pending', 'user': user.pk}, _ticket_seconds())
+    _cache().set(PENDING_KEY.format(user.pk), True, _config().get('PENDING_SECONDS', 30))
+    return ticket
+
+
+def ticket_status(ticket):
+    """
+    ``{'status': 'pending' | 'saved' | 'rejected', 'user': id, ['review': id]}``, or None when unknown.
+    """
+    return _cache().get(TICKET_KEY.format(ticket))
+
+
+def save(entries):
+    """
+    Insert logged reviews as one batch; returns the saved reviews and the tickets that were rejected.
+    """
+    movie_ids = set(Movie.objects.filter(pk__in={entry['movie'] for entry in entries}).values_list('pk', flat=True))
+    user_ids = set(
+        get_user_model().objects.filter(pk__in={entry['user'] for entry in entries})
+        .values_list('pk', flat=True)
+    )
+    reviews, tickets, rejected = [], [], []
+    for entry in entries:
+        if entry['movie'] in movie_ids and entry['user'] in user_ids:
+            reviews.append(Review(
+                movie_id=entry['movie'], user_id=entry['user'],
+                review_content=entry['review_content'], rating=entry['rating'],
+            ))
+            tickets.append(entry)
+        else:
+            rejected.append(entry)
+
+    # bulk_create skips the model signals, as in ReviewListSerializer.create
+    Review.objects.bulk_create(reviews, batch_size=500)
+    added = defaultdict(list)
+    for review in reviews:
+        added[review.movie_id].append(review.rating)
+    aggregates.record_many({movie_id: (ratings, ()) for movie_id, ratings in added.items()})
+    leaderboards.record(added=[(review.movie_id, review.created_date) for review in reviews])
+    return list(zip(tickets, reviews)), rejected
+
+
+def flush_log(path):
+    """
+    Insert the reviews appended to a log since its checkpoint; returns how many were logged.
+    """
+    name = os.path.basename(path)
+    with transaction.atomic():
+        checkpoint = IngestLog.objects.select_for_update().filter(name=name).first()
+        if checkpoint is None:
+            return 0  # Deleted by its owner, everything in it was inserted
+        try:
+            with open(path, 'rb') as file:
+                file.seek(checkpoint.offset)
+                data = file.read()
+        except FileNotFoundError:
+            return 0
+        end = data.rfind(b'\n') + 1  # A line still being written waits for the next flush
+        if not end:
+            return 0
+        entries = [json.loads(line) for line in data[:end].splitlines()]
+        saved, rejected = save(entries)
+        checkpoint.offset += end
+        checkpoint.save(update_fields=['offset', 'updated'])
+
+    if saved:
+        caching.bump('review')
+    timeout = _ticket_seconds()
+    tickets = {
+        TICKET_KEY.format(entry['ticket']): {'status': 'saved', 'user': entry['user'], 'review': review.pk}
+        for entry, review in saved
+    }
+    tickets.update({
+        TICKET_KEY.format(entry['ticket']): {'status': 'rejected', 'user': entry['user']} for entry in rejected
+    })
+    _cache().set_many(tickets, timeout)
+    if rejected:
+        logger.warning('Dropped %d logged review(s) of deleted movies or users from %s', len(rejected), name)
+    return len(entries)
+
+
+def _log_paths(directory):
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return []
+    return [os.path.join(directory, name) for name in sorted(names) if name.endswith(LOG_SUFFIX)]
+
+
+def flush_all(directory=None):
+    """
+    Flush every log in the directory that is behind; one query when none is.
+    """
+    paths = _log_paths(directory or log_directory())
+    if not paths:
+        return 0
+    offsets = dict(IngestLog.objects.filter(name__in=[os.path.basename(path) for path in paths]).values_list('name', 'offset'))
+    flushed = 0
+    for path in paths:
+        offset = offsets.get(os.path.basename(path))
+        try:
+            behind = offset is not None and os.path.getsize(path) > offset
+        except FileNotFoundError:
+            behind = False
+        if behind:
+            flushed += flush_log(path)
+    return flushed
+
+
+def recover(directory=None):
+    """
+    Insert the rest of the logs no live process holds, then delete them; returns how many reviews were logged.
+    """
+    directory = directory or log_directory()
+    recovered = 0
+    for path in _log_paths(directory):
+        try:
+            file = open(path, 'rb')
+        except FileNotFoundError:
+            continue
+        with file:
+            try:
+                fcntl.flock(file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                continue  # Its process is still running
+            name = os.path.basename(path)
+            # A log without a row never got past being opened
+            IngestLog.objects.get_or_create(name=name)
+            recovered += flush_log(path)
+            with transaction.atomic():
+                os.remove(path)
+                IngestLog.objects.filter(name=name).delete()
+    # Rows left by a delete that failed after the file of this host's log was removed
+    names = [os.path.basename(path) for path in _log_paths(directory)]
+    IngestLog.objects.filter(name__startswith=f'reviews-{socket.gethostname()}-').exclude(name__in=names).delete()
+    return recovered
+
+
+def settle(user):
+    """
+    Flush the logs when ``user`` wrote behind recently, so their next read sees their reviews.
+    """
+    if not enabled() or not user or not user.is_authenticated:
+        return 0
+    if not _cache().get(PENDING_KEY.format(user.pk)):
+        return 0
+    return flush_all()
+
+
+class WriteBehindMixin:
+    """
+    DRF view mixin that creates through the write-behind log when it is enabled
+    and flushes the logs before the reads of authors with reviews in them.
+    """
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if request.method in SAFE_METHODS:
+            # The flusher's work, not the view's, so it stays out of the query budget
+            with budgets.uncounted():
+                if settle(request.user):
+                    replicas.pin(request.user)  # The replicas may not have the reviews yet
+
+    def create(self, request, *args, **kwargs):
+        if not enabled():
+            return super().create(request, *args, **kwargs)
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        ticket = enqueue(request.user, serializer.validated_data)
+        data = {**serializer.data, 'id': ticket, 'user': request.user.username, 'status': 'pending'}
+        location = reverse('review-ingest-status', kwargs={'ticket': ticket})
+        return Response(data, status=status.HTTP_202_ACCEPTED, headers={'Location': location})
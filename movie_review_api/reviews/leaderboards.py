@@ -0,0 +1,303 @@
+"""
+Precomputed movie leaderboards.
+
+Three boards rank the movies:
+
+``top-rated``           Bayesian average rating, ``(C * m + rating_sum) / (C + review_count)``,
+                        which pulls movies with few reviews towards the mean ``m`` of all
+                        reviews; ``C`` is ``settings.LEADERBOARDS['PRIOR_WEIGHT']``
+``most-reviewed-week``  reviews created in the weekly window
+``trending``            reviews in the trending window minus the week's rate over the same
+                        length of time, so steady favourites score about zero and sudden
+                        interest stands out
+
+The scores live in ``MovieRanking``, one row per movie with reviews and an
+index per board, so a page is a walk down one index whatever the size of the
+catalogue. Windows are whole hours in UTC, the current one included.
+``ReviewActivity`` counts each movie's reviews per hour of the weekly window.
+
+``record`` puts review writes into the buckets and the rankings as they
+happen, in two statements, from the review signals and the bulk paths.
+``compact`` (``manage.py compact_leaderboards --interval``) periodically moves
+the windows on to the current hour: it subtracts the hours that left each
+window, drops the buckets older than the week and rescores every movie with
+the current prior mean. Between compactions the windows lag behind by up to
+the compaction interval.
+
+``rebuild`` recomputes everything from the review table. It repairs the
+rankings after writes that bypass ``record`` such as ``loaddata``, and
+after a ``flush``, which drops the windows the migration that created the
+tables built: until it or the next compaction has run, ``record`` does
+nothing.
+"""
+import datetime
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections, router, transaction
+from django.db.models import Case, Count, ExpressionWrapper, F, FloatField, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce, TruncHour
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import caching
+from .models import RATING_CHOICES, LeaderboardState, Movie, MovieRanking, Review, ReviewActivity
+
+
+# Score field and the rows that take part, per board
+BOARDS = {
+    'top-rated': ('bayesian_rating', Q(bayesian_rating__isnull=False)),
+    'most-reviewed-week': ('week_count', Q(week_count__gt=0)),
+    'trending': ('trending_score', Q(trending_score__isnull=False)),
+}
+
+STATE_ID = 1
+
+# Prior mean before there are any reviews: the middle of the rating scale
+DEFAULT_PRIOR_MEAN = (min(RATING_CHOICES) + max(RATING_CHOICES)) / 2
+
+# Review changes per statement, at three parameters each under SQLite's 999
+CHUNK_SIZE = 250
+
+
+def _config():
+    return getattr(settings, 'LEADERBOARDS', None) or {}
+
+
+def prior_weight():
+    return _config().get('PRIOR_WEIGHT', 10)
+
+
+def _window_hours():
+    config = _config()
+    return config.get('TRENDING_HOURS', 24), config.get('WEEK_HOURS', 168)
+
+
+def _trending_ratio():
+    # The part of the week's reviews expected in a trending window at a steady rate
+    trending_hours, week_hours = _window_hours()
+    return trending_hours / week_hours
+
+
+def hour_of(value):
+    """
+    Start of the UTC hour of a datetime, or of a datetime string as the database adapter writes it.
+    """
+    if isinstance(value, str):
+        value = parse_datetime(value)
+    if timezone.is_naive(value):
+        value = timezone.make_aware(value, datetime.timezone.utc)
+    return value.astimezone(datetime.timezone.utc).replace(minute=0, second=0, microsecond=0)
+
+
+def windows(now=None):
+    """
+    First hour of the trending and of the weekly window that end with the hour of ``now``.
+    """
+    hour = hour_of(now or timezone.now())
+    trending_hours, week_hours = _window_hours()
+    return hour - timedelta(hours=trending_hours - 1), hour - timedelta(hours=week_hours - 1)
+
+
+def trending_score(day_count, week_count):
+    if week_count <= 0:
+        return None
+    return day_count - week_count * _trending_ratio()
+
+
+def bayesian_rating(review_count, rating_sum, prior_mean):
+    if review_count <= 0:
+        return None
+    weight = prior_weight()
+    return (weight * prior_mean + rating_sum) / (weight + review_count)
+
+
+def prior_mean():
+    totals = Movie.objects.aggregate(reviews=Sum('review_count'), ratings=Sum('rating_sum'))
+    return totals['ratings'] / totals['reviews'] if totals['reviews'] else DEFAULT_PRIOR_MEAN
+
+
+def ranked(board):
+    """
+    The rankings on ``board`` with their movies, unordered; the pagination orders them by the score.
+    """
+    field, condition = BOARDS[board]
+    return MovieRanking.objects.filter(condition).select_related('movie')
+
+
+ACTIVITY_SQL = '''
+WITH deltas (movie_id, hour, n) AS (VALUES {values})
+INSERT INTO {activity} (movie_id, hour, review_count)
+SELECT deltas.movie_id, deltas.hour, deltas.n FROM deltas, {state} AS state
+WHERE state.id = {state_id} AND deltas.hour >= state.week_start
+ON CONFLICT (movie_id, hour) DO UPDATE SET review_count = {activity}.review_count + excluded.review_count
+'''
+
+# Inserts the deltas for movies without a ranking yet and adds them to the others; the upsert
+# reads the row as it is, so concurrent writers never overwrite each other's counts
+RANKING_SQL = '''
+WITH deltas (movie_id, hour, n) AS (VALUES {values})
+INSERT INTO {ranking} (movie_id, day_count, week_count, trending_score, bayesian_rating)
+SELECT
+    movie.id, changes.day_count, changes.week_count,
+    CASE WHEN changes.week_count > 0 THEN changes.day_count - changes.week_count * %s END,
+    CASE WHEN movie.review_count > 0
+        THEN (%s * state.prior_mean + movie.rating_sum) / (%s + movie.review_count) END
+FROM (
+    SELECT
+        deltas.movie_id,
+        SUM(CASE WHEN deltas.hour >= state.day_start THEN deltas.n ELSE 0 END) AS day_count,
+        SUM(CASE WHEN deltas.hour >= state.week_start THEN deltas.n ELSE 0 END) AS week_count
+    FROM deltas, {state} AS state
+    WHERE state.id = {state_id}
+    GROUP BY deltas.movie_id
+) AS changes
+JOIN {movie} AS movie ON movie.id = changes.movie_id
+JOIN {state} AS state ON state.id = {state_id}
+WHERE true
+ON CONFLICT (movie_id) DO UPDATE SET
+    day_count = {ranking}.day_count + excluded.day_count,
+    week_count = {ranking}.week_count + excluded.week_count,
+    trending_score = CASE WHEN {ranking}.week_count + excluded.week_count > 0
+        THEN {ranking}.day_count + excluded.day_count - ({ranking}.week_count + excluded.week_count) * %s END,
+    bayesian_rating = excluded.bayesian_rating
+'''
+
+
+def record(added=(), removed=(), rated=()):
+    """
+    Count reviews into (``added``) or out of (``removed``) the windows, given as ``(movie_id, created_date)``
+    pairs, and rescore the ``rated`` movie ids whose ratings changed. Run it after the movie aggregates
+    include the change, in the same transaction.
+    """
+    deltas = Counter()
+    for movie_id, created_date in added:
+        deltas[movie_id, hour_of(created_date)] += 1
+    for movie_id, created_date in removed:
+        deltas[movie_id, hour_of(created_date)] -= 1
+    deltas = {key: n for key, n in deltas.items() if n}
+    counted = {movie_id for movie_id, _ in deltas}
+    if not counted and not rated:
+        return
+
+    connection = connections[router.db_for_write(MovieRanking)]
+    qn = connection.ops.quote_name
+    adapt = connection.ops.adapt_datetimefield_value
+    tables = {
+        'activity': qn(ReviewActivity._meta.db_table), 'ranking': qn(MovieRanking._meta.db_table),
+        'movie': qn(Movie._meta.db_table), 'state': qn(LeaderboardState._meta.db_table), 'state_id': STATE_ID,
+    }
+    counts = [(movie_id, adapt(hour), n) for (movie_id, hour), n in deltas.items()]
+    # Movies whose counts stay the same still need their Bayesian rating rescored
+    rescored = counts + [(movie_id, None, 0) for movie_id in sorted(set(rated) - counted)]
+    ratio, weight = _trending_ratio(), prior_weight()
+
+    with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+        for sql, rows, extra in ((ACTIVITY_SQL, counts, []), (RANKING_SQL, rescored, [ratio, weight, weight, ratio])):
+            for start in range(0, len(rows), CHUNK_SIZE):
+                chunk = rows[start:start + CHUNK_SIZE]
+                values = ', '.join(['(%s, %s, %s)'] * len(chunk))
+                params = [value for row in chunk for value in row]
+                cursor.execute(sql.format(values=values, **tables), params + extra)
+
+
+def _window_count(**hours):
+    # The movie's reviews in the given range of hours, for an UPDATE of its ranking
+    buckets = ReviewActivity.objects.filter(movie=OuterRef('movie'), **hours).order_by().values('movie')
+    return Coalesce(Subquery(buckets.annotate(n=Sum('review_count')).values('n')), 0)
+
+
+def _rescore(rankings, prior):
+    weight = prior_weight()
+    movies = Movie.objects.filter(pk=OuterRef('movie')).annotate(score=Case(
+        When(review_count__gt=0, then=ExpressionWrapper(
+            (Value(weight * prior) + F('rating_sum')) / (Value(weight) + F('review_count')),
+            output_field=FloatField(),
+        )),
+        output_field=FloatField(),
+    ))
+    rankings.update(
+        trending_score=Case(
+            When(week_count__gt=0, then=F('day_count') - F('week_count') * Value(_trending_ratio())),
+            output_field=FloatField(),
+        ),
+        bayesian_rating=Subquery(movies.values('score')),
+    )
+
+
+def compact(now=None):
+    """
+    Move the windows on to the hour of ``now`` and rescore every movie against the current prior mean.
+    Runs ``rebuild`` when the rankings were never built.
+    """
+    now = now or timezone.now()
+    day_start, week_start = windows(now)
+    with transaction.atomic():
+        state = LeaderboardState.objects.select_for_update().filter(pk=STATE_ID).first()
+        if state is None:
+            return rebuild(now)
+
+        # Windows only move forwards, an earlier now only rescores
+        day_start, week_start = max(day_start, state.day_start), max(week_start, state.week_start)
+        left_day = Q(hour__gte=state.day_start, hour__lt=day_start)
+        left_week = Q(hour__lt=week_start)
+        moved = ReviewActivity.objects.filter(left_day | left_week).values('movie')
+        MovieRanking.objects.filter(movie__in=moved).update(
+            day_count=F('day_count') - _window_count(hour__gte=state.day_start, hour__lt=day_start),
+            week_count=F('week_count') - _window_count(hour__lt=week_start),
+        )
+        ReviewActivity.objects.filter(left_week | Q(review_count=0)).delete()
+
+        prior = prior_mean()
+        _rescore(MovieRanking.objects.all(), prior)
+        MovieRanking.objects.filter(week_count__lte=0, bayesian_rating__isnull=True).delete()
+
+        state.day_start, state.week_start = day_start, week_start
+        state.prior_mean, state.compacted_at = prior, now
+        state.save()
+    caching.bump('movieranking')
+
+
+def rebuild(now=None, batch_size=500):
+    """
+    Recompute the buckets, the rankings and the prior mean from the review table for the windows of ``now``.
+    """
+    now = now or timezone.now()
+    day_start, week_start = windows(now)
+    with transaction.atomic():
+        # Write first: a transaction that read first could not take the write lock while another one writes
+        ReviewActivity.objects.all().delete()
+        hourly = (
+            Review.objects.filter(created_date__gte=week_start).order_by()
+            .annotate(hour=TruncHour('created_date', tzinfo=datetime.timezone.utc))
+            .values('movie_id', 'hour').annotate(n=Count('id'))
+        )
+        buckets = [ReviewActivity(movie_id=row['movie_id'], hour=row['hour'], review_count=row['n']) for row in hourly]
+        ReviewActivity.objects.bulk_create(buckets, batch_size=batch_size)
+
+        day_counts, week_counts = Counter(), Counter()
+        for bucket in buckets:
+            week_counts[bucket.movie_id] += bucket.review_count
+            if bucket.hour >= day_start:
+                day_counts[bucket.movie_id] += bucket.review_count
+
+        prior = prior_mean()
+        rankings = []
+        movies = Movie.objects.order_by('pk').values_list('pk', 'review_count', 'rating_sum')
+        for movie_id, review_count, rating_sum in movies.iterator(chunk_size=batch_size):
+            if review_count or movie_id in week_counts:
+                rankings.append(MovieRanking(
+                    movie_id=movie_id,
+                    day_count=day_counts[movie_id],
+                    week_count=week_counts[movie_id],
+                    trending_score=trending_score(day_counts[movie_id], week_counts[movie_id]),
+                    bayesian_rating=bayesian_rating(review_count, rating_sum, prior),
+                ))
+        MovieRanking.objects.all().delete()
+        MovieRanking.objects.bulk_create(rankings, batch_size=batch_size)
+
+        LeaderboardState.objects.update_or_create(pk=STATE_ID, defaults={
+            'day_start': day_start, 'week_start': week_start, 'prior_mean': prior, 'compacted_at': now,
+        })
+    caching.bump('movieranking')
@@ -0,0 +1,372 @@
+"""
+Load tests of the API.
+
+Concurrent clients send a weighted mix of requests (``DEFAULT_MIX``) to the
+endpoints in ``reviews/urls.py``: review and movie listings and details,
+searches by title and by rating, review creates and updates, logins and
+token refreshes. Each client logs in and writes one review of its own
+before the measured requests, so updates always have a review to change.
+The report gives p50/p95/p99 latency, throughput and queries per request
+for every operation. Clients turned away with ``Retry-After`` (see
+``reviews.admission``) count the request as an error and wait that long.
+
+Requests go through Django's test client by default, in threads of the
+same process, so a run needs no server or network; ``loadtest`` fills a
+throwaway database for it with ``benchmarks.seed``. Given a base URL they
+go over HTTP to a running server instead, filled beforehand with
+``seed_loadtest_data`` and the same sizes and seed. Queries are counted in
+the process that runs them, so they are only reported in-process.
+
+Reports can be saved as JSON baselines. ``compare`` lists what got worse
+than a baseline by more than a threshold: the overall throughput, the p95
+latency or queries per request of an operation, or an operation that
+started failing.
+"""
+import itertools
+import json
+import random
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import defaultdict, namedtuple
+from urllib.parse import urlencode, urlsplit
+
+from django.db import connections
+from django.test import Client
+from django.urls import reverse
+
+from . import benchmarks, budgets
+
+
+# Relative weights of the operations in a run, roughly the read-heavy traffic of a review site
+DEFAULT_MIX = {
+    'review-list': 20,
+    'review-detail': 20,
+    'movie-list': 10,
+    'movie-detail': 15,
+    'review-search-title': 10,
+    'review-search-rating': 10,
+    'review-create': 6,
+    'review-update': 5,
+    'login': 2,
+    'token-refresh': 2,
+}
+
+# Password of the seeded users the clients log in as
+PASSWORD = 'loadtest-password'
+
+# Orderings of the movie list that clients ask for
+MOVIE_ORDERINGS = ['movie_title', '-release_date', '-review_count', '-average_rating']
+
+# Latency differences below this are timer noise, not regressions
+LATENCY_FLOOR_MS = 1.0
+
+# Queries per request are averages over cache hits and misses, so small changes are not regressions
+QUERIES_FLOOR = 0.5
+
+Result = namedtuple('Result', ['status', 'content', 'queries', 'seconds', 'retry_after'], defaults=[None])
+Dataset = namedtuple('Dataset', ['movies', 'reviews', 'usernames', 'password'])
+
+
+class InProcessTransport:
+    """
+    Requests through Django's test client, counting the queries each one runs.
+    """
+    def __init__(self):
+        self.client = Client()
+
+    def request(self, method, path, params=None, data=None, token=None):
+        headers = {'Authorization': f'Bearer {token}'} if token else {}
+        start = time.perf_counter()
+        with budgets.count_queries() as counter:
+            if method == 'GET':
+                response = self.client.get(path, params, headers=headers)
+            else:
+                response = self.client.generic(
+                    method, path, json.dumps(data), content_type='application/json', headers=headers,
+                )
+        return Result(
+            response.status_code, response.content, counter.count, time.perf_counter() - start,
+            response.get('Retry-After'),
+        )
+
+    def close(self):
+        connections.close_all()  # The connections of this thread
+
+
+class HTTPTransport:
+    """
+    Requests over HTTP to the server at ``base_url``.
+    """
+    def __init__(self, base_url, timeout=30):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+
+    def request(self, method, path, params=None, data=None, token=None):
+        url = self.base_url + path + (('&' if '?' in path else '?') + urlencode(params) if params else '')
+        headers = {'Accept': 'application/json', 'Content-Type': 'application/json'}
+        if token:
+            headers['Authorization'] = f'Bearer {token}'
+        body = None if data is None else json.dumps(data).encode()
+        request = urllib.request.Request(url, data=body, headers=headers, method=method)
+        start = time.perf_counter()
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                status, content, retry_after = response.status, response.read(), None
+        except urllib.error.HTTPError as e:
+            status, content, retry_after = e.code, e.read(), e.headers.get('Retry-After')
+        return Result(status, content, None, time.perf_counter() - start, retry_after)
+
+    def close(self):
+        pass
+
+
+def _collect(transport, path, params, limit):
+    # Follows the pagination links of a listing until ``limit`` results
+    results = []
+    while path and len(results) < limit:
+        response = transport.request('GET', path, params)
+        if response.status != 200:
+            raise RuntimeError(f'GET {path} answered {response.status}')
+        page = json.loads(response.content)
+        results.extend(page['results'])
+        next_url = urlsplit(page['next']) if page.get('next') else None
+        path, params = (f'{next_url.path}?{next_url.query}', None) if next_url else (None, None)
+    return results[:limit]
+
+
+def discover(transport, users, password, limit=1000):
+    """
+    Find the movies, most reviewed first, and reviews to request through the API itself.
+    """
+    movies = _collect(transport, reverse('movie-list-create'), {'ordering': '-review_count', 'page_size': 100}, limit)
+    reviews = _collect(transport, reverse('review-list-create'), {'page_size': 100}, limit)
+    if not movies or not reviews:
+        raise RuntimeError('The API has no movies or reviews to load test, seed the database first.')
+    return Dataset(
+        movies=[(movie['id'], movie['movie_title']) for movie in movies],
+        reviews=[review['id'] for review in reviews],
+        usernames=[f'user{i}' for i in range(users)],  # The names benchmarks.seed gives
+        password=password,
+    )
+
+
+class Session:
+    """
+    One simulated client: its own transport, tokens and random choices.
+    """
+    def __init__(self, transport, dataset, rng, username, skew=1.0):
+        self.transport = transport
+        self.dataset = dataset
+        self.rng = rng
+        self.username = username
+        self.access = self.refresh = None
+        self.own_reviews = []
+        # Popular movies get most of the traffic, like they get most of the reviews
+        self._movie_weights = list(itertools.accumulate(1 / rank ** skew for rank in range(1, len(dataset.movies) + 1)))
+
+    def pick_movie(self):
+        return self.rng.choices(self.dataset.movies, cum_weights=self._movie_weights)[0]
+
+    def setup(self):
+        for name in ('login', 'review-create'):
+            response = self.run(name)
+            if response.status >= 400:
+                raise RuntimeError(f'{self.username} could not {name}: {response.status} {response.content[:200]!r}')
+
+    def run(self, name):
+        return getattr(self, name.replace('-', '_'))()
+
+    def _json(self, response):
+        return json.loads(response.content) if response.status < 400 else {}
+
+    ## Reads
+    def review_list(self):
+        return self.transport.request('GET', reverse('review-list-create'), {'page_size': 20})
+
+    def review_detail(self):
+        return self.transport.request('GET', reverse('review-detail', args=[self.rng.choice(self.dataset.reviews)]))
+
+    def movie_list(self):
+        return self.transport.request('GET', reverse('movie-list-create'), {'ordering': self.rng.choice(MOVIE_ORDERINGS)})
+
+    def movie_detail(self):
+        movie_id, _ = self.pick_movie()
+        return self.transport.request('GET', reverse('movie-detail', args=[movie_id]))
+
+    def review_search_title(self):
+        _, title = self.pick_movie()
+        return self.transport.request('GET', reverse('review-search'), {'movie_title': title})
+
+    def review_search_rating(self):
+        return self.transport.request('GET', reverse('review-search'), {'rating': self.rng.randint(1, 5)})
+
+    ## Writes
+    def review_create(self):
+        movie_id, _ = self.pick_movie()
+        data = {'movie': movie_id, 'review_content': 'Written by the load test', 'rating': self.rng.randint(1, 5)}
+        response = self.transport.request('POST', reverse('review-list-create'), data=data, token=self.access)
+        review_id = self._json(response).get('id')
+        if review_id is not None:
+            self.own_reviews.append(review_id)
+        return response
+
+    def review_update(self):
+        review_id = self.rng.choice(self.own_reviews)
+        return self.transport.request(
+            'PATCH', reverse('review-detail', args=[review_id]), data={'rating': self.rng.randint(1, 5)},
+            token=self.access,
+        )
+
+    ## Authentication
+    def login(self):
+        data = {'username': self.username, 'password': self.dataset.password}
+        response = self.transport.request('POST', reverse('token_obtain_pair'), data=data)
+        tokens = self._json(response)
+        self.access, self.refresh = tokens.get('access', self.access), tokens.get('refresh', self.refresh)
+        return response
+
+    def token_refresh(self):
+        response = self.transport.request('POST', reverse('token_refresh'), data={'refresh': self.refresh})
+        tokens = self._json(response)
+        # Refresh tokens are rotated, the old one is blacklisted
+        self.access, self.refresh = tokens.get('access', self.access), tokens.get('refresh', self.refresh)
+        return response
+
+
+def run(transport_factory, dataset, concurrency=8, requests=1000, mix=None, random_seed=0, skew=1.0, config=None):
+    """
+    Send ``requests`` requests from ``concurrency`` clients in threads and return the report.
+    ``config`` adds what else a baseline has to match, e.g. the size of the dataset.
+    """
+    mix = mix or DEFAULT_MIX
+    names, weights = list(mix), list(mix.values())
+    samples = defaultdict(list)
+    errors = []
+    lock = threading.Lock()
+    ready = threading.Barrier(concurrency + 1)
+
+    def client(index, count):
+        transport = transport_factory()
+        try:
+            rng = random.Random(random_seed * 1000 + index)
+            username = dataset.usernames[index % len(dataset.usernames)]
+            session = Session(transport, dataset, rng, username, skew)
+            try:
+                session.setup()
+            except Exception as e:
+                with lock:
+                    errors.append(e)
+                return
+            finally:
+                ready.wait()
+            for name in rng.choices(names, weights, k=count):
+                try:
+                    response = session.run(name)
+                except Exception as e:  # e.g. "database is locked", a failure like any other
+                    response = Result(0, str(e).encode(), None, 0.0)
+                with lock:
+                    samples[name].append(response)
+                if response.retry_after:
+                    # Shed or throttled; clients wait as told before their next request, like browsers and SDKs
+                    time.sleep(float(response.retry_after))
+        finally:
+            transport.close()
+
+    shares = [requests // concurrency + (index < requests % concurrency) for index in range(concurrency)]
+    threads = [threading.Thread(target=client, args=(index, count)) for index, count in enumerate(shares)]
+    for thread in threads:
+        thread.start()
+    ready.wait()  # Logins and first reviews are not measured
+    if errors:
+        for thread in threads:
+            thread.join()
+        raise RuntimeError(f'Client setup failed: {errors[0]}')
+    start = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    seconds = time.perf_counter() - start
+
+    config = {
+        **(config or {}), 'concurrency': concurrency, 'requests': requests, 'mix': mix, 'random_seed': random_seed,
+        'skew': skew,
+    }
+    return report(samples, seconds, config)
+
+
+def _summary(responses, seconds):
+    latencies = [response.seconds * 1000 for response in responses]
+    queries = [response.queries for response in responses if response.queries is not None]
+    return {
+        'requests': len(responses),
+        'errors': sum(1 for response in responses if not 0 < response.status < 400),
+        'throughput': round(len(responses) / seconds, 2),
+        'p50_ms': round(benchmarks.percentile(latencies, 0.50), 3),
+        'p95_ms': round(benchmarks.percentile(latencies, 0.95), 3),
+        'p99_ms': round(benchmarks.percentile(latencies, 0.99), 3),
+        'queries_per_request': round(sum(queries) / len(queries), 2) if queries else None,
+    }
+
+
+def report(samples, seconds, config):
+    everything = [response for responses in samples.values() for response in responses]
+    return {
+        'config': config,
+        'seconds': round(seconds, 3),
+        'total': _summary(everything, seconds) if everything else None,
+        'operations': {name: _summary(responses, seconds) for name, responses in sorted(samples.items())},
+    }
+
+
+def compare(current, baseline, threshold=0.2):
+    """
+    Return a message for every way ``current`` is worse than ``baseline`` by more than ``threshold``.
+    """
+    if current['config'] != baseline['config']:
+        raise ValueError('The baseline was recorded with another configuration: dataset, concurrency, requests, mix or seed.')
+
+    regressions = []
+    old, new = baseline['total'], current['total']
+    if new['throughput'] < old['throughput'] * (1 - threshold):
+        regressions.append(f'throughput fell from {old["throughput"]:.1f} to {new["throughput"]:.1f} requests/s')
+
+    for name, old in baseline['operations'].items():
+        new = current['operations'].get(name)
+        if new is None:
+            continue
+        if new['p95_ms'] > old['p95_ms'] * (1 + threshold) and new['p95_ms'] - old['p95_ms'] > LATENCY_FLOOR_MS:
+            regressions.append(f'{name}: p95 latency rose from {old["p95_ms"]:.1f} to {new["p95_ms"]:.1f} ms')
+        if old['queries_per_request'] is not None and new['queries_per_request'] is not None and (
+            new['queries_per_request'] - old['queries_per_request'] > max(QUERIES_FLOOR, old['queries_per_request'] * threshold)
+        ):
+            regressions.append(
+                f'{name}: queries per request rose from {old["queries_per_request"]} to {new["queries_per_request"]}'
+            )
+        if new['errors'] and not old['errors']:
+            regressions.append(f'{name}: {new["errors"]} of {new["requests"]} requests failed')
+    return regressions
+
+
+def format_report(report):
+    lines = [f'{"operation":<22}{"requests":>9}{"errors":>8}{"req/s":>9}{"p50 ms":>9}{"p95 ms":>9}{"p99 ms":>9}{"queries":>9}']
+    rows = [*report['operations'].items(), ('total', report['total'])]
+    for name, summary in rows:
+        queries = summary['queries_per_request']
+        lines.append(
+            f'{name:<22}{summary["requests"]:>9}{summary["errors"]:>8}{summary["throughput"]:>9.1f}'
+            f'{summary["p50_ms"]:>9.1f}{summary["p95_ms"]:>9.1f}{summary["p99_ms"]:>9.1f}'
+            f'{"-" if queries is None else f"{queries:.2f}":>9}'
+        )
+    return '\n'.join(lines)
+
+
+def save(report, path):
+    with open(path, 'w') as file:
+        json.dump(report, file, indent=2, sort_keys=True)
+        file.write('\n')
+
+
+def load(path):
+    with open(path) as file:
+        return json.load(file)
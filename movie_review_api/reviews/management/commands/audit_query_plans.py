@@ -0,0 +1,45 @@
+from contextlib import nullcontext
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from reviews import benchmarks, query_plans
+
+
+class Command(BaseCommand):
+    help = (
+        'Run EXPLAIN QUERY PLAN on the queries of every read endpoint and flag full table scans '
+        'and temporary B-tree sorts. Use --seed to audit a throwaway database filled with synthetic data.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=0, metavar='REVIEWS',
+                            help='Audit a fresh database seeded with this many reviews instead of the configured one.')
+        parser.add_argument('--movies', type=int, default=2000)
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--fail', action='store_true', help='Exit with an error on unexpected findings, for CI.')
+
+    def handle(self, *args, **options):
+        self.verbosity = options['verbosity']
+        seeded = bool(options['seed'])
+        with benchmarks.benchmark_database() if seeded else nullcontext():
+            if seeded:
+                benchmarks.seed(options['movies'], options['users'], options['seed'])
+                with connection.cursor() as cursor:
+                    cursor.execute('ANALYZE')  # The planner picks indexes from these statistics
+            try:
+                findings = query_plans.audit()
+            except ValueError as e:
+                raise CommandError(str(e))
+
+        for finding in findings:
+            label = 'expected' if finding.expected else self.style.WARNING('FLAGGED')
+            self.stdout.write(f'{label} {finding.endpoint} {finding.params}: {finding.detail}')
+            if self.verbosity > 1:
+                self.stdout.write(f'    {finding.sql}')
+
+        unexpected = [finding for finding in findings if not finding.expected]
+        summary = f'{len(unexpected)} unexpected and {len(findings) - len(unexpected)} expected findings.'
+        if unexpected and options['fail']:
+            raise CommandError(summary)
+        self.stdout.write(self.style.WARNING(summary) if unexpected else self.style.SUCCESS(summary))
@@ -0,0 +1,55 @@
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+
+from reviews import benchmarks, loadtest
+
+
+# Searches and listings far beyond what the clients' threads can serve, next to cheap detail lookups
+OVERLOAD_MIX = {
+    'review-search-title': 30,
+    'review-search-rating': 30,
+    'review-list': 10,
+    'review-detail': 15,
+    'movie-detail': 15,
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Load test a search-heavy mix in-process with admission control off and on, and compare the detail '
+        'endpoints\' latency and the requests shed.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--movies', type=int, default=500)
+        parser.add_argument('--users', type=int, default=200)
+        parser.add_argument('--reviews', type=int, default=20000)
+        parser.add_argument('--concurrency', type=int, default=16)
+        parser.add_argument('--requests', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        with benchmarks.benchmark_database():
+            benchmarks.seed(options['movies'], options['users'], options['reviews'], skew=1.0, password=loadtest.PASSWORD)
+            discovery = loadtest.InProcessTransport()
+            try:
+                dataset = loadtest.discover(discovery, options['users'], loadtest.PASSWORD)
+            finally:
+                discovery.close()
+
+            # Cached pages would hide the overload; throttles are not what is measured here
+            overrides = {'RESPONSE_CACHE': None, 'QUERY_BUDGET_MODE': None, 'PROFILING': None}
+            admission = {
+                'CLASSES': {
+                    'search': {'CONCURRENCY': 2, 'QUEUE': 2, 'TIMEOUT': 0.5},
+                    'list': {'CONCURRENCY': 2, 'QUEUE': 2, 'TIMEOUT': 0.5},
+                },
+                'RETRY_AFTER': 1,
+            }
+            for label, config in [('off', None), ('on', admission)]:
+                with override_settings(ADMISSION=config, **overrides):
+                    report = loadtest.run(
+                        loadtest.InProcessTransport, dataset, concurrency=options['concurrency'],
+                        requests=options['requests'], mix=OVERLOAD_MIX,
+                    )
+                self.stdout.write(f'\nAdmission control {label}:')
+                self.stdout.write(loadtest.format_report(report))
@@ -0,0 +1,119 @@
+import asyncio
+import queue
+import random
+import threading
+import time
+
+from asgiref.sync import ThreadSensitiveContext, sync_to_async
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.test import AsyncClient, Client
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from reviews import benchmarks
+from reviews.models import Review
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare requests/sec and latency percentiles of the sync read endpoints served by a pool of threads, '
+        'as under WSGI, with the async endpoints served from one event loop, as under ASGI.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--movies', type=int, default=200)
+        parser.add_argument('--users', type=int, default=100)
+        parser.add_argument('--reviews', type=int, default=5000)
+        parser.add_argument('--requests', type=int, default=2000, help='Requests per mode.')
+        parser.add_argument('--concurrency', type=int, default=64, help='Threads, or concurrent tasks.')
+
+    def handle(self, *args, **options):
+        # Both modes go to the database: the async views have no response cache
+        with benchmarks.benchmark_database(), override_settings(RESPONSE_CACHE=None):
+            movies, _ = benchmarks.seed(options['movies'], options['users'], options['reviews'])
+            requests = self.build_requests(movies, options['requests'])
+
+            self.stdout.write(f'{"mode":<16}{"req/s":>10}{"p50 ms":>10}{"p95 ms":>10}{"p99 ms":>10}')
+            wsgi = self.run_threads([(sync, params) for sync, _, params in requests], options['concurrency'])
+            self.report('WSGI + threads', *wsgi)
+            asgi = asyncio.run(self.run_tasks([(url, params) for _, url, params in requests], options['concurrency']))
+            self.report('ASGI + async', *asgi)
+
+        p99 = benchmarks.percentile(wsgi[1], 0.99) / benchmarks.percentile(asgi[1], 0.99)
+        self.stdout.write(self.style.SUCCESS(
+            f'ASGI vs WSGI: {asgi[0] / wsgi[0]:.2f}x the req/s, {1 / p99:.2f}x the p99'
+        ))
+
+    def build_requests(self, movies, count):
+        """
+        The same deterministic mix of list, detail and search reads for both modes.
+        """
+        rng = random.Random(0)
+        movie_ids = [movie.pk for movie in movies]
+        review_ids = list(Review.objects.values_list('id', flat=True))
+        requests = []
+        for _ in range(count):
+            kind = rng.choice(['review-list', 'review-detail', 'review-search', 'movie-list', 'movie-detail'])
+            if kind == 'review-detail':
+                args, params = [rng.choice(review_ids)], {}
+            elif kind == 'movie-detail':
+                args, params = [rng.choice(movie_ids)], {}
+            elif kind == 'review-search':
+                args, params = [], {'rating': rng.randint(1, 5), 'page_size': 10}
+            else:
+                args, params = [], {'page_size': 10}
+            sync_name = {'review-list': 'review-list-create', 'movie-list': 'movie-list-create'}.get(kind, kind)
+            requests.append((reverse(sync_name, args=args), reverse(f'async-{kind}', args=args), params))
+        return requests
+
+    def run_threads(self, requests, concurrency):
+        pending = queue.SimpleQueue()
+        for request in requests:
+            pending.put(request)
+        latencies = []
+
+        def worker():
+            client = Client()
+            while True:
+                try:
+                    url, params = pending.get_nowait()
+                except queue.Empty:
+                    break
+                start = time.perf_counter()
+                response = client.get(url, params)
+                # What the request_finished handler does with CONN_MAX_AGE = 0
+                connections.close_all()
+                latencies.append(time.perf_counter() - start)
+                assert response.status_code == 200, response.content
+
+        threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return len(requests) / (time.perf_counter() - start), latencies
+
+    async def run_tasks(self, requests, concurrency):
+        pending = iter(requests)
+        latencies = []
+        client = AsyncClient()
+
+        async def worker():
+            for url, params in pending:
+                start = time.perf_counter()
+                # ASGIHandler gives each request its own thread for sync code and closes its connection
+                async with ThreadSensitiveContext():
+                    response = await client.get(url, params)
+                    await sync_to_async(connections.close_all)()
+                latencies.append(time.perf_counter() - start)
+                assert response.status_code == 200, response.content
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return len(requests) / (time.perf_counter() - start), latencies
+
+    def report(self, mode, rate, latencies):
+        ms = [benchmarks.percentile(latencies, fraction) * 1000 for fraction in (0.5, 0.95, 0.99)]
+        self.stdout.write(f'{mode:<16}{rate:>10,.0f}' + ''.join(f'{value:>10.1f}' for value in ms))
@@ -0,0 +1,79 @@
+import os
+import random
+import tempfile
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from reviews import benchmarks, ingest
+from reviews.models import Review
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare review ingest rows/sec of single POSTs to /api/reviews/, the same POSTs with the write-behind '
+        'log of reviews.ingest and the bulk endpoint.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--movies', type=int, default=500)
+        parser.add_argument('--single', type=int, default=300, help='Reviews sent one POST at a time.')
+        parser.add_argument('--bulk', type=int, default=20000, help='Reviews sent through the bulk endpoint.')
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        rng = random.Random(0)
+        with benchmarks.benchmark_database():
+            movies, _ = benchmarks.seed(movies=options['movies'], users=1, reviews=0)
+            movie_ids = [movie.pk for movie in movies]
+            client = APIClient()
+            client.force_authenticate(User.objects.get())
+
+            def make_items(count):
+                return [
+                    {'movie': rng.choice(movie_ids), 'review_content': f'Review {i}', 'rating': rng.randint(1, 5)}
+                    for i in range(count)
+                ]
+
+            items = make_items(options['single'])
+            start = time.perf_counter()
+            for item in items:
+                client.post(reverse('review-list-create'), item, format='json')
+            single_rate = len(items) / (time.perf_counter() - start)
+
+            # Until every queued review is inserted, including the last partial batch
+            items = make_items(options['single'])
+            with tempfile.TemporaryDirectory() as directory, override_settings(
+                # Tickets in a cache the workers could share, as write-behind requires
+                CACHES={**settings.CACHES, 'ingest': {
+                    'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+                    'LOCATION': os.path.join(directory, 'cache'),
+                }},
+                REVIEW_INGEST={'ENABLED': True, 'DIR': os.path.join(directory, 'logs'), 'FLUSH_MS': 200, 'CACHE': 'ingest'},
+            ):
+                inserted = Review.objects.count()
+                start = time.perf_counter()
+                for item in items:
+                    response = client.post(reverse('review-list-create'), item, format='json')
+                    assert response.status_code == 202, response.data
+                ingest.close()
+                queued_rate = len(items) / (time.perf_counter() - start)
+                assert Review.objects.count() == inserted + len(items)
+
+            items = make_items(options['bulk'])
+            batch_size = options['batch_size']
+            start = time.perf_counter()
+            for offset in range(0, len(items), batch_size):
+                response = client.post(reverse('review-bulk'), items[offset:offset + batch_size], format='json')
+                assert response.status_code == 201, response.data
+            bulk_rate = len(items) / (time.perf_counter() - start)
+
+        self.stdout.write(f'single POST: {single_rate:,.0f} rows/s')
+        self.stdout.write(f'write-behind POST: {queued_rate:,.0f} rows/s')
+        self.stdout.write(f'bulk POST:   {bulk_rate:,.0f} rows/s (batches of {batch_size})')
+        self.stdout.write(self.style.SUCCESS(f'speedup:     {bulk_rate / single_rate:.0f}x'))
@@ -0,0 +1,72 @@
+import json
+import statistics
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from reviews import benchmarks
+
+
+# Runs in a fresh interpreter: load the WSGI application as a worker would, then time two requests
+WORKER = r'''
+import json, os, sys, time
+from wsgiref.util import setup_testing_defaults
+
+start = time.perf_counter()
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'movie_review_api.settings')
+from django.conf import settings
+settings.DATABASES['default']['NAME'] = sys.argv[1]
+settings.WARMUP = json.loads(sys.argv[2])
+settings.PREPARE_WORKER = True
+from movie_review_api.wsgi import application
+ready = time.perf_counter()
+
+path, _, query = sys.argv[3].partition('?')
+latencies, statuses = [], []
+for _ in range(2):
+    environ = {'PATH_INFO': path, 'QUERY_STRING': query, 'HTTP_HOST': 'localhost'}
+    setup_testing_defaults(environ)
+    begin = time.perf_counter()
+    response = application(environ, lambda status, headers, exc_info=None: statuses.append(status))
+    b''.join(response)
+    response.close()
+    latencies.append(time.perf_counter() - begin)
+print(json.dumps({'ready': ready - start, 'first': latencies[0], 'second': latencies[1], 'status': statuses[0]}))
+'''
+
+
+class Command(BaseCommand):
+    help = 'Measure how long a new worker takes to load and to answer its first request, with and without warm-up.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default='/api/reviews/', help='URL of the first request.')
+        parser.add_argument('--runs', type=int, default=5, help='Fresh workers per mode; medians are shown.')
+        parser.add_argument('--reviews', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        modes = [('cold', None), ('warm-up', getattr(settings, 'WARMUP', None) or {'CONNECTIONS': True})]
+        with benchmarks.benchmark_database():
+            benchmarks.seed(reviews=options['reviews'])
+            database = str(connection.settings_dict['NAME'])
+
+            self.stdout.write(f'{"mode":<10}{"load ms":>10}{"first ms":>10}{"to first ms":>13}{"second ms":>11}')
+            for name, config in modes:
+                runs = [self.run_worker(database, config, options['path']) for _ in range(options['runs'])]
+                load, first, second = (statistics.median(run[key] * 1000 for run in runs) for key in ('ready', 'first', 'second'))
+                to_first = statistics.median((run['ready'] + run['first']) * 1000 for run in runs)
+                self.stdout.write(f'{name:<10}{load:>10.1f}{first:>10.1f}{to_first:>13.1f}{second:>11.1f}')
+
+    def run_worker(self, database, config, path):
+        result = subprocess.run(
+            [sys.executable, '-c', WORKER, database, json.dumps(config), path],
+            cwd=settings.BASE_DIR, capture_output=True, text=True,
+        )
+        if result.returncode:
+            raise CommandError(f'The worker failed:\n{result.stderr[-2000:]}')
+        run = json.loads(result.stdout.strip().splitlines()[-1])
+        if not run['status'].startswith('200'):
+            raise CommandError(f'{path} answered {run["status"]}')
+        return run
@@ -0,0 +1,59 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from reviews import benchmarks
+
+
+class Command(BaseCommand):
+    help = 'Compare payload size and latency of the list endpoints with full objects and with sparse fieldsets.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--movies', type=int, default=200)
+        parser.add_argument('--users', type=int, default=100)
+        parser.add_argument('--reviews', type=int, default=5000)
+        parser.add_argument('--page-size', type=int, default=100)
+        parser.add_argument('--requests', type=int, default=200, help='Requests per endpoint and fieldset.')
+
+    def handle(self, *args, **options):
+        page = {'page_size': options['page_size']}
+        with benchmarks.benchmark_database(), override_settings(RESPONSE_CACHE=None, ADMISSION=None):
+            benchmarks.seed(options['movies'], options['users'], options['reviews'])
+            endpoints = [
+                ('reviews', reverse('review-list-create'), [
+                    ('full', {}),
+                    ('id,rating,movie', {'fields': 'id,rating,movie'}),
+                    ('omit content', {'omit': 'review_content'}),
+                    ('expand movie', {'expand': 'movie'}),
+                ]),
+                ('review search', reverse('review-search'), [
+                    ('full', {'rating': 5}),
+                    ('id,rating,movie', {'rating': 5, 'fields': 'id,rating,movie'}),
+                ]),
+                ('movies', reverse('movie-list-create'), [
+                    ('full', {}),
+                    ('id,movie_title', {'fields': 'id,movie_title'}),
+                ]),
+            ]
+            client = APIClient()
+
+            self.stdout.write(f'{"endpoint":<16}{"fieldset":<18}{"bytes":>10}{"p50 ms":>9}{"p99 ms":>9}{"req/s":>9}')
+            for name, url, fieldsets in endpoints:
+                for label, params in fieldsets:
+                    params = {**page, **params}
+                    response = client.get(url, params)
+                    if response.status_code != 200:
+                        self.stderr.write(f'{name} {label}: {response.status_code} {response.content[:200]}')
+                        continue
+                    size = len(response.content)
+                    latencies = []
+                    for _ in range(options['requests']):
+                        start = time.perf_counter()
+                        client.get(url, params)
+                        latencies.append(time.perf_counter() - start)
+                    self.stdout.write(
+                        f'{name:<16}{label:<18}{size:>10,}{benchmarks.percentile(latencies, 0.5) * 1000:>9.2f}'
+                        f'{benchmarks.percentile(latencies, 0.99) * 1000:>9.2f}{len(latencies) / sum(latencies):>9.0f}')
@@ -0,0 +1,69 @@
+import tempfile
+
+from django.core.management.base import BaseCommand
+from django.http import HttpResponse
+from django.test import RequestFactory
+from django.test.utils import override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from reviews import benchmarks
+from reviews.profiling import ProfilingMiddleware
+
+
+TIMING = {'SERVER_TIMING': True, 'SAMPLE_RATE': 0, 'SLOW_REQUEST_MS': 1000}
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure the overhead of the profiling middleware on its own and on the read endpoints, '
+        'off, timing only and with cProfile on every request.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--movies', type=int, default=200)
+        parser.add_argument('--users', type=int, default=100)
+        parser.add_argument('--reviews', type=int, default=5000)
+        parser.add_argument('--requests', type=int, default=500, help='Requests per endpoint and mode.')
+        parser.add_argument('--rounds', type=int, default=5, help='Best of this many runs per mode.')
+
+    def handle(self, *args, **options):
+        self.middleware_overhead()
+
+        iterations = options['requests']
+        modes = [('off', None), ('timing', TIMING), ('cprofile', {**TIMING, 'SAMPLE_RATE': 1})]
+        # The cProfile dumps are thrown away with the benchmark
+        with benchmarks.benchmark_database(), tempfile.TemporaryDirectory() as dump_dir, \
+                override_settings(RESPONSE_CACHE=None, QUERY_BUDGET_MODE=None):
+            movies, _ = benchmarks.seed(options['movies'], options['users'], options['reviews'])
+            endpoints = [
+                ('review list', reverse('review-list-create'), {}),
+                ('review title search', reverse('review-search'), {'movie_title': 'movie 1'}),
+                ('movie detail', reverse('movie-detail', args=[movies[0].pk]), {}),
+            ]
+            client = APIClient()
+
+            header = ''.join(f'{name + "/s":>12}' for name, _ in modes)
+            self.stdout.write(f'{"endpoint":<22}{header}{"timing overhead":>17}')
+            for name, url, params in endpoints:
+                # Rounds alternate between the modes so drift in the machine's speed hits them all alike
+                rates = [0] * len(modes)
+                for _ in range(options['rounds']):
+                    for index, (_, profiling) in enumerate(modes):
+                        with override_settings(PROFILING=profiling and {**profiling, 'DUMP_DIR': dump_dir}):
+                            client.get(url, params)  # Warm up
+                            rate = benchmarks.throughput(lambda: client.get(url, params), iterations)
+                        rates[index] = max(rates[index], rate)
+                cells = ''.join(f'{rate:>12.0f}' for rate in rates)
+                self.stdout.write(f'{name:<22}{cells}{rates[0] / rates[1] - 1:>16.1%}')
+
+    def middleware_overhead(self):
+        # The middleware around a view that does nothing, so its own cost is not lost in the noise of a real one
+        request = RequestFactory().get('/api/reviews/')
+        middleware = ProfilingMiddleware(lambda request: HttpResponse())
+        iterations = 20000
+        with override_settings(PROFILING=None):
+            off = benchmarks.throughput(lambda: middleware(request), iterations)
+        with override_settings(PROFILING=TIMING):
+            timing = benchmarks.throughput(lambda: middleware(request), iterations)
+        self.stdout.write(f'Timing costs {(1 / timing - 1 / off) * 1e6:.0f} µs per request\n')
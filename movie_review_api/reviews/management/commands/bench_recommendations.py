@@ -0,0 +1,50 @@
+import os
+import random
+import tempfile
+
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+
+from reviews import benchmarks, recommendations
+from reviews.models import Review
+
+
+class Command(BaseCommand):
+    help = (
+        'Time a full and an incremental similarity computation on a seeded database, and the similar '
+        'and recommended lookups against the memory-mapped result.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--movies', type=int, default=2000)
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--reviews', type=int, default=100000)
+        parser.add_argument('--changed', type=int, default=50, help='Reviews edited before the incremental run.')
+        parser.add_argument('--lookups', type=int, default=20000)
+
+    def handle(self, *args, **options):
+        with benchmarks.benchmark_database(), tempfile.TemporaryDirectory() as directory:
+            benchmarks.seed(options['movies'], options['users'], options['reviews'], skew=1.0)
+            path = os.path.join(directory, 'similarities.bin')
+            with override_settings(RECOMMENDATIONS={'PATH': path, 'NEIGHBOURS': 20}):
+                full = recommendations.compute(full=True)
+                self.stdout.write(
+                    f'full:        {full.movies} movies, {full.neighbours} neighbours in {full.seconds:.2f} s, '
+                    f'{os.path.getsize(path) / 1024:.0f} KiB file')
+
+                edited = list(Review.objects.order_by('?').values_list('pk', flat=True)[:options['changed']])
+                Review.objects.filter(pk__in=edited).update(rating=1)
+                incremental = recommendations.compute()
+                self.stdout.write(
+                    f'incremental: {incremental.recomputed} movies recomputed in {incremental.seconds:.2f} s')
+
+                index = recommendations.get_index()
+                movie_ids = list(index.movie_ids)
+                rng = random.Random(0)
+                targets = [rng.choice(movie_ids) for _ in range(options['lookups'])]
+                rate = benchmarks.throughput(lambda: recommendations.similar_movies(targets.pop()), len(targets))
+                self.stdout.write(f'similar:     {1e6 / rate:.1f} µs per lookup')
+
+                ratings = {movie_id: rng.randint(1, 5) for movie_id in rng.sample(movie_ids, 50)}
+                rate = benchmarks.throughput(lambda: recommendations.recommend(ratings), 200)
+                self.stdout.write(f'recommended: {1e3 / rate:.2f} ms for a user with {len(ratings)} ratings')
@@ -0,0 +1,150 @@
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from reviews import benchmarks, replicas
+from reviews.models import Review
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure read throughput of the review endpoints with 0 up to all of the configured replicas '
+        'while another process keeps writing reviews and the replicas are re-synced. Run with e.g. '
+        'DATABASE_REPLICAS=3 so the replica aliases exist; they are pointed at temporary copies.'
+    )
+
+    # SQLite files on one host share its CPU and disk, so replicas alone cannot add capacity here.
+    # Each alias is modelled as a database server instead: it runs one query at a time and every
+    # query costs --query-latency on top of SQLite's own time, for the round trip and server work.
+
+    def add_arguments(self, parser):
+        parser.add_argument('--movies', type=int, default=500)
+        parser.add_argument('--users', type=int, default=100)
+        parser.add_argument('--reviews', type=int, default=20000)
+        parser.add_argument('--readers', type=int, default=4, help='Reader processes.')
+        parser.add_argument('--duration', type=float, default=5, help='Seconds per replica count.')
+        parser.add_argument('--sync-interval', type=float, default=1, help='Seconds between replica syncs.')
+        parser.add_argument('--query-latency', type=float, default=20, help='Milliseconds per query and server.')
+
+    def handle(self, *args, **options):
+        aliases = replicas.replica_aliases()
+        if not aliases:
+            raise CommandError('No replicas configured, set the DATABASE_REPLICAS environment variable.')
+
+        with benchmarks.benchmark_database(), tempfile.TemporaryDirectory() as directory, \
+                override_settings(RESPONSE_CACHE=None, QUERY_BUDGET_MODE=None):
+            movies, users = benchmarks.seed(options['movies'], options['users'], options['reviews'])
+            self.movie_ids = [movie.pk for movie in movies]
+            self.user_ids = [user.pk for user in users]
+            self.review_ids = list(Review.objects.values_list('id', flat=True))
+            for alias in aliases:
+                # What create_test_db does for the primary
+                connections[alias].close()
+                connections[alias].settings_dict['NAME'] = os.path.join(directory, f'{alias}.sqlite3')
+            replicas.sync(aliases)
+
+            self.stdout.write(f'{"replicas":<10}{"reads/s":>10}{"writes/s":>10}')
+            baseline = None
+            for count in range(len(aliases) + 1):
+                with override_settings(DATABASE_REPLICAS=aliases[:count]):
+                    reads, writes = self.measure(options, syncing=count > 0)
+                baseline = baseline or reads
+                self.stdout.write(f'{count:<10}{reads:>10,.0f}{writes:>10,.0f}    {reads / baseline:.2f}x')
+
+    def measure(self, options, syncing):
+        # Every process opens its own connections; inherited SQLite handles must not be shared
+        connections.close_all()
+        context = multiprocessing.get_context('fork')
+        results = context.Queue()
+        self.servers = {
+            alias: DatabaseServer(context.Lock(), options['query_latency'] / 1000)
+            for alias in [replicas.PRIMARY, *replicas.replica_aliases()]
+        }
+        start = time.time() + 1  # Time for every process to start
+        window = (start, start + options['duration'])
+        processes = [context.Process(target=self.read, args=(i, window, results)) for i in range(options['readers'])]
+        processes.append(context.Process(target=self.write, args=(window, results)))
+        if syncing:
+            processes.append(context.Process(target=self.sync, args=(window, options['sync_interval'])))
+        for process in processes:
+            process.start()
+        counts = {'read': 0, 'write': 0}
+        for _ in range(options['readers'] + 1):
+            kind, count = results.get()
+            counts[kind] += count
+        for process in processes:
+            process.join()
+        return counts['read'] / options['duration'], counts['write'] / options['duration']
+
+    def read(self, seed, window, results):
+        self.install_servers()
+        rng = random.Random(seed)
+        client = Client()
+        count = 0
+        for _ in _until(window):
+            kind = rng.randrange(3)
+            if kind == 0:
+                response = client.get(reverse('review-list-create'), {'page_size': 20})
+            elif kind == 1:
+                response = client.get(reverse('review-search'), {'rating': rng.randint(1, 5), 'page_size': 20})
+            else:
+                response = client.get(reverse('review-detail', args=[rng.choice(self.review_ids)]))
+            assert response.status_code == 200, response.content
+            count += 1
+        results.put(('read', count))
+        connections.close_all()
+
+    def write(self, window, results):
+        self.install_servers()
+        rng = random.Random(-1)
+        count = 0
+        for _ in _until(window):
+            Review.objects.create(
+                movie_id=rng.choice(self.movie_ids), user_id=rng.choice(self.user_ids),
+                review_content='Written during the benchmark', rating=rng.randint(1, 5),
+            )
+            count += 1
+        results.put(('write', count))
+        connections.close_all()
+
+    def install_servers(self):
+        for alias, server in self.servers.items():
+            connections[alias].execute_wrappers.append(server)
+
+    def sync(self, window, interval):
+        for _ in _until(window):
+            replicas.sync()
+            time.sleep(interval)
+        connections.close_all()
+
+
+def _until(window):
+    start, end = window
+    time.sleep(max(0, start - time.time()))
+    while time.time() < end:
+        yield
+
+
+class DatabaseServer:
+    """
+    Execute wrapper that lets one query at a time through, each taking at least ``latency`` seconds.
+    """
+    def __init__(self, lock, latency):
+        self.lock = lock
+        self.latency = latency
+
+    def __call__(self, execute, sql, params, many, context):
+        with self.lock:
+            start = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                time.sleep(max(0, self.latency - (time.perf_counter() - start)))
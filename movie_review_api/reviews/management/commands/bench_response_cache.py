@@ -0,0 +1,45 @@
+from django.core.cache import caches
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from reviews import benchmarks
+
+
+class Command(BaseCommand):
+    help = 'Compare uncached, cache-hit and 304 revalidation throughput of the cached read endpoints.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--movies', type=int, default=200)
+        parser.add_argument('--users', type=int, default=100)
+        parser.add_argument('--reviews', type=int, default=5000)
+        parser.add_argument('--requests', type=int, default=300, help='Requests per endpoint and mode.')
+
+    def handle(self, *args, **options):
+        iterations = options['requests']
+        with benchmarks.benchmark_database():
+            movies, _ = benchmarks.seed(options['movies'], options['users'], options['reviews'])
+            review_id = movies[0].review_set.values_list('id', flat=True).first()
+            endpoints = [
+                ('movie list', reverse('movie-list-create'), {}),
+                ('movie detail', reverse('movie-detail', args=[movies[0].pk]), {}),
+                ('review detail', reverse('review-detail', args=[review_id]), {}),
+                ('review search', reverse('review-search'), {'rating': 5, 'page_size': 10}),
+                ('review title search', reverse('review-search'), {'movie_title': 'movie 1'}),
+            ]
+            client = APIClient()
+
+            self.stdout.write(f'{"endpoint":<22}{"uncached/s":>12}{"hit/s":>12}{"304/s":>12}{"speedup":>10}')
+            for name, url, params in endpoints:
+                with override_settings(RESPONSE_CACHE=None):
+                    uncached = benchmarks.throughput(lambda: client.get(url, params), iterations)
+
+                caches['default'].clear()
+                etag = client.get(url, params)['ETag']
+                hit = benchmarks.throughput(lambda: client.get(url, params), iterations)
+                revalidated = benchmarks.throughput(
+                    lambda: client.get(url, params, HTTP_IF_NONE_MATCH=etag), iterations)
+
+                self.stdout.write(
+                    f'{name:<22}{uncached:>12.0f}{hit:>12.0f}{revalidated:>12.0f}{hit / uncached:>9.1f}x')
@@ -0,0 +1,60 @@
+import time
+
+from django.core.management.base import BaseCommand
+from rest_framework.renderers import JSONRenderer
+
+from reviews import benchmarks, rows
+from reviews.models import Movie, Review
+from reviews.renderers import FastJSONRenderer
+from reviews.serializers import MovieSerializer, ReviewSerializer
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare serializing and rendering a long review or movie list through the DRF serializers and '
+        'JSONRenderer with values() rows and the orjson renderer.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10000, help='Rows per list.')
+        parser.add_argument('--rounds', type=int, default=5, help='Best of this many runs.')
+
+    def handle(self, *args, **options):
+        size = options['rows']
+        with benchmarks.benchmark_database():
+            benchmarks.seed(movies=size, users=100, reviews=size)
+            lists = [
+                ('reviews', Review.objects.select_related('movie', 'user'), ReviewSerializer, rows.ReviewRows()),
+                ('movies', Movie.objects.all(), MovieSerializer, rows.MovieRows()),
+            ]
+            self.stdout.write(
+                f'{"list":<10}{"path":<12}{"fetch ms":>10}{"serialize ms":>14}{"render ms":>11}{"rows/s":>12}')
+            for name, queryset, serializer_class, row_format in lists:
+                paths = [
+                    ('serializer', lambda: list(queryset.all()), lambda page: serializer_class(page, many=True).data,
+                     JSONRenderer()),
+                    ('values', lambda: list(queryset.values(*row_format.columns)), row_format, FastJSONRenderer()),
+                ]
+                outputs = []
+                for path, fetch, serialize, renderer in paths:
+                    best = None
+                    for _ in range(options['rounds']):
+                        timings, output = self.measure(fetch, serialize, renderer)
+                        best = timings if best is None or sum(timings) < sum(best) else best
+                    outputs.append(output)
+                    fetch_s, serialize_s, render_s = best
+                    self.stdout.write(
+                        f'{name:<10}{path:<12}{fetch_s * 1000:>10.1f}{serialize_s * 1000:>14.1f}'
+                        f'{render_s * 1000:>11.1f}{size / sum(best):>12,.0f}')
+                if outputs[0] != outputs[1]:
+                    self.stderr.write(f'The {name} outputs differ')
+
+    def measure(self, fetch, serialize, renderer):
+        start = time.perf_counter()
+        page = fetch()
+        fetched = time.perf_counter()
+        data = serialize(page)
+        serialized = time.perf_counter()
+        output = renderer.render(data)
+        rendered = time.perf_counter()
+        return (fetched - start, serialized - fetched, rendered - serialized), output
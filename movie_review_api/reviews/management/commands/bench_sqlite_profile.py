@@ -0,0 +1,115 @@
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, close_old_connections, connection, connections, transaction
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from reviews import benchmarks
+from reviews.models import Movie, Review
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare review writes/sec, list reads/sec and "database is locked" errors of concurrent writer and '
+        'reader threads between SQLite\'s defaults and the production profile in settings.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--writers', type=int, default=4)
+        parser.add_argument('--readers', type=int, default=8)
+        parser.add_argument('--duration', type=float, default=10, help='Seconds per profile.')
+        parser.add_argument('--reviews', type=int, default=20000)
+
+    def handle(self, *args, **options):
+        profiles = [
+            # A new connection per request in rollback-journal mode, deferred transactions
+            ('default', None, 0, {}),
+            ('production', settings.SQLITE_PRODUCTION_PRAGMAS, settings.SQLITE_PRODUCTION_CONN_MAX_AGE,
+             dict(settings.SQLITE_PRODUCTION_OPTIONS)),
+        ]
+        self.stdout.write(f'{"profile":<12}{"writes/s":>10}{"reads/s":>10}{"locked":>8}')
+        for name, pragmas, conn_max_age, db_options in profiles:
+            with sqlite_profile(pragmas, conn_max_age, db_options), benchmarks.benchmark_database(), \
+                    override_settings(RESPONSE_CACHE=None, QUERY_BUDGET_MODE=None):
+                movies, users = benchmarks.seed(users=50, reviews=options['reviews'])
+                writes, reads, errors = self.run(
+                    [movie.pk for movie in movies], [user.pk for user in users], options,
+                )
+            duration = options['duration']
+            self.stdout.write(f'{name:<12}{writes / duration:>10,.0f}{reads / duration:>10,.0f}{errors:>8}')
+
+    def run(self, movie_ids, user_ids, options):
+        connection.close()  # Every thread gets its own connection under the profile being measured
+        deadline = time.time() + options['duration']
+        counts = {'writes': 0, 'reads': 0, 'errors': 0}
+        lock = threading.Lock()
+
+        def count(name):
+            with lock:
+                counts[name] += 1
+
+        def request(func):
+            try:
+                func()
+                return True
+            except OperationalError as e:
+                if 'locked' not in str(e):
+                    raise
+                count('errors')
+                return False
+            finally:
+                close_old_connections()  # The end of a request: closes the connection unless CONN_MAX_AGE keeps it
+
+        def write(rng):
+            # A review POST in one transaction, as with ATOMIC_REQUESTS or get_or_create:
+            # the movie is read first, so a deferred transaction has to upgrade its lock to write
+            with transaction.atomic():
+                movie = Movie.objects.get(pk=rng.choice(movie_ids))
+                Review.objects.create(
+                    movie=movie, user_id=rng.choice(user_ids),
+                    review_content='Written during the benchmark', rating=rng.randint(1, 5),
+                )
+
+        def writer(seed):
+            rng = random.Random(seed)
+            while time.time() < deadline:
+                if request(lambda: write(rng)):
+                    count('writes')
+            connections.close_all()
+
+        def reader():
+            client = Client()
+            url = reverse('review-list-create')
+            while time.time() < deadline:
+                if request(lambda: client.get(url, {'page_size': 20})):
+                    count('reads')
+            connections.close_all()
+
+        threads = [threading.Thread(target=writer, args=(i,)) for i in range(options['writers'])]
+        threads += [threading.Thread(target=reader) for _ in range(options['readers'])]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return counts['writes'], counts['reads'], counts['errors']
+
+
+@contextmanager
+def sqlite_profile(pragmas, conn_max_age, db_options):
+    # New connections read these from the shared settings dict, as create_test_db relies on for NAME
+    settings_dict = connection.settings_dict
+    saved = settings_dict['CONN_MAX_AGE'], settings_dict['OPTIONS']
+    settings_dict['CONN_MAX_AGE'], settings_dict['OPTIONS'] = conn_max_age, db_options
+    connection.close()
+    try:
+        with override_settings(SQLITE_PRAGMAS=pragmas):
+            yield
+    finally:
+        connection.close()
+        settings_dict['CONN_MAX_AGE'], settings_dict['OPTIONS'] = saved
@@ -0,0 +1,78 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from django.test.utils import override_settings
+
+from reviews import benchmarks, typeahead
+from reviews.models import Movie
+
+
+WORDS = (
+    'the dark night knight day star city war love story return last lost king queen house man woman '
+    'blue red black white river road home world great little big secret time dream fire ice storm'
+).split()
+
+
+class Command(BaseCommand):
+    help = (
+        'Time building the movie-title typeahead index, lookups against it and the autocomplete endpoint, '
+        'next to the movie_title search the search box used before.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--movies', type=int, default=20000)
+        parser.add_argument('--reviews', type=int, default=50000)
+        parser.add_argument('--lookups', type=int, default=20000)
+        parser.add_argument('--requests', type=int, default=500)
+
+    def handle(self, *args, **options):
+        rng = random.Random(0)
+        with benchmarks.benchmark_database(), \
+                override_settings(RESPONSE_CACHE=None, ADMISSION=None, QUERY_BUDGET_MODE=None):
+            movies, _ = benchmarks.seed(options['movies'], 100, options['reviews'], skew=1.0)
+            for movie in movies:
+                movie.movie_title = ' '.join(rng.choices(WORDS, k=rng.randint(1, 4))).title()
+            Movie.objects.bulk_update(movies, ['movie_title'], batch_size=2000)
+
+            start = time.perf_counter()
+            index = typeahead.build()
+            self.stdout.write(
+                f'build:       {len(index)} titles, {len(index.keys)} keys, {len(index.top)} prefixes ranked '
+                f'in {(time.perf_counter() - start) * 1000:.0f} ms')
+
+            # What a user types, one keystroke at a time
+            titles = [typeahead.normalize(movie.movie_title) for movie in rng.sample(movies, 200)]
+            prefixes = [title[:length] for title in titles for length in range(1, min(len(title), 8) + 1)]
+            queries = [rng.choice(prefixes) for _ in range(options['lookups'])]
+            rate = benchmarks.throughput(lambda: index.lookup(queries.pop(), 10), len(queries))
+            self.stdout.write(f'lookup:      {rate:,.0f} lookups/s, {1e6 / rate:.1f} µs per lookup')
+
+            start = time.perf_counter()
+            changed = index.with_movie(movies[0].pk, 'The Last Dark Star', 1000)
+            self.stdout.write(f'change:      {(time.perf_counter() - start) * 1000:.1f} ms to copy in one title')
+            if changed.lookup('last dark', 1)[0].movie_title != 'The Last Dark Star':
+                raise CommandError('The changed index does not suggest the new title')
+
+            client = Client()
+            typeahead.get_index()
+            for label, path, param in [
+                ('autocomplete', '/api/movies/autocomplete/', 'q'),
+                ('search', '/api/reviews/search-by-movie-or-rating/', 'movie_title'),
+            ]:
+                queries = [rng.choice(prefixes) for _ in range(options['requests'])]
+                latencies = []
+
+                def request():
+                    begin = time.perf_counter()
+                    response = client.get(path, {param: queries.pop()})
+                    latencies.append(time.perf_counter() - begin)
+                    if response.status_code != 200:
+                        raise CommandError(f'{path} answered {response.status_code}')
+
+                rate = benchmarks.throughput(request, len(queries))
+                self.stdout.write(
+                    f'{label + ":":<13}{rate:,.0f} requests/s, '
+                    f'p50 {benchmarks.percentile(latencies, 0.5) * 1000:.2f} ms, '
+                    f'p99 {benchmarks.percentile(latencies, 0.99) * 1000:.2f} ms')
@@ -0,0 +1,32 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from reviews import schema
+
+
+class Command(BaseCommand):
+    help = (
+        'Write the OpenAPI schema of /swagger/ and /redoc/ as JSON and YAML for the current version of the code '
+        '(OPENAPI_SCHEMA["DIR"]), so no request has to generate it.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dir', help='Write here instead of OPENAPI_SCHEMA["DIR"].')
+        parser.add_argument(
+            '--check', action='store_true', help='Only fail if the files for the current code are missing.')
+
+    def handle(self, *args, **options):
+        key = schema.fingerprint()
+        if options['check']:
+            missing = [
+                path for path in (schema.artifact_path(key, codec, options['dir']) for codec in schema.CODECS)
+                if not os.path.exists(path)
+            ]
+            if missing:
+                raise CommandError(f'The schema is out of date, missing {", ".join(missing)}')
+            return
+
+        paths = schema.build(options['dir'])
+        if options['verbosity']:
+            self.stdout.write(self.style.SUCCESS(f'Schema {key} written to {", ".join(paths)}'))
@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from reviews import leaderboards
+
+
+class Command(BaseCommand):
+    help = (
+        'Move the leaderboard windows on to the current hour, once or every --interval seconds, '
+        'or recompute the leaderboards from the review table with --rebuild.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=0, help='Keep compacting every this many seconds.')
+        parser.add_argument('--rebuild', action='store_true', help='Recompute everything from the reviews first.')
+
+    def handle(self, *args, **options):
+        if options['rebuild']:
+            leaderboards.rebuild()
+        while True:
+            start = time.perf_counter()
+            leaderboards.compact()
+            if options['verbosity']:
+                self.stdout.write(f'Compacted the leaderboards in {(time.perf_counter() - start) * 1000:.0f} ms')
+            if not options['interval']:
+                return
+            time.sleep(options['interval'])
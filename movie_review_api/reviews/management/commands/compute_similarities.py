@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from reviews import recommendations
+
+
+class Command(BaseCommand):
+    help = (
+        'Compute the nearest neighbours of every movie from the ratings into the file the similar and '
+        'recommended endpoints read, recomputing only movies whose ratings changed unless --full.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help='Recompute every movie.')
+        parser.add_argument('--path', help='Write here instead of RECOMMENDATIONS["PATH"].')
+
+    def handle(self, *args, **options):
+        result = recommendations.compute(path=options['path'], full=options['full'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Recomputed {result.recomputed} of {result.movies} movie(s), {result.neighbours} neighbours '
+            f'in {result.seconds:.2f} s'
+        ))
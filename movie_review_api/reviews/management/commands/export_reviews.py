@@ -0,0 +1,44 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from reviews import export
+
+
+class Command(BaseCommand):
+    help = 'Stream reviews to a file or stdout as NDJSON or CSV, optionally gzipped, in constant memory.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=sorted(export.FORMATS), default='ndjson')
+        parser.add_argument('--output', '-o', help='File to write, stdout when omitted.')
+        parser.add_argument('--gzip', action='store_true', help='Gzip the output.')
+        parser.add_argument('--movie', type=int, help='Only reviews of this movie id.')
+        parser.add_argument('--rating', type=int, help='Only reviews with this rating.')
+        parser.add_argument('--created-after', help='ISO 8601 date or datetime, inclusive.')
+        parser.add_argument('--created-before', help='ISO 8601 date or datetime, exclusive.')
+        parser.add_argument('--chunk-size', type=int, default=export.CHUNK_SIZE, help='Rows fetched per query.')
+
+    def handle(self, *args, **options):
+        params = {
+            name: options[name]
+            for name in ('movie', 'rating', 'created_after', 'created_before')
+            if options[name] is not None
+        }
+        filterset = export.filter_reviews(params)
+        if not filterset.is_valid():
+            raise CommandError(f'Invalid filters: {dict(filterset.errors)}')
+
+        chunks = export.stream(filterset.qs, options['format'], compress=options['gzip'],
+                               chunk_size=options['chunk_size'])
+        if options['output']:
+            with open(options['output'], 'wb') as output:
+                for chunk in chunks:
+                    output.write(chunk)
+            self.stderr.write(self.style.SUCCESS(f'Reviews exported to {options["output"]}.'))
+        else:
+            # Bytes go straight to the underlying stream, bypassing the text wrapper
+            output = getattr(self.stdout, '_out', sys.stdout)
+            output = getattr(output, 'buffer', output)
+            for chunk in chunks:
+                output.write(chunk)
+            output.flush()
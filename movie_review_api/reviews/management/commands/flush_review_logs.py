@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from reviews import ingest
+
+
+class Command(BaseCommand):
+    help = (
+        'Insert the reviews left in the write-behind logs of worker processes that are gone, then delete '
+        'those logs; with --all also flush the logs of running workers.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Also flush the logs that running workers hold.')
+
+    def handle(self, *args, **options):
+        recovered = ingest.recover()
+        flushed = ingest.flush_all() if options['all'] else 0
+        if options['verbosity']:
+            self.stdout.write(f'Recovered {recovered} review(s), flushed {flushed} from running workers')
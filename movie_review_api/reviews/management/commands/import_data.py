@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from reviews import importer
+
+
+class Command(BaseCommand):
+    help = (
+        'Import movies, users or reviews from a CSV or NDJSON file (optionally .gz) in batched transactions. '
+        'An interrupted import resumes where it stopped when run again with the same file.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=sorted(importer.IMPORTERS))
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=importer.FORMATS, help='Taken from the file extension by default.')
+        parser.add_argument('--batch-size', type=int, default=importer.BATCH_SIZE, help='Records per transaction.')
+        parser.add_argument('--keep-ids', action='store_true', help='Insert rows with the ids from the file.')
+        parser.add_argument('--restart', action='store_true', help='Ignore the checkpoint and start from the top.')
+
+    def handle(self, *args, **options):
+        self.verbosity = options['verbosity']
+        try:
+            run = importer.ImportRun(
+                importer.IMPORTERS[options['kind']](keep_ids=options['keep_ids']),
+                options['path'],
+                source_format=options['format'],
+                batch_size=options['batch_size'],
+                restart=options['restart'],
+            )
+            checkpoint = run.run(progress=self.report)
+        except (OSError, ValueError, importer.CheckpointMismatch) as e:
+            raise CommandError(str(e))
+
+        if not hasattr(run, 'started'):
+            self.stdout.write(f'{options["path"]} was already imported, pass --restart to import it again.')
+            return
+        if run.resumed_at:
+            self.stdout.write(f'Resumed after record {run.resumed_at}.')
+        for position, error in run.errors:
+            self.stderr.write(f'record {position}: {error}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {run.imported} {options["kind"]} ({checkpoint.rows_skipped} records skipped in total) '
+            f'at {run.rate:,.0f} rows/s.'
+        ))
+
+    def report(self, run):
+        if self.verbosity and not run.checkpoint.finished:
+            self.stdout.write(f'{run.checkpoint.rows_done:,} records, {run.rate:,.0f} rows/s')
@@ -0,0 +1,86 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from reviews import benchmarks, loadtest
+
+
+class Command(BaseCommand):
+    help = (
+        'Load test the API with a weighted mix of requests from concurrent clients, in-process against a seeded '
+        'throwaway database or over HTTP with --base-url, and compare the results with a JSON baseline.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--base-url', help='Send the requests to this running server, seeded with seed_loadtest_data.')
+        parser.add_argument('--movies', type=int, default=500)
+        parser.add_argument('--users', type=int, default=200)
+        parser.add_argument('--reviews', type=int, default=20000)
+        parser.add_argument('--skew', type=float, default=1.0, help='Popularity skew of movies and users.')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed of the dataset and the clients.')
+        parser.add_argument('--password', default=loadtest.PASSWORD)
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument('--requests', type=int, default=2000, help='Requests over all clients.')
+        parser.add_argument(
+            '--mix', help='Operation weights replacing the default mix, e.g. "review-list=5,login=1".',
+        )
+        parser.add_argument('--save-baseline', metavar='PATH', help='Write the report to this JSON file.')
+        parser.add_argument('--baseline', metavar='PATH', help='Fail when the run is worse than this JSON report.')
+        parser.add_argument('--threshold', type=float, default=0.2, help='Tolerated relative regression.')
+
+    def handle(self, *args, **options):
+        mix = self.parse_mix(options['mix'])
+        dataset = {key: options[key] for key in ('movies', 'users', 'reviews', 'skew', 'seed')}
+        config = {'target': 'http' if options['base_url'] else 'in-process', 'dataset': dataset}
+        run_options = {
+            'concurrency': options['concurrency'], 'requests': options['requests'], 'mix': mix,
+            'random_seed': options['seed'], 'skew': options['skew'], 'config': config,
+        }
+
+        if options['base_url']:
+            transport_factory = lambda: loadtest.HTTPTransport(options['base_url'])
+            report = self.run(transport_factory, options, run_options)
+        else:
+            with benchmarks.benchmark_database():
+                benchmarks.seed(
+                    options['movies'], options['users'], options['reviews'], random_seed=options['seed'],
+                    skew=options['skew'], password=options['password'],
+                )
+                report = self.run(loadtest.InProcessTransport, options, run_options)
+
+        self.stdout.write(loadtest.format_report(report))
+        if options['save_baseline']:
+            loadtest.save(report, options['save_baseline'])
+            self.stdout.write(f'Baseline written to {options["save_baseline"]}')
+        if options['baseline']:
+            try:
+                regressions = loadtest.compare(report, loadtest.load(options['baseline']), options['threshold'])
+            except (OSError, ValueError) as e:
+                raise CommandError(f'Cannot compare with {options["baseline"]}: {e}')
+            if regressions:
+                raise CommandError('Regressed against the baseline:\n  ' + '\n  '.join(regressions))
+            self.stdout.write(self.style.SUCCESS(f'No regression beyond {options["threshold"]:.0%} of the baseline'))
+
+    def run(self, transport_factory, options, run_options):
+        discovery = transport_factory()
+        try:
+            dataset = loadtest.discover(discovery, options['users'], options['password'])
+        finally:
+            discovery.close()
+        try:
+            return loadtest.run(transport_factory, dataset, **run_options)
+        except RuntimeError as e:
+            raise CommandError(str(e))
+
+    def parse_mix(self, value):
+        if not value:
+            return dict(loadtest.DEFAULT_MIX)
+        mix = {}
+        for item in value.split(','):
+            name, _, weight = item.partition('=')
+            name = name.strip()
+            if name not in loadtest.DEFAULT_MIX:
+                raise CommandError(f'Unknown operation {name!r}, choose from {", ".join(loadtest.DEFAULT_MIX)}')
+            try:
+                mix[name] = float(weight)
+            except ValueError:
+                raise CommandError(f'Weight of {name!r} is not a number: {weight!r}')
+        return mix
@@ -0,0 +1,34 @@
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand
+
+from reviews import startup
+
+
+class Command(BaseCommand):
+    help = (
+        'Report what importing the WSGI or ASGI application costs, per module and per top-level package, '
+        'from python -X importtime in a fresh interpreter.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--asgi', action='store_true', help='Profile asgi.py instead of wsgi.py.')
+        parser.add_argument('--module', help='Profile importing this module instead, e.g. movie_review_api.urls.')
+        parser.add_argument('--top', type=int, default=25, help='Rows per table.')
+
+    def handle(self, *args, **options):
+        module = options['module'] or ('movie_review_api.asgi' if options['asgi'] else 'movie_review_api.wsgi')
+        times = startup.import_times(module)
+        total = sum(entry.self_us for entry in times)
+
+        packages = defaultdict(int)
+        for entry in times:
+            packages[entry.module.split('.')[0]] += entry.self_us
+        self.stdout.write(f'Importing {module}: {len(times)} modules, {total / 1000:.1f} ms\n')
+        self.stdout.write(f'{"package":<40}{"ms":>9}{"share":>8}')
+        for package, self_us in sorted(packages.items(), key=lambda item: -item[1])[:options['top']]:
+            self.stdout.write(f'{package:<40}{self_us / 1000:>9.1f}{self_us / total:>8.1%}')
+
+        self.stdout.write(f'\n{"module":<50}{"self ms":>9}{"total ms":>10}')
+        for entry in sorted(times, key=lambda entry: -entry.self_us)[:options['top']]:
+            self.stdout.write(f'{entry.module:<50}{entry.self_us / 1000:>9.1f}{entry.cumulative_us / 1000:>10.1f}')
@@ -0,0 +1,18 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from reviews import changelog
+
+
+class Command(BaseCommand):
+    help = 'Delete the delete tombstones of the change feed older than --days (default CHANGE_LOG["TOMBSTONE_DAYS"]).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=float, help='Keep the tombstones of this many days.')
+
+    def handle(self, *args, **options):
+        older_than = timedelta(days=options['days']) if options['days'] is not None else None
+        pruned = changelog.prune(older_than)
+        if options['verbosity']:
+            self.stdout.write(f'Pruned {pruned} tombstone(s)')
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from reviews import aggregates
+
+
+class Command(BaseCommand):
+    help = 'Recompute the per-movie rating aggregates from the review table, or verify them with --verify.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('movie_ids', nargs='*', type=int, help='Only process these movie ids.')
+        parser.add_argument('--verify', action='store_true', help='Report stale aggregates without fixing them.')
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        movie_ids = options['movie_ids'] or None
+        stale = aggregates.rebuild(
+            movie_ids=movie_ids,
+            verify_only=options['verify'],
+            batch_size=options['batch_size'],
+        )
+
+        if options['verify']:
+            if stale:
+                raise CommandError(f'{len(stale)} movie(s) have stale aggregates: {stale}')
+            self.stdout.write(self.style.SUCCESS('All movie aggregates are up to date.'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'Rebuilt aggregates, {len(stale)} movie(s) were corrected.'))
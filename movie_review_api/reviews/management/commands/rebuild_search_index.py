@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from reviews import search
+
+
+class Command(BaseCommand):
+    help = 'Recreate the full-text search index and its sync triggers, then reindex every movie and review.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+        parser.add_argument('--optimize', action='store_true', help='Merge the index segments after rebuilding.')
+
+    def handle(self, *args, **options):
+        connection = connections[options['database']]
+        if not search.install(connection, rebuild=True):
+            raise CommandError('Full-text search needs SQLite with FTS5, searches use the icontains fallback.')
+
+        if options['optimize']:
+            with connection.cursor() as cursor:
+                for fts_table in (search.MOVIE_FTS_TABLE, search.REVIEW_FTS_TABLE):
+                    cursor.execute(f"INSERT INTO {fts_table}({fts_table}) VALUES ('optimize')")
+
+        self.stdout.write(self.style.SUCCESS('Search index rebuilt.'))
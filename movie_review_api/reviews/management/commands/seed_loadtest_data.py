@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from reviews import benchmarks, loadtest
+from reviews.models import Movie
+
+
+class Command(BaseCommand):
+    help = (
+        'Fill an empty database with the deterministic load test dataset, for running loadtest --base-url '
+        'against a local server with the same sizes and seed.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--movies', type=int, default=500)
+        parser.add_argument('--users', type=int, default=200)
+        parser.add_argument('--reviews', type=int, default=20000)
+        parser.add_argument('--skew', type=float, default=1.0)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--password', default=loadtest.PASSWORD)
+
+    def handle(self, *args, **options):
+        if Movie.objects.exists():
+            raise CommandError('The database already has movies, seed an empty one so runs stay comparable.')
+        benchmarks.seed(
+            options['movies'], options['users'], options['reviews'], random_seed=options['seed'],
+            skew=options['skew'], password=options['password'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Seeded {options["movies"]} movies, {options["users"]} users (user0 to user{options["users"] - 1}) '
+            f'and {options["reviews"]} reviews'
+        ))
@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from reviews import replicas
+
+
+class Command(BaseCommand):
+    help = (
+        'Copy the primary SQLite database over the read replicas in DATABASE_REPLICAS, once or every '
+        '--interval seconds, as a local stand-in for replication.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=0, help='Keep syncing every this many seconds.')
+
+    def handle(self, *args, **options):
+        aliases = replicas.replica_aliases()
+        if not aliases:
+            raise CommandError('No replicas configured, set the DATABASE_REPLICAS environment variable.')
+
+        while True:
+            start = time.perf_counter()
+            try:
+                replicas.sync(aliases)
+            except ValueError as e:
+                raise CommandError(str(e))
+            if options['verbosity']:
+                self.stdout.write(f'Synced {", ".join(aliases)} in {(time.perf_counter() - start) * 1000:.0f} ms')
+            if not options['interval']:
+                return
+            time.sleep(options['interval'])
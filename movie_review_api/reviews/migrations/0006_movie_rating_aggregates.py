@@ -0,0 +1,67 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:24
+
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+
+
+def backfill_aggregates(apps, schema_editor):
+    Movie = apps.get_model('reviews', 'Movie')
+    Review = apps.get_model('reviews', 'Review')
+    buckets = {f'rating_{rating}_count': Count('id', filter=Q(rating=rating)) for rating in range(1, 6)}
+    rows = Review.objects.order_by().values('movie_id').annotate(
+        review_count=Count('id'), rating_sum=Sum('rating'), **buckets)
+    for row in rows:
+        movie_id = row.pop('movie_id')
+        row['average_rating'] = row['rating_sum'] / row['review_count']
+        Movie.objects.filter(pk=movie_id).update(**row)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reviews', '0005_alter_review_options_rename_title_movie_movie_title'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='movie',
+            name='average_rating',
+            field=models.FloatField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='movie',
+            name='rating_1_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='movie',
+            name='rating_2_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='movie',
+            name='rating_3_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='movie',
+            name='rating_4_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='movie',
+            name='rating_5_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='movie',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='movie',
+            name='review_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_aggregates, migrations.RunPython.noop),
+    ]
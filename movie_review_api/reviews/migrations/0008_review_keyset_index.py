@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:37
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reviews', '0007_full_text_search_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='review',
+            options={'ordering': ['created_date', 'id']},
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['created_date', 'id'], name='review_created_id_idx'),
+        ),
+    ]
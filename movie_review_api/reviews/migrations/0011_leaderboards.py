@@ -0,0 +1,102 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:10
+
+import datetime
+from collections import Counter
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncHour
+from django.utils import timezone
+
+
+def build_leaderboards(apps, schema_editor):
+    # What leaderboards.rebuild() does, on the historical models, so record() has windows from the first review
+    from reviews import leaderboards
+
+    Movie = apps.get_model('reviews', 'Movie')
+    Review = apps.get_model('reviews', 'Review')
+    LeaderboardState = apps.get_model('reviews', 'LeaderboardState')
+    MovieRanking = apps.get_model('reviews', 'MovieRanking')
+    ReviewActivity = apps.get_model('reviews', 'ReviewActivity')
+
+    now = timezone.now()
+    day_start, week_start = leaderboards.windows(now)
+    hourly = (
+        Review.objects.filter(created_date__gte=week_start).order_by()
+        .annotate(hour=TruncHour('created_date', tzinfo=datetime.timezone.utc))
+        .values('movie_id', 'hour').annotate(n=Count('id'))
+    )
+    buckets = [ReviewActivity(movie_id=row['movie_id'], hour=row['hour'], review_count=row['n']) for row in hourly]
+    ReviewActivity.objects.bulk_create(buckets, batch_size=500)
+
+    day_counts, week_counts = Counter(), Counter()
+    for bucket in buckets:
+        week_counts[bucket.movie_id] += bucket.review_count
+        if bucket.hour >= day_start:
+            day_counts[bucket.movie_id] += bucket.review_count
+
+    totals = Movie.objects.aggregate(reviews=Sum('review_count'), ratings=Sum('rating_sum'))
+    prior = totals['ratings'] / totals['reviews'] if totals['reviews'] else leaderboards.DEFAULT_PRIOR_MEAN
+    rankings = [
+        MovieRanking(
+            movie_id=movie_id,
+            day_count=day_counts[movie_id],
+            week_count=week_counts[movie_id],
+            trending_score=leaderboards.trending_score(day_counts[movie_id], week_counts[movie_id]),
+            bayesian_rating=leaderboards.bayesian_rating(review_count, rating_sum, prior),
+        )
+        for movie_id, review_count, rating_sum in Movie.objects.values_list('pk', 'review_count', 'rating_sum')
+        if review_count or movie_id in week_counts
+    ]
+    MovieRanking.objects.bulk_create(rankings, batch_size=500)
+    LeaderboardState.objects.create(
+        pk=leaderboards.STATE_ID, day_start=day_start, week_start=week_start, prior_mean=prior, compacted_at=now,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reviews', '0010_query_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeaderboardState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day_start', models.DateTimeField()),
+                ('week_start', models.DateTimeField()),
+                ('prior_mean', models.FloatField()),
+                ('compacted_at', models.DateTimeField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='MovieRanking',
+            fields=[
+                ('movie', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='ranking', serialize=False, to='reviews.movie')),
+                ('day_count', models.IntegerField(default=0)),
+                ('week_count', models.IntegerField(default=0)),
+                ('trending_score', models.FloatField(null=True)),
+                ('bayesian_rating', models.FloatField(null=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['bayesian_rating', 'movie'], name='ranking_bayesian_idx'), models.Index(fields=['week_count', 'movie'], name='ranking_week_count_idx'), models.Index(fields=['trending_score', 'movie'], name='ranking_trending_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ReviewActivity',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField()),
+                ('review_count', models.IntegerField(default=0)),
+                ('movie', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='reviews.movie')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['hour'], name='review_activity_hour_idx')],
+                'constraints': [models.UniqueConstraint(fields=('movie', 'hour'), name='review_activity_hour_uniq')],
+            },
+        ),
+        migrations.RunPython(build_leaderboards, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:31
+
+from django.db import migrations, models
+
+
+def create_change_log(apps, schema_editor):
+    from reviews import changelog
+    changelog.install(schema_editor.connection)
+
+
+def drop_change_log(apps, schema_editor):
+    from reviews import changelog
+    changelog.uninstall(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reviews', '0012_ingest_log'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChangeLogState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pruned_seq', models.BigIntegerField(default=0)),
+                ('pruned_at', models.DateTimeField(null=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Change',
+            fields=[
+                ('seq', models.BigAutoField(primary_key=True, serialize=False)),
+                ('model', models.CharField(max_length=10)),
+                ('object_id', models.BigIntegerField()),
+                ('deleted', models.BooleanField(default=False)),
+                ('changed_at', models.DateTimeField()),
+            ],
+            options={
+                'indexes': [models.Index(condition=models.Q(('deleted', True)), fields=['changed_at'], name='change_tombstone_idx')],
+                'constraints': [models.UniqueConstraint(fields=('model', 'object_id'), name='change_object_uniq')],
+            },
+        ),
+        migrations.RunPython(create_change_log, drop_change_log),
+    ]
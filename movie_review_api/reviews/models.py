@@ -3,6 +3,7 @@ from django.contrib.auth.models import User
 from django.utils.timezone import now
 
 
+RATING_CHOICES = range(1, 6)  # Ratings are whole stars from 1 to 5
 
 
 class Movie(models.Model):
@@ -10,8 +11,32 @@ class Movie(models.Model):
     description = models.TextField()
     release_date = models.DateField()
 
+    # Denormalized rating aggregates, maintained by reviews.aggregates on every review write
+    review_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_sum = models.PositiveIntegerField(default=0, editable=False)
+    average_rating = models.FloatField(default=0, editable=False)
+    rating_1_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_2_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_3_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_4_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_5_count = models.PositiveIntegerField(default=0, editable=False)
+
+    class Meta:
+        indexes = [
+            # The orderings MovieListCreate offers; SQLite appends the rowid, so keyset pages seek on (field, id)
+            models.Index(fields=['movie_title'], name='movie_title_idx'),
+            models.Index(fields=['release_date'], name='movie_release_date_idx'),
+            models.Index(fields=['review_count'], name='movie_review_count_idx'),
+            models.Index(fields=['average_rating'], name='movie_average_rating_idx'),
+        ]
+
     def __str__(self):
-        return self.title
+        return self.movie_title
+
+    @property
+    def rating_histogram(self):
+        # Number of reviews per star rating, keyed "1" to "5"
+        return {str(rating): getattr(self, f'rating_{rating}_count') for rating in RATING_CHOICES}
 
 class Review(models.Model):
     movie = models.ForeignKey(Movie, on_delete=models.CASCADE)  # Movie relationship
@@ -21,9 +46,132 @@ class Review(models.Model):
     created_date = models.DateTimeField(auto_now_add=True)
     
     class Meta:
-        ordering = ['created_date']
+        ordering = ['created_date', 'id']
+        indexes = [
+            # Keyset pagination seeks on (created_date, id), see reviews.pagination
+            models.Index(fields=['created_date', 'id'], name='review_created_id_idx'),
+            # Reviews with a given rating in listing order, for the rating search
+            models.Index(fields=['rating', 'created_date', 'id'], name='review_rating_created_idx'),
+            # A movie's or a user's reviews in listing order
+            models.Index(fields=['movie', 'created_date', 'id'], name='review_movie_created_idx'),
+            models.Index(fields=['user', 'created_date', 'id'], name='review_user_created_idx'),
+        ]
 
     def __str__(self):
         return f'{self.movie.movie_title} review by {self.user.username}'
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember what was loaded so the aggregate signals can tell what an update changed
+        instance._loaded_rating = instance.__dict__.get('rating')
+        instance._loaded_movie_id = instance.__dict__.get('movie_id')
+        return instance
+
+
+class MovieRanking(models.Model):
+    """
+    Precomputed leaderboard scores of a movie, kept current by reviews.leaderboards.
+    """
+    movie = models.OneToOneField(Movie, on_delete=models.CASCADE, primary_key=True, related_name='ranking')
+    day_count = models.IntegerField(default=0)  # Reviews created in the trending window
+    week_count = models.IntegerField(default=0)  # Reviews created in the weekly window
+    trending_score = models.FloatField(null=True)  # None without reviews this week
+    bayesian_rating = models.FloatField(null=True)  # None without any reviews
+
+    class Meta:
+        indexes = [
+            # One per leaderboard, read backwards from the best score; the movie id breaks ties
+            models.Index(fields=['bayesian_rating', 'movie'], name='ranking_bayesian_idx'),
+            models.Index(fields=['week_count', 'movie'], name='ranking_week_count_idx'),
+            models.Index(fields=['trending_score', 'movie'], name='ranking_trending_idx'),
+        ]
+
+    def __str__(self):
+        return f'Ranking of movie {self.movie_id}'
+
+
+class ReviewActivity(models.Model):
+    """
+    Number of reviews a movie got in one hour of the weekly window, so hours can leave the windows again.
+    """
+    movie = models.ForeignKey(Movie, on_delete=models.CASCADE)
+    hour = models.DateTimeField()  # Start of the hour, UTC
+    review_count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['movie', 'hour'], name='review_activity_hour_uniq')]
+        indexes = [models.Index(fields=['hour'], name='review_activity_hour_idx')]
+
+    def __str__(self):
+        return f'{self.review_count} review(s) of movie {self.movie_id} at {self.hour}'
+
+
+class LeaderboardState(models.Model):
+    """
+    The windows and rating prior the rankings were last compacted to; a single row.
+    """
+    day_start = models.DateTimeField()  # First hour of the trending window
+    week_start = models.DateTimeField()  # First hour of the weekly window
+    prior_mean = models.FloatField()  # Mean rating of all reviews, the Bayesian average's prior
+    compacted_at = models.DateTimeField()
+
+
+class ImportCheckpoint(models.Model):
+    """
+    Progress of an import_data run, saved in the same transaction as each batch so a rerun resumes exactly.
+    """
+    kind = models.CharField(max_length=20)  # movies, users or reviews
+    source = models.CharField(max_length=500)  # Absolute path of the imported file
+    source_size = models.BigIntegerField()
+    rows_done = models.PositiveBigIntegerField(default=0)
+    rows_skipped = models.PositiveBigIntegerField(default=0)
+    finished = models.BooleanField(default=False)
+    updated = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['kind', 'source'], name='import_checkpoint_source_uniq')]
+
+    def __str__(self):
+        return f'{self.kind} from {self.source}: {self.rows_done} rows'
+
+
+class IngestLog(models.Model):
+    """
+    How far a write-behind review log has been inserted, saved in the same transaction as each flush.
+    """
+    name = models.CharField(max_length=200, unique=True)  # File name in the REVIEW_INGEST directory
+    offset = models.PositiveBigIntegerField(default=0)  # Bytes of the log already inserted
+    updated = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f'{self.name}: {self.offset} bytes flushed'
+
+
+class Change(models.Model):
+    """
+    The latest change of a movie or review for the delta-sync feed, written by the triggers of reviews.changelog.
+    """
+    seq = models.BigAutoField(primary_key=True)  # Never reused; each change replaces the object's row with a new one
+    model = models.CharField(max_length=10)  # movie or review
+    object_id = models.BigIntegerField()
+    deleted = models.BooleanField(default=False)  # A tombstone
+    changed_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['model', 'object_id'], name='change_object_uniq')]
+        indexes = [
+            # Tombstones by age, for pruning
+            models.Index(fields=['changed_at'], name='change_tombstone_idx', condition=models.Q(deleted=True)),
+        ]
+
+    def __str__(self):
+        return f'{self.seq}: {"deleted" if self.deleted else "changed"} {self.model} {self.object_id}'
+
 
+class ChangeLogState(models.Model):
+    """
+    The highest sequence number whose tombstones may have been pruned; a single row.
+    """
+    pruned_seq = models.BigIntegerField(default=0)
+    pruned_at = models.DateTimeField(null=True)
@@ -0,0 +1,223 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import namedtuple
+
+from django.core.exceptions import ValidationError
+from django.core.paginator import InvalidPage
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+from rest_framework.utils.urls import replace_query_param
+
+from . import search
+
+
+KeysetCursor = namedtuple('KeysetCursor', ['position', 'reverse'])
+
+
+## Page-number pagination, kept for relevance-ranked searches
+class ReviewPagination(PageNumberPagination):
+    page_size = 5  # Number of reviews per page
+    page_size_query_param = 'page_size'
+    max_page_size = 10
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Cursor pagination that seeks on the full ordering key instead of OFFSET.
+
+    The cursor holds the ordering values of the row at the edge of the page and
+    the next page is fetched with ``WHERE (a, b) > (x, y) ORDER BY a, b LIMIT n``,
+    which an index on the ordering fields answers without reading the skipped
+    rows, so every page costs the same however deep the client scrolls. ``id``
+    is always the last ordering field, so the key is unique and rows inserted
+    while a client pages never shift or repeat results. No COUNT(*) is run.
+    """
+    page_size = 10
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ordering = ('id',)
+    tiebreaker = 'id'
+
+    def get_ordering(self, request, queryset, view):
+        ordering = super().get_ordering(request, queryset, view)
+        if not any(field.lstrip('-') in (self.tiebreaker, 'pk') for field in ordering):
+            # Same direction as the last field, so a descending ordering still walks one index backwards
+            direction = '-' if ordering[-1].startswith('-') else ''
+            ordering += (direction + self.tiebreaker,)
+        return ordering
+
+    def paginate_queryset(self, queryset, request, view=None):
+        page_queryset = self._page_queryset(queryset, request, view)
+        if page_queryset is None:
+            return None
+        return self._set_page(list(page_queryset))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        page_queryset = self._page_queryset(queryset, request, view)
+        if page_queryset is None:
+            return None
+        return self._set_page([obj async for obj in page_queryset])
+
+    def _page_queryset(self, queryset, request, view):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.model = queryset.model
+        self.cursor = self.decode_cursor(request)
+
+        self.reverse = self.cursor is not None and self.cursor.reverse
+        ordering = [_flip(field) for field in self.ordering] if self.reverse else list(self.ordering)
+        queryset = queryset.order_by(*ordering)
+        if self.cursor is not None:
+            queryset = queryset.filter(self._seek(ordering, self.cursor.position))
+
+        # One extra row tells us whether there is anything beyond this page
+        return queryset[:self.page_size + 1]
+
+    def _set_page(self, results):
+        has_more = len(results) > self.page_size
+        self.page = results[:self.page_size]
+
+        if self.reverse:
+            self.page.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, self.cursor is not None
+        return self.page
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(KeysetCursor(self._position(self.page[-1]), reverse=False))
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(KeysetCursor(self._position(self.page[0]), reverse=True))
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+
+        try:
+            tokens = json.loads(urlsafe_b64decode(encoded.encode('ascii')))
+            raw_position = tokens['p']
+            if len(raw_position) != len(self.ordering):
+                raise ValueError('Cursor does not match the ordering')
+            position = [
+                self._field(name).to_python(value) for name, value in zip(self.ordering, raw_position)
+            ]
+            return KeysetCursor(position, reverse=bool(tokens.get('r')))
+        except (TypeError, ValueError, KeyError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, cursor):
+        tokens = {'p': [_jsonable(value) for value in cursor.position]}
+        if cursor.reverse:
+            tokens['r'] = 1
+        encoded = urlsafe_b64encode(json.dumps(tokens, separators=(',', ':')).encode('ascii')).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def _field(self, name):
+        name = name.lstrip('-')
+        return self.model._meta.pk if name == 'pk' else self.model._meta.get_field(name)
+
+    def _position(self, instance):
+        if isinstance(instance, dict):  # A values() row, see reviews.rows
+            return [instance[self._field(name).attname] for name in self.ordering]
+        return [self._field(name).value_from_object(instance) for name in self.ordering]
+
+    def _seek(self, ordering, position):
+        # Row-value comparison (a, b) > (x, y) spelled out as (a > x) OR (a = x AND b > y)
+        condition = Q()
+        equal = Q()
+        for field, value in zip(ordering, position):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            condition |= equal & Q(**{f'{name}__{lookup}': value})
+            equal &= Q(**{name: value})
+        return condition
+
+
+async def apaginate_queryset(paginator, queryset, request, view=None):
+    """
+    ``paginator.paginate_queryset`` for async views, with the queries run through the async ORM.
+    Page-number paginators get the same page, count and links as DRF would build.
+    """
+    if hasattr(paginator, 'apaginate_queryset'):
+        return await paginator.apaginate_queryset(queryset, request, view)
+
+    page_size = paginator.get_page_size(request)
+    if not page_size:
+        return None
+    django_paginator = paginator.django_paginator_class(queryset, page_size)
+    django_paginator.count = await queryset.acount()  # A cached_property, so set it before anything reads it
+    page_number = paginator.get_page_number(request, django_paginator)
+    try:
+        number = django_paginator.validate_number(page_number)
+    except InvalidPage as exc:
+        raise NotFound(paginator.invalid_page_message.format(page_number=page_number, message=str(exc)))
+
+    bottom = (number - 1) * page_size
+    results = [obj async for obj in queryset[bottom:bottom + page_size]]
+    paginator.page = django_paginator._get_page(results, number, django_paginator)
+    if paginator.page.has_other_pages() and paginator.template is not None:
+        paginator.display_page_controls = True
+    paginator.request = request
+    return list(paginator.page)
+
+
+class SearchPaginationMixin:
+    """
+    View mixin that pages relevance-ranked search results by page number.
+    A bm25 score has no stable keyset, so cursors only cover the plain listings.
+    """
+    search_params = ()
+    search_pagination_class = ReviewPagination
+
+    @property
+    def paginator(self):
+        if not hasattr(self, '_paginator'):
+            params = self.request.query_params if getattr(self, 'request', None) else {}
+            # A term without a word to search for (blank, punctuation) is no search and keeps the listing order
+            ranked = any(search.search_terms(params.get(param)) for param in self.search_params)
+            self._paginator = (self.search_pagination_class if ranked else self.pagination_class)()
+        return self._paginator
+
+
+class ReviewCursorPagination(KeysetPagination):
+    # Same order as Review.Meta.ordering, served by the (created_date, id) index
+    ordering = ('created_date', 'id')
+
+
+class MovieCursorPagination(KeysetPagination):
+    ordering = ('id',)
+
+
+class LeaderboardPagination(KeysetPagination):
+    tiebreaker = 'pk'
+
+    def get_ordering(self, request, queryset, view):
+        # Best score first, read backwards down the board's (score, movie) index
+        return (f'-{view.score_field}', '-pk')
+
+
+class MovieSearchPagination(PageNumberPagination):
+    page_size = 10
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
+def _flip(field):
+    return field[1:] if field.startswith('-') else f'-{field}'
+
+
+def _jsonable(value):
+    # Full precision ISO strings; DjangoJSONEncoder would drop the microseconds
+    return value.isoformat() if hasattr(value, 'isoformat') else value
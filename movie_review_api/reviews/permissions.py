@@ -10,5 +10,9 @@ class IsOwnerOrReadOnly(permissions.BasePermission):
         if request.method in permissions.SAFE_METHODS:
             return True
 
-        # Write permissions are only allowed to the owner of the review
-        return obj.user == request.user
+        # Objects without an owner, such as movies, are not the requester's to change
+        if not hasattr(obj, 'user_id'):
+            return False
+
+        # Write permissions are only allowed to the owner of the review; comparing ids never loads obj.user
+        return obj.user_id == request.user.id
@@ -0,0 +1,295 @@
+"""
+Per-request timing breakdown and sampled profiles.
+
+``ProfilingMiddleware`` times every request and splits it into phases:
+
+``db``         time in SQL and the number of queries (``desc``), on every database
+``count``      the part of ``db`` spent in ``COUNT(*)`` queries, i.e. page counts
+``auth``       DRF authentication, including its queries
+``queue``      waiting for a slot of the view's admission class, see reviews.admission
+``serialize``  the top-level serializer's ``to_representation``
+``render``     rendering the response to JSON, inside the view (the response cache) or after it
+``view``       the rest of the time until the view returned, including its other queries
+``total``      the whole request through the middleware below this one
+
+The breakdown goes out as a ``Server-Timing`` header, which browser dev tools
+show per request, and as one JSON line on the ``reviews.profiling`` logger.
+``auth``, ``serialize`` and ``render`` need ``ProfiledViewMixin`` on the view;
+other views report the database time and the total only. Async views run
+their queries in another thread, so they report no database time either.
+
+A fraction ``SAMPLE_RATE`` of requests runs under cProfile, dumped as a
+``.prof`` file (``python -m pstats``, snakeviz or flameprof read it). Slow
+requests cannot be known in advance, so a background thread samples the
+stack of any request that has been running longer than ``SLOW_REQUEST_MS``
+and writes the samples as folded stacks (``.folded``) that flamegraph.pl
+and speedscope draw as a flame graph. Requests that are neither sampled nor
+slow only pay for the timers; ``manage.py bench_profiling`` measures that.
+"""
+import cProfile
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, defaultdict
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+
+
+logger = logging.getLogger(__name__)
+
+# Order of the phases in the Server-Timing header and the log line
+PHASES = ['db', 'count', 'auth', 'queue', 'view', 'serialize', 'render', 'total']
+
+# Timings of the request being handled, None outside the middleware
+_timings = ContextVar('request_timings', default=None)
+
+
+def _config():
+    return getattr(settings, 'PROFILING', None) or {}
+
+
+class Timings:
+    """
+    Phase durations of one request; also the execute wrapper that times its queries.
+    """
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.durations = defaultdict(float)  # Seconds per phase
+        self.queries = 0
+        self.view_end = self.render_end = None
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.queries += 1
+            self.durations['db'] += elapsed
+            if sql.startswith('SELECT COUNT('):
+                self.durations['count'] += elapsed
+
+    def finish(self):
+        end = time.perf_counter()
+        durations = self.durations
+        if self.view_end is not None:
+            rendered_in_view = durations['render']
+            if self.render_end is not None:
+                durations['render'] += self.render_end - self.view_end
+            durations['view'] = (
+                self.view_end - self.start - durations['auth'] - durations.get('queue', 0) - durations['serialize']
+                - rendered_in_view
+            )
+        durations['total'] = end - self.start
+
+    def as_dict(self):
+        timings = {f'{name}_ms': round(self.durations[name] * 1000, 3) for name in PHASES if name in self.durations}
+        timings['queries'] = self.queries
+        return timings
+
+    def server_timing(self):
+        entries = []
+        for name in PHASES:
+            if name not in self.durations:
+                continue
+            entry = f'{name};dur={self.durations[name] * 1000:.1f}'
+            if name == 'db':
+                entry += f';desc="{self.queries} queries"'
+            entries.append(entry)
+        return ', '.join(entries)
+
+
+@contextmanager
+def phase(name):
+    """
+    Add the time spent in the block to phase ``name`` of the current request, if it is being timed.
+    """
+    timings = _timings.get()
+    if timings is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.durations[name] += time.perf_counter() - start
+
+
+class ProfiledViewMixin:
+    """
+    DRF view mixin that times authentication, serialization and rendering for ``ProfilingMiddleware``.
+    """
+    def perform_authentication(self, request):
+        with phase('auth'):
+            super().perform_authentication(request)
+
+    def get_serializer(self, *args, **kwargs):
+        serializer = super().get_serializer(*args, **kwargs)
+        if _timings.get() is not None:
+            # Only this serializer is timed, a list serializer's children run inside it
+            to_representation = serializer.to_representation
+
+            def timed_to_representation(instance):
+                with phase('serialize'):
+                    return to_representation(instance)
+            serializer.to_representation = timed_to_representation
+        return serializer
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        timings = _timings.get()
+        if timings is not None:
+            timings.view_end = time.perf_counter()
+            if hasattr(response, 'add_post_render_callback'):
+                # Runs at once for responses the view already rendered
+                response.add_post_render_callback(lambda response: setattr(timings, 'render_end', time.perf_counter()))
+        return response
+
+
+def fold(frame):
+    """
+    One stack in the folded format of flamegraph.pl, outermost call first.
+    """
+    calls = []
+    while frame is not None:
+        code = frame.f_code
+        calls.append(f'{os.path.basename(code.co_filename)}:{code.co_name}')
+        frame = frame.f_back
+    return ';'.join(reversed(calls))
+
+
+class SlowRequestSampler:
+    """
+    Background thread that samples the stacks of requests running longer than their threshold.
+
+    It looks for slow requests every ``poll_interval`` seconds and samples them every ``interval``
+    seconds; requests only register and unregister, so fast ones never wake the thread.
+    """
+    def __init__(self, interval=0.005, poll_interval=0.05):
+        self.interval = interval
+        self.poll_interval = poll_interval
+        self._requests = {}  # Thread id -> (when sampling starts, Counter of folded stacks)
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def watch(self, threshold):
+        samples = Counter()
+        with self._lock:
+            self._requests[threading.get_ident()] = (time.perf_counter() + threshold, samples)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='slow-request-sampler', daemon=True)
+                self._thread.start()
+        return samples
+
+    def unwatch(self):
+        # Under the lock, so the samples are complete once this returns
+        with self._lock:
+            self._requests.pop(threading.get_ident(), None)
+
+    def _run(self):
+        while True:
+            sampled = False
+            with self._lock:
+                now = time.perf_counter()
+                if any(start <= now for start, _ in self._requests.values()):
+                    frames = sys._current_frames()
+                    for ident, (start, samples) in self._requests.items():
+                        if start <= now and ident in frames:
+                            samples[fold(frames[ident])] += 1
+                            sampled = True
+            time.sleep(self.interval if sampled else self.poll_interval)
+
+
+slow_requests = SlowRequestSampler()
+
+
+class ProfilingMiddleware:
+    """
+    Times each request into ``Server-Timing`` and a log line, and profiles sampled and slow requests.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        config = _config()
+        if not config:
+            return self.get_response(request)
+
+        timings = Timings()
+        token = _timings.set(timings)
+        profiler = cProfile.Profile() if random.random() < config.get('SAMPLE_RATE', 0) else None
+        slow_ms = config.get('SLOW_REQUEST_MS')
+        samples = slow_requests.watch(slow_ms / 1000) if slow_ms else None
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(timings))
+                if profiler is not None:
+                    profiler.enable()
+                try:
+                    response = self.get_response(request)
+                finally:
+                    if profiler is not None:
+                        profiler.disable()
+        finally:
+            if samples is not None:
+                slow_requests.unwatch()
+            _timings.reset(token)
+        self.report(config, request, response, timings, profiler, samples)
+        return response
+
+    async def __acall__(self, request):
+        config = _config()
+        if not config:
+            return await self.get_response(request)
+        timings = Timings()
+        token = _timings.set(timings)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _timings.reset(token)
+        self.report(config, request, response, timings)
+        return response
+
+    def report(self, config, request, response, timings, profiler=None, samples=None):
+        timings.finish()
+        if config.get('SERVER_TIMING', True):
+            response['Server-Timing'] = timings.server_timing()
+
+        record = {
+            'method': request.method, 'path': request.path, 'status': response.status_code, **timings.as_dict(),
+        }
+        if profiler is not None or samples:
+            record['profile'] = self.dump(config, request, profiler, samples)
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(json.dumps(record), extra={'timings': record})
+
+    def dump(self, config, request, profiler, samples):
+        directory = config.get('DUMP_DIR') or os.path.join(settings.BASE_DIR, 'profiles')
+        os.makedirs(directory, exist_ok=True)
+        slug = request.path.strip('/').replace('/', '-') or 'root'
+        name = os.path.join(directory, f'{time.strftime("%Y%m%d-%H%M%S")}-{request.method}-{slug}-{uuid.uuid4().hex[:8]}')
+        if profiler is not None:
+            profiler.dump_stats(f'{name}.prof')
+        if samples:
+            with open(f'{name}.folded', 'w') as file:
+                for stack, count in samples.most_common():
+                    file.write(f'{stack} {count}\n')
+        return name
@@ -0,0 +1,172 @@
+"""
+Query plan audit of the read endpoints.
+
+Every DRF view in the URLconf that answers GET is requested once
+per entry in ``AUDIT_REQUESTS`` (or once without parameters), through the
+whole view so filtering and pagination add their clauses, and the SELECTs
+it runs are collected. Each distinct statement is then run again under
+``EXPLAIN QUERY PLAN`` and flagged when SQLite reads a whole table (``SCAN``
+without an index) or sorts rows in a temporary B-tree. Plans depend on the
+table statistics, so audit a database that is filled and analyzed like
+production; ``audit_query_plans --seed`` builds one.
+
+Findings listed in ``EXPECTED_FINDINGS`` are reported but do not fail the
+audit, e.g. relevance-ranked searches sort their matches by bm25, which no
+index can provide.
+"""
+from collections import namedtuple
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connections
+from django.test.utils import override_settings
+from django.urls import URLPattern, URLResolver, get_resolver, reverse
+from rest_framework.test import APIClient
+from rest_framework.views import APIView
+
+
+# Parameters of the audited requests per URL name, for the filters and orderings each endpoint offers
+AUDIT_REQUESTS = {
+    'review-list-create': [{}, {'page_size': 100}],
+    'review-search': [{'rating': 3}, {'movie_title': 'movie'}, {'q': 'review'}, {'q': 'review', 'rating': 3}],
+    'review-export': [{}, {'rating': 3}, {'movie': 1}, {'created_after': '2000-01-01'}],
+    'movie-list-create': [
+        {},
+        *({'ordering': ordering} for ordering in (
+            'movie_title', '-movie_title', 'release_date', '-review_count', '-average_rating',
+        )),
+        {'min_rating': 4, 'ordering': '-average_rating'},
+        {'search': 'movie'},
+    ],
+    'movie-autocomplete': [{'q': 'movie'}],
+}
+
+# (URL name, query parameter, substring of the plan line) of findings that are known and accepted
+EXPECTED_FINDINGS = [
+    # Relevance-ranked searches sort their matches by bm25
+    ('review-search', 'q', 'USE TEMP B-TREE FOR ORDER BY'),
+    ('review-search', 'movie_title', 'USE TEMP B-TREE FOR ORDER BY'),
+    ('movie-list-create', 'search', 'USE TEMP B-TREE FOR ORDER BY'),
+    # The export pages through the reviews in id order and filters on the way; a fifth of the rows
+    # have any one rating, and a date range is either wide (walk the ids) or narrow (sort the range)
+    ('review-export', 'rating', 'SCAN reviews_review'),
+    ('review-export', 'created_after', 'SCAN reviews_review'),
+    ('review-export', 'created_after', 'USE TEMP B-TREE FOR ORDER BY'),
+    # The typeahead index is built from every movie, once per process rather than per request
+    ('movie-autocomplete', 'q', 'SCAN reviews_movie'),
+]
+
+# Scans that are never worth flagging: the schema, which introspection (``search.is_available``)
+# reads, and SCAN CONSTANT ROW for SELECTs without a table
+IGNORED_SCANS = {'sqlite_master', 'sqlite_schema', 'CONSTANT'}
+
+Endpoint = namedtuple('Endpoint', ['name', 'view_class'])
+PlanFinding = namedtuple('PlanFinding', ['endpoint', 'params', 'sql', 'detail', 'expected'])
+
+
+def endpoints(resolver=None, namespace=''):
+    """
+    Yield the named URL patterns whose view is a DRF view that answers GET.
+    """
+    resolver = resolver or get_resolver()
+    for pattern in resolver.url_patterns:
+        if isinstance(pattern, URLResolver):
+            inner = f'{namespace}{pattern.namespace}:' if pattern.namespace else namespace
+            yield from endpoints(pattern, inner)
+        elif isinstance(pattern, URLPattern) and pattern.name:
+            view_class = getattr(pattern.callback, 'cls', None)
+            actions = getattr(pattern.callback, 'actions', None)
+            answers_get = 'get' in actions if actions else hasattr(view_class, 'get')
+            if view_class and issubclass(view_class, APIView) and answers_get:
+                yield Endpoint(f'{namespace}{pattern.name}', view_class), pattern
+
+
+class StatementCollector:
+    """
+    Database execute wrapper that keeps the distinct SELECT statements with their parameters.
+    """
+    def __init__(self):
+        self.statements = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        if not many and sql.lstrip().upper().startswith('SELECT'):
+            self.statements.setdefault(sql, params)
+        return execute(sql, params, many, context)
+
+
+def explain(connection, sql, params):
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+        return [row[-1] for row in cursor.fetchall()]
+
+
+def findings(sql, plan):
+    """
+    The lines of ``plan`` that read a whole table or sort in a temporary B-tree.
+    """
+    sorts = [detail for detail in plan if 'USE TEMP B-TREE' in detail]
+    # A bare scan in rowid order that stops after a page is how SQLite reads ORDER BY id LIMIT n
+    paged_rowid_walk = not sorts and ' LIMIT ' in sql and ' WHERE ' not in sql
+    scans = [
+        detail for detail in plan
+        # SCAN t USING [COVERING] INDEX walks an index in order; virtual tables are the FTS index
+        if detail.startswith('SCAN ') and ' USING ' not in detail and 'VIRTUAL TABLE' not in detail
+        and detail.split()[1] not in IGNORED_SCANS and not paged_rowid_walk
+    ]
+    return scans + sorts
+
+
+def _url(endpoint, pattern):
+    groups = pattern.pattern.regex.groupindex
+    if not groups:
+        return reverse(endpoint.name)
+    # Detail views are audited on their first object
+    view_class = endpoint.view_class
+    queryset = getattr(view_class, 'queryset', None)
+    lookup = getattr(view_class, 'lookup_url_kwarg', None) or getattr(view_class, 'lookup_field', None)
+    if queryset is None or set(groups) != {lookup}:
+        return None
+    pk = queryset.model.objects.order_by('pk').values_list('pk', flat=True).first()
+    return None if pk is None else reverse(endpoint.name, kwargs={lookup: pk})
+
+
+def audit(using='default'):
+    """
+    Request every endpoint and return a list of PlanFinding.
+    """
+    connection = connections[using]
+    if connection.vendor != 'sqlite':
+        raise ValueError('The query plan audit reads SQLite plans only.')
+
+    client = APIClient()
+    user = User.objects.order_by('pk').first()
+    if user is not None:
+        client.force_authenticate(user)
+
+    # Cached responses would hide the queries, budgets and admission limits are not what is
+    # checked here (an export left unread would keep its slot); the test client sends requests
+    # to the testserver host
+    overrides = {
+        'RESPONSE_CACHE': None, 'QUERY_BUDGET_MODE': None, 'ADMISSION': {},
+        'ALLOWED_HOSTS': [*settings.ALLOWED_HOSTS, 'testserver'],
+    }
+    results = []
+    for endpoint, pattern in endpoints():
+        url = _url(endpoint, pattern)
+        if url is None:
+            continue
+        for params in AUDIT_REQUESTS.get(endpoint.name, [{}]):
+            collector = StatementCollector()
+            with override_settings(**overrides), connection.execute_wrapper(collector):
+                response = client.get(url, params)
+                if response.streaming:
+                    # The first chunk runs the first page of the query, later pages repeat its shape
+                    next(iter(response.streaming_content), None)
+            for sql, sql_params in collector.statements.items():
+                for detail in findings(sql, explain(connection, sql, sql_params)):
+                    expected = any(
+                        name == endpoint.name and param in params and text in detail
+                        for name, param, text in EXPECTED_FINDINGS
+                    )
+                    results.append(PlanFinding(endpoint.name, params, sql, detail, expected))
+    return results
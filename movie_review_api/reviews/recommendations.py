@@ -0,0 +1,314 @@
+"""
+Item-item movie recommendations from the ratings matrix.
+
+``compute`` (``manage.py compute_similarities``) is an offline job. It
+loads the sparse user x movie rating matrix, stored once per movie and once
+per user as ``{id: value}`` dicts. Each rating is centred on its user's
+mean rating, so that the cosine between two movies' columns is the adjusted
+cosine similarity. For each movie it keeps the top ``NEIGHBOURS`` movies with
+a positive similarity and at least ``MIN_COMMON_USERS`` raters in common. A
+movie's row is found from its own raters' other ratings, so the cost grows
+with the number of co-ratings, not with movies squared.
+
+The neighbours go into one binary file:
+
+    header | movie ids (int64, sorted) | row offsets (uint32) | fingerprints (uint64)
+           | neighbour ids (int64) | similarities (float32)
+
+Web workers memory-map the file read-only (``get_index``), so every process
+on a host shares the one copy in the page cache. A lookup is a binary
+search over the movie ids plus a slice of the two neighbour arrays. The job
+writes a new file and swaps it into place, and a worker reopens the file
+when its inode changes.
+
+Each movie's fingerprint is a checksum of its (user, rating) pairs. A later
+run recomputes only the rows of movies whose fingerprint changed. In the
+rows of the other movies it replaces the entries of changed movies using
+the recomputed similarities, which are symmetric. Changed ratings also move
+their users' means, which shifts the other movies' similarities slightly,
+and a changed movie dropping out can leave a shorter list. Run with
+``--full`` from time to time to clear both.
+"""
+import math
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+from array import array
+from bisect import bisect_left
+from collections import Counter, defaultdict, namedtuple
+from heapq import nlargest
+
+from django.conf import settings
+
+from . import caching
+from .models import RATING_CHOICES, Review
+
+
+MAGIC = b'MRSIM001'
+HEADER = struct.Struct('<8sIIQd')  # Magic, neighbours per movie, movies, neighbours in total, build time
+
+ComputeResult = namedtuple('ComputeResult', ['movies', 'recomputed', 'neighbours', 'seconds'])
+
+
+def _config():
+    return getattr(settings, 'RECOMMENDATIONS', None) or {}
+
+
+def index_path():
+    return os.fspath(_config().get('PATH') or os.path.join(settings.BASE_DIR, 'similarities.bin'))
+
+
+def neighbour_count():
+    return _config().get('NEIGHBOURS', 20)
+
+
+class RatingMatrix:
+    """
+    Sparse user x movie matrix of ratings centred on each user's mean, by movie and by user.
+    """
+    def __init__(self, reviews):
+        # A user who reviewed a movie twice counts with their mean rating for it
+        ratings = defaultdict(lambda: defaultdict(list))
+        for movie_id, user_id, rating in reviews:
+            ratings[movie_id][user_id].append(rating)
+
+        self.fingerprints = {}
+        by_user = defaultdict(dict)
+        for movie_id, raters in ratings.items():
+            pairs = array('q', [value for user_id in sorted(raters) for value in (user_id, *sorted(raters[user_id]))])
+            self.fingerprints[movie_id] = (len(pairs) << 32) | zlib.crc32(pairs.tobytes())
+            for user_id, user_ratings in raters.items():
+                by_user[user_id][movie_id] = sum(user_ratings) / len(user_ratings)
+
+        self.by_movie = defaultdict(dict)
+        self.by_user = {}
+        for user_id, user_ratings in by_user.items():
+            mean = sum(user_ratings.values()) / len(user_ratings)
+            centred = {movie_id: rating - mean for movie_id, rating in user_ratings.items()}
+            self.by_user[user_id] = list(centred.items())
+            for movie_id, value in centred.items():
+                self.by_movie[movie_id][user_id] = value
+        self.norms = {
+            movie_id: math.sqrt(sum(value * value for value in raters.values()))
+            for movie_id, raters in self.by_movie.items()
+        }
+
+    @classmethod
+    def load(cls, batch_size=5000):
+        reviews = Review.objects.order_by().values_list('movie_id', 'user_id', 'rating')
+        return cls(reviews.iterator(chunk_size=batch_size))
+
+    def similarities(self, movie_id, min_common_users=2):
+        """
+        Adjusted cosine similarity of the movie with every movie that shares raters with it, where positive.
+        """
+        norm = self.norms.get(movie_id)
+        if not norm:
+            return {}  # Every rater gave their own mean rating, there is nothing to compare
+        dots, common = defaultdict(float), Counter()
+        for user_id, value in self.by_movie[movie_id].items():
+            for other, other_value in self.by_user[user_id]:
+                dots[other] += value * other_value
+                common[other] += 1
+        dots.pop(movie_id, None)
+        norms = self.norms
+        return {
+            other: dot / (norm * norms[other])
+            for other, dot in dots.items()
+            if dot > 0 and common[other] >= min_common_users
+        }
+
+
+def top(similarities, k):
+    # Most similar first, ties to the older movie
+    return nlargest(k, similarities, key=lambda item: (item[1], -item[0]))
+
+
+class SimilarityIndex:
+    """
+    Read-only view of a neighbours file through a memory map.
+    """
+    def __init__(self, path):
+        with open(path, 'rb') as file:
+            self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.k, movies, total, self.built = HEADER.unpack_from(self._mmap)
+        if magic != MAGIC:
+            raise ValueError(f'{path} is not a similarity index.')
+
+        view = memoryview(self._mmap)
+        offset = HEADER.size
+
+        def section(typecode, length):
+            nonlocal offset
+            size = length * array(typecode).itemsize
+            values = view[offset:offset + size].cast(typecode)
+            offset += _padded(size)
+            return values
+
+        self.movie_ids = section('q', movies)
+        self.offsets = section('I', movies + 1)
+        self.fingerprints = section('Q', movies)
+        self.neighbour_ids = section('q', total)
+        self.scores = section('f', total)
+
+    def __len__(self):
+        return len(self.movie_ids)
+
+    def _position(self, movie_id):
+        position = bisect_left(self.movie_ids, movie_id)
+        if position < len(self.movie_ids) and self.movie_ids[position] == movie_id:
+            return position
+        return None
+
+    def neighbours(self, movie_id):
+        """
+        ``[(movie_id, similarity)]`` of the movie's nearest neighbours, most similar first.
+        """
+        position = self._position(movie_id)
+        if position is None:
+            return []
+        start, end = self.offsets[position], self.offsets[position + 1]
+        return list(zip(self.neighbour_ids[start:end], self.scores[start:end]))
+
+    def fingerprint(self, movie_id):
+        position = self._position(movie_id)
+        return None if position is None else self.fingerprints[position]
+
+    def rows(self):
+        for position, movie_id in enumerate(self.movie_ids):
+            start, end = self.offsets[position], self.offsets[position + 1]
+            yield movie_id, list(zip(self.neighbour_ids[start:end], self.scores[start:end]))
+
+
+def _padded(size):
+    # Sections start on 8 byte boundaries
+    return size + -size % 8
+
+
+def write_index(path, k, rows, fingerprints):
+    """
+    Write ``{movie_id: [(neighbour_id, similarity)]}`` to a new file and swap it in at ``path``.
+    """
+    movie_ids = array('q', sorted(rows))
+    offsets, neighbour_ids, scores = array('I', [0]), array('q'), array('f')
+    for movie_id in movie_ids:
+        for neighbour_id, score in rows[movie_id]:
+            neighbour_ids.append(neighbour_id)
+            scores.append(score)
+        offsets.append(len(neighbour_ids))
+
+    temporary = f'{path}.{os.getpid()}.tmp'
+    with open(temporary, 'wb') as file:
+        file.write(HEADER.pack(MAGIC, k, len(movie_ids), len(neighbour_ids), time.time()))
+        sections = [movie_ids, offsets, array('Q', (fingerprints[movie_id] for movie_id in movie_ids)), neighbour_ids, scores]
+        for values in sections:
+            data = values.tobytes()
+            file.write(data + bytes(_padded(len(data)) - len(data)))
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temporary, path)  # Readers keep the old file mapped until they reopen
+
+
+def compute(path=None, full=False):
+    """
+    Rebuild the neighbours file, recomputing only the movies whose ratings changed unless ``full``.
+    """
+    start = time.perf_counter()
+    path = path or index_path()
+    k = neighbour_count()
+    min_common_users = _config().get('MIN_COMMON_USERS', 2)
+    matrix = RatingMatrix.load()
+
+    previous = None
+    if not full and os.path.exists(path):
+        previous = SimilarityIndex(path)
+        if previous.k != k:
+            previous = None  # Shorter lists cannot be topped up
+
+    if previous is None:
+        changed = set(matrix.by_movie)
+        rows = {}
+    else:
+        changed = {
+            movie_id for movie_id, fingerprint in matrix.fingerprints.items()
+            if previous.fingerprint(movie_id) != fingerprint
+        }
+        gone = set(previous.movie_ids) - set(matrix.by_movie)
+        stale = changed | gone
+        rows = {
+            movie_id: [(other, score) for other, score in neighbours if other not in stale]
+            for movie_id, neighbours in previous.rows() if movie_id not in stale
+        }
+
+    # Similarity is symmetric, so the recomputed rows also give the other movies' entries for them
+    recomputed = {movie_id: matrix.similarities(movie_id, min_common_users) for movie_id in changed}
+    for movie_id, similarities in recomputed.items():
+        if previous is not None:
+            for other, score in similarities.items():
+                if other in rows and other not in changed:
+                    rows[other].append((movie_id, score))
+        rows[movie_id] = list(similarities.items())
+    rows = {movie_id: top(neighbours, k) for movie_id, neighbours in rows.items()}
+
+    write_index(path, k, rows, matrix.fingerprints)
+    caching.bump('moviesimilarity')
+    return ComputeResult(
+        len(rows), len(changed), sum(len(neighbours) for neighbours in rows.values()), time.perf_counter() - start,
+    )
+
+
+_loaded = None  # (path, inode and mtime, SimilarityIndex) of this process
+_lock = threading.Lock()
+
+
+def get_index():
+    """
+    The current neighbours file mapped into this process, or None before the first ``compute``.
+    """
+    global _loaded
+    path = index_path()
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    key = (path, stat.st_ino, stat.st_mtime_ns)
+    loaded = _loaded
+    if loaded is None or loaded[0] != key:
+        with _lock:
+            if _loaded is None or _loaded[0] != key:
+                _loaded = (key, SimilarityIndex(path))
+            loaded = _loaded
+    return loaded[1]
+
+
+def similar_movies(movie_id, index=None):
+    index = index or get_index()
+    return index.neighbours(movie_id) if index is not None else []
+
+
+def recommend(ratings, limit=10, index=None):
+    """
+    Movies predicted to rate highest for a user with ``{movie_id: rating}``, as ``[(movie_id, predicted)]``.
+
+    The prediction is the user's mean plus the similarity-weighted mean of their deviations
+    on the rated neighbours of each candidate; movies they rated are left out.
+    """
+    index = index or get_index()
+    if index is None or not ratings:
+        return []
+    mean = sum(ratings.values()) / len(ratings)
+    deviations, weights = defaultdict(float), defaultdict(float)
+    for movie_id, rating in ratings.items():
+        for other, similarity in index.neighbours(movie_id):
+            if other not in ratings:
+                deviations[other] += similarity * (rating - mean)
+                weights[other] += similarity
+    lowest, highest = min(RATING_CHOICES), max(RATING_CHOICES)
+    predictions = [
+        (movie_id, min(highest, max(lowest, mean + deviations[movie_id] / weight)))
+        for movie_id, weight in weights.items()
+    ]
+    return top(predictions, limit)
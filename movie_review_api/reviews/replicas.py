@@ -0,0 +1,139 @@
+"""
+Read replicas with read-your-writes pinning.
+
+``ReplicaRouter`` sends reads to the database alias chosen for the current
+request and everything else to the primary (``default``). Only views with
+``ReplicaReadMixin`` choose a replica, and only for safe methods, after
+authentication; writes, authentication lookups, admin pages and management
+commands keep using the primary.
+
+After a user writes through one of those views, their reads stay on the
+primary for ``settings.REPLICA_PIN_SECONDS``, so they see their own review
+even while the replicas lag behind. The pins live in the default cache,
+which has to be shared by all worker processes for pins to follow a client
+from one worker to the next. Replica lag is assumed to stay under the same
+window: the response cache reads from the primary while a version is that
+young, so it never stores a replica's stale page under the new version.
+
+Replicas are the aliases in ``settings.DATABASE_REPLICAS``. For local
+testing they are SQLite files that ``sync()`` (``manage.py sync_replicas``)
+refreshes from the primary with SQLite's online backup, a stand-in for real
+replication.
+"""
+import random
+import time
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+from rest_framework.permissions import SAFE_METHODS
+
+
+PRIMARY = DEFAULT_DB_ALIAS
+
+PIN_KEY = 'reviews:replica-pin:{}'
+
+# Alias the reads of the current request or task go to; None leaves it to Django (the primary)
+_read_alias = ContextVar('replica_read_alias', default=None)
+
+
+def replica_aliases():
+    return list(getattr(settings, 'DATABASE_REPLICAS', ()))
+
+
+def pin_seconds():
+    return getattr(settings, 'REPLICA_PIN_SECONDS', 5)
+
+
+def choose_replica():
+    aliases = replica_aliases()
+    return random.choice(aliases) if aliases else None
+
+
+@contextmanager
+def reading_from(alias):
+    token = _read_alias.set(alias)
+    try:
+        yield
+    finally:
+        _read_alias.reset(token)
+
+
+def primary_reads_since(timestamp):
+    """
+    Read from the primary inside the block when ``timestamp`` is too recent for the replicas to have caught up.
+    """
+    if _read_alias.get() is None or time.time() - timestamp >= pin_seconds():
+        return nullcontext()
+    return reading_from(PRIMARY)
+
+
+def pin(user):
+    cache.set(PIN_KEY.format(user.pk), True, pin_seconds())
+
+
+def is_pinned(user):
+    return bool(user and user.is_authenticated and cache.get(PIN_KEY.format(user.pk)))
+
+
+class ReplicaRouter:
+    """
+    Database router: reads where the current request chose, writes and migrations on the primary.
+    """
+    def db_for_read(self, model, **hints):
+        return _read_alias.get()
+
+    def db_for_write(self, model, **hints):
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary
+        databases = {PRIMARY, *replica_aliases()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get the schema with the data, by copying the primary
+        return False if db in replica_aliases() else None
+
+
+class ReplicaReadMixin:
+    """
+    View mixin that serves safe requests from a replica unless the user wrote recently,
+    and pins the user to the primary after a successful write.
+    """
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)  # Authenticates, on the primary
+        if request.method in SAFE_METHODS and not is_pinned(request.user):
+            alias = choose_replica()
+            if alias is not None:
+                self._replica_token = _read_alias.set(alias)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        token = getattr(self, '_replica_token', None)
+        if token is not None:
+            _read_alias.reset(token)
+            self._replica_token = None
+        elif request.method not in SAFE_METHODS and response.status_code < 400:
+            user = getattr(request, 'user', None)
+            if user is not None and user.is_authenticated:
+                pin(user)
+        return super().finalize_response(request, response, *args, **kwargs)
+
+
+def sync(aliases=None, using=PRIMARY):
+    """
+    Copy the primary SQLite database over each replica with the online backup API.
+    The copy is a consistent snapshot and replica readers wait on its locks like on any writer.
+    """
+    source = connections[using]
+    if source.vendor != 'sqlite':
+        raise ValueError('Copying replicas is a stand-in for SQLite only, use the database\'s own replication.')
+    source.ensure_connection()
+    for alias in replica_aliases() if aliases is None else aliases:
+        target = connections[alias]
+        target.ensure_connection()
+        source.connection.backup(target.connection)
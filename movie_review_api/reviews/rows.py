@@ -0,0 +1,190 @@
+"""
+Read-only fast path for the list endpoints.
+
+``RowListMixin`` fetches a page of reviews or movies as plain dicts with
+``values()``, the joined movie title and username included, and reshapes
+them into exactly what ``ReviewSerializer`` or ``MovieSerializer`` outputs,
+without building and running the serializer's fields for every row.
+Dates go through the serializer's own date fields, so formats and time
+zones still follow the REST_FRAMEWORK settings. A view only takes the fast
+path while its serializer is one with a row format in ``ROW_FORMATS``;
+changing a serializer's fields means changing its row format with it, and
+the parity tests compare the two byte for byte.
+
+With a sparse fieldset (reviews.fieldsets) only the columns behind the
+requested fields are fetched, from ``field_columns`` and
+``expanded_columns``, and each row is built by one getter per field.
+"""
+from operator import itemgetter
+
+from django.conf import settings
+from rest_framework import ISO_8601
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+
+from . import profiling
+from .serializers import MovieSerializer, ReviewSerializer
+
+
+def datetime_representation(field):
+    """
+    ``field.to_representation`` for the aware UTC datetimes the database returns.
+
+    DRF converts every value to the current time zone before formatting it, most of the cost of a row;
+    when that zone is UTC the conversion changes nothing and is skipped.
+    """
+    output_format = getattr(field, 'format', api_settings.DATETIME_FORMAT)
+    zone = field.timezone if hasattr(field, 'timezone') else field.default_timezone()
+    if not isinstance(output_format, str) or output_format.lower() != ISO_8601 or str(zone) not in ('UTC', 'Etc/UTC'):
+        return field.to_representation
+
+    def to_representation(value):
+        if value is None or value.utcoffset():
+            return field.to_representation(value)
+        value = value.isoformat()
+        return value[:-6] + 'Z' if value.endswith('+00:00') else value
+    return to_representation
+
+
+class ReviewRows:
+    serializer_class = ReviewSerializer
+    columns = ('id', 'movie_id', 'movie__movie_title', 'review_content', 'rating', 'user__username', 'created_date')
+    # The columns behind each output field, in output order
+    field_columns = {
+        'id': ('id',), 'movie': ('movie_id',), 'movie_title': ('movie__movie_title',),
+        'review_content': ('review_content',), 'rating': ('rating',), 'user': ('user__username',),
+        'created_date': ('created_date',),
+    }
+
+    @property
+    def expanded_columns(self):
+        return {
+            'movie': tuple(f'movie__{column}' for column in MovieRows.columns),
+            'user': ('user_id', 'user__username'),
+        }
+
+    def getters(self, fieldset):
+        created_date = datetime_representation(self.serializer_class().fields['created_date'])
+        getters = {
+            'id': itemgetter('id'),
+            'movie': itemgetter('movie_id'),
+            'movie_title': itemgetter('movie__movie_title'),
+            'review_content': itemgetter('review_content'),
+            'rating': itemgetter('rating'),
+            'user': itemgetter('user__username'),
+            'created_date': lambda row: created_date(row['created_date']),
+        }
+        if 'movie' in fieldset.expand:
+            getters['movie'] = MOVIE_ROWS.nested('movie__')
+        if 'user' in fieldset.expand:
+            getters['user'] = lambda row: {'id': row['user_id'], 'username': row['user__username']}
+        return [(name, getters[name]) for name in fieldset.fields]
+
+    def __call__(self, rows, fieldset=None):
+        if fieldset is not None:
+            return sparse(rows, self.getters(fieldset))
+        created_date = datetime_representation(self.serializer_class().fields['created_date'])
+        return [
+            {
+                'id': row['id'],
+                'movie': row['movie_id'],
+                'movie_title': row['movie__movie_title'],
+                'review_content': row['review_content'],
+                'rating': row['rating'],
+                'user': row['user__username'],
+                'created_date': created_date(row['created_date']),
+            }
+            for row in rows
+        ]
+
+
+class MovieRows:
+    serializer_class = MovieSerializer
+    columns = (
+        'id', 'movie_title', 'description', 'release_date', 'review_count', 'rating_sum', 'average_rating',
+        'rating_1_count', 'rating_2_count', 'rating_3_count', 'rating_4_count', 'rating_5_count',
+    )
+    field_columns = {
+        'id': ('id',), 'movie_title': ('movie_title',), 'description': ('description',),
+        'release_date': ('release_date',), 'review_count': ('review_count',), 'rating_sum': ('rating_sum',),
+        'average_rating': ('average_rating',),
+        'rating_histogram': ('rating_1_count', 'rating_2_count', 'rating_3_count', 'rating_4_count', 'rating_5_count'),
+    }
+    expanded_columns = {}
+
+    def field_getters(self, prefix=''):
+        release_date = self.serializer_class().fields['release_date'].to_representation
+        histogram = [(str(rating), f'{prefix}rating_{rating}_count') for rating in range(1, 6)]
+        return {
+            'id': itemgetter(f'{prefix}id'),
+            'movie_title': itemgetter(f'{prefix}movie_title'),
+            'description': itemgetter(f'{prefix}description'),
+            'release_date': lambda row: release_date(row[f'{prefix}release_date']),
+            'review_count': itemgetter(f'{prefix}review_count'),
+            'rating_sum': itemgetter(f'{prefix}rating_sum'),
+            'average_rating': lambda row: float(row[f'{prefix}average_rating']),
+            'rating_histogram': lambda row: {rating: row[column] for rating, column in histogram},
+        }
+
+    def getters(self, fieldset):
+        getters = self.field_getters()
+        return [(name, getters[name]) for name in fieldset.fields]
+
+    def nested(self, prefix):
+        """
+        Getter of the whole movie from the columns of a related movie, named with ``prefix``.
+        """
+        getters = list(self.field_getters(prefix).items())
+        return lambda row: {name: get(row) for name, get in getters}
+
+    def __call__(self, rows, fieldset=None):
+        if fieldset is not None:
+            return sparse(rows, self.getters(fieldset))
+        release_date = self.serializer_class().fields['release_date'].to_representation
+        return [
+            {
+                'id': row['id'],
+                'movie_title': row['movie_title'],
+                'description': row['description'],
+                'release_date': release_date(row['release_date']),
+                'review_count': row['review_count'],
+                'rating_sum': row['rating_sum'],
+                'average_rating': float(row['average_rating']),
+                'rating_histogram': {
+                    '1': row['rating_1_count'], '2': row['rating_2_count'], '3': row['rating_3_count'],
+                    '4': row['rating_4_count'], '5': row['rating_5_count'],
+                },
+            }
+            for row in rows
+        ]
+
+
+def sparse(rows, getters):
+    return [{name: get(row) for name, get in getters} for row in rows]
+
+
+MOVIE_ROWS = MovieRows()
+ROW_FORMATS = {rows.serializer_class: rows for rows in (ReviewRows(), MOVIE_ROWS)}
+
+
+class RowListMixin:
+    """
+    List view mixin that serializes from ``values()`` rows when ``settings.FAST_LIST_SERIALIZATION`` is on.
+    """
+    def list(self, request, *args, **kwargs):
+        rows = ROW_FORMATS.get(self.get_serializer_class())
+        if rows is None or not getattr(settings, 'FAST_LIST_SERIALIZATION', False):
+            return super().list(request, *args, **kwargs)
+
+        fieldset = self.get_fieldset() if hasattr(self, 'get_fieldset') else None
+        queryset = self.filter_queryset(self.get_queryset())
+        columns = rows.columns if fieldset is None else self.get_fieldset_columns(queryset)
+        queryset = queryset.values(*columns)
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            with profiling.phase('serialize'):
+                data = rows(page, fieldset)
+            return self.get_paginated_response(data)
+        with profiling.phase('serialize'):
+            data = rows(queryset, fieldset)
+        return Response(data)
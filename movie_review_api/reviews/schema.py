@@ -0,0 +1,203 @@
+"""
+OpenAPI schema built once per version of the code, for ``/swagger/`` and ``/redoc/``.
+
+drf_yasg introspects every view, serializer and ``swagger_auto_schema`` on
+each request for the spec, the one the docs UIs load with ``?format=openapi``
+and the one client generators download. The spec only changes when the code
+does, so ``CachedSchemaMixin`` serves it from bytes rendered once per
+process and keyed by ``fingerprint()``: a hash of the routes and of the
+source of the modules that define their views, serializers, filters and
+paginators, plus the drf_yasg and DRF versions. The key is also the ETag, so
+a revalidating client gets a 304 for nothing.
+
+``manage.py build_openapi_schema`` writes the JSON and YAML for the current
+key to ``settings.OPENAPI_SCHEMA['DIR']`` at build time; CI can publish those
+files, and a process that finds the files for its key never generates the
+schema at all. Without them the first request generates it, under a lock so
+a burst of docs requests does it once.
+
+The schema is generated without a request, so it has no ``host`` and the UIs
+call the API on the host that served them; ``public`` is always on, as on
+the views in the URLconf. ``OPENAPI_SCHEMA = None`` goes back to generating
+on every request.
+"""
+import hashlib
+import json
+import os
+import sys
+import threading
+
+import drf_yasg
+import rest_framework
+from django.conf import settings
+from django.http import HttpResponse
+from django.urls import URLPattern, URLResolver, get_resolver
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import quote_etag
+from drf_yasg.app_settings import swagger_settings
+from drf_yasg.codecs import OpenAPICodecJson, OpenAPICodecYaml
+from drf_yasg.generators import OpenAPISchemaGenerator
+
+from . import docs
+
+
+CODECS = {'json': OpenAPICodecJson, 'yaml': OpenAPICodecYaml}
+
+# Classes whose definitions shape a view's part of the schema
+RELATED_CLASSES = ('serializer_class', 'filterset_class', 'pagination_class')
+
+_rendered = {}  # (key, codec) -> bytes
+_lock = threading.Lock()
+_fingerprint = None
+
+
+def _config():
+    return getattr(settings, 'OPENAPI_SCHEMA', None) or {}
+
+
+def _directory():
+    return _config().get('DIR') or os.path.join(settings.BASE_DIR, 'openapi')
+
+
+def _routes(patterns, prefix=''):
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            yield from _routes(pattern.url_patterns, prefix + str(pattern.pattern))
+        elif isinstance(pattern, URLPattern):
+            yield prefix + str(pattern.pattern), pattern.callback
+
+
+def _modules(view_class):
+    classes = list(view_class.__mro__)
+    for name in RELATED_CLASSES:
+        related = getattr(view_class, name, None)
+        if isinstance(related, type):
+            classes += related.__mro__
+    return {cls.__module__ for cls in classes}
+
+
+def fingerprint(urlconf=None):
+    """
+    Hash of everything the generated schema depends on; computed once per process for the default URLconf.
+    """
+    global _fingerprint
+    if urlconf is None and _fingerprint is not None:
+        return _fingerprint
+    digest = hashlib.sha1()
+    # Generating sets info.version, so the info is hashed as it is before
+    info = swagger_settings.DEFAULT_INFO
+    info = {**info, 'version': info._default_version}
+    digest.update(json.dumps(
+        [drf_yasg.__version__, rest_framework.VERSION, info, settings.SWAGGER_SETTINGS], sort_keys=True, default=str,
+    ).encode())
+
+    modules = set()
+    for route, callback in _routes(get_resolver(urlconf).url_patterns):
+        digest.update(f'{route} {callback.__module__}.{callback.__qualname__}\n'.encode())
+        view_class = getattr(callback, 'cls', None) or getattr(callback, 'view_class', None)
+        if view_class is not None:
+            modules |= _modules(view_class)
+    # Only the project's own source; libraries are covered by their versions
+    base_dir = str(settings.BASE_DIR)
+    for name in sorted(modules):
+        path = getattr(sys.modules.get(name), '__file__', None)
+        if path and path.startswith(base_dir):
+            with open(path, 'rb') as file:
+                digest.update(file.read())
+
+    key = digest.hexdigest()[:16]
+    if urlconf is None:
+        _fingerprint = key
+    return key
+
+
+class SchemaGenerator(OpenAPISchemaGenerator):
+    """
+    drf_yasg's generator, after handing it the views' ``swagger_auto_schema`` from reviews.docs.
+    """
+    def get_schema(self, request=None, public=False):
+        docs.load()
+        return super().get_schema(request, public)
+
+
+def generate():
+    """
+    The schema as drf_yasg would generate it for an anonymous request, minus the host.
+    """
+    generator = swagger_settings.DEFAULT_GENERATOR_CLASS(swagger_settings.DEFAULT_INFO, '', None)
+    return generator.get_schema(request=None, public=True)
+
+
+def artifact_path(key, codec, directory=None):
+    return os.path.join(directory or _directory(), f'openapi-{key}.{codec}')
+
+
+def build(directory=None):
+    """
+    Write the schema for the current key in every format and delete the files of other keys; returns the paths.
+    """
+    directory = directory or _directory()
+    os.makedirs(directory, exist_ok=True)
+    key = fingerprint()
+    schema = generate()
+    paths = []
+    for codec, codec_class in CODECS.items():
+        path = artifact_path(key, codec, directory)
+        with open(f'{path}.tmp', 'wb') as file:
+            file.write(codec_class([]).encode(schema))
+        os.replace(f'{path}.tmp', path)
+        paths.append(path)
+    for name in os.listdir(directory):
+        if name.startswith('openapi-') and os.path.join(directory, name) not in paths:
+            os.remove(os.path.join(directory, name))
+    return paths
+
+
+def rendered(codec):
+    """
+    The encoded schema for the current key: from memory, else the built file, else generated now.
+    """
+    key = fingerprint()
+    content = _rendered.get((key, codec))
+    if content is not None:
+        return key, content
+    with _lock:
+        if (key, codec) not in _rendered:
+            try:
+                with open(artifact_path(key, codec), 'rb') as file:
+                    _rendered[key, codec] = file.read()
+            except FileNotFoundError:
+                schema = generate()
+                for name, codec_class in CODECS.items():
+                    _rendered[key, name] = codec_class([]).encode(schema)
+    return key, _rendered[key, codec]
+
+
+def clear():
+    global _fingerprint
+    with _lock:
+        _rendered.clear()
+        _fingerprint = None
+
+
+class CachedSchemaMixin:
+    """
+    Mixin for a drf_yasg ``SchemaView`` that serves the spec formats from ``rendered()`` with an ETag.
+    The HTML of the UIs holds no schema and still goes through drf_yasg.
+    """
+    def get(self, request, version='', format=None):
+        codec_class = getattr(request.accepted_renderer, 'codec_class', None)
+        codec = next((name for name, cls in CODECS.items() if cls is codec_class), None)
+        if not _config() or codec is None:
+            return super().get(request, version, format)
+
+        renderer = request.accepted_renderer
+        key, content = rendered(codec)
+        etag = quote_etag(f'{key}-{renderer.format}')
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = HttpResponse(content, content_type=f'{renderer.media_type}; charset={renderer.charset}')
+        response['ETag'] = etag
+        patch_cache_control(response, max_age=_config().get('MAX_AGE', 0), must_revalidate=True)
+        patch_vary_headers(response, ['Accept'])
+        return response
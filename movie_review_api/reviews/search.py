@@ -0,0 +1,244 @@
+"""
+Full-text search over movie titles, movie descriptions and review content.
+
+On SQLite the text is indexed in FTS5 tables that mirror ``reviews_movie``
+and ``reviews_review`` (external content, so the text is not stored twice)
+and are kept in sync by triggers, which also covers ``bulk_create`` and
+``QuerySet.update()``. Matches are ranked with bm25 and every search term
+is treated as a prefix. Other database backends, or SQLite builds without
+FTS5, fall back to ``icontains`` filtering ordered by the default ordering.
+"""
+import re
+from contextlib import contextmanager
+
+from asgiref.sync import sync_to_async
+from django.db import connections
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from django.db.utils import OperationalError
+
+
+MOVIE_FTS_TABLE = 'reviews_movie_fts'
+REVIEW_FTS_TABLE = 'reviews_review_fts'
+
+# Title matches count for more than description matches when ranking movies
+MOVIE_TITLE_WEIGHT = 10.0
+MOVIE_DESCRIPTION_WEIGHT = 1.0
+
+_FTS_TABLES = {
+    MOVIE_FTS_TABLE: ('reviews_movie', ['movie_title', 'description']),
+    REVIEW_FTS_TABLE: ('reviews_review', ['review_content']),
+}
+
+_TERM_RE = re.compile(r'\w+', re.UNICODE)
+
+_available = {}
+
+
+def _trigger_sql(fts_table, content_table, columns):
+    cols = ', '.join(columns)
+    new_values = ', '.join(f'new.{col}' for col in columns)
+    old_values = ', '.join(f'old.{col}' for col in columns)
+    delete_row = (
+        f"INSERT INTO {fts_table}({fts_table}, rowid, {cols}) VALUES ('delete', old.id, {old_values});"
+    )
+    insert_row = f"INSERT INTO {fts_table}(rowid, {cols}) VALUES (new.id, {new_values});"
+    return {
+        'ai': f"CREATE TRIGGER {fts_table}_ai AFTER INSERT ON {content_table} BEGIN {insert_row} END",
+        'ad': f"CREATE TRIGGER {fts_table}_ad AFTER DELETE ON {content_table} BEGIN {delete_row} END",
+        # Only text changes touch the index; the rating aggregate updates on movies do not
+        'au': f"CREATE TRIGGER {fts_table}_au AFTER UPDATE OF {cols} ON {content_table} BEGIN "
+              f"{delete_row} {insert_row} END",
+    }
+
+
+def _index_sql(fts_table, content_table, columns):
+    cols = ', '.join(columns)
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts_table} USING fts5("
+        f"{cols}, content='{content_table}', content_rowid='id', "
+        f"tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+        *_trigger_sql(fts_table, content_table, columns).values(),
+    ]
+
+
+def install(connection, rebuild=True):
+    """
+    Create the FTS5 tables if they are missing and (re)create their sync triggers,
+    so trigger changes reach existing databases on the next migrate.
+    Does nothing on backends other than SQLite or when FTS5 is not compiled in.
+    """
+    if connection.vendor != 'sqlite':
+        return False
+
+    existing = set(connection.introspection.table_names())
+    try:
+        with connection.cursor() as cursor:
+            for fts_table, (content_table, columns) in _FTS_TABLES.items():
+                created = fts_table not in existing
+                _drop_triggers(cursor, fts_table)
+                for statement in _index_sql(fts_table, content_table, columns):
+                    cursor.execute(statement)
+                if created or rebuild:
+                    # Index whatever rows the content table already holds
+                    cursor.execute(f"INSERT INTO {fts_table}({fts_table}) VALUES ('rebuild')")
+    except OperationalError:
+        return False  # no such module: fts5
+    finally:
+        _available.pop(connection.alias, None)
+    return True
+
+
+def _drop_triggers(cursor, fts_table):
+    for suffix in ('ai', 'ad', 'au'):
+        cursor.execute(f'DROP TRIGGER IF EXISTS {fts_table}_{suffix}')
+
+
+def uninstall(connection):
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for fts_table in _FTS_TABLES:
+            _drop_triggers(cursor, fts_table)
+            cursor.execute(f'DROP TABLE IF EXISTS {fts_table}')
+    _available.pop(connection.alias, None)
+
+
+@contextmanager
+def deferred_indexing(connection, fts_table):
+    """
+    Index the rows inserted inside the block with one INSERT ... SELECT at the end
+    instead of the per-row trigger, several times faster for bulk loads.
+
+    Must run inside a transaction: the insert trigger is dropped and recreated
+    within it, so other connections never see it missing and a rollback puts it
+    back. Only rows with ids above the current maximum are indexed, so the
+    block has to let the database assign the ids.
+    """
+    if not is_available(connection.alias):
+        yield
+        return
+
+    assert connection.in_atomic_block, 'deferred_indexing() needs a transaction'
+    content_table, columns = _FTS_TABLES[fts_table]
+    cols = ', '.join(columns)
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT MAX(id) FROM {content_table}')
+        last_id = cursor.fetchone()[0] or 0
+        cursor.execute(f'DROP TRIGGER {fts_table}_ai')
+    yield
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {fts_table}(rowid, {cols}) SELECT id, {cols} FROM {content_table} WHERE id > %s',
+            [last_id],
+        )
+        cursor.execute(_trigger_sql(fts_table, content_table, columns)['ai'])
+
+
+def is_available(using='default'):
+    """
+    Whether the FTS5 index exists on the given database, checked once per process.
+    """
+    if using not in _available:
+        connection = connections[using]
+        _available[using] = (
+            connection.vendor == 'sqlite'
+            and set(_FTS_TABLES) <= set(connection.introspection.table_names())
+        )
+    return _available[using]
+
+
+async def ais_available(using='default'):
+    """
+    ``is_available`` for async code; only the first call per process leaves the event loop.
+    """
+    if using not in _available:
+        await sync_to_async(is_available)(using)
+    return _available[using]
+
+
+def search_terms(text):
+    return _TERM_RE.findall(text or '')
+
+
+def match_expression(text, column=None):
+    """
+    Turn user input into an FTS5 query where every term must match as a prefix.
+    Terms are quoted so FTS5 operators typed by the user are searched literally.
+    """
+    terms = search_terms(text)
+    if not terms:
+        return None
+    expression = ' '.join(f'"{term}"*' for term in terms)
+    if column:
+        expression = f'{{{column}}} : ({expression})'
+    return expression
+
+
+def _icontains(queryset, text, *fields):
+    # Fallback: every term has to appear in at least one of the fields
+    for term in search_terms(text):
+        condition = Q()
+        for field in fields:
+            condition |= Q(**{f'{field}__icontains': term})
+        queryset = queryset.filter(condition)
+    return queryset
+
+
+def _fts_matches(fts_table, match):
+    return RawSQL(f'SELECT rowid FROM {fts_table} WHERE {fts_table} MATCH %s', [match])
+
+
+def _fts_rank(queryset, fts_table, field, match, rank_sql):
+    # Rows whose FTS row matches, ranked by the bm25 of that row in a correlated subquery;
+    # bm25 scores are negative, so ascending order puts the best matches first
+    opts = queryset.model._meta
+    column = f'{opts.db_table}.{opts.get_field(field).column}'
+    rank = RawSQL(
+        f'SELECT {rank_sql} FROM {fts_table} WHERE {fts_table} MATCH %s AND {fts_table}.rowid = {column}', [match],
+    )
+    rank_alias = f'{fts_table}_rank'
+    queryset = queryset.filter(**{f'{field}__in': _fts_matches(fts_table, match)})
+    return queryset.annotate(**{rank_alias: rank}).order_by(rank_alias, 'id')
+
+
+def search_movies(queryset, text):
+    """
+    Movies whose title or description match, best matches first.
+    """
+    match = match_expression(text)
+    if match is None:
+        return queryset
+    if not is_available(queryset.db):
+        return _icontains(queryset, text, 'movie_title', 'description')
+    rank = f'bm25({MOVIE_FTS_TABLE}, {MOVIE_TITLE_WEIGHT}, {MOVIE_DESCRIPTION_WEIGHT})'
+    return _fts_rank(queryset, MOVIE_FTS_TABLE, 'id', match, rank)
+
+
+def search_reviews_by_movie_title(queryset, text, ranked=True):
+    """
+    Reviews of movies whose title matches, best matching titles first.
+    Pass ``ranked=False`` when another search orders the results; the title
+    matches are then only filtered on, without a bm25 rank per row.
+    """
+    match = match_expression(text, column='movie_title')
+    if match is None:
+        return queryset
+    if not is_available(queryset.db):
+        return _icontains(queryset, text, 'movie__movie_title')
+    if not ranked:
+        return queryset.filter(movie_id__in=_fts_matches(MOVIE_FTS_TABLE, match))
+    rank = f'bm25({MOVIE_FTS_TABLE}, {MOVIE_TITLE_WEIGHT}, {MOVIE_DESCRIPTION_WEIGHT})'
+    return _fts_rank(queryset, MOVIE_FTS_TABLE, 'movie', match, rank)
+
+
+def search_reviews(queryset, text):
+    """
+    Reviews whose content matches, most relevant first.
+    """
+    match = match_expression(text)
+    if match is None:
+        return queryset
+    if not is_available(queryset.db):
+        return _icontains(queryset, text, 'review_content')
+    return _fts_rank(queryset, REVIEW_FTS_TABLE, 'id', match, f'bm25({REVIEW_FTS_TABLE})')
@@ -1,6 +1,10 @@
+from collections import defaultdict
+
 from rest_framework import serializers
-from .models import Movie, Review
+from django.db import transaction
+from .models import Movie, MovieRanking, Review
 from django.contrib.auth.models import User
+from . import aggregates, caching, leaderboards, typeahead
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -31,7 +35,171 @@ class UserSerializer(serializers.ModelSerializer):
         return instance
 
 
-class ReviewSerializer(serializers.ModelSerializer):
+class MovieRelatedField(serializers.PrimaryKeyRelatedField):
+    """
+    Movie primary key field that uses ``context['movies']`` when a bulk request has already
+    fetched every referenced movie, instead of running one query per review.
+    """
+
+    def to_internal_value(self, data):
+        movies = self.context.get('movies')
+        if movies is None:
+            return super().to_internal_value(data)
+        if isinstance(data, bool):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        try:
+            movie = movies.get(int(data))
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        if movie is None:
+            self.fail('does_not_exist', pk_value=data)
+        return movie
+
+
+class BulkListSerializer(serializers.ListSerializer):
+    """
+    List serializer for the bulk endpoints, which build it themselves; ``many=True``
+    elsewhere keeps DRF's ``ListSerializer``.
+
+    Every item is validated on its own, so the valid ones can still be saved
+    while the invalid ones are reported back: ``errors`` has one entry per
+    item, empty for the valid ones, as with DRF's list serializer, and
+    ``save()`` saves the items at ``valid_indexes``. For updates ``instance``
+    is a dict of the existing objects by primary key and each item names its
+    object with ``id``.
+    """
+
+    def is_valid(self, *, raise_exception=False):
+        self.valid_indexes = []
+        self.valid_instances = []
+        validated = []
+        errors = []
+
+        for index, item in enumerate(self.initial_data):
+            try:
+                instance = self._instance_for(item)
+                self.child.instance = instance
+                self.child.initial_data = item
+                validated.append(self.child.run_validation(item))
+            except serializers.ValidationError as exc:
+                errors.append(exc.detail)
+            else:
+                errors.append({})
+                self.valid_indexes.append(index)
+                self.valid_instances.append(instance)
+        self.child.instance = None
+
+        self._validated_data = validated
+        self._errors = errors if any(errors) else []
+        if self._errors and raise_exception:
+            raise serializers.ValidationError(self.errors)
+        return not self._errors
+
+    def _instance_for(self, item):
+        if self.instance is None:
+            return None
+        if not isinstance(item, dict) or 'id' not in item:
+            raise serializers.ValidationError({'id': ['This field is required.']})
+        try:
+            return self.instance[int(item['id'])]
+        except (KeyError, TypeError, ValueError):
+            raise serializers.ValidationError({'id': [f'No object with id "{item["id"]}".']})
+
+
+class ReviewListSerializer(BulkListSerializer):
+
+    def create(self, validated_data):
+        # bulk_create skips the model signals, so keep the aggregates and caches current here
+        reviews = [Review(**attrs) for attrs in validated_data]
+        with transaction.atomic():
+            Review.objects.bulk_create(reviews)
+            added = defaultdict(list)
+            for review in reviews:
+                added[review.movie_id].append(review.rating)
+            aggregates.record_many({movie_id: (ratings, ()) for movie_id, ratings in added.items()})
+            leaderboards.record(added=[(review.movie_id, review.created_date) for review in reviews])
+        caching.bump('review')
+        return reviews
+
+    def update(self, instances, validated_data):
+        reviews = self.valid_instances
+        changes = defaultdict(lambda: ([], []))
+        moved = []
+        fields = set()
+        for review, attrs in zip(reviews, validated_data):
+            old_movie_id, old_rating = review.movie_id, review.rating
+            for field, value in attrs.items():
+                setattr(review, field, value)
+                fields.add(field)
+            if (old_movie_id, old_rating) != (review.movie_id, review.rating):
+                changes[old_movie_id][1].append(old_rating)
+                changes[review.movie_id][0].append(review.rating)
+            if old_movie_id != review.movie_id:
+                moved.append((old_movie_id, review))
+
+        with transaction.atomic():
+            if fields:
+                Review.objects.bulk_update(reviews, fields)
+            aggregates.record_many(changes)
+            leaderboards.record(
+                added=[(review.movie_id, review.created_date) for _, review in moved],
+                removed=[(movie_id, review.created_date) for movie_id, review in moved],
+                rated=list(changes),
+            )
+        caching.bump('review')
+        return reviews
+
+
+class MovieListSerializer(BulkListSerializer):
+
+    def create(self, validated_data):
+        movies = Movie.objects.bulk_create([Movie(**attrs) for attrs in validated_data])
+        caching.bump('movie')
+        typeahead.invalidate()
+        return movies
+
+    def update(self, instances, validated_data):
+        movies = self.valid_instances
+        fields = set()
+        for movie, attrs in zip(movies, validated_data):
+            for field, value in attrs.items():
+                setattr(movie, field, value)
+                fields.add(field)
+        if fields:
+            Movie.objects.bulk_update(movies, fields)
+        caching.bump('movie')
+        typeahead.invalidate()
+        return movies
+
+
+class SparseFieldsetSerializerMixin:
+    """
+    Serializer mixin that keeps only the fields of ``context['fieldset']``, with the ones it expands
+    nested, when it serializes the response itself rather than a nested object; see reviews.fieldsets.
+    """
+    def get_fields(self):
+        fields = super().get_fields()
+        fieldset = self.context.get('fieldset')
+        parent = self.parent.parent if isinstance(self.parent, serializers.ListSerializer) else self.parent
+        if fieldset is None or parent is not None:
+            return fields
+        for name in fieldset.expand:
+            fields[name] = self.get_expanded_field(name, fields[name])
+        return {name: fields[name] for name in fieldset.fields}
+
+    def get_expanded_field(self, name, field):
+        # Serializers with nested forms of some fields override this; any other field stays as it is
+        return field
+
+
+class ReviewUserSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = User
+        fields = ['id', 'username']
+
+
+class ReviewSerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
+    movie = MovieRelatedField(queryset=Movie.objects.all())
     movie_title = serializers.ReadOnlyField(source='movie.movie_title')  # Display the movie title
     user = serializers.ReadOnlyField(source='user.username')  # Display the user name of the person creating the review
 
@@ -50,9 +218,36 @@ class ReviewSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("Rating must be between 1 and 5.")
         return value
 
-class MovieSerializer(serializers.ModelSerializer):
+    def get_expanded_field(self, name, field):
+        # ?expand=movie,user nests the movie and the user in place of the movie id and the username
+        if name == 'movie':
+            return MovieSerializer(read_only=True)
+        if name == 'user':
+            return ReviewUserSerializer(read_only=True)
+        return super().get_expanded_field(name, field)
+
+class MovieSerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
+    rating_histogram = serializers.ReadOnlyField()  # Number of reviews per star rating
+
     class Meta:
         model = Movie
-        fields = ['id', 'movie_title', 'description', 'release_date']
+        fields = ['id', 'movie_title', 'description', 'release_date',
+                  'review_count', 'rating_sum', 'average_rating', 'rating_histogram']
+        read_only_fields = ['review_count', 'rating_sum', 'average_rating', 'rating_histogram']
+
+
+class MovieRankingSerializer(serializers.ModelSerializer):
+    movie = MovieSerializer(read_only=True)
+    score = serializers.SerializerMethodField()  # The score the leaderboard is ranked by
+
+    class Meta:
+        model = MovieRanking
+        fields = ['score', 'bayesian_rating', 'week_count', 'day_count', 'trending_score', 'movie']
+
+    def get_score(self, ranking):
+        return getattr(ranking, self.context['view'].score_field)
 
 
+class ScoredMovieSerializer(serializers.Serializer):
+    score = serializers.FloatField()  # Similarity to the movie, or the rating predicted for the user
+    movie = MovieSerializer()
@@ -0,0 +1,119 @@
+from django.contrib.auth import get_user_model
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.models import QuerySet
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+
+from . import aggregates, authentication, caching, changelog, leaderboards, search, typeahead
+from .models import Movie, Review
+
+
+def _movie_being_deleted(movie_id, origin):
+    # ``origin`` is what delete() was called on; nothing outlives the delete, even one that fails
+    if isinstance(origin, QuerySet):
+        return origin.model is Movie
+    return isinstance(origin, Movie) and origin.pk == movie_id
+
+
+@receiver(post_save, sender=Review)
+def update_movie_aggregates_on_save(sender, instance, created, raw=False, **kwargs):
+    """
+    Keep the movie rating aggregates in step with a created or edited review.
+    """
+    if raw:
+        return  # Fixtures are loaded as-is, run rebuild_movie_aggregates afterwards
+
+    old_rating = getattr(instance, '_loaded_rating', None)
+    old_movie_id = getattr(instance, '_loaded_movie_id', None)
+
+    review = (instance.movie_id, instance.created_date)
+    if created:
+        aggregates.record_ratings(instance.movie_id, added=[instance.rating])
+        leaderboards.record(added=[review])
+    elif old_rating is None or old_movie_id is None:
+        # The previous values were never loaded, so recount this movie instead of guessing
+        aggregates.rebuild(movie_ids=[instance.movie_id])
+        leaderboards.record(rated=[instance.movie_id])
+    elif old_movie_id != instance.movie_id:
+        aggregates.record_ratings(old_movie_id, removed=[old_rating])
+        aggregates.record_ratings(instance.movie_id, added=[instance.rating])
+        leaderboards.record(added=[review], removed=[(old_movie_id, instance.created_date)])
+    elif old_rating != instance.rating:
+        aggregates.record_ratings(instance.movie_id, added=[instance.rating], removed=[old_rating])
+        leaderboards.record(rated=[instance.movie_id])
+
+    instance._loaded_rating = instance.rating
+    instance._loaded_movie_id = instance.movie_id
+
+
+@receiver(post_delete, sender=Review)
+def update_movie_aggregates_on_delete(sender, instance, origin=None, **kwargs):
+    """
+    Remove a deleted review from its movie's aggregates, including reviews removed by CASCADE.
+    """
+    if _movie_being_deleted(instance.movie_id, origin):
+        return  # Skips the UPDATEs per review when a whole movie goes, its ranking goes with it
+    aggregates.record_ratings(instance.movie_id, removed=[instance.rating])
+    leaderboards.record(removed=[(instance.movie_id, instance.created_date)])
+
+
+@receiver(post_save, sender=Movie)
+@receiver(post_delete, sender=Movie)
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+@receiver(post_save, sender=get_user_model())
+@receiver(post_delete, sender=get_user_model())
+def invalidate_cached_responses(sender, **kwargs):
+    """
+    Move the model's cache version on, so cached responses built from the old rows are never served again.
+    """
+    caching.bump(sender._meta.model_name)
+
+
+@receiver(post_save, sender=Movie)
+def update_title_index_on_save(sender, instance, raw=False, **kwargs):
+    """
+    Put the saved title into this process's typeahead index and have the others rebuild theirs.
+    """
+    if raw:
+        typeahead.invalidate()
+    else:
+        typeahead.movie_saved(instance)
+
+
+@receiver(post_delete, sender=Movie)
+def update_title_index_on_delete(sender, instance, **kwargs):
+    typeahead.movie_deleted(instance)
+
+
+@receiver(post_save, sender=get_user_model())
+@receiver(post_delete, sender=get_user_model())
+def forget_cached_user(sender, instance, **kwargs):
+    """
+    Drop the user from this process's JWT user cache, so a deactivation takes effect on the next request.
+    """
+    authentication.user_cache.invalidate(str(instance.pk))
+
+
+@receiver(post_save, sender=BlacklistedToken)
+@receiver(post_delete, sender=BlacklistedToken)
+def invalidate_revoked_token_filter(sender, **kwargs):
+    """
+    Tell every process's revoked token filter to pick up the blacklist change.
+    """
+    caching.bump('blacklistedtoken')
+
+
+def ensure_search_index(sender, using=DEFAULT_DB_ALIAS, **kwargs):
+    """
+    SQLite drops triggers when a migration rebuilds a table, so put the search index triggers back.
+    """
+    search.install(connections[using], rebuild=False)
+
+
+def ensure_change_log(sender, using=DEFAULT_DB_ALIAS, **kwargs):
+    """
+    Put the change log triggers back after migrations too, as for the search index.
+    """
+    changelog.install(connections[using], backfill=False)
@@ -0,0 +1,96 @@
+"""
+Production tuning for SQLite connections.
+
+``configure_connection`` runs on every new connection (Django's
+``connection_created`` signal) and applies ``settings.SQLITE_PRAGMAS``:
+WAL so readers and the writer stop blocking each other, ``synchronous =
+NORMAL`` which is safe from corruption in WAL mode, a memory map for reads
+and a busy timeout so writers queue for the lock instead of failing with
+"database is locked". Connections are kept open between requests with
+``CONN_MAX_AGE``, so the pragmas are paid for once per connection, not per
+request.
+
+The profile only applies with ``SQLITE_PROFILE=production`` in the
+environment, see settings: otherwise ``SQLITE_PRAGMAS`` is None, connections
+close after each request and the checks below have nothing to compare, so
+tests and management commands leave the database file as it is.
+
+``check_pragmas`` compares a live connection against the settings. It runs
+as a database system check (``manage.py check --database default``, and
+before ``migrate``) and from ``verify_startup``, which refuses to serve
+with a misconfigured database; reviews.startup.prepare_worker runs it when
+a worker starts.
+"""
+from django.conf import settings
+from django.core import checks
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connections
+
+
+# PRAGMA synchronous reads back as a number
+SYNCHRONOUS_LEVELS = {'0': 'OFF', '1': 'NORMAL', '2': 'FULL', '3': 'EXTRA'}
+
+
+def pragmas():
+    return getattr(settings, 'SQLITE_PRAGMAS', None) or {}
+
+
+def configure_connection(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for name, value in pragmas().items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+
+
+def _normalize(name, value):
+    value = str(value).upper()
+    return SYNCHRONOUS_LEVELS.get(value, value) if name == 'synchronous' else value
+
+
+def check_pragmas(connection):
+    """
+    Return a message for every pragma whose live value differs from ``SQLITE_PRAGMAS``.
+    """
+    problems = []
+    with connection.cursor() as cursor:
+        for name, expected in pragmas().items():
+            if name == 'journal_mode' and connection.is_in_memory_db():
+                continue  # In-memory databases only have a memory journal
+            cursor.execute(f'PRAGMA {name}')
+            row = cursor.fetchone()
+            actual = row[0] if row else None
+            if _normalize(name, actual) != _normalize(name, expected):
+                problems.append(f'PRAGMA {name} is {actual}, expected {expected}')
+    return problems
+
+
+def sqlite_profile_check(app_configs=None, databases=None, **kwargs):
+    errors = []
+    for alias in databases or ():
+        connection = connections[alias]
+        if connection.vendor != 'sqlite':
+            continue
+        for problem in check_pragmas(connection):
+            errors.append(checks.Error(f'{problem} on database {alias!r}.', id='reviews.E001'))
+        if pragmas() and not connection.settings_dict['CONN_MAX_AGE'] and not connection.is_in_memory_db():
+            errors.append(checks.Warning(
+                f'Database {alias!r} opens a new connection for every request.',
+                hint='Set CONN_MAX_AGE so connections and their pragmas are reused.',
+                id='reviews.W001',
+            ))
+    return errors
+
+
+def verify_startup():
+    """
+    Check every configured SQLite database, raising ImproperlyConfigured on the first mismatch.
+    """
+    for alias in connections:
+        connection = connections[alias]
+        if connection.vendor != 'sqlite':
+            continue
+        problems = check_pragmas(connection)
+        connection.close()  # Nothing opened here outlives startup, e.g. into forked workers
+        if problems:
+            raise ImproperlyConfigured(f'Database {alias!r}: ' + '; '.join(problems))
@@ -0,0 +1,150 @@
+"""
+Worker start-up: where the import time goes, and a warm-up before the first request.
+
+``import_times`` runs ``python -X importtime`` on the WSGI or ASGI module in a
+fresh interpreter and returns the cost of every module imported on the way;
+``manage.py profile_imports`` prints the most expensive ones and the total
+per top-level package.
+
+Django defers a lot of one-off work to the first request: importing the
+URLconf, and with it every view, serializer and filter, resolving the
+``REST_FRAMEWORK`` import strings, opening the database connections and
+running their pragmas, compiling the first SQL statements. A freshly scaled
+worker pays for all of it on a live request. ``warm_up`` does it up front
+when ``settings.WARMUP`` is set:
+
+``CONNECTIONS``  open a connection on every database
+``URLS``         paths requested through the whole middleware stack, which also fills the response cache
+``TYPEAHEAD``    build the movie-title index of reviews.typeahead
+
+``prepare_worker`` checks the SQLite settings with
+``reviews.sqlite.verify_startup``, then warms up. wsgi.py and asgi.py call it
+once the apps are loaded, but only when ``settings.PREPARE_WORKER`` is set
+(``PREPARE_WORKER=1`` in the environment), so importing them has no side
+effects. A server hook such as gunicorn's ``post_worker_init`` can call it
+instead.
+
+Connections and the per-worker caches only help the process they were made
+in. A worker forked from a warmed process (gunicorn ``--preload``) drops the
+inherited connections instead of sharing them, and opens its own on its
+first request.
+
+The documentation tooling is the other large start-up cost, and loads only
+when its routes are hit, see reviews.docs. ``manage.py bench_cold_start``
+measures the time to the first response.
+"""
+import logging
+import os
+import re
+import subprocess
+import sys
+import time
+from collections import namedtuple
+
+from django.conf import settings
+from django.db import connections
+from django.urls import get_resolver
+from rest_framework.settings import api_settings
+
+from . import sqlite, typeahead
+
+
+logger = logging.getLogger(__name__)
+
+ImportTime = namedtuple('ImportTime', ['module', 'self_us', 'cumulative_us', 'depth'])
+
+IMPORT_TIME_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \| ( *)(\S+)$')
+
+
+def _config():
+    return getattr(settings, 'WARMUP', None) or {}
+
+
+def import_times(module='movie_review_api.wsgi'):
+    """
+    Cost of every module a fresh interpreter imports to set up Django and import ``module``, in import order.
+    """
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import django; django.setup(); import {module}'],
+        cwd=settings.BASE_DIR, capture_output=True, text=True,
+        env={**os.environ, 'DJANGO_SETTINGS_MODULE': os.environ.get('DJANGO_SETTINGS_MODULE', 'movie_review_api.settings')},
+    )
+    if result.returncode:
+        raise RuntimeError(f'Importing {module} failed:\n{result.stderr[-2000:]}')
+    times = []
+    for line in result.stderr.splitlines():
+        match = IMPORT_TIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            times.append(ImportTime(name, int(self_us), int(cumulative_us), len(indent) // 2))
+    return times
+
+
+def _host():
+    # A host the request passes ALLOWED_HOSTS with
+    for host in settings.ALLOWED_HOSTS:
+        host = host.lstrip('.')
+        if host and host != '*':
+            return host
+    return 'localhost'
+
+
+def _drop_inherited_connections():
+    # A forked worker must neither use nor close its parent's connections
+    for connection in connections.all(initialized_only=True):
+        connection.connection = None
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_drop_inherited_connections)
+
+
+def prepare_worker():
+    """
+    Refuse to serve from a misconfigured database, then warm up; returns the seconds per warm-up step.
+    """
+    sqlite.verify_startup()
+    return warm_up()
+
+
+def warm_up():
+    """
+    Do the first request's one-off work now, as ``settings.WARMUP`` says; returns the seconds per step.
+    """
+    config = _config()
+    if not config:
+        return {}
+    timings = {}
+
+    def step(name, func):
+        start = time.perf_counter()
+        try:
+            func()
+        except Exception:
+            logger.exception('Warm-up step %s failed', name)
+        timings[name] = time.perf_counter() - start
+
+    # Imports every view, serializer and filter; the reverse lookups are built on first use too
+    step('urls', lambda: get_resolver().reverse_dict)
+    step('rest_framework', lambda: [getattr(api_settings, name) for name in api_settings.import_strings])
+    if config.get('CONNECTIONS', True):
+        step('connections', lambda: [connections[alias].ensure_connection() for alias in connections])
+    if config.get('URLS'):
+        step('requests', lambda: _request(config['URLS']))
+    if config.get('TYPEAHEAD'):
+        step('typeahead', typeahead.get_index)
+
+    logger.info('Warm-up took %.1f ms: %s', sum(timings.values()) * 1000,
+                ', '.join(f'{name} {seconds * 1000:.1f} ms' for name, seconds in timings.items()))
+    return timings
+
+
+def _request(urls):
+    # django.test is already loaded by simplejwt; its client runs the full middleware stack
+    from django.test import Client
+
+    client = Client(raise_request_exception=False, HTTP_HOST=_host())
+    for url in urls:
+        response = client.get(url)
+        if response.status_code >= 400:
+            logger.warning('Warm-up request to %s answered %s', url, response.status_code)
@@ -1,3 +1,1966 @@
-from django.test import TestCase
+import csv
+import gzip
+import importlib
+import io
+import json
+import math
+import os
+import random
+import tempfile
+import threading
+import time
+import warnings
+from datetime import date, datetime, timedelta, timezone
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.apps import apps as django_apps
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection, connections, transaction
+from django.db.models.signals import post_delete
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import get_resolver, reverse
+from rest_framework import serializers
+from rest_framework.exceptions import ErrorDetail
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient, APITestCase
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from . import (
+    admission, aggregates, async_views, authentication, benchmarks, caching, changelog, export, fieldsets, importer,
+    ingest, leaderboards, loadtest, profiling, query_plans, recommendations, renderers, replicas, schema, search,
+    sqlite, startup, typeahead, views,
+)
+from .budgets import QueryBudgetExceeded, count_queries
+from .models import IngestLog, LeaderboardState, Movie, MovieRanking, Review, ReviewActivity
+from .permissions import IsOwnerOrReadOnly
+from .serializers import MovieSerializer, ReviewListSerializer, ReviewSerializer
+
+
+def make_movie(title='Inception', **kwargs):
+    return Movie.objects.create(
+        movie_title=title,
+        description=kwargs.pop('description', f'{title} description'),
+        release_date=kwargs.pop('release_date', date(2010, 7, 16)),
+        **kwargs,
+    )
+
+
+class MovieAggregateTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='alice')
+        self.movie = make_movie()
+        self.client.force_authenticate(self.user)
+
+    def test_aggregate_writes_go_to_the_primary_while_reads_use_a_replica(self):
+        with replicas.reading_from('replica2'):  # Not a configured database, so using it would raise
+            aggregates.record_many({self.movie.pk: ([4, 5], ())})
+        self.assertAggregates(self.movie, 2, 9, {4: 1, 5: 1})
+
+    def assertAggregates(self, movie, count, total, histogram):
+        movie.refresh_from_db()
+        self.assertEqual(movie.review_count, count)
+        self.assertEqual(movie.rating_sum, total)
+        self.assertAlmostEqual(movie.average_rating, total / count if count else 0.0)
+        self.assertEqual(movie.rating_histogram, {str(r): histogram.get(r, 0) for r in range(1, 6)})
+
+    def test_create_update_delete_through_api(self):
+        url = reverse('review-list-create')
+        first = self.client.post(url, {'movie': self.movie.pk, 'review_content': 'Great', 'rating': 5})
+        self.client.post(url, {'movie': self.movie.pk, 'review_content': 'Fine', 'rating': 3})
+        self.assertAggregates(self.movie, 2, 8, {5: 1, 3: 1})
+
+        detail = reverse('review-detail', args=[first.data['id']])
+        self.client.patch(detail, {'rating': 2})
+        self.assertAggregates(self.movie, 2, 5, {2: 1, 3: 1})
+
+        self.client.delete(detail)
+        self.assertAggregates(self.movie, 1, 3, {3: 1})
+
+    def test_moving_review_to_another_movie(self):
+        other = make_movie('Heat')
+        review = Review.objects.create(movie=self.movie, user=self.user, review_content='x', rating=4)
+        review = Review.objects.get(pk=review.pk)
+        review.movie = other
+        review.save()
+        self.assertAggregates(self.movie, 0, 0, {})
+        self.assertAggregates(other, 1, 4, {4: 1})
+
+    def test_cascade_from_user_delete(self):
+        bob = User.objects.create_user(username='bob')
+        Review.objects.create(movie=self.movie, user=self.user, review_content='x', rating=4)
+        Review.objects.create(movie=self.movie, user=bob, review_content='y', rating=1)
+        bob.delete()
+        self.assertAggregates(self.movie, 1, 4, {4: 1})
+
+    def test_failed_movie_delete_leaves_review_deletes_counted(self):
+        first = Review.objects.create(movie=self.movie, user=self.user, review_content='x', rating=4)
+        Review.objects.create(movie=self.movie, user=self.user, review_content='y', rating=2)
+
+        def fail(sender, **kwargs):
+            raise RuntimeError('delete failed')
+        post_delete.connect(fail, sender=Review)
+        try:
+            with self.assertRaises(RuntimeError), transaction.atomic():
+                self.movie.delete()
+        finally:
+            post_delete.disconnect(fail, sender=Review)
+
+        Review.objects.get(pk=first.pk).delete()
+        self.assertAggregates(self.movie, 1, 2, {2: 1})
+
+    def test_movie_serializer_exposes_aggregates(self):
+        Review.objects.create(movie=self.movie, user=self.user, review_content='x', rating=4)
+        response = self.client.get(reverse('movie-detail', args=[self.movie.pk]))
+        self.assertEqual(response.data['review_count'], 1)
+        self.assertEqual(response.data['average_rating'], 4.0)
+        self.assertEqual(response.data['rating_histogram']['4'], 1)
+
+    def test_movie_list_sort_and_filter_on_aggregates(self):
+        other = make_movie('Heat')
+        Review.objects.create(movie=self.movie, user=self.user, review_content='x', rating=2)
+        Review.objects.create(movie=other, user=self.user, review_content='y', rating=5)
+        url = reverse('movie-list-create')
+
+        response = self.client.get(url, {'ordering': '-average_rating'})
+        self.assertEqual([m['movie_title'] for m in response.data['results']], ['Heat', 'Inception'])
+
+        response = self.client.get(url, {'min_rating': 4})
+        self.assertEqual([m['movie_title'] for m in response.data['results']], ['Heat'])
+
+
+class RebuildMovieAggregatesCommandTests(TestCase):
+    def test_verify_detects_and_rebuild_repairs_drift(self):
+        user = User.objects.create_user(username='alice')
+        movie = make_movie()
+        Review.objects.create(movie=movie, user=user, review_content='x', rating=3)
+        # QuerySet.update() bypasses the signals, so the aggregates drift
+        Review.objects.update(rating=5)
+
+        with self.assertRaises(CommandError):
+            call_command('rebuild_movie_aggregates', '--verify', stdout=StringIO())
+
+        call_command('rebuild_movie_aggregates', stdout=StringIO())
+        movie.refresh_from_db()
+        self.assertEqual((movie.review_count, movie.rating_sum, movie.rating_5_count), (1, 5, 1))
+        call_command('rebuild_movie_aggregates', '--verify', stdout=StringIO())
+
+
+class ConcurrentAggregateTests(TransactionTestCase):
+    def test_parallel_review_writes_do_not_lose_increments(self):
+        movie = make_movie()
+        users = [User.objects.create_user(username=f'user{i}') for i in range(4)]
+        per_thread = 25
+        errors = []
+
+        def write_reviews(user):
+            try:
+                for i in range(per_thread):
+                    Review.objects.create(movie=movie, user=user, review_content='x', rating=i % 5 + 1)
+            except Exception as exc:  # Surface failures from the worker thread
+                errors.append(exc)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=write_reviews, args=(user,)) for user in users]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        movie.refresh_from_db()
+        self.assertEqual(movie.review_count, len(users) * per_thread)
+        self.assertEqual(movie.rating_sum, len(users) * 75)
+        self.assertEqual(movie.rating_histogram, {str(r): len(users) * 5 for r in range(1, 6)})
+
+
+class FullTextSearchTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='alice')
+        self.inception = make_movie('Inception', description='A thief who steals corporate secrets through dreams')
+        self.interstellar = make_movie('Interstellar', description='Explorers travel through a wormhole')
+        self.heat = make_movie('Heat', description='A group of professional bank robbers')
+        Review.objects.create(movie=self.inception, user=self.user, review_content='Mind bending dream heist', rating=5)
+        Review.objects.create(movie=self.interstellar, user=self.user, review_content='Beautiful space epic', rating=4)
+        Review.objects.create(movie=self.heat, user=self.user, review_content='Classic heist thriller', rating=4)
+
+    def search(self, **params):
+        response = self.client.get(reverse('review-search'), params)
+        self.assertEqual(response.status_code, 200)
+        return response.data['results']
+
+    def test_search_index_is_installed(self):
+        self.assertTrue(search.is_available())
+
+    def test_movie_title_prefix_search(self):
+        titles = {r['movie_title'] for r in self.search(movie_title='int')}
+        self.assertEqual(titles, {'Interstellar'})
+        titles = {r['movie_title'] for r in self.search(movie_title='in')}
+        self.assertEqual(titles, {'Inception', 'Interstellar'})
+
+    def test_review_content_search_ranked_and_combined_with_rating(self):
+        self.assertEqual({r['movie_title'] for r in self.search(q='heist')}, {'Inception', 'Heat'})
+        self.assertEqual([r['movie_title'] for r in self.search(q='heist', rating=4)], ['Heat'])
+
+    def test_index_follows_updates_and_deletes(self):
+        self.inception.movie_title = 'Dreamscape'
+        self.inception.save()
+        self.assertEqual(self.search(movie_title='inception'), [])
+        self.assertEqual(len(self.search(movie_title='dreams')), 1)
+
+        Review.objects.filter(movie=self.heat).delete()
+        self.assertEqual({r['movie_title'] for r in self.search(q='heist')}, {'Dreamscape'})
+
+    def test_user_input_is_not_parsed_as_fts_syntax(self):
+        self.assertEqual(self.search(q='heist" OR "space'), [])
+        self.assertEqual(len(self.search(q='NEAR(')), 0)
+
+    def test_movie_search_ranks_title_matches_first(self):
+        make_movie('Thief', description='A safecracker')
+        response = self.client.get(reverse('movie-list-create'), {'search': 'thief'})
+        self.assertEqual([m['movie_title'] for m in response.data['results']], ['Thief', 'Inception'])
+
+    def test_blank_terms_list_in_the_default_order(self):
+        movies = self.client.get(reverse('movie-list-create')).data['results']
+        reviews = self.search()
+        with warnings.catch_warnings():
+            warnings.simplefilter('error')
+            for term in ['', '   ', '"*']:
+                response = self.client.get(reverse('movie-list-create'), {'search': term})
+                self.assertEqual(response.data['results'], movies)
+                self.assertIn('next', response.data)
+                self.assertNotIn('count', response.data)
+                self.assertEqual(self.search(movie_title=term, q=term), reviews)
+
+    def test_fallback_without_index(self):
+        queryset = search._icontains(Review.objects.all(), 'heist class', 'review_content')
+        self.assertEqual([r.movie_id for r in queryset], [self.heat.pk])
+
+
+class KeysetPaginationTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='alice')
+        self.movie = make_movie()
+        self.reviews = [
+            Review.objects.create(movie=self.movie, user=self.user, review_content=f'Review {i}', rating=i % 5 + 1)
+            for i in range(7)
+        ]
+
+    def walk(self, url, params=None):
+        ids, pages = [], 0
+        response = self.client.get(url, params)
+        while True:
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn('count', response.data)
+            ids += [item['id'] for item in response.data['results']]
+            pages += 1
+            if not response.data['next']:
+                return ids, pages
+            response = self.client.get(response.data['next'])
+
+    def test_review_list_walks_in_created_order(self):
+        ids, pages = self.walk(reverse('review-list-create'), {'page_size': 3})
+        self.assertEqual(ids, [review.pk for review in self.reviews])
+        self.assertEqual(pages, 3)
+
+    def test_previous_link_returns_the_earlier_page(self):
+        url = reverse('review-list-create')
+        first = self.client.get(url, {'page_size': 3})
+        self.assertIsNone(first.data['previous'])
+        second = self.client.get(first.data['next'])
+        back = self.client.get(second.data['previous'])
+        self.assertEqual(back.data['results'], first.data['results'])
+        self.assertIsNone(back.data['previous'])
+
+    def test_rows_inserted_while_paging_are_not_repeated(self):
+        url = reverse('review-list-create')
+        first = self.client.get(url, {'page_size': 3})
+        Review.objects.filter(pk=self.reviews[0].pk).delete()
+        late = Review.objects.create(movie=self.movie, user=self.user, review_content='Late', rating=3)
+        ids = [item['id'] for item in first.data['results']]
+        response = self.client.get(first.data['next'])
+        while True:
+            ids += [item['id'] for item in response.data['results']]
+            if not response.data['next']:
+                break
+            response = self.client.get(response.data['next'])
+        self.assertEqual(ids, [review.pk for review in self.reviews] + [late.pk])
+
+    def test_timestamp_ties_are_broken_by_id(self):
+        Review.objects.update(created_date=self.reviews[0].created_date)
+        ids, _ = self.walk(reverse('review-search'), {'rating': '', 'page_size': 2})
+        self.assertEqual(ids, sorted(review.pk for review in self.reviews))
+
+    def test_movie_list_cursor_follows_requested_ordering(self):
+        for title, rating in [('Heat', 5), ('Alien', 1), ('Up', 4)]:
+            movie = make_movie(title)
+            Review.objects.create(movie=movie, user=self.user, review_content='x', rating=rating)
+        ids, _ = self.walk(reverse('movie-list-create'), {'ordering': '-average_rating', 'page_size': 1})
+        expected = list(Movie.objects.order_by('-average_rating', 'id').values_list('id', flat=True))
+        self.assertEqual(ids, expected)
+
+    def test_invalid_cursor_is_rejected(self):
+        response = self.client.get(reverse('review-list-create'), {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 404)
+
+
+@override_settings(QUERY_BUDGET_MODE='raise')
+class QueryBudgetTests(APITestCase):
+    """
+    Every request runs under its view's query_budget, so an N+1 raises QueryBudgetExceeded.
+    """
+    def setUp(self):
+        search.is_available()  # Warm the per-process index check
+        users = [User.objects.create_user(username=f'user{i}') for i in range(10)]
+        self.movies = [make_movie(f'Movie {i}') for i in range(10)]
+        self.reviews = [
+            Review.objects.create(movie=movie, user=user, review_content='x', rating=3)
+            for movie, user in zip(self.movies, users)
+        ]
+        token = RefreshToken.for_user(users[0]).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def test_review_endpoints(self):
+        review = self.reviews[0]
+        detail = reverse('review-detail', args=[review.pk])
+        self.assertEqual(self.client.get(reverse('review-list-create')).status_code, 200)
+        self.assertEqual(self.client.get(detail).status_code, 200)
+        response = self.client.post(
+            reverse('review-list-create'), {'movie': self.movies[1].pk, 'review_content': 'y', 'rating': 4})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.client.patch(detail, {'rating': 5}).status_code, 200)
+        response = self.client.put(detail, {'movie': self.movies[2].pk, 'review_content': 'z', 'rating': 1})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.delete(detail).status_code, 204)
+
+    def test_search_and_movie_endpoints(self):
+        for params in ({}, {'rating': 3}, {'movie_title': 'movie'}, {'q': 'x', 'rating': 3}):
+            self.assertEqual(self.client.get(reverse('review-search'), params).status_code, 200)
+        for params in ({}, {'search': 'movie'}, {'ordering': '-average_rating'}):
+            self.assertEqual(self.client.get(reverse('movie-list-create'), params).status_code, 200)
+        detail = reverse('movie-detail', args=[self.movies[0].pk])
+        self.assertEqual(self.client.get(detail).status_code, 200)
+        # Movies have no owner, so no user may change or delete them
+        self.assertEqual(self.client.patch(detail, {'description': 'Changed'}).status_code, 403)
+        self.assertEqual(self.client.delete(detail).status_code, 403)
+        self.assertTrue(Movie.objects.filter(pk=self.movies[0].pk).exists())
+        response = self.client.post(
+            reverse('movie-list-create'), {'movie_title': 'New', 'description': 'd', 'release_date': '2020-01-01'})
+        self.assertEqual(response.status_code, 201)
+
+    def test_signup(self):
+        self.client.credentials()
+        response = self.client.post(
+            reverse('signup'), {'username': 'carol', 'email': 'carol@example.com', 'password': 'Secret-123'})
+        self.assertEqual(response.status_code, 201)
+
+    def test_list_cost_does_not_grow_with_page_size(self):
+        url = reverse('review-list-create')
+        self.client.get(url, {'page_size': 2})  # Caches the JWT user
+        with count_queries() as small:
+            self.client.get(url, {'page_size': 1})
+        with count_queries() as large:
+            self.client.get(url, {'page_size': 10})
+        self.assertEqual(small.count, large.count)
+
+    def test_over_budget_raises_or_logs(self):
+        with mock.patch.object(views.ReviewListCreate, 'query_budget', {'GET': 0}):
+            with self.assertRaises(QueryBudgetExceeded):
+                self.client.get(reverse('review-list-create'))
+            with override_settings(QUERY_BUDGET_MODE='log'), self.assertLogs('reviews.budgets', 'WARNING'):
+                self.client.get(reverse('review-list-create'), {'page_size': 2})
+
+    def test_every_api_view_declares_a_budget(self):
+        for pattern in get_resolver('reviews.urls').url_patterns:
+            view_class = pattern.callback.view_class
+            if view_class.__module__ != views.__name__:
+                continue  # simplejwt token views
+            methods = [m.upper() for m in view_class.http_method_names if hasattr(view_class, m)]
+            for method in set(methods) - {'OPTIONS', 'HEAD'}:
+                with self.subTest(view=view_class.__name__, method=method):
+                    self.assertIsNotNone(view_class().get_query_budget(method))
+
+
+class ResponseCacheTests(APITestCase):
+    def setUp(self):
+        caches['default'].clear()
+        self.user = User.objects.create_user(username='alice')
+        self.movie = make_movie()
+        self.review = Review.objects.create(movie=self.movie, user=self.user, review_content='Great', rating=5)
+        self.url = reverse('movie-detail', args=[self.movie.pk])
+
+    def test_hit_skips_the_database(self):
+        first = self.client.get(self.url)
+        with self.assertNumQueries(0):
+            second = self.client.get(self.url)
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(second['ETag'], first['ETag'])
+
+    def test_writes_invalidate_dependent_responses(self):
+        reviews_url = reverse('review-detail', args=[self.review.pk])
+        self.client.get(self.url)
+        self.client.get(reviews_url)
+
+        self.client.force_authenticate(self.user)
+        self.client.patch(reviews_url, {'rating': 1})
+        self.client.force_authenticate(None)
+        self.assertEqual(self.client.get(self.url).json()['average_rating'], 1.0)
+
+        self.user.username = 'alice2'
+        self.user.save()
+        self.assertEqual(self.client.get(reviews_url).json()['user'], 'alice2')
+
+    def test_conditional_get(self):
+        first = self.client.get(self.url)
+        self.assertIn('Last-Modified', first)
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+        Movie.objects.filter(pk=self.movie.pk).first().save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], first['ETag'])
+
+    def test_write_in_the_same_second_is_not_hidden_by_if_modified_since(self):
+        # Every version from the same second
+        with mock.patch.object(caching, '_new_token', side_effect=lambda: (1_700_000_000.25, os.urandom(8).hex())):
+            first = self.client.get(self.url)
+            Movie.objects.filter(pk=self.movie.pk).update(description='Changed')
+            Movie.objects.get(pk=self.movie.pk).save()
+            response = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=first['Last-Modified'])
+        self.assertEqual(response['Last-Modified'], first['Last-Modified'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['description'], 'Changed')
+
+    def test_query_string_is_part_of_the_key(self):
+        make_movie('Heat')
+        url = reverse('movie-list-create')
+        self.assertEqual(len(self.client.get(url, {'page_size': 1}).json()['results']), 1)
+        self.assertEqual(len(self.client.get(url, {'page_size': 2}).json()['results']), 2)
+
+    def test_file_based_backend(self):
+        with tempfile.TemporaryDirectory() as directory:
+            backend = {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': directory}
+            with override_settings(CACHES={'default': backend}):
+                first = self.client.get(self.url)
+                with self.assertNumQueries(0):
+                    self.assertEqual(self.client.get(self.url).content, first.content)
+                self.movie.save()
+                self.assertNotEqual(self.client.get(self.url)['ETag'], first['ETag'])
+
+
+@override_settings(QUERY_BUDGET_MODE='raise')
+class BulkEndpointTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='alice')
+        self.movies = [make_movie(f'Movie {i}') for i in range(3)]
+        self.client.force_authenticate(self.user)
+
+    def test_bulk_create_reviews_reports_errors_per_item(self):
+        items = [
+            {'movie': self.movies[0].pk, 'review_content': 'Great', 'rating': 5},
+            {'movie': 9999, 'review_content': 'Ghost', 'rating': 3},
+            {'movie': self.movies[0].pk, 'review_content': 'Meh', 'rating': 9},
+            {'movie': self.movies[1].pk, 'review_content': 'Fine', 'rating': 3},
+        ]
+        response = self.client.post(reverse('review-bulk'), items, format='json')
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual((response.data['saved'], response.data['failed']), (2, 2))
+        results = response.data['results']
+        self.assertIn('movie', results[1]['errors'])
+        self.assertIn('rating', results[2]['errors'])
+        created = Review.objects.get(pk=results[0]['id'])
+        self.assertEqual((created.user, created.rating), (self.user, 5))
+
+        self.movies[0].refresh_from_db()
+        self.assertEqual((self.movies[0].review_count, self.movies[0].rating_5_count), (1, 1))
+        call_command('rebuild_movie_aggregates', '--verify', stdout=StringIO())
+
+    def test_bulk_create_query_count_does_not_grow_per_row(self):
+        items = [
+            {'movie': self.movies[i % 3].pk, 'review_content': f'Review {i}', 'rating': i % 5 + 1}
+            for i in range(300)
+        ]
+        with count_queries() as counter:
+            response = self.client.post(reverse('review-bulk'), items, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertLess(counter.count, 14)
+        self.assertEqual(Review.objects.count(), 300)
+        self.assertEqual(search.search_reviews(Review.objects.all(), 'review').count(), 300)
+        call_command('rebuild_movie_aggregates', '--verify', stdout=StringIO())
+
+    def test_bulk_update_reviews_moves_aggregates(self):
+        own = Review.objects.create(movie=self.movies[0], user=self.user, review_content='x', rating=2)
+        other = Review.objects.create(
+            movie=self.movies[0], user=User.objects.create_user(username='bob'), review_content='y', rating=4)
+        items = [
+            {'id': own.pk, 'movie': self.movies[1].pk, 'rating': 5},
+            {'id': other.pk, 'rating': 1},
+            {'rating': 3},
+        ]
+        response = self.client.patch(reverse('review-bulk'), items, format='json')
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual(response.data['results'][0], {'id': own.pk})
+        self.assertIn('id', response.data['results'][1]['errors'])
+        self.assertIn('id', response.data['results'][2]['errors'])
+
+        own.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual((own.movie, own.rating, other.rating), (self.movies[1], 5, 4))
+        call_command('rebuild_movie_aggregates', '--verify', stdout=StringIO())
+
+    def test_bulk_movies(self):
+        self.client.force_authenticate(User.objects.create_user(username='staff', is_staff=True))
+        items = [
+            {'movie_title': 'Alien', 'description': 'Space horror', 'release_date': '1979-05-25'},
+            {'movie_title': 'No date', 'description': 'x'},
+        ]
+        response = self.client.post(reverse('movie-bulk'), items, format='json')
+        self.assertEqual(response.status_code, 207)
+        alien_id = response.data['results'][0]['id']
+
+        response = self.client.patch(reverse('movie-bulk'), [{'id': alien_id, 'movie_title': 'Aliens'}], format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Movie.objects.get(pk=alien_id).movie_title, 'Aliens')
+        self.assertEqual(search.search_movies(Movie.objects.all(), 'aliens').get().pk, alien_id)
+
+    def test_bulk_list_serializer_keeps_the_errors_contract(self):
+        # Only the bulk endpoints use it; many=True elsewhere is DRF's own list serializer
+        self.assertIs(type(ReviewSerializer(many=True)), serializers.ListSerializer)
+        items = [{'movie': self.movies[0].pk, 'review_content': 'Fine', 'rating': 3}, {'rating': 9}]
+        serializer = ReviewListSerializer(data=items, child=ReviewSerializer())
+        self.assertFalse(serializer.is_valid())
+        self.assertEqual(serializer.errors[0], {})
+        self.assertEqual(set(serializer.errors[1]), {'movie', 'review_content', 'rating'})
+        self.assertEqual(serializer.valid_indexes, [0])
+        with self.assertRaises(serializers.ValidationError):
+            serializer.is_valid(raise_exception=True)
+
+    def test_bulk_movies_are_staff_only(self):
+        response = self.client.post(reverse('movie-bulk'), [{'movie_title': 'Alien', 'description': 'x'}], format='json')
+        self.assertEqual(response.status_code, 403)
+        response = self.client.patch(reverse('movie-bulk'), [{'id': self.movies[0].pk, 'movie_title': 'Mine'}], format='json')
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(Movie.objects.count(), 3)
+        self.assertEqual(Movie.objects.get(pk=self.movies[0].pk).movie_title, 'Movie 0')
+
+    def test_rejects_non_lists_and_oversized_payloads(self):
+        self.client.force_authenticate(User.objects.create_user(username='staff', is_staff=True))
+        response = self.client.post(reverse('movie-bulk'), {'movie_title': 'x'}, format='json')
+        self.assertEqual(response.status_code, 400)
+        with override_settings(BULK_MAX_ITEMS=1):
+            response = self.client.post(reverse('movie-bulk'), [{}, {}], format='json')
+        self.assertEqual(response.status_code, 400)
+        self.client.force_authenticate(None)
+        self.assertEqual(self.client.post(reverse('movie-bulk'), [], format='json').status_code, 401)
+
+
+class ReviewExportTests(APITestCase):
+    def setUp(self):
+        caches['throttle'].clear()
+        self.user = User.objects.create_user(username='alice')
+        self.movies = [make_movie(f'Movie {i}') for i in range(2)]
+        self.reviews = [
+            Review.objects.create(movie=self.movies[i % 2], user=self.user, review_content=f'Review, "{i}"\nline',
+                                  rating=i % 5 + 1)
+            for i in range(7)
+        ]
+        self.client.force_authenticate(self.user)
+
+    def export(self, params=None, **extra):
+        response = self.client.get(reverse('review-export'), params or {}, **extra)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return response, b''.join(response.streaming_content)
+
+    def test_ndjson_rows_match_the_serializer(self):
+        response, body = self.export()
+        self.assertTrue(response['Content-Type'].startswith('application/x-ndjson'))
+        rows = [json.loads(line) for line in body.decode().splitlines()]
+        self.assertEqual([row['id'] for row in rows], [review.pk for review in self.reviews])
+        expected = json.loads(json.dumps(ReviewSerializer(self.reviews[0]).data))
+        self.assertEqual(rows[0], expected)
+
+    def test_csv_with_filters(self):
+        Review.objects.filter(pk=self.reviews[2].pk).update(created_date=datetime(2020, 1, 1, tzinfo=timezone.utc))
+        params = {'format': 'csv', 'movie': self.movies[0].pk, 'created_after': '2021-01-01'}
+        response, body = self.export(params)
+        self.assertIn('reviews.csv', response['Content-Disposition'])
+        rows = list(csv.DictReader(io.StringIO(body.decode())))
+        self.assertEqual([int(row['id']) for row in rows], [self.reviews[i].pk for i in (0, 4, 6)])
+        self.assertEqual(rows[0]['review_content'], self.reviews[0].review_content)
+
+        _, body = self.export({'rating': 2, 'format': 'ndjson'})
+        self.assertEqual(len(body.splitlines()), 2)
+        response = self.client.get(reverse('review-export'), {'created_before': 'yesterday'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_gzip_when_accepted(self):
+        _, plain = self.export()
+        response, body = self.export(HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(body), plain)
+
+    def test_rows_are_read_in_chunks(self):
+        with count_queries() as counter:
+            rows = list(export.iter_rows(Review.objects.all(), chunk_size=3))
+        self.assertEqual([row[0] for row in rows], [review.pk for review in self.reviews])
+        self.assertEqual(counter.count, 3)
+
+    def test_command_writes_gzipped_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'reviews.csv.gz')
+            call_command('export_reviews', '--format=csv', '--gzip', '--rating=1', '--chunk-size=1',
+                         f'--output={path}', stderr=StringIO())
+            with gzip.open(path, 'rt', newline='') as output:
+                rows = list(csv.DictReader(output))
+        self.assertEqual([int(row['id']) for row in rows], [self.reviews[0].pk, self.reviews[5].pk])
+        with self.assertRaises(CommandError):
+            call_command('export_reviews', '--created-after=soon', stderr=StringIO())
+
+
+class ImportDataCommandTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def write(self, name, text):
+        path = os.path.join(self.directory.name, name)
+        opener = gzip.open if name.endswith('.gz') else open
+        with opener(path, 'wt', encoding='utf-8') as output:
+            output.write(text)
+        return path
+
+    def import_data(self, *args):
+        stdout, stderr = StringIO(), StringIO()
+        call_command('import_data', *args, stdout=stdout, stderr=stderr)
+        return stdout.getvalue(), stderr.getvalue()
+
+    def test_imports_movies_users_and_reviews(self):
+        movies = self.write('movies.csv', 'movie_title,description,release_date\n'
+                                          'Alien,Space horror,1979-05-25\nBroken,,not a date\nHeat,Crime,1995-12-15\n')
+        users = self.write('users.ndjson', '{"username": "alice"}\n\n{"username": "bob", "email": "b@x.org"}\n'
+                                           '{"username": "alice"}\n{"username": "eve", "password": "hunter2"}\n')
+        output, errors = self.import_data('movies', movies)
+        self.assertIn('Imported 2 movies (1 records skipped', output)
+        self.assertIn('record 2: release_date', errors)
+        output, errors = self.import_data('users', users)
+        self.assertIn('Imported 2 users (2 records skipped', output)
+        self.assertFalse(User.objects.get(username='bob').has_usable_password())
+
+        alien = Movie.objects.get(movie_title='Alien')
+        lines = [
+            {'movie': alien.pk, 'user': 'alice', 'review_content': 'Great', 'rating': 5,
+             'created_date': '2001-02-03T04:05:06Z'},
+            {'movie_title': 'Heat', 'username': 'bob', 'review_content': 'Long', 'rating': '3'},
+            {'movie_title': 'Nope', 'user': 'bob', 'review_content': 'x', 'rating': 3},
+            {'movie': alien.pk, 'user': 'mallory', 'review_content': 'x', 'rating': 3},
+            {'movie': alien.pk, 'user': 'bob', 'review_content': 'x', 'rating': 6},
+        ]
+        reviews = self.write('reviews.ndjson.gz', '\n'.join(json.dumps(line) for line in lines) + '\n{oops\n')
+        output, errors = self.import_data('reviews', reviews, '--batch-size=2')
+        self.assertIn('Imported 2 reviews (4 records skipped', output)
+        self.assertEqual(errors.count('record '), 4)
+        self.assertEqual(Review.objects.get(rating=5).created_date, datetime(2001, 2, 3, 4, 5, 6, tzinfo=timezone.utc))
+        self.assertEqual(Review.objects.get(rating=3).movie.movie_title, 'Heat')
+        self.assertEqual(search.search_reviews(Review.objects.all(), 'great').count(), 1)
+        call_command('rebuild_movie_aggregates', '--verify', stdout=StringIO())
+        # The insert trigger is back once the batches are indexed
+        Review.objects.create(movie=alien, user=User.objects.get(username='bob'), review_content='Great too', rating=4)
+        self.assertEqual(search.search_reviews(Review.objects.all(), 'great').count(), 2)
+
+        output, _ = self.import_data('reviews', reviews)
+        self.assertIn('already imported', output)
+        self.assertEqual(Review.objects.count(), 3)
+
+    def test_writes_go_to_the_primary_while_reads_use_a_replica(self):
+        with replicas.reading_from('replica2'):
+            self.assertEqual(importer.MovieImporter().connection.alias, 'default')
+
+    def test_resumes_after_a_crash(self):
+        movie = make_movie()
+        User.objects.create_user(username='alice')
+        lines = [f'{movie.pk},alice,Review {i},{i % 5 + 1}' for i in range(10)]
+        path = self.write('reviews.csv', 'movie,user,review_content,rating\n' + '\n'.join(lines) + '\n')
+
+        original_save = importer.ReviewImporter.save
+        calls = []
+
+        def crash_on_third_batch(self, objs):
+            calls.append(len(objs))
+            if len(calls) == 3:
+                raise RuntimeError('power cut')
+            original_save(self, objs)
+
+        with mock.patch.object(importer.ReviewImporter, 'save', crash_on_third_batch):
+            with self.assertRaises(RuntimeError):
+                self.import_data('reviews', path, '--batch-size=3')
+        self.assertEqual(Review.objects.count(), 6)
+
+        output, _ = self.import_data('reviews', path, '--batch-size=3')
+        self.assertIn('Resumed after record 6', output)
+        self.assertEqual(sorted(Review.objects.values_list('review_content', flat=True)),
+                         sorted(f'Review {i}' for i in range(10)))
+        call_command('rebuild_movie_aggregates', '--verify', stdout=StringIO())
+
+        with open(path, 'a') as source:
+            source.write(f'{movie.pk},alice,One more,4\n')
+        with self.assertRaises(CommandError):
+            self.import_data('reviews', path)
+        self.import_data('reviews', path, '--restart')
+        self.assertEqual(Review.objects.count(), 21)
+
+    def test_round_trip_through_export(self):
+        movie = make_movie()
+        user = User.objects.create_user(username='alice')
+        Review.objects.create(movie=movie, user=user, review_content='Line one,\n"two"', rating=4)
+        path = os.path.join(self.directory.name, 'reviews.csv.gz')
+        call_command('export_reviews', '--format=csv', '--gzip', f'--output={path}', stderr=StringIO())
+        exported = Review.objects.get()
+        Review.objects.all().delete()
+
+        self.import_data('reviews', path, '--keep-ids')
+        imported = Review.objects.get()
+        self.assertEqual(
+            (imported.pk, imported.review_content, imported.created_date),
+            (exported.pk, exported.review_content, exported.created_date),
+        )
+
+
+class JWTAuthenticationTests(APITestCase):
+    def setUp(self):
+        # The caches rely on versions every worker process sees, which a file-based cache provides
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        backend = {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': self.directory}
+        self.shipped_caches = settings.CACHES
+        settings_override = override_settings(CACHES={**settings.CACHES, 'default': backend})
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        authentication.user_cache.clear()
+        authentication.revoked_tokens.reset()
+        self.user = User.objects.create_user(username='alice')
+        self.movie = make_movie()
+        token = RefreshToken.for_user(self.user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def user_queries(self, *params):
+        with CaptureQueriesContext(connection) as queries:
+            for param in params:
+                self.assertEqual(self.client.get(reverse('review-list-create'), {'page_size': param}).status_code, 200)
+        return [query for query in queries if 'FROM "auth_user" WHERE' in query['sql']]
+
+    def test_user_is_loaded_once(self):
+        self.assertEqual(len(self.user_queries(1, 2, 3)), 1)
+
+    def test_user_changes_take_effect_on_the_next_request(self):
+        self.user_queries(1)
+        self.user.is_active = False
+        self.user.save()
+        response = self.client.get(reverse('review-list-create'), {'page_size': 2})
+        self.assertEqual(response.status_code, 401)
+
+    def test_cache_is_bounded(self):
+        cache = authentication.UserCache(max_size=2)
+        for i in range(3):
+            cache.set(str(i), User(pk=i, username=f'user{i}'))
+        self.assertIsNone(cache.get('0'))
+        self.assertEqual(cache.get('2').username, 'user2')
+        self.assertIsNot(cache.get('2'), cache.get('2'))
+
+    def test_owner_check_compares_ids(self):
+        review = Review.objects.create(movie=self.movie, user=self.user, review_content='x', rating=3)
+        review = Review.objects.get(pk=review.pk)
+        request = mock.Mock(method='PATCH', user=self.user)
+        other = mock.Mock(method='PATCH', user=User(pk=self.user.pk + 1))
+        with count_queries() as counter:
+            self.assertTrue(IsOwnerOrReadOnly().has_object_permission(request, None, review))
+            self.assertFalse(IsOwnerOrReadOnly().has_object_permission(other, None, review))
+        self.assertEqual(counter.count, 0)
+
+    def test_rotated_refresh_tokens_are_rejected(self):
+        refresh = str(RefreshToken.for_user(self.user))
+        self.assertEqual(self.client.post(reverse('token_refresh'), {'refresh': refresh}).status_code, 200)
+        self.assertEqual(self.client.post(reverse('token_refresh'), {'refresh': refresh}).status_code, 401)
+
+    def test_filter_skips_the_blacklist_query(self):
+        revoked = RefreshToken.for_user(self.user)
+        revoked.blacklist()
+        live = str(RefreshToken.for_user(self.user))
+        authentication.FilteredRefreshToken(live)  # Syncs the filter with the blacklist
+
+        with CaptureQueriesContext(connection) as queries:
+            authentication.FilteredRefreshToken(live)
+        self.assertEqual(len(queries), 0)
+        with self.assertRaises(TokenError):
+            authentication.FilteredRefreshToken(str(revoked))
+
+    def test_versions_set_by_another_process_are_seen(self):
+        # A separate cache instance on the same files stands in for another worker process
+        other_process = FileBasedCache(self.directory, {})
+        self.user_queries(1)
+        revoked = RefreshToken.for_user(self.user)
+        authentication.FilteredRefreshToken(str(revoked))  # Syncs the filter
+
+        # Rows written without signals, then the versions moved on elsewhere
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        BlacklistedToken.objects.bulk_create([BlacklistedToken(token=OutstandingToken.objects.get(jti=revoked['jti']))])
+        for name in ('user', 'blacklistedtoken'):
+            other_process.set(caching.VERSION_KEY.format(name), (time.time(), 'elsewhere'), timeout=None)
+
+        self.assertEqual(self.client.get(reverse('review-list-create')).status_code, 401)
+        with self.assertRaises(TokenError):
+            authentication.FilteredRefreshToken(str(revoked))
+
+    def test_local_memory_cache_keeps_users_in_process(self):
+        # The shipped CACHES: local memory, so only this process's writes and the timeout invalidate
+        with override_settings(CACHES=self.shipped_caches):
+            self.assertEqual(len(self.user_queries(1, 2)), 1)
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(self.client.get(reverse('review-list-create')).status_code, 200)
+            self.assertEqual([query for query in queries if 'FROM "auth_user" WHERE' in query['sql']], [])
+            self.user.is_active = False
+            self.user.save()
+            self.assertEqual(self.client.get(reverse('review-list-create')).status_code, 401)
+
+    def test_local_memory_versions_are_not_trusted_by_the_filter(self):
+        with override_settings(CACHES=self.shipped_caches):
+            live = str(RefreshToken.for_user(self.user))
+            authentication.FilteredRefreshToken(live)
+            with CaptureQueriesContext(connection) as queries:
+                authentication.FilteredRefreshToken(live)
+            self.assertEqual(len(queries), 1)  # The blacklist table itself
+
+    def test_bloom_filter(self):
+        bloom = authentication.BloomFilter(1000, error_rate=0.01)
+        for i in range(1000):
+            bloom.add(f'in-{i}')
+        self.assertTrue(all(f'in-{i}' in bloom for i in range(1000)))
+        false_positives = sum(f'out-{i}' in bloom for i in range(10000))
+        self.assertLess(false_positives, 300)
+
+
+class AsyncViewTests(TestCase):
+    def setUp(self):
+        caches['default'].clear()
+        self.user = User.objects.create_user(username='alice')
+        self.movies = [make_movie(f'Movie {i}', description=f'Heist number {i}') for i in range(3)]
+        for i in range(12):
+            Review.objects.create(movie=self.movies[i % 3], user=self.user, review_content=f'Heist review {i}',
+                                  rating=i % 5 + 1)
+
+    async def assertSameAsSync(self, sync_name, async_name, args=(), params=None):
+        sync_response = await sync_to_async(self.client.get)(reverse(sync_name, args=args), params or {})
+        async_response = await self.async_client.get(reverse(async_name, args=args), params or {})
+        self.assertEqual(async_response.status_code, sync_response.status_code)
+        sync_data, async_data = sync_response.json(), async_response.json()
+        # Links point at each endpoint's own URL
+        for data in (sync_data, async_data):
+            if isinstance(data, dict):
+                for key in ('next', 'previous'):
+                    if data.get(key):
+                        data[key] = data[key].split('?', 1)[1]
+        self.assertEqual(async_data, sync_data)
+        return async_data
+
+    async def test_reads_match_the_sync_endpoints(self):
+        review = await Review.objects.afirst()
+        cases = [
+            ('review-list-create', 'async-review-list', (), {'page_size': 5}),
+            ('review-detail', 'async-review-detail', (review.pk,), None),
+            ('review-detail', 'async-review-detail', (9999,), None),
+            ('review-search', 'async-review-search', (), {'rating': 2}),
+            ('review-search', 'async-review-search', (), {'q': 'heist', 'page': 2}),
+            ('review-search', 'async-review-search', (), {'q': 'heist', 'page': 9}),
+            ('movie-list-create', 'async-movie-list', (), {'ordering': '-average_rating', 'page_size': 2}),
+            ('movie-list-create', 'async-movie-list', (), {'search': 'heist'}),
+            ('movie-list-create', 'async-movie-list', (), {'min_rating': 'x'}),
+            ('movie-detail', 'async-movie-detail', (self.movies[0].pk,), None),
+        ]
+        for sync_name, async_name, args, params in cases:
+            with self.subTest(sync_name, args=args, params=params):
+                await self.assertSameAsSync(sync_name, async_name, args, params)
+
+    async def test_cursor_links_walk_every_review(self):
+        url, seen = reverse('async-review-list') + '?page_size=5', []
+        while url:
+            data = (await self.async_client.get(url)).json()
+            seen += [row['id'] for row in data['results']]
+            url = data['next']
+        self.assertEqual(seen, [review.pk async for review in Review.objects.all()])
+
+    @override_settings(ADMISSION={'CLASSES': {'search': {'THROTTLE': {'RATE': 0.01, 'BURST': 2}}}, 'THROTTLE_CACHE': 'throttle'})
+    async def test_throttles_apply_to_async_reads(self):
+        await sync_to_async(caches['throttle'].clear)()
+        self.addCleanup(caches['throttle'].clear)  # Anonymous search tests share the emptied bucket
+        url = reverse('async-review-search')
+        statuses = [(await self.async_client.get(url, {'rating': 5})).status_code for _ in range(3)]
+        self.assertEqual(statuses, [200, 200, 429])
+        self.assertIn('Retry-After', await self.async_client.get(url, {'rating': 5}))
+        # The sync endpoint draws on the same bucket
+        response = await sync_to_async(self.client.get)(reverse('review-search'), {'rating': 5})
+        self.assertEqual(response.status_code, 429)
+
+    @override_settings(ADMISSION={'CLASSES': {'list': {'CONCURRENCY': 0}}, 'RETRY_AFTER': 3})
+    async def test_admission_sheds_async_reads(self):
+        with self.assertLogs('reviews.admission', 'WARNING'):
+            response = await self.async_client.get(reverse('async-review-list'))
+        self.assertEqual((response.status_code, response['Retry-After']), (503, '3'))
+        # Permissions come first, as on the sync endpoint
+        response = await self.async_client.post(reverse('async-review-list'), {})
+        self.assertEqual(response.status_code, 401)
+
+    @override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+    async def test_signup_and_login_hash_in_the_executor(self):
+        threads = []
+
+        def record_thread(func):
+            def wrapper(*args, **kwargs):
+                threads.append(threading.current_thread().name)
+                return func(*args, **kwargs)
+            return wrapper
+
+        with mock.patch.object(async_views, 'make_password', record_thread(async_views.make_password)), \
+                mock.patch.object(async_views, 'check_password', record_thread(async_views.check_password)):
+            response = await self.async_client.post(
+                reverse('async-signup'), {'username': 'bob', 'email': 'Bob@EXAMPLE.com', 'password': 'Secret-123'},
+                content_type='application/json',
+            )
+            self.assertEqual(response.status_code, 201)
+            self.assertEqual(response.json()['user']['email'], 'Bob@example.com')
+            response = await self.async_client.post(reverse('async-signup'), {'username': 'bob', 'password': 'x'})
+            self.assertIn('username', response.json())
+
+            login = reverse('async-login')
+            response = await self.async_client.post(login, {'username': 'bob', 'password': 'wrong'})
+            self.assertEqual(response.status_code, 401)
+            response = await self.async_client.post(login, {'username': 'bob', 'password': 'Secret-123'})
+            self.assertEqual(response.status_code, 200)
+
+        self.assertTrue(threads and all(name.startswith('password-hash') for name in threads))
+        access = response.json()['access']
+        movie = await sync_to_async(self.client.post)(
+            reverse('movie-list-create'), {'movie_title': 'New', 'description': 'd', 'release_date': '2020-01-01'},
+            HTTP_AUTHORIZATION=f'Bearer {access}',
+        )
+        self.assertEqual(movie.status_code, 201)
+
+
+class QueryPlanAuditTests(TestCase):
+    def test_flags_table_scans_and_temporary_sorts(self):
+        sql = 'SELECT * FROM t WHERE a = %s ORDER BY b LIMIT 10'
+        self.assertEqual(query_plans.findings(sql, ['SEARCH t USING INDEX t_a (a=?)']), [])
+        self.assertEqual(
+            query_plans.findings(sql, ['SCAN t', 'USE TEMP B-TREE FOR ORDER BY']),
+            ['SCAN t', 'USE TEMP B-TREE FOR ORDER BY'],
+        )
+        # Walking the rowid in order for one page, an index or the FTS table is fine
+        self.assertEqual(query_plans.findings('SELECT * FROM t ORDER BY id LIMIT 10', ['SCAN t']), [])
+        self.assertEqual(query_plans.findings(sql, ['SCAN t USING INDEX t_b', 'SCAN fts VIRTUAL TABLE INDEX 0:M']), [])
+
+    def test_read_endpoints_use_indexes(self):
+        # Enough movies that SQLite looks the search matches up by key rather than scanning the table
+        benchmarks.seed(movies=200, users=20, reviews=2000)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        findings = query_plans.audit()
+        audited = {endpoint.name for endpoint, _ in query_plans.endpoints()}
+        self.assertTrue({'review-search', 'review-export', 'movie-list-create', 'movie-detail'} <= audited)
+        self.assertEqual([finding for finding in findings if not finding.expected], [])
+        # Ranked searches sort by relevance, and the audit saw it
+        self.assertTrue(any(finding.endpoint == 'review-search' for finding in findings))
+
+        output = StringIO()
+        call_command('audit_query_plans', '--fail', stdout=output)
+        self.assertIn('0 unexpected', output.getvalue())
+
+
+@override_settings(DATABASE_REPLICAS=['replica1', 'replica2'])
+class ReplicaRoutingTests(APITestCase):
+    def setUp(self):
+        caches['default'].clear()
+        self.user = User.objects.create_user(username='alice')
+        self.movie = make_movie()
+        # The test database is the only one there is, so the "replica" chosen is the primary itself
+        self.chosen = []
+        patcher = mock.patch.object(replicas, 'choose_replica', side_effect=lambda: self.chosen.append(1) or 'default')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_router_sends_reads_where_the_request_chose(self):
+        router = replicas.ReplicaRouter()
+        self.assertIsNone(router.db_for_read(Review))
+        with replicas.reading_from('replica2'):
+            self.assertEqual(router.db_for_read(Review), 'replica2')
+            self.assertEqual(router.db_for_write(Review), 'default')
+        self.assertFalse(router.allow_migrate('replica1', 'reviews'))
+        self.assertIsNone(router.allow_migrate('default', 'reviews'))
+
+    def test_reads_stay_on_the_primary_after_a_write(self):
+        url = reverse('review-list-create')
+        self.client.get(url)
+        self.assertEqual(len(self.chosen), 1)
+
+        self.client.force_authenticate(self.user)
+        response = self.client.post(url, {'movie': self.movie.pk, 'review_content': 'Mine', 'rating': 4})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(self.chosen), 1)  # Writes never go to a replica
+        self.assertEqual(self.client.get(url).json()['results'][0]['review_content'], 'Mine')
+        self.assertEqual(len(self.chosen), 1)  # Pinned
+
+        self.client.force_authenticate(User.objects.create_user(username='bob'))
+        self.client.get(reverse('review-search'), {'rating': 3})
+        self.assertEqual(len(self.chosen), 2)
+
+        caches['default'].delete(replicas.PIN_KEY.format(self.user.pk))  # The pin expires
+        self.client.force_authenticate(self.user)
+        self.client.get(reverse('movie-detail', args=[self.movie.pk]))
+        self.assertEqual(len(self.chosen), 3)
+
+    def test_recently_bumped_versions_read_from_the_primary(self):
+        router = replicas.ReplicaRouter()
+        with replicas.reading_from('replica1'):
+            with replicas.primary_reads_since(time.time()):
+                self.assertEqual(router.db_for_read(Review), 'default')
+            with replicas.primary_reads_since(time.time() - 60):
+                self.assertEqual(router.db_for_read(Review), 'replica1')
+
+
+class SQLiteProfileTests(TestCase):
+    def journal_mode(self, name=None):
+        # A connection of its own, to a scratch file when ``name`` is given
+        settings_dict = connections['default'].settings_dict
+        new_connection = connections['default'].__class__({**settings_dict, 'NAME': name or settings_dict['NAME']})
+        self.addCleanup(new_connection.close)
+        self.assertEqual(sqlite.check_pragmas(new_connection), [])
+        with new_connection.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            return cursor.fetchone()[0]
+
+    def test_profile_is_opt_in(self):
+        # Tests run without SQLITE_PROFILE=production, so they leave the database files as they are
+        self.assertIsNone(settings.SQLITE_PRAGMAS)
+        self.assertEqual(self.journal_mode(), 'delete')
+        self.assertEqual(sqlite.sqlite_profile_check(databases=['default']), [])
+
+    @override_settings(SQLITE_PRAGMAS=settings.SQLITE_PRODUCTION_PRAGMAS)
+    def test_new_connections_get_the_pragmas(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.assertEqual(self.journal_mode(os.path.join(directory.name, 'db.sqlite3')), 'wal')
+
+    @override_settings(SQLITE_PRAGMAS={'synchronous': 'NORMAL', 'busy_timeout': 5000})
+    def test_check_reports_pragmas_that_did_not_take(self):
+        errors = sqlite.sqlite_profile_check(databases=['default'])
+        self.assertEqual([error.id for error in errors], ['reviews.E001', 'reviews.W001'])
+        self.assertIn('PRAGMA synchronous is 2, expected NORMAL', errors[0].msg)
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class LoadTestTests(TransactionTestCase):
+    def test_skewed_seed_is_deterministic(self):
+        movies, _ = benchmarks.seed(movies=20, users=10, reviews=1000, random_seed=3, skew=1.2, password='secret')
+        counts = sorted(Movie.objects.values_list('review_count', flat=True), reverse=True)
+        self.assertGreater(counts[0], 5 * counts[len(counts) // 2])  # A few movies get most reviews
+        self.assertTrue(User.objects.get(username='user0').check_password('secret'))
+
+        first = list(Review.objects.order_by('id').values_list('movie__movie_title', 'user__username', 'rating'))
+        Movie.objects.all().delete()
+        User.objects.all().delete()
+        benchmarks.seed(movies=20, users=10, reviews=1000, random_seed=3, skew=1.2, password='secret')
+        second = list(Review.objects.order_by('id').values_list('movie__movie_title', 'user__username', 'rating'))
+        self.assertEqual(first, second)
+
+    def test_run_covers_every_operation(self):
+        benchmarks.seed(movies=20, users=5, reviews=200, skew=1.0, password=loadtest.PASSWORD)
+        transport = loadtest.InProcessTransport()
+        dataset = loadtest.discover(transport, users=5, password=loadtest.PASSWORD)
+        self.assertEqual(len(dataset.movies), 20)
+
+        report = loadtest.run(loadtest.InProcessTransport, dataset, concurrency=2, requests=200)
+        self.assertEqual(set(report['operations']), set(loadtest.DEFAULT_MIX))
+        self.assertEqual(report['total']['requests'], 200)
+        self.assertEqual(report['total']['errors'], 0)
+        for summary in report['operations'].values():
+            self.assertLessEqual(summary['p50_ms'], summary['p95_ms'])
+            self.assertLessEqual(summary['p95_ms'], summary['p99_ms'])
+            self.assertIsNotNone(summary['queries_per_request'])
+
+        self.assertEqual(loadtest.compare(report, report), [])
+        path = os.path.join(tempfile.mkdtemp(), 'baseline.json')
+        loadtest.save(report, path)
+        self.assertEqual(loadtest.load(path), json.loads(json.dumps(report)))
+
+    def test_compare_reports_regressions(self):
+        def summary(p95_ms, queries, errors=0, throughput=100):
+            return {
+                'requests': 100, 'errors': errors, 'throughput': throughput, 'p50_ms': 1, 'p95_ms': p95_ms,
+                'p99_ms': p95_ms, 'queries_per_request': queries,
+            }
+
+        config = {'concurrency': 8}
+        baseline = {'config': config, 'total': summary(10, 2), 'operations': {
+            'review-list': summary(10, 2), 'review-detail': summary(10, 1), 'login': summary(10, 2),
+        }}
+        current = {'config': config, 'total': summary(10, 2, throughput=70), 'operations': {
+            'review-list': summary(15, 2), 'review-detail': summary(10, 2), 'login': summary(10.5, 2, errors=3),
+        }}
+        regressions = loadtest.compare(current, baseline, threshold=0.2)
+        self.assertEqual(len(regressions), 4)
+        self.assertIn('throughput fell', regressions[0])
+        self.assertIn('review-list: p95 latency rose', regressions[1])
+        self.assertIn('review-detail: queries per request rose', regressions[2])
+        self.assertIn('login: 3 of 100 requests failed', regressions[3])
+
+        with self.assertRaises(ValueError):
+            loadtest.compare(current, {**baseline, 'config': {'concurrency': 4}})
+
+
+@override_settings(RESPONSE_CACHE=None)
+class ProfilingTests(APITestCase):
+    def setUp(self):
+        search.is_available()  # Warm the per-process index check
+        self.user = User.objects.create_user(username='alice')
+        movie = make_movie('Inception')
+        Review.objects.create(movie=movie, user=self.user, review_content='Great', rating=5)
+        token = RefreshToken.for_user(self.user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    @override_settings(PROFILING={'SAMPLE_RATE': 0, 'SLOW_REQUEST_MS': None})
+    def test_server_timing_and_log_line(self):
+        with self.assertLogs('reviews.profiling', 'INFO') as logs:
+            response = self.client.get(reverse('review-search'), {'movie_title': 'inception'})
+        timing = {entry.split(';')[0]: entry for entry in response['Server-Timing'].split(', ')}
+        self.assertEqual(list(timing), ['db', 'count', 'auth', 'queue', 'view', 'serialize', 'render', 'total'])
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record['path'], reverse('review-search'))
+        self.assertEqual(record['status'], 200)
+        self.assertIn(f'desc="{record["queries"]} queries"', timing['db'])
+        self.assertGreaterEqual(record['total_ms'], record['view_ms'] + record['serialize_ms'])
+
+    @override_settings(PROFILING=None)
+    def test_off(self):
+        self.assertNotIn('Server-Timing', self.client.get(reverse('review-list-create')))
+
+    def test_sampled_requests_dump_a_profile(self):
+        directory = tempfile.mkdtemp()
+        with override_settings(PROFILING={'SAMPLE_RATE': 1, 'SLOW_REQUEST_MS': None, 'DUMP_DIR': directory}), \
+                self.assertLogs('reviews.profiling', 'INFO') as logs:
+            self.client.get(reverse('review-list-create'))
+        name = json.loads(logs.records[0].getMessage())['profile']
+        self.assertEqual(os.listdir(directory), [os.path.basename(name) + '.prof'])
+
+    def test_slow_requests_are_sampled(self):
+        def slow_request():
+            time.sleep(0.2)
+
+        samples = profiling.slow_requests.watch(0)
+        slow_request()
+        profiling.slow_requests.unwatch()
+        self.assertTrue(samples)
+        self.assertTrue(all('tests.py:slow_request' in stack for stack in samples))
+
+
+@override_settings(RESPONSE_CACHE=None)
+class FastListSerializationTests(APITestCase):
+    def setUp(self):
+        search.is_available()  # Warm the per-process index check
+        users = [User.objects.create_user(username=name) for name in ('alice', 'bjørn', 'o\'neil')]
+        movies = [
+            make_movie('Movie Amélie', description='Paris \u2028 "quoted" \\ back'),
+            make_movie('Movie 東京', release_date=date(1953, 11, 3)),
+            make_movie('Another movie'),
+        ]
+        for i in range(12):
+            Review.objects.create(
+                movie=movies[i % 3], user=users[i % 2], rating=5 - i % 3 - i % 2,
+                review_content=f'review {i} ✓ \u2029 <b>tag</b>',
+            )
+        Review.objects.create(movie=movies[0], user=users[2], rating=5, review_content='One more review')
+
+    def get_both(self, url, params=None):
+        fast = self.client.get(url, params)
+        with override_settings(FAST_LIST_SERIALIZATION=False), mock.patch.object(renderers, 'orjson', None):
+            stock = self.client.get(url, params)
+        return fast, stock
+
+    def test_lists_match_the_serializers_byte_for_byte(self):
+        fieldsets = {
+            'review-list-create': [
+                {'fields': 'id,rating,movie', 'page_size': 2}, {'omit': 'review_content,movie_title'},
+                {'expand': 'movie,user'}, {'fields': 'id', 'expand': 'user'},
+            ],
+            'review-search': [{'rating': 3, 'fields': 'id,rating'}, {'q': 'review', 'expand': 'movie', 'omit': 'user'}],
+            'movie-list-create': [
+                {'fields': 'movie_title,rating_histogram', 'page_size': 2},
+                {'omit': 'description', 'ordering': '-average_rating', 'page_size': 2},
+            ],
+        }
+        for name in ('review-list-create', 'review-search', 'movie-list-create'):
+            for params in query_plans.AUDIT_REQUESTS[name] + [{'page_size': 2}] + fieldsets[name]:
+                with self.subTest(name=name, params=params):
+                    fast, stock = self.get_both(reverse(name), params)
+                    self.assertEqual(fast.status_code, 200)
+                    self.assertEqual(fast.content, stock.content)
+                    self.assertTrue(fast.json()['results'])
+                    if fast.json().get('next'):
+                        fast, stock = self.get_both(fast.json()['next'])
+                        self.assertEqual(fast.content, stock.content)
+
+    def test_renderer_matches_drf(self):
+        data = {
+            'text': 'line \u2028 paragraph \u2029 "quoted" é 東京 ✓', 'error': ErrorDetail('bad', code='invalid'),
+            'when': datetime(2024, 5, 1, 12, 30, 15, 123456, tzinfo=timezone.utc), 'day': date(2024, 5, 1),
+            'ratio': 10 / 3, 'whole': 4.0, 'nested': [{1: None, 'ok': True}], 'empty': {},
+        }
+        # Indented output and integers orjson cannot encode go through DRF's renderer
+        for data, media_type in [(data, None), (data, 'application/json; indent=4'), ({'big': 2 ** 70}, None)]:
+            self.assertEqual(
+                renderers.FastJSONRenderer().render(data, media_type), JSONRenderer().render(data, media_type),
+            )
+
+
+def brute_force_leaderboards(now, prior_mean=None, prior_weight=10):
+    """
+    Every leaderboard straight from the review table, best first, as [(movie id, score)].
+    """
+    hour = now.astimezone(timezone.utc).replace(minute=0, second=0, microsecond=0)
+    day_start, week_start = hour - timedelta(hours=23), hour - timedelta(hours=167)
+    reviews = list(Review.objects.values_list('movie_id', 'rating', 'created_date'))
+    if prior_mean is None:
+        prior_mean = sum(rating for _, rating, _ in reviews) / len(reviews)
+
+    stats = {}
+    for movie_id, rating, created in reviews:
+        count, total, day, week = stats.get(movie_id, (0, 0, 0, 0))
+        stats[movie_id] = (count + 1, total + rating, day + (created >= day_start), week + (created >= week_start))
+
+    top_rated, most_reviewed, trending = [], [], []
+    for movie_id, (count, total, day, week) in stats.items():
+        top_rated.append((movie_id, (prior_weight * prior_mean + total) / (prior_weight + count)))
+        if week:
+            most_reviewed.append((movie_id, week))
+            trending.append((movie_id, day - week / 7))
+    best_first = lambda ranking: sorted(ranking, key=lambda item: (item[1], item[0]), reverse=True)
+    return {
+        'top-rated': best_first(top_rated), 'most-reviewed-week': best_first(most_reviewed),
+        'trending': best_first(trending),
+    }
+
+
+@override_settings(QUERY_BUDGET_MODE='raise', LEADERBOARDS={'PRIOR_WEIGHT': 10})
+class LeaderboardTests(APITestCase):
+    # Hours before now of the reviews of each movie, inside and outside both windows
+    REVIEW_AGES = [[0, 1, 30], [2, 5, 10, 12], [50, 100, 160], [170, 200], [0], [26, 27, 28, 29, 160, 180]]
+
+    def setUp(self):
+        self.now = datetime.now(timezone.utc)
+        self.user = User.objects.create_user(username='alice')
+        self.movies = [make_movie(f'Movie {i}') for i in range(len(self.REVIEW_AGES) + 1)]
+        for i, (movie, ages) in enumerate(zip(self.movies, self.REVIEW_AGES)):
+            for j, age in enumerate(ages):
+                review = Review.objects.create(movie=movie, user=self.user, review_content='x', rating=1 + (i + j) % 5)
+                Review.objects.filter(pk=review.pk).update(created_date=self.now - timedelta(hours=age))
+        leaderboards.rebuild(self.now)  # The dates moved with update(), which record() does not see
+        self.client.force_authenticate(self.user)
+
+    def get_board(self, board):
+        ranking, url = [], reverse('movie-leaderboard', args=[board]) + '?page_size=2'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            page = response.json()
+            ranking += [(item['movie']['id'], item['score']) for item in page['results']]
+            url = page['next']
+        return ranking
+
+    def assertMatchBruteForce(self, now, prior_mean=None):
+        for board, expected in brute_force_leaderboards(now, prior_mean).items():
+            with self.subTest(board=board):
+                ranking = self.get_board(board)
+                self.assertEqual([movie_id for movie_id, _ in ranking], [movie_id for movie_id, _ in expected])
+                for (_, score), (_, expected_score) in zip(ranking, expected):
+                    self.assertAlmostEqual(score, expected_score)
+
+    def test_rebuild_matches_brute_force(self):
+        self.assertMatchBruteForce(self.now)
+
+    def test_incremental_writes_match_brute_force(self):
+        url = reverse('review-list-create')
+        created = [
+            self.client.post(url, {'movie': movie.pk, 'review_content': 'y', 'rating': rating}).data['id']
+            for movie, rating in [(self.movies[3], 5), (self.movies[3], 4), (self.movies[6], 2), (self.movies[0], 1)]
+        ]
+        self.client.patch(reverse('review-detail', args=[created[0]]), {'rating': 1})
+        self.client.patch(reverse('review-detail', args=[created[1]]), {'movie': self.movies[2].pk})
+        self.client.delete(reverse('review-detail', args=[created[3]]))
+        old = Review.objects.filter(movie=self.movies[5]).order_by('created_date').first()
+        self.client.delete(reverse('review-detail', args=[old.pk]))  # Outside both windows
+        items = [{'movie': self.movies[4].pk, 'review_content': 'z', 'rating': 5}] * 3
+        self.client.post(reverse('review-bulk'), items, format='json')
+        self.client.patch(reverse('review-bulk'), [{'id': created[2], 'movie': self.movies[1].pk}], format='json')
+
+        # The prior mean only moves on with a compaction
+        self.assertMatchBruteForce(self.now, LeaderboardState.objects.get().prior_mean)
+        leaderboards.compact(self.now)
+        self.assertMatchBruteForce(self.now)
+
+    def test_compaction_moves_the_windows(self):
+        for hours in (1, 25, 100, 400):
+            later = self.now + timedelta(hours=hours)
+            leaderboards.compact(later)
+            with self.subTest(hours=hours):
+                self.assertMatchBruteForce(later)
+
+    def test_migration_builds_the_boards_for_the_first_review(self):
+        for model in (LeaderboardState, MovieRanking, ReviewActivity):
+            model.objects.all().delete()
+        migration = importlib.import_module('reviews.migrations.0011_leaderboards')
+        migration.build_leaderboards(django_apps, None)
+        now = datetime.now(timezone.utc)
+        self.assertMatchBruteForce(now)
+
+        movie = self.movies[6]
+        response = self.client.post(reverse('review-list-create'), {'movie': movie.pk, 'review_content': 'y', 'rating': 5})
+        self.assertEqual(response.status_code, 201)
+        self.assertIn(movie.pk, [movie_id for movie_id, _ in self.get_board('most-reviewed-week')])
+        self.assertMatchBruteForce(now, LeaderboardState.objects.get().prior_mean)
+
+    def test_deleting_a_movie_drops_its_ranking(self):
+        self.movies[0].delete()
+        self.assertNotIn(self.movies[0].pk, [movie_id for movie_id, _ in self.get_board('top-rated')])
+
+    def test_unknown_board(self):
+        self.assertEqual(self.client.get(reverse('movie-leaderboard', args=['worst'])).status_code, 404)
+
+
+def brute_force_neighbours(k, min_common_users=2):
+    """
+    Top-k adjusted cosine neighbours of every reviewed movie, straight from the definition.
+    """
+    ratings = {(user_id, movie_id): rating for movie_id, user_id, rating in Review.objects.values_list('movie_id', 'user_id', 'rating')}
+    users = {user_id for user_id, _ in ratings}
+    movies = {movie_id for _, movie_id in ratings}
+    means = {
+        user: sum(r for (u, _), r in ratings.items() if u == user) / sum(1 for u, _ in ratings if u == user)
+        for user in users
+    }
+    centred = {key: rating - means[key[0]] for key, rating in ratings.items()}
+    norms = {movie: math.sqrt(sum(value ** 2 for (_, m), value in centred.items() if m == movie)) for movie in movies}
+
+    neighbours = {}
+    for movie in movies:
+        scores = []
+        for other in movies - {movie}:
+            common = [user for user in users if (user, movie) in centred and (user, other) in centred]
+            dot = sum(centred[user, movie] * centred[user, other] for user in common)
+            if dot > 0 and len(common) >= min_common_users and norms[movie] and norms[other]:
+                scores.append((other, dot / (norms[movie] * norms[other])))
+        neighbours[movie] = sorted(scores, key=lambda item: (-item[1], item[0]))[:k]
+    return neighbours
+
+
+@override_settings(QUERY_BUDGET_MODE='raise')
+class RecommendationTests(APITestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'similarities.bin')
+        settings = override_settings(RECOMMENDATIONS={'PATH': self.path, 'NEIGHBOURS': 3, 'MIN_COMMON_USERS': 2})
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+        rng = random.Random(7)
+        self.users = [User.objects.create_user(username=f'user{i}') for i in range(10)]
+        self.movies = [make_movie(f'Movie {i}') for i in range(8)]
+        for user in self.users:
+            for movie in rng.sample(self.movies, 5):
+                Review.objects.create(movie=movie, user=user, review_content='x', rating=rng.randint(1, 5))
+
+    def assertNeighbours(self, actual, expected):
+        self.assertEqual([movie_id for movie_id, _ in actual], [movie_id for movie_id, _ in expected])
+        for (_, score), (_, expected_score) in zip(actual, expected):
+            self.assertAlmostEqual(score, expected_score, places=5)  # Stored as float32
+
+    def test_full_compute_matches_brute_force(self):
+        result = recommendations.compute()
+        self.assertEqual(result.recomputed, len(self.movies))
+        index = recommendations.get_index()
+        for movie_id, expected in brute_force_neighbours(3).items():
+            with self.subTest(movie=movie_id):
+                self.assertNeighbours(index.neighbours(movie_id), expected)
+
+    def test_incremental_compute_only_recomputes_changed_movies(self):
+        recommendations.compute()
+        first = recommendations.get_index()
+        changed = {self.movies[0].pk, self.movies[1].pk}
+        review = Review.objects.filter(movie=self.movies[0]).first()
+        review.rating = 6 - review.rating if review.rating != 3 else 5
+        review.save()
+        Review.objects.filter(movie=self.movies[1]).first().delete()
+
+        result = recommendations.compute()
+        self.assertEqual(result.recomputed, 2)
+        index = recommendations.get_index()
+        self.assertIsNot(index, first)  # Workers pick up the new file
+        expected = brute_force_neighbours(3)
+        for movie_id in changed:
+            self.assertNeighbours(index.neighbours(movie_id), expected[movie_id])
+        # Other movies carry the new similarities to the changed ones
+        recomputed = {movie_id: dict(expected[movie_id]) for movie_id in changed}
+        for movie_id in expected.keys() - changed:
+            for other, score in index.neighbours(movie_id):
+                if other in changed:
+                    self.assertAlmostEqual(score, recomputed[other].get(movie_id, score), places=5)
+
+        full = recommendations.compute(full=True)
+        self.assertEqual(full.recomputed, len(self.movies))
+
+    def test_endpoints(self):
+        self.client.force_authenticate(self.users[0])
+        similar = reverse('movie-similar', args=[self.movies[0].pk])
+        self.assertEqual(self.client.get(similar).json(), [])
+        self.assertEqual(self.client.get(reverse('movie-recommended')).json(), [])
+
+        recommendations.compute()
+        expected = brute_force_neighbours(3)[self.movies[0].pk]
+        response = self.client.get(similar).json()
+        self.assertNeighbours([(item['movie']['id'], item['score']) for item in response], expected)
+        self.assertEqual(self.client.get(reverse('movie-similar', args=[9999])).status_code, 404)
+
+        response = self.client.get(reverse('movie-recommended'), {'limit': 3}).json()
+        rated = set(Review.objects.filter(user=self.users[0]).values_list('movie_id', flat=True))
+        self.assertTrue(response)
+        self.assertFalse(rated & {item['movie']['id'] for item in response})
+        scores = [item['score'] for item in response]
+        self.assertEqual(scores, sorted(scores, reverse=True))
+        self.assertTrue(all(1 <= score <= 5 for score in scores))
+
+
+class AdmissionControlTests(APITestCase):
+    def setUp(self):
+        caches['throttle'].clear()
+        self.user = User.objects.create_user(username='alice')
+        self.review = Review.objects.create(movie=make_movie(), user=self.user, review_content='x', rating=5)
+        self.client.force_authenticate(self.user)
+
+    def test_limiter_queues_then_sheds(self):
+        limiter = admission.Limiter('test', concurrency=1, queue=1, timeout=5)
+        self.assertTrue(limiter.acquire())
+        queued = []
+        waiter = threading.Thread(target=lambda: queued.append(limiter.acquire()))
+        waiter.start()
+        while not limiter.snapshot()['waiting']:
+            time.sleep(0.001)
+        self.assertFalse(limiter.acquire())  # The queue is full
+        limiter.release()
+        waiter.join()
+        self.assertEqual(queued, [True])
+        snapshot = limiter.snapshot()
+        self.assertEqual((snapshot['active'], snapshot['admitted'], snapshot['rejected']), (1, 2, 1))
+
+        impatient = admission.Limiter('test', concurrency=1, queue=1, timeout=0.01)
+        impatient.acquire()
+        self.assertFalse(impatient.acquire())
+        self.assertEqual(impatient.snapshot()['timed_out'], 1)
+
+    @override_settings(ADMISSION={'CLASSES': {'search': {'CONCURRENCY': 0}}, 'RETRY_AFTER': 3})
+    def test_full_class_is_shed_with_503_and_others_still_served(self):
+        with self.assertLogs('reviews.admission', 'WARNING'):
+            response = self.client.get(reverse('review-search'), {'rating': 5})
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '3')
+        self.assertEqual(self.client.get(reverse('review-detail', args=[self.review.pk])).status_code, 200)
+
+        self.client.force_authenticate(User.objects.create_user(username='staff', is_staff=True))
+        metrics = self.client.get(reverse('admission-metrics')).json()
+        self.assertEqual((metrics['search']['rejected'], metrics['search']['active']), (1, 0))
+
+    @override_settings(ADMISSION={'CLASSES': {'search': {'THROTTLE': {'RATE': 0.01, 'BURST': 2}}}, 'THROTTLE_CACHE': 'throttle'})
+    def test_token_bucket_throttles_each_user(self):
+        url = reverse('review-search')
+        self.assertEqual([self.client.get(url, {'rating': 5}).status_code for _ in range(3)], [200, 200, 429])
+        self.assertIn('Retry-After', self.client.get(url, {'rating': 5}))
+        self.client.force_authenticate(User.objects.create_user(username='bob'))
+        self.assertEqual(self.client.get(url, {'rating': 5}).status_code, 200)
+
+    @override_settings(ADMISSION={'CLASSES': {'export': {'CONCURRENCY': 1, 'QUEUE': 0}}})
+    def test_export_holds_its_slot_until_the_stream_closes(self):
+        url = reverse('review-export')
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(admission.get_limiter('export').snapshot()['active'], 1)
+        with self.assertLogs('reviews.admission', 'WARNING'):
+            self.assertEqual(self.client.get(url).status_code, 503)
+
+        b''.join(response.streaming_content)  # The test client closes the response once it is read
+        self.assertEqual(admission.get_limiter('export').snapshot()['active'], 0)
+        self.assertEqual(len(b''.join(self.client.get(url).streaming_content).splitlines()), 1)
+
+
+def shared_ingest_settings(directory, **config):
+    # Tickets and pending flags in a file-based cache, which every worker process would see
+    backend = {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': os.path.join(directory, 'cache')}
+    return override_settings(
+        CACHES={**settings.CACHES, 'ingest': backend},
+        REVIEW_INGEST={'ENABLED': True, 'DIR': os.path.join(directory, 'logs'), 'CACHE': 'ingest', **config},
+    )
+
+
+@override_settings(QUERY_BUDGET_MODE='raise')
+class WriteBehindIngestTests(APITestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = os.path.join(directory.name, 'logs')
+        os.mkdir(self.directory)
+        overrides = shared_ingest_settings(directory.name, FLUSH_MS=None)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        self.addCleanup(ingest.close)
+
+        self.user = User.objects.create_user(username='alice')
+        self.movie = make_movie()
+        leaderboards.rebuild()
+        self.client.force_authenticate(self.user)
+
+    def post(self, rating=5):
+        return self.client.post(
+            reverse('review-list-create'), {'movie': self.movie.pk, 'review_content': 'Queued', 'rating': rating},
+            format='json',
+        )
+
+    def test_posts_are_queued_then_flushed_for_the_author(self):
+        responses = [self.post(rating) for rating in (5, 4, 3)]
+        self.assertEqual([response.status_code for response in responses], [202, 202, 202])
+        self.assertEqual(responses[0].data['status'], 'pending')
+        self.assertEqual(responses[0].data['movie_title'], 'Inception')
+        self.assertFalse(Review.objects.exists())
+        self.assertEqual(self.post(rating=9).status_code, 400)  # Still validated up front
+
+        # The author's next read flushes the log first, outside the view's budget
+        response = self.client.get(reverse('review-list-create'))
+        self.assertEqual([review['rating'] for review in response.json()['results']], [5, 4, 3])
+        self.movie.refresh_from_db()
+        self.assertEqual((self.movie.review_count, self.movie.rating_sum), (3, 12))
+        self.assertEqual(self.movie.ranking.week_count, 3)
+
+        status = self.client.get(responses[1]['Location']).json()
+        self.assertEqual((status['status'], status['review']['rating']), ('saved', 4))
+        self.assertEqual(ingest.flush_all(), 0)  # Nothing is inserted twice
+
+        self.client.force_authenticate(User.objects.create_user(username='bob'))
+        self.assertEqual(self.client.get(responses[1]['Location']).status_code, 404)
+
+    def test_recover_replays_a_dead_process_log_from_its_checkpoint(self):
+        gone = make_movie('Deleted')
+        entries = [
+            {'ticket': 'a', 'user': self.user.pk, 'movie': self.movie.pk, 'review_content': 'Saved', 'rating': 5},
+            {'ticket': 'b', 'user': self.user.pk, 'movie': self.movie.pk, 'review_content': 'Lost', 'rating': 2},
+            {'ticket': 'c', 'user': self.user.pk, 'movie': gone.pk, 'review_content': 'Gone', 'rating': 1},
+        ]
+        lines = [json.dumps(entry).encode() + b'\n' for entry in entries]
+        path = os.path.join(self.directory, 'reviews-otherhost-1-dead.log')
+        with open(path, 'wb') as file:
+            file.write(b''.join(lines) + b'{"ticket": "d", "us')  # Cut off mid-write
+        # The first review was inserted before the process died
+        IngestLog.objects.create(name=os.path.basename(path), offset=len(lines[0]))
+        gone.delete()
+
+        with self.assertLogs('reviews.ingest', 'WARNING'):
+            self.assertEqual(ingest.recover(self.directory), 2)
+        self.assertEqual(list(Review.objects.values_list('review_content', flat=True)), ['Lost'])
+        self.assertEqual(ingest.ticket_status('c')['status'], 'rejected')
+        self.assertFalse(os.path.exists(path))
+        self.assertFalse(IngestLog.objects.exists())
+
+    def test_live_log_is_not_recovered_and_rotates_once_flushed(self):
+        self.post()
+        log = ingest.get_log()
+        self.assertEqual(ingest.recover(self.directory), 0)  # Its process holds the lock
+        self.assertFalse(log.rotate())  # Not inserted yet
+        self.assertEqual(ingest.flush_all(), 1)
+        with override_settings(REVIEW_INGEST={'DIR': self.directory, 'ROTATE_BYTES': 1}):
+            self.assertTrue(log.rotate())
+        self.assertEqual(os.listdir(self.directory), [log.name])
+        self.assertEqual(list(IngestLog.objects.values_list('name', flat=True)), [log.name])
+
+    def test_local_memory_cache_keeps_write_behind_off(self):
+        with override_settings(REVIEW_INGEST={'ENABLED': True, 'DIR': self.directory}):
+            self.assertEqual([error.id for error in ingest.ingest_check()], ['reviews.E002'])
+            self.assertEqual(self.post().status_code, 201)  # Inserted at once
+        self.assertEqual(ingest.ingest_check(), [])
+        self.assertEqual(Review.objects.count(), 1)
+
+    @override_settings(REVIEW_INGEST={'ENABLED': False})
+    def test_disabled_ingest_creates_at_once_without_a_second_movie_lookup(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.post()
+        self.assertEqual(response.status_code, 201)
+        movie_lookups = [query for query in queries if query['sql'].startswith('SELECT') and '"reviews_movie"' in query['sql']]
+        self.assertEqual(len(movie_lookups), 1)
+
+
+class WriteBehindFlusherTests(TransactionTestCase):
+    def test_flusher_thread_inserts_within_flush_interval(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        overrides = shared_ingest_settings(directory.name, FLUSH_MS=20)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        self.addCleanup(ingest.close)
+
+        movie = make_movie()
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user(username='alice'))
+        for rating in (1, 2):
+            response = client.post(
+                reverse('review-list-create'), {'movie': movie.pk, 'review_content': 'Queued', 'rating': rating},
+                format='json',
+            )
+            self.assertEqual(response.status_code, 202)
+        deadline = time.monotonic() + 5
+        while Review.objects.count() < 2 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(sorted(Review.objects.values_list('rating', flat=True)), [1, 2])
+
+
+@override_settings(QUERY_BUDGET_MODE='raise', CHANGE_LOG={'PAGE_SIZE': 100, 'MAX_LIMIT': 1000})
+class ChangeFeedTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='alice')
+        self.movie = make_movie()
+        self.client.force_authenticate(self.user)
+
+    def sync(self, cursor=0, limit=None):
+        """
+        Every page after ``cursor``; returns the changes and the final cursor.
+        """
+        changes = []
+        while True:
+            url = f'{reverse("change-feed")}?cursor={cursor}' + (f'&limit={limit}' if limit else '')
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200, response.data)
+            changes += response.data['changes']
+            cursor = response.data['cursor']
+            if not response.data['has_more']:
+                return changes, cursor
+
+    def test_sync_from_scratch_then_only_the_changes(self):
+        review = Review.objects.create(movie=self.movie, user=self.user, review_content='x', rating=3)
+        changes, cursor = self.sync(limit=1)
+        # The review updated the movie's aggregates after it was inserted, so the movie comes last, once
+        self.assertEqual([(change['model'], change['id']) for change in changes], [('review', review.pk), ('movie', self.movie.pk)])
+        self.assertEqual(changes[0]['data']['movie_title'], 'Inception')
+        self.assertEqual(changes[1]['data']['review_count'], 1)
+
+        # Steady state: nothing new, nothing sent
+        self.assertEqual(self.sync(cursor), ([], cursor))
+
+        # A bulk insert, a renamed user and a raw update all reach the log
+        other = Review.objects.bulk_create([Review(movie=self.movie, user=self.user, review_content='y', rating=5)])[0]
+        Review.objects.filter(pk=review.pk).update(rating=1)
+        self.user.username = 'alicia'
+        self.user.save()
+        changes, cursor = self.sync(cursor)
+        self.assertEqual({(change['model'], change['id']) for change in changes}, {('review', other.pk), ('review', review.pk)})
+        self.assertEqual({change['data']['user'] for change in changes}, {'alicia'})
+
+    def test_cascaded_deletes_leave_tombstones(self):
+        reviews = [Review.objects.create(movie=self.movie, user=self.user, review_content='x', rating=r) for r in (1, 2)]
+        other_movie = make_movie('Heat')
+        bob = User.objects.create_user(username='bob')
+        bobs = Review.objects.create(movie=other_movie, user=bob, review_content='z', rating=4)
+        _, cursor = self.sync()
+
+        self.movie.delete()
+        bob.delete()
+        changes, _ = self.sync(cursor)
+        tombstones = {(change['model'], change['id']) for change in changes if change['deleted']}
+        self.assertEqual(tombstones, {
+            ('movie', reviews[0].movie_id), ('review', reviews[0].pk), ('review', reviews[1].pk), ('review', bobs.pk),
+        })
+        self.assertTrue(all('data' not in change for change in changes if change['deleted']))
+
+    def test_pruned_tombstones_expire_older_cursors(self):
+        review = Review.objects.create(movie=self.movie, user=self.user, review_content='x', rating=3)
+        _, old_cursor = self.sync()
+        review.delete()
+        self.assertEqual(changelog.prune(timedelta(0)), 1)
+        self.assertEqual(changelog.prune(timedelta(0)), 0)
+
+        response = self.client.get(reverse('change-feed'), {'cursor': old_cursor})
+        self.assertEqual(response.status_code, 410)
+        changes, _ = self.sync()  # Starting over still gets the current rows
+        self.assertEqual([(change['model'], change['deleted']) for change in changes], [('movie', False)])
+        self.assertEqual(self.client.get(reverse('change-feed'), {'cursor': -1}).status_code, 400)
+
+
+@override_settings(QUERY_BUDGET_MODE='raise', RESPONSE_CACHE=None)
+class SparseFieldsetTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='alice')
+        self.movie = make_movie()
+        self.review = Review.objects.create(movie=self.movie, user=self.user, review_content='Long text', rating=4)
+
+    def get_sql(self, url, params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json(), queries[-1]['sql']
+
+    def test_thin_fieldsets_fetch_only_their_columns(self):
+        for fast in (True, False):
+            with self.subTest(fast=fast), override_settings(FAST_LIST_SERIALIZATION=fast):
+                data, sql = self.get_sql(reverse('review-list-create'), {'fields': 'id,rating,movie'})
+                self.assertEqual(data['results'], [{'id': self.review.pk, 'rating': 4, 'movie': self.movie.pk}])
+                self.assertNotIn('JOIN', sql)
+                self.assertNotIn('review_content', sql)
+
+                data, sql = self.get_sql(reverse('movie-list-create'), {'omit': 'description'})
+                self.assertNotIn('description', data['results'][0])
+                self.assertNotIn('description', sql)
+
+        data, sql = self.get_sql(reverse('review-detail', args=[self.review.pk]), {'fields': 'rating,user'})
+        self.assertEqual(data, {'rating': 4, 'user': 'alice'})
+        self.assertIn('auth_user', sql)
+        self.assertNotIn('reviews_movie', sql)
+
+    def test_expand_nests_the_movie_and_user(self):
+        data, _ = self.get_sql(reverse('review-detail', args=[self.review.pk]), {'fields': 'id', 'expand': 'movie,user'})
+        self.assertEqual(data['user'], {'id': self.user.pk, 'username': 'alice'})
+        self.assertEqual(data['movie']['movie_title'], 'Inception')
+        self.assertEqual(data['movie']['rating_histogram']['4'], 1)
+        self.assertEqual(list(data), ['id', 'movie', 'user'])
+
+    def test_fields_without_a_nested_form_are_kept_as_they_are(self):
+        fieldset = fieldsets.Fieldset(('id', 'movie_title'), frozenset({'movie_title'}), ())
+        data = MovieSerializer(self.movie, context={'fieldset': fieldset}).data
+        self.assertEqual(data, {'id': self.movie.pk, 'movie_title': 'Inception'})
+
+    def test_unknown_names_are_rejected_and_writes_keep_every_field(self):
+        response = self.client.get(reverse('review-list-create'), {'fields': 'id,secret', 'expand': 'movie_title'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(set(response.json()), {'fields', 'expand'})
+        self.assertEqual(self.client.get(reverse('movie-list-create'), {'expand': 'user'}).status_code, 400)
+
+        self.client.force_authenticate(self.user)
+        response = self.client.patch(
+            f'{reverse("review-detail", args=[self.review.pk])}?fields=id', {'rating': 2}, format='json',
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['review_content'], 'Long text')
+
+
+class OpenAPISchemaTests(APITestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        settings_override = override_settings(OPENAPI_SCHEMA={'DIR': self.directory})
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        schema.clear()
+        self.addCleanup(schema.clear)
+
+    def get_spec(self, name='schema-swagger-ui', format='openapi', **headers):
+        return self.client.get(reverse(name), {'format': format}, **headers)
+
+    def test_spec_is_generated_once_and_revalidated(self):
+        with mock.patch.object(schema, 'generate', wraps=schema.generate) as generate, \
+                self.assertLogs('drf_yasg', 'WARNING'):
+            swagger = self.get_spec()
+            redoc = self.get_spec('schema-redoc')
+            yaml = self.get_spec(format='yaml')
+        generate.assert_called_once()
+
+        self.assertEqual(swagger.status_code, 200)
+        self.assertEqual(swagger.content, redoc.content)
+        spec = json.loads(swagger.content)
+        self.assertIn('/movies/', spec['paths'])
+        self.assertNotIn('host', spec)
+        # The views' swagger_auto_schema, applied when the schema was generated
+        export = spec['paths']['/reviews/export/']['get']
+        self.assertEqual(export['summary'], 'Export reviews')
+        self.assertIn('created_after', [parameter['name'] for parameter in export['parameters']])
+        self.assertIn(b'/movies/:', yaml.content)
+        self.assertNotEqual(swagger['ETag'], yaml['ETag'])
+
+        response = self.get_spec(HTTP_IF_NONE_MATCH=swagger['ETag'])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], swagger['ETag'])
+
+        response = self.client.get(reverse('schema-redoc'))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('text/html', response['Content-Type'])
+
+    def test_built_files_are_served_without_generating(self):
+        with self.assertRaises(CommandError):
+            call_command('build_openapi_schema', check=True)
+        with self.assertLogs('drf_yasg', 'WARNING'):
+            call_command('build_openapi_schema', verbosity=0)
+        call_command('build_openapi_schema', check=True)
+        open(os.path.join(self.directory, 'openapi-stale.json'), 'w').close()
+        with self.assertLogs('drf_yasg', 'WARNING'):
+            call_command('build_openapi_schema', verbosity=0)
+        self.assertEqual(len(os.listdir(self.directory)), 2)
+
+        schema.clear()
+        with mock.patch.object(schema, 'generate') as generate:
+            response = self.get_spec(format='json')
+        generate.assert_not_called()
+        with open(schema.artifact_path(schema.fingerprint(), 'json'), 'rb') as file:
+            self.assertEqual(response.content, file.read())
+
+
+class StartupTests(APITestCase):
+    def test_urlconf_leaves_the_docs_tooling_unloaded(self):
+        modules = {entry.module for entry in startup.import_times('movie_review_api.urls')}
+        self.assertIn('reviews.views', modules)
+        self.assertFalse({'drf_yasg.views', 'drf_yasg.utils', 'movie_review_api.docs'} & modules)
+
+    def test_warm_up_opens_connections_and_runs_requests(self):
+        make_movie()
+        with override_settings(WARMUP=None):
+            self.assertEqual(startup.warm_up(), {})
+
+        urls = [f'{reverse("movie-list-create")}?page_size=1', '/api/missing/']
+        with override_settings(WARMUP={'CONNECTIONS': True, 'URLS': urls}), \
+                self.assertLogs('reviews.startup', 'INFO') as logs:
+            timings = startup.warm_up()
+        self.assertEqual(list(timings), ['urls', 'rest_framework', 'connections', 'requests'])
+        self.assertIsNotNone(connection.connection)
+        self.assertTrue(any('/api/missing/ answered 404' in line for line in logs.output))
+        self.assertFalse(any('/api/movies/' in line for line in logs.output if 'answered' in line))
+
+    def test_servers_prepare_workers_only_when_asked(self):
+        for module in ('movie_review_api.wsgi', 'movie_review_api.asgi'):
+            for prepare in (False, True):
+                with self.subTest(module=module, prepare=prepare), override_settings(PREPARE_WORKER=prepare), \
+                        mock.patch.object(startup, 'prepare_worker') as prepare_worker:
+                    importlib.reload(importlib.import_module(module))
+                self.assertEqual(prepare_worker.called, prepare)
+
+    def test_prepare_worker_checks_the_database_before_warming_up(self):
+        # verify_startup closes the connections, which the test case still needs
+        with mock.patch.object(sqlite, 'verify_startup', side_effect=ImproperlyConfigured), \
+                mock.patch.object(startup, 'warm_up') as warm_up, self.assertRaises(ImproperlyConfigured):
+            startup.prepare_worker()
+        warm_up.assert_not_called()
+        with mock.patch.object(sqlite, 'verify_startup') as verify_startup, \
+                override_settings(WARMUP={'CONNECTIONS': False}):
+            self.assertEqual(list(startup.prepare_worker()), ['urls', 'rest_framework'])
+        verify_startup.assert_called_once_with()
+
+
+class TypeaheadTests(APITestCase):
+    def setUp(self):
+        caches['default'].clear()
+        typeahead.clear()
+        self.addCleanup(typeahead.clear)
+        self.knight = make_movie('The Dark Knight', review_count=50)
+        self.hour = make_movie('Darkest Hour', review_count=10)
+        self.city = make_movie('Dark City', review_count=3)
+        make_movie('Amélie', review_count=1)
+
+    def suggest(self, q, **params):
+        response = self.client.get(reverse('movie-autocomplete'), {'q': q, **params})
+        self.assertEqual(response.status_code, 200)
+        return [result['movie_title'] for result in response.data['results']]
+
+    def test_title_words_match_most_reviewed_first_without_queries(self):
+        self.assertEqual(self.suggest('dark'), ['The Dark Knight', 'Darkest Hour', 'Dark City'])
+        with self.assertNumQueries(0):
+            self.assertEqual(self.suggest('DARK k'), ['The Dark Knight'])
+            self.assertEqual(self.suggest('ame'), ['Amélie'])
+            self.assertEqual(self.suggest('dark', limit=1), ['The Dark Knight'])
+            self.assertEqual(len(self.suggest('d', limit='many')), 3)
+            self.assertEqual(self.suggest(''), [])
+            self.assertEqual(self.suggest('knights'), [])
+        response = self.client.get(reverse('movie-autocomplete'), {'q': 'city'})
+        self.assertEqual(response.data['results'], [{'id': self.city.pk, 'movie_title': 'Dark City', 'review_count': 3}])
+
+    def test_saves_and_deletes_change_the_index_in_place(self):
+        self.suggest('dark')
+        with mock.patch.object(typeahead, 'build') as build:
+            with self.captureOnCommitCallbacks(execute=True):
+                water = make_movie('Dark Water', review_count=20)
+            self.assertEqual(self.suggest('dark'), ['The Dark Knight', 'Dark Water', 'Darkest Hour', 'Dark City'])
+            with self.captureOnCommitCallbacks(execute=True):
+                water.movie_title = 'Deep Water'
+                water.save()
+                self.city.delete()
+            self.assertEqual(self.suggest('dark'), ['The Dark Knight', 'Darkest Hour'])
+            self.assertEqual(self.suggest('water'), ['Deep Water'])
+        build.assert_not_called()
+
+    def test_other_processes_writes_rebuild_the_index(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        shared = {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': directory.name}
+        with override_settings(CACHES={**settings.CACHES, 'titles': shared}, TYPEAHEAD={'CACHE': 'titles', 'CHECK_SECONDS': 0}):
+            self.suggest('dark')
+            # A write in another process moves the shared version on
+            Movie.objects.filter(pk=self.hour.pk).update(movie_title='Brightest Hour')
+            self.assertEqual(self.suggest('dark'), ['The Dark Knight', 'Darkest Hour', 'Dark City'])
+            other_process = FileBasedCache(directory.name, {})
+            other_process.set(caching.VERSION_KEY.format(typeahead.VERSION_NAME), 'elsewhere', timeout=None)
+            self.assertEqual(self.suggest('dark'), ['The Dark Knight', 'Dark City'])
+
+            # Bulk writes send no signals and invalidate instead
+            with self.captureOnCommitCallbacks(execute=True):
+                Movie.objects.bulk_create([Movie(movie_title='Dark Star', release_date=date(1974, 1, 1))])
+                typeahead.invalidate()
+            self.assertEqual(self.suggest('dark star'), ['Dark Star'])
+
+    @override_settings(TYPEAHEAD={'CACHE': 'default', 'CHECK_SECONDS': 0})
+    def test_local_memory_versions_are_not_used(self):
+        self.assertEqual([warning.id for warning in typeahead.typeahead_check()], ['reviews.W002'])
+        self.assertIsNone(typeahead.shared_version())
+        self.suggest('dark')
+        with self.captureOnCommitCallbacks(execute=True):
+            make_movie('Dark Water', review_count=20)
+        self.assertEqual(self.suggest('dark water'), ['Dark Water'])  # This process's own writes still apply
+        self.assertNotIn(caching.VERSION_KEY.format(typeahead.VERSION_NAME), caches['default'])
+
+    def test_changed_index_answers_like_a_rebuilt_one(self):
+        rng = random.Random(0)
+        words = ['the', 'dark', 'darker', 'day', 'night', 'knight', 'door']
+        movies = {
+            movie_id: (' '.join(rng.choices(words, k=rng.randint(1, 3))).title(), rng.randrange(10))
+            for movie_id in range(60)
+        }
+        index = typeahead.PrefixIndex(movies, top_size=5, scan_limit=4)
+        self.assertIn('d', index.top)
+        for step in range(200):
+            movie_id = rng.randrange(80)
+            if rng.random() < 0.3:
+                index = index.without_movie(movie_id)
+            else:
+                index = index.with_movie(movie_id, ' '.join(rng.choices(words, k=rng.randint(1, 3))), rng.randrange(10))
+        rebuilt = typeahead.PrefixIndex(dict(index.movies), top_size=5, scan_limit=4)
+        self.assertEqual(index.keys, rebuilt.keys)
+        self.assertEqual(list(index.ids), list(rebuilt.ids))
+        for prefix in ['d', 'da', 'dar', 'dark', 'dark k', 'k', 'the', 'the d', 'n', 'door']:
+            for limit in (1, 5, 8):
+                self.assertEqual(index.lookup(prefix, limit), rebuilt.lookup(prefix, limit), (prefix, limit))
+
+    def test_warm_up_builds_the_index(self):
+        with override_settings(WARMUP={'CONNECTIONS': False, 'TYPEAHEAD': True}):
+            self.assertEqual(list(startup.warm_up()), ['urls', 'rest_framework', 'typeahead'])
+        with self.assertNumQueries(0):
+            self.assertEqual(self.suggest('amelie'), ['Amélie'])
@@ -0,0 +1,339 @@
+"""
+Movie-title suggestions for the search box, from an in-memory prefix index.
+
+Every keystroke in the search box used to run ``ReviewSearchFilter``, a
+``LIKE`` join returning a page of reviews, when the box only needs a few
+titles. ``/api/movies/autocomplete/?q=`` answers from a ``PrefixIndex``
+each worker keeps in memory instead, without a query.
+
+Titles are normalized (case folded, accents and punctuation dropped) and
+every word suffix of a title is a key: "The Dark Knight" is found as
+"the dark knight", "dark knight" and "knight". The keys sit in one sorted
+list with the movie ids alongside, so the titles matching a prefix are the
+contiguous range a binary search finds. Suggestions are the matching movies
+with the most reviews first. Ranking a range costs time in its length, so
+the top ``MAX_LIMIT`` movies of every prefix whose range is longer than
+``SCAN_LIMIT`` keys ("t", "the", ...) are ranked when the index is built.
+
+Each process builds its index with one query, when ``startup.warm_up``
+runs or on the first lookup. Movie saves and deletes replace the index in
+their process with a copy holding the change once the transaction commits,
+and set a new ``movietitles`` version in the ``TYPEAHEAD['CACHE']`` cache;
+the other processes see the version change within ``CHECK_SECONDS`` and
+rebuild. That cache has to be one the processes share: without one (the
+default, and a local-memory alias counts as none, see ``reviews.W002``) the
+other processes only catch up at their next refresh. Writes that send no
+signals (bulk endpoints, imports) call ``invalidate``. Review counts change through ``QuerySet.update()`` on every
+review write, so the weights are refreshed by a rebuild every
+``REFRESH_SECONDS`` rather than per review. A process rebuilding keeps
+answering from its previous index meanwhile.
+"""
+import re
+import threading
+import time
+import unicodedata
+from array import array
+from bisect import bisect_left
+from collections import namedtuple
+from heapq import nsmallest
+
+from django.conf import settings
+from django.core import checks
+from django.core.cache import caches
+from django.db import transaction
+
+from . import caching
+from .models import Movie
+
+
+VERSION_NAME = 'movietitles'
+
+# Sorts after every character normalize() keeps, so prefix + END bounds the keys starting with prefix
+END = '\U0010ffff'
+
+_APOSTROPHES = str.maketrans('', '', "'’")
+_SEPARATORS = re.compile(r'[\W_]+')
+
+Suggestion = namedtuple('Suggestion', ['id', 'movie_title', 'review_count'])
+
+
+def _config():
+    return getattr(settings, 'TYPEAHEAD', None) or {}
+
+
+def normalize(text):
+    """
+    ``text`` as the index compares it: case folded, without accents, words separated by single spaces.
+    """
+    text = text.casefold().translate(_APOSTROPHES)
+    if not text.isascii():
+        text = ''.join(char for char in unicodedata.normalize('NFKD', text) if not unicodedata.combining(char))
+    return ' '.join(word for word in _SEPARATORS.split(text) if word)
+
+
+def _keys(title):
+    words = normalize(title).split(' ')
+    return [' '.join(words[start:]) for start in range(len(words)) if words[start]]
+
+
+class PrefixIndex:
+    """
+    Immutable index of ``{movie_id: (title, review_count)}``; changes return a new index.
+    """
+    def __init__(self, movies, top_size=50, scan_limit=256):
+        self.movies = movies
+        self.top_size = top_size
+        self.scan_limit = scan_limit
+        entries = sorted((key, movie_id) for movie_id, (title, _) in movies.items() for key in _keys(title))
+        self.keys = [key for key, _ in entries]
+        self.ids = array('q', [movie_id for _, movie_id in entries])
+        self.top = self._rank_long_ranges()
+
+    def __len__(self):
+        return len(self.movies)
+
+    def _rank(self, movie_id):
+        title, weight = self.movies[movie_id]
+        return (-weight, title.casefold(), movie_id)
+
+    def _range(self, prefix, lo=0, hi=None):
+        hi = len(self.keys) if hi is None else hi
+        lo = bisect_left(self.keys, prefix, lo, hi)
+        return lo, bisect_left(self.keys, prefix + END, lo, hi)
+
+    def _best(self, lo, hi, limit):
+        # A movie with two words starting with the prefix has two keys in the range
+        return nsmallest(limit, set(self.ids[lo:hi]), key=self._rank)
+
+    def _rank_long_ranges(self):
+        # Prefixes one character longer than the previous level's long ones, until none is long
+        top = {}
+        ranges = [(0, len(self.keys))]
+        length = 0
+        while ranges:
+            length += 1
+            longer = []
+            for lo, hi in ranges:
+                position = lo
+                while position < hi:
+                    prefix = self.keys[position][:length]
+                    if len(prefix) < length:
+                        # The whole key, already counted under the previous level's prefix
+                        position = bisect_left(self.keys, prefix + '\0', position, hi)
+                        continue
+                    start, end = self._range(prefix, position, hi)
+                    if end - start > self.scan_limit:
+                        top[prefix] = self._best(start, end, self.top_size)
+                        longer.append((start, end))
+                    position = end
+            ranges = longer
+        return top
+
+    def lookup(self, query, limit=10):
+        """
+        The ``limit`` movies with the most reviews and a title word starting with ``query``.
+        """
+        prefix = normalize(query)
+        if not prefix:
+            return []
+        if prefix in self.top and limit <= self.top_size:
+            movie_ids = self.top[prefix][:limit]
+        else:
+            movie_ids = self._best(*self._range(prefix), limit)
+        return [Suggestion(movie_id, *self.movies[movie_id]) for movie_id in movie_ids]
+
+    def with_movie(self, movie_id, title, review_count):
+        """
+        A copy with the movie added, or its title and review count replaced.
+        """
+        return self._changed(movie_id, (title, review_count))
+
+    def without_movie(self, movie_id):
+        return self._changed(movie_id, None)
+
+    def _changed(self, movie_id, entry):
+        old = self.movies.get(movie_id)
+        if old == entry:
+            return self
+        index = object.__new__(PrefixIndex)
+        index.top_size, index.scan_limit = self.top_size, self.scan_limit
+        index.movies = dict(self.movies)
+        index.keys = list(self.keys)
+        index.ids = array('q', self.ids)
+        old_keys = _keys(old[0]) if old else []
+        new_keys = _keys(entry[0]) if entry else []
+
+        for key in old_keys:
+            position = bisect_left(index.keys, key)
+            while index.ids[position] != movie_id:
+                position += 1
+            del index.keys[position], index.ids[position]
+        index.movies.pop(movie_id, None)
+        if entry:
+            index.movies[movie_id] = entry
+        for key in new_keys:
+            position = bisect_left(index.keys, key)
+            while position < len(index.keys) and index.keys[position] == key and index.ids[position] < movie_id:
+                position += 1
+            index.keys.insert(position, key)
+            index.ids.insert(position, movie_id)
+
+        # Prefixes that only grow long through changes are scanned until the next rebuild
+        index.top = dict(self.top)
+        prefixes = {key[:length] for key in old_keys + new_keys for length in range(1, len(key) + 1)}
+        for prefix in prefixes & index.top.keys():
+            listed = index.top[prefix]
+            matches = any(key.startswith(prefix) for key in new_keys)
+            if movie_id in listed and (not matches or index._rank(movie_id) > self._rank(movie_id)):
+                # Dropped or moved down: the movie that moves up into the list is not known, rank again
+                index.top[prefix] = index._best(*index._range(prefix), index.top_size)
+            elif matches:
+                ranked = sorted({*listed, movie_id}, key=index._rank)
+                index.top[prefix] = ranked[:index.top_size]
+        return index
+
+
+def build():
+    """
+    A new index of every movie, from one query.
+    """
+    config = _config()
+    movies = {
+        movie_id: (title, review_count)
+        for movie_id, title, review_count in Movie.objects.values_list('id', 'movie_title', 'review_count').iterator()
+    }
+    return PrefixIndex(movies, top_size=config.get('MAX_LIMIT', 50), scan_limit=config.get('SCAN_LIMIT', 256))
+
+
+def _cache():
+    # A version in a process-local cache would never reach the other processes
+    alias = _config().get('CACHE')
+    cache = caches[alias] if alias else None
+    return None if cache is None or caching.is_process_local(cache) else cache
+
+
+def typeahead_check(app_configs=None, **kwargs):
+    alias = _config().get('CACHE')
+    if not alias or not caching.is_process_local(caches[alias]):
+        return []
+    return [checks.Warning(
+        f'TYPEAHEAD["CACHE"] {alias!r} is local to each process, so title changes only reach the other '
+        'processes at their next refresh.',
+        hint='Point it at a cache the worker processes share (Redis, Memcached, database), or set it to None.',
+        id='reviews.W002',
+    )]
+
+
+def shared_version():
+    # None without a cache to hear about other processes' writes from
+    cache = _cache()
+    if cache is None:
+        return None
+    key = caching.VERSION_KEY.format(VERSION_NAME)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, caching._new_token(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def _set_new_version():
+    cache = _cache()
+    if cache is None:
+        return None
+    version = caching._new_token()
+    cache.set(caching.VERSION_KEY.format(VERSION_NAME), version, timeout=None)
+    return version
+
+
+Loaded = namedtuple('Loaded', ['index', 'version', 'built', 'checked'])
+
+_loaded = None  # Loaded of this process
+_lock = threading.Lock()
+
+
+def _current(loaded, now):
+    global _loaded
+    config = _config()
+    if now - loaded.built > config.get('REFRESH_SECONDS', 300):
+        return False
+    if now - loaded.checked < config.get('CHECK_SECONDS', 1):
+        return True
+    if loaded.version != shared_version():
+        return False
+    if _loaded is loaded:
+        _loaded = loaded._replace(checked=now)
+    return True
+
+
+def get_index():
+    """
+    This process's index, rebuilt first when another process changed a movie or it is due a refresh.
+    """
+    global _loaded
+    loaded = _loaded
+    if loaded is not None and _current(loaded, time.monotonic()):
+        return loaded.index
+    # One thread rebuilds, the others answer from the index there is, if any
+    if not _lock.acquire(blocking=loaded is None):
+        return loaded.index
+    try:
+        if _loaded is None or not _current(_loaded, time.monotonic()):
+            version = shared_version()  # Read first: a write committed during the query moves it on again
+            index = build()
+            now = time.monotonic()
+            _loaded = Loaded(index, version, now, now)
+        return _loaded.index
+    finally:
+        _lock.release()
+
+
+def suggest(query, limit=10):
+    return get_index().lookup(query, limit)
+
+
+def _apply(movie_id, entry):
+    global _loaded
+    with _lock:
+        loaded = _loaded
+        # Only an index that had every other change can take this one and stay current
+        in_sync = loaded is not None and loaded.version == shared_version()
+        version = _set_new_version()
+        if in_sync:
+            index = loaded.index.with_movie(movie_id, *entry) if entry else loaded.index.without_movie(movie_id)
+            _loaded = loaded._replace(index=index, version=version)
+
+
+def movie_saved(movie):
+    """
+    Put the movie's title into the index once the transaction commits.
+    """
+    movie_id, entry = movie.pk, (movie.movie_title, movie.review_count)
+    transaction.on_commit(lambda: _apply(movie_id, entry))
+
+
+def movie_deleted(movie):
+    movie_id = movie.pk
+    transaction.on_commit(lambda: _apply(movie_id, None))
+
+
+def invalidate():
+    """
+    Make every process rebuild its index, after movie writes that send no signals.
+    """
+    def outdate():
+        global _loaded
+        with _lock:
+            _set_new_version()
+            if _loaded is not None:
+                _loaded = _loaded._replace(built=float('-inf'))
+    transaction.on_commit(outdate)
+
+
+def clear():
+    """
+    Forget this process's index.
+    """
+    global _loaded
+    with _lock:
+        _loaded = None
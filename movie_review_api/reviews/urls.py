@@ -1,6 +1,6 @@
 
 from django.urls import path, include
-from . import views
+from . import async_views, views
 from rest_framework.routers import DefaultRouter
 from .views import (
     ReviewListCreate, 
@@ -8,7 +8,10 @@ from .views import (
     MovieListCreate, 
     MovieDetail, 
     SignupView,
-    ReviewSearchFilter
+    ReviewSearchFilter,
+    ReviewBulk,
+    ReviewExport,
+    MovieBulk,
 )
 from rest_framework_simplejwt.views import (
     TokenObtainPairView,
@@ -27,10 +30,29 @@ urlpatterns = [
     # path('reviews/by-movie/<str:movie_title>', ReviewSearchFilter.as_view(), name='review-list-by-movie'),
     path('reviews/search-by-movie-or-rating/', ReviewSearchFilter.as_view(), name='review-search'),
     path('reviews/<int:pk>/', ReviewDetail.as_view(), name='review-detail'),
+    path('reviews/bulk/', ReviewBulk.as_view(), name='review-bulk'),
+    path('reviews/ingest/<str:ticket>/', views.ReviewIngestStatus.as_view(), name='review-ingest-status'),
+    path('reviews/export/', ReviewExport.as_view(), name='review-export'),
     path('movies/', MovieListCreate.as_view(), name='movie-list-create'),
     path('movies/<int:pk>/', MovieDetail.as_view(), name='movie-detail'),
+    path('movies/<int:pk>/similar/', views.SimilarMovies.as_view(), name='movie-similar'),
+    path('movies/recommended/', views.RecommendedMovies.as_view(), name='movie-recommended'),
+    path('movies/autocomplete/', views.MovieAutocomplete.as_view(), name='movie-autocomplete'),
+    path('movies/bulk/', MovieBulk.as_view(), name='movie-bulk'),
+    path('movies/leaderboards/<str:board>/', views.MovieLeaderboard.as_view(), name='movie-leaderboard'),
+    path('changes/', views.ChangeFeed.as_view(), name='change-feed'),
+    path('admission/metrics/', views.AdmissionMetrics.as_view(), name='admission-metrics'),
     path('signup/', SignupView.as_view(), name='signup'),
     path('login/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
+
+    # Async read endpoints, signup and login for ASGI deployments, see reviews.async_views
+    path('async/reviews/', async_views.ReviewList.as_view(), name='async-review-list'),
+    path('async/reviews/search-by-movie-or-rating/', async_views.ReviewSearch.as_view(), name='async-review-search'),
+    path('async/reviews/<int:pk>/', async_views.ReviewDetail.as_view(), name='async-review-detail'),
+    path('async/movies/', async_views.MovieList.as_view(), name='async-movie-list'),
+    path('async/movies/<int:pk>/', async_views.MovieDetail.as_view(), name='async-movie-detail'),
+    path('async/signup/', async_views.SignupView.as_view(), name='async-signup'),
+    path('async/login/', async_views.LoginView.as_view(), name='async-login'),
 ]
 # urlpatterns += router.urls
\ No newline at end of file
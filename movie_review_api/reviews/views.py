@@ -1,29 +1,56 @@
+import math
+import re
+
+from django.conf import settings
+from django.db import connection
+from django.http import StreamingHttpResponse
 from django.shortcuts import render
 from rest_framework import generics
 from .models import Movie, Review
-from .serializers import MovieSerializer, ReviewSerializer, UserSerializer
+from .serializers import (
+    MovieListSerializer, MovieRankingSerializer, MovieSerializer, ReviewListSerializer, ReviewSerializer,
+    ScoredMovieSerializer, UserSerializer,
+)
 from django.contrib.auth.models import User
 from django.contrib.auth import authenticate
-from rest_framework.pagination import PageNumberPagination
 from rest_framework import viewsets
-from rest_framework.permissions import AllowAny, IsAuthenticated, IsAuthenticatedOrReadOnly
+from rest_framework.permissions import AllowAny, IsAdminUser, IsAuthenticated, IsAuthenticatedOrReadOnly
 from .permissions import IsOwnerOrReadOnly
+from .admission import AdmissionControlMixin
+from .ingest import WriteBehindMixin
+from .budgets import QueryBudgetMixin, uncounted
+from .profiling import ProfiledViewMixin
+from .caching import CachedResponseMixin
+from .replicas import ReplicaReadMixin
+from .fieldsets import SparseFieldsetMixin
+from .rows import RowListMixin
+from .filters import MovieFilter
+from .docs import query_param, swagger_auto_schema
+from . import admission, changelog, export, ingest, leaderboards, recommendations, search, typeahead
+from .pagination import (
+    LeaderboardPagination,
+    MovieCursorPagination,
+    MovieSearchPagination,
+    ReviewCursorPagination,
+    ReviewPagination,
+    SearchPaginationMixin,
+)
 from rest_framework import status
+from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework.response import Response
-from drf_yasg.utils import swagger_auto_schema
 from rest_framework.views import APIView
 from rest_framework.authtoken.models import Token
-from drf_yasg import openapi
 from rest_framework import filters
 from django_filters.rest_framework import DjangoFilterBackend
 
 
 
 
-class SignupView(generics.CreateAPIView):
+class SignupView(ProfiledViewMixin, QueryBudgetMixin, generics.CreateAPIView):
     queryset = User.objects.all()
     permission_classes = [AllowAny]  # Allow anyone to register
     serializer_class = UserSerializer
+    query_budget = {'POST': 2}  # Username uniqueness check and insert
 
     @swagger_auto_schema(operation_summary="Signup a new user", operation_description="Register a new user account.")
     def create(self, request, *args, **kwargs):
@@ -59,25 +86,26 @@ class LoginView(APIView):
 
 
 ## View to list or create reviews 
-class ReviewListCreate(generics.ListCreateAPIView):
+class ReviewListCreate(ProfiledViewMixin, QueryBudgetMixin, AdmissionControlMixin, ReplicaReadMixin, WriteBehindMixin, CachedResponseMixin, SparseFieldsetMixin, RowListMixin, generics.ListCreateAPIView):
     """
     A simple view to fetch all movie reviews within the system.
-    Can also be used to create a new review for a specified movie.
+    Can also be used to create a new review for a specified movie, or to queue it
+    with 202 when the write-behind ingest of reviews.ingest is enabled.
     """
-    queryset = Review.objects.all()
+    queryset = Review.objects.select_related('movie', 'user')  # ReviewSerializer reads movie_title and username
     serializer_class = ReviewSerializer
     permission_classes = [IsAuthenticatedOrReadOnly, IsOwnerOrReadOnly]
+    pagination_class = ReviewCursorPagination
+    # Budgets include the JWT user lookup; a POST also validates the movie, updates its aggregates
+    # and updates its ranking in a transaction of its own
+    query_budget = {'GET': 2, 'POST': 8}
+    admission_class = {'GET': 'list'}  # See reviews.admission
+    cache_models = ('review', 'movie', 'user')  # Responses show the movie title and username
     
 
     def perform_create(self, serializer):
-        # Automatically associate the review with the logged-in user and validate the movie exists
-        movie_id = self.request.data.get('movie')  # Get the movie ID from request
-        try:
-            movie = Movie.objects.get(id=movie_id)
-            # Set the user who created the review as the logged-in user
-            serializer.save(user=self.request.user, movie=movie)
-        except Movie.DoesNotExist:
-            raise Response({"error": "Movie does not exist."}, status=status.HTTP_400_BAD_REQUEST)
+        # Automatically associate the review with the logged-in user; validation already loaded the movie
+        serializer.save(user=self.request.user)
 
     @swagger_auto_schema(operation_summary="List all reviews", operation_description="Retrieve all reviews for movies.")
     def list(self, request, *args, **kwargs):
@@ -89,13 +117,16 @@ class ReviewListCreate(generics.ListCreateAPIView):
 
 
 ## View to fetch details of a particular review
-class ReviewDetail(generics.RetrieveUpdateDestroyAPIView):
+class ReviewDetail(ProfiledViewMixin, QueryBudgetMixin, ReplicaReadMixin, CachedResponseMixin, SparseFieldsetMixin, generics.RetrieveUpdateDestroyAPIView):
     """
     A simple view to fetch the details of a specific movie review using the id.
     """
-    queryset = Review.objects.all()
+    queryset = Review.objects.select_related('movie', 'user')  # ReviewSerializer reads movie_title and username
     serializer_class = ReviewSerializer
     permission_classes = [IsAuthenticatedOrReadOnly, IsOwnerOrReadOnly]
+    # Moving a review to another movie updates the aggregates of both movies, then the leaderboards
+    query_budget = {'GET': 2, 'PUT': 10, 'PATCH': 10, 'DELETE': 8}
+    cache_models = ('review', 'movie', 'user')
 
     @swagger_auto_schema(operation_summary="Retrieve a review", operation_description="Retrieve details of a specific review.")
     def retrieve(self, request, *args, **kwargs):
@@ -110,46 +141,71 @@ class ReviewDetail(generics.RetrieveUpdateDestroyAPIView):
         return super().destroy(request, *args, **kwargs)
 
 
-## View to add pagination to Reviews List 
-class ReviewPagination(PageNumberPagination):
-    page_size = 5  # Number of reviews per page
-    page_size_query_param = 'page_size'
-    max_page_size = 10
-
+## View to follow a review queued by the write-behind ingest
+class ReviewIngestStatus(ProfiledViewMixin, QueryBudgetMixin, ReplicaReadMixin, WriteBehindMixin, APIView):
+    """
+    Status of a review queued with 202 by its ticket id, with the review once it is saved.
+    Only its author can see it.
+    """
+    permission_classes = [IsAuthenticated]
+    query_budget = 2  # JWT user lookup and the saved review; flushing the logs first is not counted
+
+    @swagger_auto_schema(operation_summary="Follow a queued review", operation_description="Status of a review accepted with 202, and the review once it is saved.")
+    def get(self, request, ticket):
+        state = ingest.ticket_status(ticket)
+        if state is None or state['user'] != request.user.pk:
+            raise NotFound('No queued review with this id.')
+        data = {'id': ticket, 'status': state['status']}
+        if state['status'] == 'pending':
+            return Response(data, status=status.HTTP_202_ACCEPTED)
+        if state['status'] == 'saved':
+            review = Review.objects.select_related('movie', 'user').filter(pk=state['review']).first()
+            data['review'] = ReviewSerializer(review).data if review is not None else None  # None once deleted
+        return Response(data)
 
 
 ## View to fetch reviews by Movie title 
-class ReviewSearchFilter(generics.ListAPIView):
+class ReviewSearchFilter(ProfiledViewMixin, QueryBudgetMixin, AdmissionControlMixin, ReplicaReadMixin, CachedResponseMixin, SearchPaginationMixin, SparseFieldsetMixin, RowListMixin, generics.ListAPIView):
     """
     A simple view to serach movie reviews within the system using either the movie title or rating.
+    Title and content searches use the full-text index and return the most relevant reviews first.
     """
     serializer_class = ReviewSerializer
-    pagination_class = ReviewPagination
+    pagination_class = ReviewCursorPagination
 
-    # Adding the search and filtering backends
-    filter_backends = [filters.SearchFilter, DjangoFilterBackend]
-    
-    # Allowing searching by movie title
-    search_fields = ['movie__movie_title']  # Searching in the related 'movie' field
-    search_param = 'movie_title'
+    # Ranked title/content searches are paged by page number, plain listings by cursor
+    search_params = ['movie_title', 'q']
+    search_pagination_class = ReviewPagination
+    query_budget = 3  # JWT user lookup, page count for ranked searches and the page itself
+    admission_class = 'search'
+    cache_models = ('review', 'movie', 'user')
+
+    # Title and content searches go through reviews.search, so only the rating filter backend is needed
+    filter_backends = [DjangoFilterBackend]
     
     # Allowing filtering by rating
     filterset_fields = ['rating']  # Optional filtering by rating (1-5)
     
     def get_queryset(self):
         """
-        Optionally restricts the returned reviews to a given movie title or rating,
+        Optionally restricts the returned reviews to a given movie title, review text or rating,
         by filtering against query parameters in the URL.
         """
-        queryset = Review.objects.all()  # Base queryset for all reviews
+        queryset = Review.objects.select_related('movie', 'user')  # Base queryset for all reviews, joined for the serializer
         
         # Extract query parameters
         movie_title = self.request.query_params.get('movie_title', None)
+        text = self.request.query_params.get('q', None)
         rating = self.request.query_params.get('rating', None)
 
-        # Filter by movie title if provided
-        if movie_title:
-            queryset = queryset.filter(movie__movie_title__icontains=movie_title)
+        # Full-text search on the movie title, matching each word as a prefix
+        if search.search_terms(movie_title):
+            # Results are ranked by the content search when both are given
+            queryset = search.search_reviews_by_movie_title(queryset, movie_title, ranked=not search.search_terms(text))
+
+        # Full-text search on the review content
+        if search.search_terms(text):
+            queryset = search.search_reviews(queryset, text)
         
         # Filter by rating if provided
         if rating:
@@ -160,8 +216,9 @@ class ReviewSearchFilter(generics.ListAPIView):
     
     @swagger_auto_schema(
     manual_parameters=[
-        openapi.Parameter('movie_title', openapi.IN_QUERY, description="Search by movie title", type=openapi.TYPE_STRING),
-        openapi.Parameter('rating', openapi.IN_QUERY, description="Filter by rating (1-5)", type=openapi.TYPE_INTEGER)
+        query_param('movie_title', 'string', "Search by movie title"),
+        query_param('q', 'string', "Search the review text"),
+        query_param('rating', 'integer', "Filter by rating (1-5)")
     ])
     def get(self, request, *args, **kwargs):
         return super().get(request, *args, **kwargs)
@@ -170,7 +227,7 @@ class ReviewSearchFilter(generics.ListAPIView):
 
 
 
-class MovieListCreate(generics.ListCreateAPIView):
+class MovieListCreate(ProfiledViewMixin, QueryBudgetMixin, AdmissionControlMixin, ReplicaReadMixin, CachedResponseMixin, SearchPaginationMixin, SparseFieldsetMixin, RowListMixin, generics.ListCreateAPIView):
     """
     A simple view to fetch all movies within the system.
     Can also be used to create a new movie to be added to the system
@@ -178,6 +235,19 @@ class MovieListCreate(generics.ListCreateAPIView):
     queryset = Movie.objects.all()
     serializer_class = MovieSerializer
     permission_classes = [IsAuthenticatedOrReadOnly, IsOwnerOrReadOnly]
+    pagination_class = MovieCursorPagination
+
+    # Ranked searches are paged by page number, listings and sorted listings by cursor
+    search_params = ['search']
+    search_pagination_class = MovieSearchPagination
+    query_budget = {'GET': 3, 'POST': 2}
+    admission_class = {'GET': 'list'}
+    cache_models = ('movie', 'review')  # Review writes change the rating aggregates
+
+    # Filtering and sorting on the precomputed rating aggregates
+    filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
+    filterset_class = MovieFilter
+    ordering_fields = ['movie_title', 'release_date', 'review_count', 'average_rating']
 
     @swagger_auto_schema(operation_summary="List all movies", operation_description="Retrieve all movies.")
     def list(self, request, *args, **kwargs):
@@ -190,10 +260,13 @@ class MovieListCreate(generics.ListCreateAPIView):
 
 
 
-class MovieDetail(generics.RetrieveUpdateDestroyAPIView):
+class MovieDetail(ProfiledViewMixin, QueryBudgetMixin, ReplicaReadMixin, CachedResponseMixin, SparseFieldsetMixin, generics.RetrieveUpdateDestroyAPIView):
     queryset = Movie.objects.all()
     serializer_class = MovieSerializer
     permission_classes = [IsAuthenticatedOrReadOnly, IsOwnerOrReadOnly]
+    # A delete also collects and removes the movie's reviews, ranking and review activity in one query each
+    query_budget = {'GET': 2, 'PUT': 3, 'PATCH': 3, 'DELETE': 7}
+    cache_models = ('movie', 'review')
 
     @swagger_auto_schema(operation_summary="Retrieve a movie", operation_description="Retrieve details of a specific movie.")
     def retrieve(self, request, *args, **kwargs):
@@ -206,3 +279,343 @@ class MovieDetail(generics.RetrieveUpdateDestroyAPIView):
     @swagger_auto_schema(operation_summary="Delete a movie", operation_description="Delete an existing movie.")
     def destroy(self, request, *args, **kwargs):
         return super().destroy(request, *args, **kwargs)
+
+
+
+## View to list the movie leaderboards, precomputed by reviews.leaderboards
+class MovieLeaderboard(ProfiledViewMixin, QueryBudgetMixin, AdmissionControlMixin, ReplicaReadMixin, CachedResponseMixin, generics.ListAPIView):
+    """
+    A view to list the movies on a leaderboard, best first: top-rated by Bayesian average
+    rating, most-reviewed-week or trending. Every page is read straight off the board's index.
+    """
+    serializer_class = MovieRankingSerializer
+    permission_classes = [IsAuthenticatedOrReadOnly]
+    pagination_class = LeaderboardPagination
+    filter_backends = []
+    query_budget = 2  # JWT user lookup and the page with its movies
+    admission_class = 'list'
+    cache_models = ('movieranking', 'movie', 'review')
+
+    @property
+    def score_field(self):
+        return leaderboards.BOARDS[self.kwargs['board']][0]
+
+    def get_queryset(self):
+        if getattr(self, 'swagger_fake_view', False):
+            return leaderboards.MovieRanking.objects.none()
+        if self.kwargs['board'] not in leaderboards.BOARDS:
+            raise NotFound(f'No leaderboard named "{self.kwargs["board"]}", choose one of {", ".join(leaderboards.BOARDS)}.')
+        return leaderboards.ranked(self.kwargs['board'])
+
+    @swagger_auto_schema(operation_summary="List a movie leaderboard",
+                         operation_description="Movies ranked by top-rated, most-reviewed-week or trending.")
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+
+## Views to recommend movies from the item-item similarities computed by reviews.recommendations
+class SimilarMovies(ProfiledViewMixin, QueryBudgetMixin, ReplicaReadMixin, CachedResponseMixin, generics.ListAPIView):
+    """
+    A view to list the movies rated most like this one, most similar first.
+    """
+    serializer_class = ScoredMovieSerializer
+    permission_classes = [IsAuthenticatedOrReadOnly]
+    pagination_class = None
+    filter_backends = []
+    query_budget = 2  # JWT user lookup and the movies
+    cache_models = ('movie', 'moviesimilarity')
+
+    @swagger_auto_schema(operation_summary="List similar movies",
+                         operation_description="Movies whose ratings are most like this movie's, from the offline similarity job.")
+    def list(self, request, *args, **kwargs):
+        pk = kwargs['pk']
+        neighbours = recommendations.similar_movies(pk)
+        movies = Movie.objects.in_bulk([pk, *(movie_id for movie_id, _ in neighbours)])
+        if pk not in movies:
+            raise NotFound('No movie with this id.')
+        return Response(self.get_serializer(_scored(neighbours, movies), many=True).data)
+
+
+class RecommendedMovies(ProfiledViewMixin, QueryBudgetMixin, AdmissionControlMixin, ReplicaReadMixin, generics.ListAPIView):
+    """
+    A view to list the movies the logged-in user is predicted to rate highest, from their latest ratings.
+    Responses differ per user, so they are not cached.
+    """
+    serializer_class = ScoredMovieSerializer
+    permission_classes = [IsAuthenticated]
+    pagination_class = None
+    filter_backends = []
+    query_budget = 3  # JWT user lookup, the user's ratings and the movies
+    admission_class = 'list'
+    max_limit = 50
+
+    @swagger_auto_schema(operation_summary="List recommended movies",
+                         operation_description="Movies you are predicted to rate highest, best first.",
+                         manual_parameters=[query_param('limit', 'integer', "Number of movies, at most 50")])
+    def list(self, request, *args, **kwargs):
+        limit = min(max(_as_int(request.query_params.get('limit')) or 10, 1), self.max_limit)
+        recent = (getattr(settings, 'RECOMMENDATIONS', None) or {}).get('RECENT_RATINGS', 50)
+        latest = Review.objects.filter(user=request.user).order_by('-created_date', '-id')
+        # Oldest first, so the latest rating of a movie reviewed twice wins
+        ratings = dict(reversed(latest.values_list('movie_id', 'rating')[:recent]))
+        predictions = recommendations.recommend(ratings, limit)
+        movies = Movie.objects.in_bulk([movie_id for movie_id, _ in predictions]) if predictions else {}
+        return Response(self.get_serializer(_scored(predictions, movies), many=True).data)
+
+
+def _scored(scores, movies):
+    # Movies deleted since the similarities were computed are left out
+    return [{'score': score, 'movie': movies[movie_id]} for movie_id, score in scores if movie_id in movies]
+
+
+## View to suggest movie titles while the user types, from the in-memory index of reviews.typeahead
+class MovieAutocomplete(ProfiledViewMixin, QueryBudgetMixin, APIView):
+    """
+    A view to list the movies with a title word starting with ``q``, most reviewed first.
+    The suggestions are public, so requests are not authenticated and cost no query.
+    """
+    permission_classes = [AllowAny]
+    authentication_classes = []
+    query_budget = 0
+
+    @swagger_auto_schema(operation_summary="Suggest movie titles",
+                         operation_description="Movies with a title word starting with q, most reviewed first.",
+                         manual_parameters=[query_param('q', 'string', "What the user typed so far"),
+                                            query_param('limit', 'integer', "Number of movies, at most 50")])
+    def get(self, request, *args, **kwargs):
+        config = getattr(settings, 'TYPEAHEAD', None) or {}
+        max_limit = config.get('MAX_LIMIT', 50)
+        limit = min(max(_as_int(request.query_params.get('limit')) or config.get('LIMIT', 10), 1), max_limit)
+        # Building the index is this process's, not this request's, work
+        with uncounted():
+            index = typeahead.get_index()
+        results = index.lookup(request.query_params.get('q', ''), limit)
+        return Response({'results': [suggestion._asdict() for suggestion in results]})
+
+
+## View to sync movies and reviews incrementally, from the change log of reviews.changelog
+class ChangeFeed(ProfiledViewMixin, QueryBudgetMixin, AdmissionControlMixin, ReplicaReadMixin, APIView):
+    """
+    A view to list the movies and reviews created, updated or deleted after a cursor, oldest change first.
+    Deletes come as tombstones without data; clients pass the returned cursor back until has_more is false.
+    """
+    query_budget = 5  # JWT user lookup, the pruning horizon, the changes and the changed movies and reviews
+    admission_class = 'list'
+
+    @swagger_auto_schema(operation_summary="Sync changes",
+                         operation_description="Movies and reviews changed after the cursor; 410 when the cursor is too old.",
+                         manual_parameters=[
+                             query_param('cursor', 'integer', "Cursor of the last page, 0 to start"),
+                             query_param('limit', 'integer', "Changes per page"),
+                         ])
+    def get(self, request, *args, **kwargs):
+        if connection.vendor != 'sqlite':
+            raise changelog.Unsupported()
+        config = getattr(settings, 'CHANGE_LOG', None) or {}
+        cursor = _as_int(request.query_params.get('cursor', 0))
+        if cursor is None or cursor < 0:
+            raise ValidationError({'cursor': 'Must be a cursor returned by this endpoint, or 0.'})
+        max_limit = config.get('MAX_LIMIT', 1000)
+        limit = min(max(_as_int(request.query_params.get('limit')) or config.get('PAGE_SIZE', 100), 1), max_limit)
+        context = {'request': request, 'view': self}
+        changes, cursor, has_more = changelog.changes_since(cursor, limit, {
+            'movie': lambda movies: MovieSerializer(movies, many=True, context=context).data,
+            'review': lambda reviews: ReviewSerializer(reviews, many=True, context=context).data,
+        })
+        return Response({'changes': changes, 'cursor': cursor, 'has_more': has_more})
+
+
+## View to report the admission control of this worker process
+class AdmissionMetrics(ProfiledViewMixin, QueryBudgetMixin, APIView):
+    """
+    A view to show staff the queue depth, active requests and rejections per admission class.
+    """
+    permission_classes = [IsAdminUser]
+    query_budget = 1  # JWT user lookup
+
+    @swagger_auto_schema(operation_summary="Admission control metrics",
+                         operation_description="Counters of the worker process that answers, see reviews.admission.")
+    def get(self, request, *args, **kwargs):
+        return Response(admission.metrics())
+
+
+## View to export reviews for offline analysis
+class ReviewExport(ProfiledViewMixin, QueryBudgetMixin, AdmissionControlMixin, APIView):
+    """
+    A view to download every review matching the filters as NDJSON (the default) or CSV.
+    The rows are streamed in chunks, so the response never sits in memory as a whole,
+    and are gzipped when the client accepts it.
+    """
+    permission_classes = [IsAuthenticated]
+    renderer_classes = [export.NDJSONRenderer, export.CSVRenderer]
+    query_budget = 1  # JWT user lookup; the rows are read while streaming, after the view has returned
+    admission_class = 'export'  # Holds its slot until the whole corpus has streamed
+
+    accepts_gzip = re.compile(r'\bgzip\b')
+
+    @swagger_auto_schema(
+    operation_summary="Export reviews",
+    operation_description="Stream reviews as NDJSON or CSV, gzipped when the client sends Accept-Encoding: gzip.",
+    manual_parameters=[
+        query_param('format', 'string', "ndjson (default) or csv"),
+        query_param('movie', 'integer', "Filter by movie id"),
+        query_param('rating', 'integer', "Filter by rating (1-5)"),
+        query_param('created_after', 'string', "ISO 8601 date or datetime, inclusive"),
+        query_param('created_before', 'string', "ISO 8601 date or datetime, exclusive"),
+    ])
+    def get(self, request, *args, **kwargs):
+        filterset = export.filter_reviews(request.query_params)
+        if not filterset.is_valid():
+            raise ValidationError(filterset.errors)
+
+        export_format = request.accepted_renderer.format
+        compress = bool(self.accepts_gzip.search(request.META.get('HTTP_ACCEPT_ENCODING', '')))
+        response = StreamingHttpResponse(
+            export.stream(filterset.qs, export_format, compress=compress),
+            content_type=f'{export.FORMATS[export_format]}; charset=utf-8',
+        )
+        response['Content-Disposition'] = f'attachment; filename="reviews.{export_format}"'
+        response['Vary'] = 'Accept, Accept-Encoding'
+        if compress:
+            response['Content-Encoding'] = 'gzip'
+        return response
+
+
+## Bulk endpoints for catalogue sync and review ingest
+class BulkAPIView(ProfiledViewMixin, QueryBudgetMixin, AdmissionControlMixin, ReplicaReadMixin, generics.GenericAPIView):
+    """
+    Base view that creates (POST) or updates (PATCH) many objects from one JSON array.
+    Valid items are saved with bulk_create/bulk_update in a single transaction and the
+    invalid ones are reported back by their position in the array.
+    """
+    permission_classes = [IsAuthenticated]
+    bulk_serializer_class = None  # A reviews.serializers.BulkListSerializer
+
+    # Lookups, transaction savepoints, aggregate and leaderboard updates, plus one query for
+    # every batch of rows; never one per row
+    query_budget = {'POST': 12, 'PATCH': 12}
+    admission_class = 'bulk'
+    rows_per_query = 20
+
+    def get_query_budget(self, method):
+        budget = super().get_query_budget(method)
+        if budget is None:
+            return None
+        return budget + math.ceil(len(getattr(self, 'bulk_items', ())) / self.rows_per_query)
+
+    def get_items(self, request):
+        items = request.data
+        if not isinstance(items, list):
+            raise ValidationError({'detail': 'Expected a list of items.'})
+        max_items = getattr(settings, 'BULK_MAX_ITEMS', 5000)
+        if len(items) > max_items:
+            raise ValidationError({'detail': f'At most {max_items} items can be sent in one request.'})
+        self.bulk_items = items
+        return items
+
+    def get_bulk_context(self, items):
+        # Objects every item may refer to, fetched once for the whole array
+        return {}
+
+    def get_instances(self, ids):
+        return self.get_queryset().in_bulk(ids)
+
+    def get_save_kwargs(self):
+        return {}
+
+    def get_bulk_serializer(self, instance=None, data=None, partial=False):
+        # Built here rather than with many=True, which keeps DRF's ListSerializer for every other use
+        context = self.get_serializer_context()
+        child = self.get_serializer_class()(context=context, partial=partial)
+        return self.bulk_serializer_class(instance, data=data, child=child, context=context, partial=partial)
+
+    def post(self, request, *args, **kwargs):
+        items = self.get_items(request)
+        serializer = self.get_bulk_serializer(data=items)
+        return self.save_items(serializer, items, status.HTTP_201_CREATED)
+
+    def patch(self, request, *args, **kwargs):
+        items = self.get_items(request)
+        ids = {_as_int(item.get('id')) for item in items if isinstance(item, dict)} - {None}
+        serializer = self.get_bulk_serializer(self.get_instances(ids), data=items, partial=True)
+        return self.save_items(serializer, items, status.HTTP_200_OK)
+
+    def save_items(self, serializer, items, success_status):
+        serializer.context.update(self.get_bulk_context(items))
+        serializer.is_valid()
+        saved = serializer.save(**self.get_save_kwargs()) if serializer.valid_indexes else []
+
+        results = [None] * len(items)
+        for index, obj in zip(serializer.valid_indexes, saved):
+            results[index] = {'id': obj.pk}
+        item_errors = {index: errors for index, errors in enumerate(serializer.errors) if errors}
+        for index, errors in item_errors.items():
+            results[index] = {'errors': errors}
+
+        if not item_errors:
+            response_status = success_status
+        elif saved:
+            response_status = status.HTTP_207_MULTI_STATUS
+        else:
+            response_status = status.HTTP_400_BAD_REQUEST
+        return Response(
+            {'saved': len(saved), 'failed': len(item_errors), 'results': results},
+            status=response_status,
+        )
+
+
+class ReviewBulk(BulkAPIView):
+    """
+    Create or update many reviews of the logged-in user in one request.
+    """
+    serializer_class = ReviewSerializer
+    bulk_serializer_class = ReviewListSerializer
+
+    def get_queryset(self):
+        # Only the user's own reviews can be updated, others read as not found
+        return Review.objects.filter(user=self.request.user)
+
+    def get_bulk_context(self, items):
+        movie_ids = {_as_int(item.get('movie')) for item in items if isinstance(item, dict)} - {None}
+        return {'movies': Movie.objects.in_bulk(movie_ids)}
+
+    def get_save_kwargs(self):
+        return {'user': self.request.user}
+
+    @swagger_auto_schema(operation_summary="Create reviews in bulk", request_body=ReviewSerializer(many=True),
+                         operation_description="Create up to BULK_MAX_ITEMS reviews, reporting errors per item.")
+    def post(self, request, *args, **kwargs):
+        return super().post(request, *args, **kwargs)
+
+    @swagger_auto_schema(operation_summary="Update reviews in bulk", request_body=ReviewSerializer(many=True),
+                         operation_description="Update many of your reviews, each item identified by its id.")
+    def patch(self, request, *args, **kwargs):
+        return super().patch(request, *args, **kwargs)
+
+
+class MovieBulk(BulkAPIView):
+    """
+    Create or update many movies in one request, for staff syncing the catalogue.
+    """
+    # Movies have no owner, so like on MovieDetail no other user may change them
+    permission_classes = [IsAdminUser]
+    queryset = Movie.objects.all()
+    serializer_class = MovieSerializer
+    bulk_serializer_class = MovieListSerializer
+
+    @swagger_auto_schema(operation_summary="Create movies in bulk", request_body=MovieSerializer(many=True),
+                         operation_description="Staff only. Create up to BULK_MAX_ITEMS movies, reporting errors per item.")
+    def post(self, request, *args, **kwargs):
+        return super().post(request, *args, **kwargs)
+
+    @swagger_auto_schema(operation_summary="Update movies in bulk", request_body=MovieSerializer(many=True),
+                         operation_description="Staff only. Update many movies, each item identified by its id.")
+    def patch(self, request, *args, **kwargs):
+        return super().patch(request, *args, **kwargs)
+
+
+def _as_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None